@@ -3,15 +3,24 @@ Authentication and Connection Helper
 Provides database connection functionality
 """
 
+import os
 import yaml
 import logging
 
+# Parsed config files by path, reloaded when the file's mtime changes
+_config_cache = {}
+
 def load_config(path="config/config.yaml"):
     """Load configuration from YAML file"""
     try:
+        mtime = os.path.getmtime(path)
+        cached = _config_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
         with open(path, "r") as f:
             config = yaml.safe_load(f)
-            return config
+        _config_cache[path] = (mtime, config)
+        return config
     except FileNotFoundError:
         logging.warning(f"Config file {path} not found, using defaults")
         return {}
@@ -4,23 +4,33 @@ Backend API Server for Order Matching React Application
 Provides REST API endpoints for the React + Electron frontend
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 import sys
 import os
 from pathlib import Path
-import pyodbc
+import io
+import csv
 import json
+import decimal
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import logging
 import traceback
 import uuid
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Add project root to path
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
+from utils import db_pool
+
+sys.path.append(str(Path(__file__).parent))
+from matching_jobs import MatchingJobQueue
+
 try:
     from auth_helper import get_connection_string
 except ImportError:
@@ -28,6 +38,12 @@ except ImportError:
     def get_connection_string():
         return os.environ.get('DATABASE_CONNECTION_STRING', '')
 
+# Arrow IPC export is optional
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
 # Import enhanced matching engine
 try:
     sys.path.append(str(project_root / 'src' / 'reconciliation'))
@@ -50,9 +66,9 @@ class DatabaseManager:
         self.connection_string = get_connection_string()
         
     def get_connection(self):
-        """Get database connection"""
+        """Get a pooled database connection"""
         try:
-            return pyodbc.connect(self.connection_string)
+            return db_pool.connect(self.connection_string)
         except Exception as e:
             logger.error(f"Database connection failed: {str(e)}")
             raise
@@ -119,6 +135,89 @@ class DatabaseManager:
 
 db = DatabaseManager()
 
+class MetadataCache:
+    """
+    Table names, types and primary keys from INFORMATION_SCHEMA, loaded once and
+    refreshed by a background timer so endpoints don't probe the catalog per request
+    """
+    
+    def __init__(self, db, refresh_seconds=300):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self.tables = None
+        self.loaded_at = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._timer = None
+    
+    def refresh(self):
+        """Reload table metadata; keeps the previous snapshot if the query fails"""
+        try:
+            rows = self.db.execute_query("""
+                SELECT TABLE_SCHEMA as table_schema, TABLE_NAME as name, TABLE_TYPE as type
+                FROM INFORMATION_SCHEMA.TABLES
+            """)
+            tables = {row['name'].lower(): {**row, 'primary_key': []} for row in rows}
+            
+            key_rows = self.db.execute_query("""
+                SELECT kcu.TABLE_NAME as table_name, kcu.COLUMN_NAME as column_name
+                FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS tc
+                INNER JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE kcu
+                    ON kcu.CONSTRAINT_NAME = tc.CONSTRAINT_NAME AND kcu.TABLE_SCHEMA = tc.TABLE_SCHEMA
+                WHERE tc.CONSTRAINT_TYPE = 'PRIMARY KEY'
+                ORDER BY kcu.TABLE_NAME, kcu.ORDINAL_POSITION
+            """)
+            for row in key_rows:
+                table = tables.get(row['table_name'].lower())
+                if table is not None:
+                    table['primary_key'].append(row['column_name'])
+            
+            with self._lock:
+                self.tables = tables
+                self.loaded_at = time.monotonic()
+        except Exception as e:
+            logger.warning(f"Metadata refresh failed: {str(e)}")
+        finally:
+            self._schedule()
+    
+    def _schedule(self):
+        timer = threading.Timer(self.refresh_seconds, self.refresh)
+        timer.daemon = True
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = timer
+        timer.start()
+    
+    def _ensure_loaded(self):
+        if self.tables is None:
+            with self._load_lock:
+                if self.tables is None:
+                    self.refresh()
+        if self.tables is None:
+            raise RuntimeError("Table metadata is not available")
+    
+    def table_exists(self, table_name):
+        self._ensure_loaded()
+        return table_name.lower() in self.tables
+    
+    def get_table(self, table_name):
+        self._ensure_loaded()
+        return self.tables.get(table_name.lower())
+    
+    def primary_key(self, table_name):
+        """The table's single primary key column, or None (no key or a composite key)"""
+        table = self.get_table(table_name)
+        if table and len(table['primary_key']) == 1:
+            return table['primary_key'][0]
+        return None
+    
+    def age(self):
+        """Seconds since the last successful refresh"""
+        return None if self.loaded_at is None else round(time.monotonic() - self.loaded_at, 1)
+
+metadata = MetadataCache(db, refresh_seconds=int(os.environ.get('METADATA_REFRESH_SECONDS', '300')))
+
 # Error handler
 @app.errorhandler(Exception)
 def handle_exception(e):
@@ -143,7 +242,8 @@ def health_check():
         return jsonify({
             'status': 'healthy',
             'timestamp': datetime.now().isoformat(),
-            'database': 'connected'
+            'database': 'connected',
+            'connection_pools': db_pool.pool_stats()
         })
     except Exception as e:
         return jsonify({
@@ -194,57 +294,73 @@ def get_system_status():
         })
 
 # Dashboard endpoints
+DASHBOARD_QUERIES = {
+    # System metrics
+    'system_metrics': ('fact_order_movements', """
+        SELECT 
+            COUNT(*) as total_movements,
+            COUNT(DISTINCT CASE WHEN movement_type = 'ORDER_PLACED' THEN order_id END) as total_orders,
+            COUNT(DISTINCT CASE WHEN movement_type = 'SHIPMENT_SHIPPED' THEN shipment_id END) as total_shipments
+        FROM fact_order_movements
+    """),
+    # Matching metrics
+    'matching_metrics': ('enhanced_matching_results', """
+        SELECT 
+            COUNT(*) as total_matches,
+            AVG(match_confidence) as avg_confidence,
+            COUNT(CASE WHEN quantity_check_result = 'FAIL' OR delivery_match = 'MISMATCH' OR match_confidence < 0.8 THEN 1 END) as hitl_queue_size
+        FROM enhanced_matching_results
+    """),
+    # Layer performance
+    'layer_performance': ('enhanced_matching_results', """
+        SELECT 
+            match_layer as layer,
+            COUNT(*) as matches,
+            AVG(match_confidence) as confidence
+        FROM enhanced_matching_results
+        GROUP BY match_layer
+        ORDER BY match_layer
+    """),
+    # Top customers
+    'top_customers': ('enhanced_matching_results', """
+        SELECT TOP 5
+            customer_name as name,
+            COUNT(*) as value
+        FROM enhanced_matching_results
+        GROUP BY customer_name
+        ORDER BY COUNT(*) DESC
+    """),
+}
+
+# Independent dashboard queries run side by side, each on its own pooled connection
+dashboard_executor = ThreadPoolExecutor(max_workers=len(DASHBOARD_QUERIES), thread_name_prefix='dashboard')
+
+def run_dashboard_query(name, table_name, query):
+    """Run one dashboard query; returns (rows or None, seconds)"""
+    started = time.perf_counter()
+    try:
+        if not metadata.table_exists(table_name):
+            return None, 0.0
+        return db.execute_query(query), time.perf_counter() - started
+    except Exception as e:
+        logger.warning(f"Dashboard query {name} failed: {str(e)}")
+        return None, time.perf_counter() - started
+
 @app.route('/api/dashboard/overview', methods=['GET'])
 def get_dashboard_overview():
-    """Get dashboard overview data"""
+    """Get dashboard overview data (add ?debug=1 for per-query timings)"""
     try:
-        # System metrics
-        system_metrics = db.execute_query("""
-            SELECT 
-                COUNT(*) as total_movements,
-                COUNT(DISTINCT CASE WHEN movement_type = 'ORDER_PLACED' THEN order_id END) as total_orders,
-                COUNT(DISTINCT CASE WHEN movement_type = 'SHIPMENT_SHIPPED' THEN shipment_id END) as total_shipments
-            FROM fact_order_movements
-        """)[0] if db.execute_query("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'fact_order_movements'")[0][''] > 0 else {'total_movements': 0, 'total_orders': 0, 'total_shipments': 0}
-        
-        # Matching metrics
-        try:
-            matching_metrics = db.execute_query("""
-                SELECT 
-                    COUNT(*) as total_matches,
-                    AVG(match_confidence) as avg_confidence,
-                    COUNT(CASE WHEN quantity_check_result = 'FAIL' OR delivery_match = 'MISMATCH' OR match_confidence < 0.8 THEN 1 END) as hitl_queue_size
-                FROM enhanced_matching_results
-            """)[0]
-        except:
-            matching_metrics = {'total_matches': 0, 'avg_confidence': 0, 'hitl_queue_size': 0}
-        
-        # Layer performance
-        try:
-            layer_performance = db.execute_query("""
-                SELECT 
-                    match_layer as layer,
-                    COUNT(*) as matches,
-                    AVG(match_confidence) as confidence
-                FROM enhanced_matching_results
-                GROUP BY match_layer
-                ORDER BY match_layer
-            """)
-        except:
-            layer_performance = []
+        started = time.perf_counter()
+        futures = {
+            name: dashboard_executor.submit(run_dashboard_query, name, table_name, query)
+            for name, (table_name, query) in DASHBOARD_QUERIES.items()
+        }
+        results = {name: future.result() for name, future in futures.items()}
         
-        # Top customers
-        try:
-            top_customers = db.execute_query("""
-                SELECT TOP 5
-                    customer_name as name,
-                    COUNT(*) as value
-                FROM enhanced_matching_results
-                GROUP BY customer_name
-                ORDER BY COUNT(*) DESC
-            """)
-        except:
-            top_customers = []
+        system_metrics = (results['system_metrics'][0] or [None])[0] or {'total_movements': 0, 'total_orders': 0, 'total_shipments': 0}
+        matching_metrics = (results['matching_metrics'][0] or [None])[0] or {'total_matches': 0, 'avg_confidence': 0, 'hitl_queue_size': 0}
+        layer_performance = results['layer_performance'][0] or []
+        top_customers = results['top_customers'][0] or []
         
         # Recent activity (mock data for now)
         recent_activity = [
@@ -269,7 +385,7 @@ def get_dashboard_overview():
         if system_metrics['total_shipments'] > 0:
             match_rate = (matching_metrics['total_matches'] / system_metrics['total_shipments']) * 100
         
-        return jsonify({
+        overview = {
             'totalMovements': system_metrics['total_movements'],
             'totalMatches': matching_metrics['total_matches'],
             'matchRate': match_rate,
@@ -277,7 +393,16 @@ def get_dashboard_overview():
             'recentActivity': recent_activity,
             'layerPerformance': layer_performance,
             'topCustomers': top_customers
-        })
+        }
+        
+        if request.args.get('debug', '').lower() in ('1', 'true', 'yes'):
+            overview['timings'] = {
+                'queries_ms': {name: round(seconds * 1000, 1) for name, (_, seconds) in results.items()},
+                'total_ms': round((time.perf_counter() - started) * 1000, 1),
+                'metadata_age_s': metadata.age()
+            }
+        
+        return jsonify(overview)
         
     except Exception as e:
         logger.error(f"Dashboard overview error: {str(e)}")
@@ -292,43 +417,197 @@ def get_dashboard_overview():
         })
 
 # Data viewer endpoints
+# Tables the data viewer and export endpoints may read (validated to prevent SQL injection)
+DATA_VIEWER_TABLES = [
+    'fact_order_movements', 'enhanced_matching_results', 
+    'FACT_ORDER_LIST', 'FM_orders_shipped', 'shipment_summary_cache'
+]
+
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '5000'))
+
+def estimated_row_count(table_name):
+    """Row count from partition metadata, without scanning the table"""
+    result = db.execute_query("""
+        SELECT SUM(p.rows) as total
+        FROM sys.partitions p
+        WHERE p.object_id = OBJECT_ID(?) AND p.index_id IN (0, 1)
+    """, [table_name])
+    return int(result[0]['total'] or 0) if result else 0
+
 @app.route('/api/data/<table_name>', methods=['GET'])
 def get_table_data(table_name):
-    """Get paginated table data"""
+    """
+    Get table data a page at a time.
+    Tables with a single-column primary key are paged by key (keyset): pass a
+    page's next_cursor as ?after= or its prev_cursor as ?before=, so every page
+    costs the same however deep it is. ?page=N without a cursor (jumping to a
+    page, or tables without such a key) uses offset paging. total is estimated
+    from partition statistics.
+    """
     try:
         page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 100))
-        offset = (page - 1) * limit
+        limit = max(1, min(int(request.args.get('limit', 100)), 1000))
+        after = request.args.get('after')
+        before = request.args.get('before')
         
-        # Validate table name to prevent SQL injection
-        allowed_tables = [
-            'fact_order_movements', 'enhanced_matching_results', 
-            'FACT_ORDER_LIST', 'FM_orders_shipped', 'shipment_summary_cache'
-        ]
-        
-        if table_name not in allowed_tables:
+        if table_name not in DATA_VIEWER_TABLES:
             return jsonify({'error': 'Table not allowed'}), 400
         
-        # Get total count
-        count_query = f"SELECT COUNT(*) as total FROM {table_name}"
-        total_result = db.execute_query(count_query)
-        total = total_result[0]['total'] if total_result else 0
-        
-        # Get data
-        data_query = f"SELECT * FROM {table_name} ORDER BY 1 OFFSET {offset} ROWS FETCH NEXT {limit} ROWS ONLY"
-        data = db.execute_query(data_query)
+        key = metadata.primary_key(table_name)
+        total = estimated_row_count(table_name)
+        
+        if key is None or (after is None and before is None and page > 1):
+            offset = (page - 1) * limit
+            order_by = f"[{key}]" if key else "1"
+            data_query = f"SELECT * FROM {table_name} ORDER BY {order_by} OFFSET {offset} ROWS FETCH NEXT {limit} ROWS ONLY"
+            data = db.execute_query(data_query)
+            
+            return jsonify({
+                'data': data,
+                'total': total,
+                'total_is_estimate': True,
+                'page': page,
+                'limit': limit,
+                'key': key,
+                'next_cursor': data[-1][key] if key and len(data) == limit else None,
+                'prev_cursor': data[0][key] if key and data and page > 1 else None
+            })
+        
+        # Fetch one extra row to know whether another page follows
+        if before is not None:
+            data = db.execute_query(f"""
+                SELECT * FROM (
+                    SELECT TOP (?) * FROM {table_name} WHERE [{key}] < ? ORDER BY [{key}] DESC
+                ) page ORDER BY [{key}]
+            """, [limit + 1, before])
+            has_previous, has_next = len(data) > limit, True
+            data = data[-limit:]
+        elif after is not None:
+            data = db.execute_query(f"SELECT TOP (?) * FROM {table_name} WHERE [{key}] > ? ORDER BY [{key}]",
+                                    [limit + 1, after])
+            has_previous, has_next = True, len(data) > limit
+            data = data[:limit]
+        else:
+            data = db.execute_query(f"SELECT TOP (?) * FROM {table_name} ORDER BY [{key}]", [limit + 1])
+            has_previous, has_next = False, len(data) > limit
+            data = data[:limit]
         
         return jsonify({
             'data': data,
             'total': total,
-            'page': page,
-            'limit': limit
+            'total_is_estimate': True,
+            'limit': limit,
+            'key': key,
+            'next_cursor': data[-1][key] if data and has_next else None,
+            'prev_cursor': data[0][key] if data and has_previous else None
         })
         
     except Exception as e:
         logger.error(f"Get table data error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def _arrow_type(type_code, precision, scale):
+    """Arrow type for a pyodbc cursor.description type code"""
+    if type_code is bool:
+        return pa.bool_()
+    if type_code is int:
+        return pa.int64()
+    if type_code is float:
+        return pa.float64()
+    if type_code is decimal.Decimal:
+        return pa.decimal128(precision or 38, scale or 0)
+    if type_code is datetime:
+        return pa.timestamp('us')
+    if type_code is date:
+        return pa.date32()
+    if type_code in (bytes, bytearray):
+        return pa.binary()
+    return pa.string()
+
+def _stream_rows(table_name, key, chunk_size):
+    """Yield (columns, rows) chunks from one pooled connection, never holding the whole table"""
+    order_by = f" ORDER BY [{key}]" if key else ""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM {table_name}{order_by}")
+        description = cursor.description
+        # Lead with the columns alone so an empty table still gets a CSV header / Arrow schema
+        yield description, []
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield description, rows
+
+def _export_ndjson(chunks):
+    for description, rows in chunks:
+        columns = [column[0] for column in description]
+        yield ''.join(json.dumps(dict(zip(columns, row)), default=str) + '\n' for row in rows)
+
+def _export_csv(chunks):
+    header_written = False
+    for description, rows in chunks:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not header_written:
+            writer.writerow([column[0] for column in description])
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+def _export_arrow(chunks):
+    # One IPC stream; the schema comes from the leading chunk, each later chunk is a record batch flushed to the client
+    buffer = io.BytesIO()
+    writer = None
+    for description, rows in chunks:
+        if writer is None:
+            schema = pa.schema([(column[0], _arrow_type(column[1], column[4], column[5])) for column in description])
+            writer = pa.ipc.new_stream(buffer, schema)
+        if not rows:
+            continue
+        columns = list(zip(*rows))
+        writer.write_batch(pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+        ))
+        yield _drain(buffer)
+    if writer is not None:
+        writer.close()
+        yield _drain(buffer)
+
+def _drain(buffer):
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return data
+
+EXPORT_FORMATS = {
+    'ndjson': (_export_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (_export_csv, 'text/csv', 'csv'),
+    'arrow': (_export_arrow, 'application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+@app.route('/api/export/<table_name>', methods=['GET'])
+def export_table(table_name):
+    """Stream a whole table as NDJSON (default), CSV or Arrow IPC, EXPORT_CHUNK_SIZE rows at a time"""
+    if table_name not in DATA_VIEWER_TABLES:
+        return jsonify({'error': 'Table not allowed'}), 400
+    
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unknown export format: {export_format}"}), 400
+    if export_format == 'arrow' and pa is None:
+        return jsonify({'error': 'Arrow export requires pyarrow'}), 400
+    
+    chunk_size = max(1, min(int(request.args.get('chunk_size', EXPORT_CHUNK_SIZE)), 50000))
+    encode, mimetype, extension = EXPORT_FORMATS[export_format]
+    chunks = _stream_rows(table_name, metadata.primary_key(table_name), chunk_size)
+    
+    return Response(
+        stream_with_context(encode(chunks)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={table_name}_export.{extension}'}
+    )
+
 @app.route('/api/data/<table_name>/schema', methods=['GET'])
 def get_table_schema(table_name):
     """Get table schema information"""
@@ -421,9 +700,24 @@ def approve_match(match_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # Matching engine endpoints
+def run_matching_job(job):
+    """Run one queued matching job, reporting engine progress on the job"""
+    engine = EnhancedMatchingEngine(progress_callback=job.report)
+    return engine.run_enhanced_matching(
+        job.customer_name,
+        job.po_number,
+        incremental=bool(job.options.get('incremental', False))
+    )
+
+matching_jobs = MatchingJobQueue(
+    run_matching_job,
+    max_workers=int(os.environ.get('MATCHING_JOB_WORKERS', '2')),
+    max_jobs=int(os.environ.get('MATCHING_JOB_HISTORY', '200'))
+)
+
 @app.route('/api/matching/run', methods=['POST'])
 def run_matching():
-    """Run the enhanced matching engine"""
+    """Queue an enhanced matching run; poll /api/matching/jobs/<job_id> for progress"""
     try:
         if not EnhancedMatchingEngine:
             return jsonify({'error': 'Matching engine not available'}), 500
@@ -435,11 +729,10 @@ def run_matching():
         if not customer_name:
             return jsonify({'error': 'Customer name is required'}), 400
         
-        # Run enhanced matching
-        engine = EnhancedMatchingEngine()
-        results = engine.run_enhanced_matching(customer_name, po_number)
+        # A customer/PO run already queued or running returns its existing job
+        job, created = matching_jobs.submit(customer_name, po_number, data.get('options') or {})
         
-        return jsonify(results)
+        return jsonify({**job.to_dict(), 'deduplicated': not created}), 202 if created else 200
         
     except Exception as e:
         logger.error(f"Run matching error: {str(e)}")
@@ -451,6 +744,22 @@ def run_matching():
             'match_rate': 0
         }), 500
 
+@app.route('/api/matching/jobs', methods=['GET'])
+def get_matching_jobs():
+    """List recent matching jobs"""
+    limit = int(request.args.get('limit', 50))
+    jobs = [job.to_dict() for job in matching_jobs.list(limit)]
+    return jsonify({'data': jobs, 'total': len(jobs)})
+
+@app.route('/api/matching/jobs/<job_id>', methods=['GET'])
+def get_matching_job(job_id):
+    """Job status and per-layer progress; ?include_result=1 adds the full result with matches"""
+    job = matching_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    include_result = request.args.get('include_result', '').lower() in ('1', 'true', 'yes')
+    return jsonify(job.to_dict(include_result=include_result))
+
 @app.route('/api/matching/history', methods=['GET'])
 def get_matching_history():
     """Get matching execution history"""
@@ -622,18 +931,6 @@ def get_customers():
 def get_available_tables():
     """Get list of available tables"""
     try:
-        query = """
-            SELECT 
-                TABLE_NAME as name,
-                TABLE_TYPE as type
-            FROM INFORMATION_SCHEMA.TABLES
-            WHERE TABLE_TYPE = 'BASE TABLE'
-                AND TABLE_NAME IN ('fact_order_movements', 'enhanced_matching_results', 
-                                  'FACT_ORDER_LIST', 'FM_orders_shipped', 'shipment_summary_cache')
-        """
-        
-        tables = db.execute_query(query)
-        
         # Add display names
         display_names = {
             'fact_order_movements': 'Movement Table',
@@ -643,6 +940,12 @@ def get_available_tables():
             'shipment_summary_cache': 'Shipment Cache'
         }
         
+        tables = []
+        for table_name in display_names:
+            table = metadata.get_table(table_name)
+            if table and table['type'] == 'BASE TABLE':
+                tables.append({'name': table['name'], 'type': table['type']})
+        
         for table in tables:
             table['displayName'] = display_names.get(table['name'], table['name'])
         
@@ -0,0 +1,156 @@
+"""
+In-memory job queue for enhanced matching runs started through the API.
+- Submissions return a job id immediately; a bounded worker pool runs them
+- One active job per customer and PO: resubmitting returns the queued/running job
+- Per-stage progress reported by the engine (LOADED, LAYER_0..LAYER_3, STORED)
+- Finished jobs and their results are kept until the store is full, oldest evicted first
+"""
+
+import threading
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED'
+
+# Percent complete once each engine stage has finished
+STAGE_PROGRESS = {
+    'STARTED': 5,
+    'LOADED': 20,
+    'LAYER_0': 40,
+    'LAYER_1': 55,
+    'LAYER_2': 70,
+    'LAYER_3': 85,
+    'STORED': 95,
+}
+
+
+class MatchingJob:
+    """One matching run and its progress"""
+
+    def __init__(self, customer_name: str, po_number: Optional[str] = None, options: Optional[Dict] = None):
+        self.id = str(uuid.uuid4())
+        self.customer_name = customer_name
+        self.po_number = po_number
+        self.options = options or {}
+        self.status = QUEUED
+        self.progress = 0
+        self.stages: List[Dict[str, Any]] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.submitted_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def report(self, stage: str, details: Optional[Dict[str, Any]] = None):
+        """Progress callback handed to the engine"""
+        with self._lock:
+            self.stages.append({'stage': stage, 'at': datetime.now().isoformat(), **(details or {})})
+            self.progress = max(self.progress, STAGE_PROGRESS.get(stage, self.progress))
+
+    def to_dict(self, include_result: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            job = {
+                'job_id': self.id,
+                'customer_name': self.customer_name,
+                'po_number': self.po_number,
+                'status': self.status,
+                'progress': self.progress,
+                'stages': list(self.stages),
+                'error': self.error,
+                'submitted_at': self.submitted_at.isoformat(),
+                'started_at': self.started_at.isoformat() if self.started_at else None,
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            }
+            if self.result is not None:
+                # Summary without the per-match rows, which can be large
+                job['summary'] = {key: value for key, value in self.result.items()
+                                  if key not in ('matches', 'unmatched_shipment_ids')}
+                if include_result:
+                    job['result'] = self.result
+            return job
+
+
+class MatchingJobQueue:
+    """
+    Bounded pool of matching runs. runner(job) performs the run, calling
+    job.report(stage, details) as it goes, and returns the result dict.
+    """
+
+    def __init__(self, runner: Callable[[MatchingJob], Dict[str, Any]], max_workers: int = 2, max_jobs: int = 200):
+        self.runner = runner
+        self.max_jobs = max_jobs
+        self._jobs: Dict[str, MatchingJob] = {}
+        self._active_by_key: Dict[str, MatchingJob] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='matching-job')
+
+    @staticmethod
+    def job_key(customer_name: str, po_number: Optional[str] = None):
+        """Runs for the same customer and PO (or the whole customer, when po_number is empty) are de-duplicated"""
+        po = str(po_number).strip().upper() if po_number is not None else ''
+        return customer_name.strip().upper(), po or None
+
+    def submit(self, customer_name: str, po_number: Optional[str] = None, options: Optional[Dict] = None):
+        """Queue a run; returns (job, created) where created is False for a de-duplicated submission"""
+        key = self.job_key(customer_name, po_number)
+        with self._lock:
+            active = self._active_by_key.get(key)
+            if active is not None and active.active:
+                return active, False
+
+            job = MatchingJob(customer_name, po_number, options)
+            self._jobs[job.id] = job
+            self._active_by_key[key] = job
+            self._evict_finished()
+
+        self._executor.submit(self._run, key, job)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[MatchingJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, limit: int = 50) -> List[MatchingJob]:
+        """Most recently submitted jobs first"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return sorted(jobs, key=lambda job: job.submitted_at, reverse=True)[:limit]
+
+    def _run(self, key: str, job: MatchingJob):
+        job.status = RUNNING
+        job.started_at = datetime.now()
+        job.report('STARTED')
+        try:
+            job.result = self.runner(job)
+            job.status = SUCCEEDED
+            job.progress = 100
+        except Exception as e:
+            logger.error(f"Matching job {job.id} for {job.customer_name} failed: {str(e)}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = datetime.now()
+            with self._lock:
+                if self._active_by_key.get(key) is job:
+                    del self._active_by_key[key]
+
+    def _evict_finished(self):
+        # Dicts keep insertion order, so the first finished jobs are the oldest
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if not job.active][:excess]:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -224,6 +224,8 @@ def reject_match(match_id):
     })
 
 # Matching engine endpoints
+mock_jobs = {}
+
 @app.route('/api/matching/run', methods=['POST'])
 def run_matching():
     """Run the enhanced matching engine"""
@@ -278,7 +280,37 @@ def run_matching():
         'unmatched_shipment_ids': [1004]
     }
     
-    return jsonify(results)
+    # Same contract as the real server's job queue; mock jobs finish immediately
+    now = datetime.now().isoformat()
+    job = {
+        'job_id': str(uuid.uuid4()),
+        'customer_name': customer_name,
+        'po_number': po_number,
+        'status': 'SUCCEEDED',
+        'progress': 100,
+        'stages': [
+            {'stage': stage, 'at': now, 'total_matches': total}
+            for stage, total in [('LAYER_0', 8), ('LAYER_1', 12), ('LAYER_2', 14), ('LAYER_3', 14), ('STORED', 14)]
+        ],
+        'error': None,
+        'submitted_at': now,
+        'started_at': now,
+        'finished_at': now,
+        'deduplicated': False
+    }
+    mock_jobs[job['job_id']] = {**job, 'result': results}
+    
+    return jsonify(job), 202
+
+@app.route('/api/matching/jobs/<job_id>', methods=['GET'])
+def get_matching_job(job_id):
+    """Get matching job status"""
+    job = mock_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if request.args.get('include_result', '').lower() in ('1', 'true', 'yes'):
+        return jsonify(job)
+    return jsonify({key: value for key, value in job.items() if key != 'result'})
 
 @app.route('/api/matching/history', methods=['GET'])
 def get_matching_history():
@@ -26,7 +26,14 @@ VALUES
     ('GREYSON', 'threshold', 'uncertain_match', '0.7'),
     ('GREYSON', 'attribute_weight', 'style', '3.0'),
     ('GREYSON', 'attribute_weight', 'color', '2.0'),
-    ('GREYSON', 'attribute_weight', 'size', '1.0');
+    ('GREYSON', 'attribute_weight', 'size', '1.0'),
+    ('GREYSON', 'blocking', 'exact_blocks', 'style'),             -- comma-separated passes, '+' joins columns
+    ('GREYSON', 'blocking', 'style_window', '7'),                 -- sorted-neighbourhood window on normalized style (0 = off)
+    ('GREYSON', 'blocking', 'color_ngram', '3'),                  -- colour n-gram length (0 = off)
+    ('GREYSON', 'blocking', 'color_min_shared', '2'),
+    ('GREYSON', 'blocking', 'color_block_on', 'po_number'),
+    ('GREYSON', 'blocking', 'max_candidate_pairs', '250000'),
+    ('GREYSON', 'blocking', 'full_comparison_below', '10000');
 */
 
 -- Indexes for performance
@@ -0,0 +1,33 @@
+-- 14_add_incremental_watermarks.sql
+-- Adds the per-customer high-water mark used by incremental enhanced matching runs
+
+-- Row version on shipments: bumped on every insert/update, so new or changed
+-- shipments are exactly those above the last recorded mark
+IF COL_LENGTH('dbo.FM_orders_shipped', 'row_version') IS NULL
+BEGIN
+    ALTER TABLE [dbo].[FM_orders_shipped] ADD [row_version] ROWVERSION;
+    CREATE INDEX [IX_FM_orders_shipped_row_version] ON [dbo].[FM_orders_shipped] ([Customer], [row_version]);
+    PRINT 'Added row_version to FM_orders_shipped';
+END
+
+-- Scope and watermark of each matching batch
+IF COL_LENGTH('dbo.reconciliation_batch', 'watermark_row_version') IS NULL
+BEGIN
+    ALTER TABLE [dbo].[reconciliation_batch] ADD
+        [customer_name] NVARCHAR(255) NULL,
+        [po_number] NVARCHAR(100) NULL,
+        [run_mode] NVARCHAR(20) NULL, -- FULL, INCREMENTAL
+        [watermark_row_version] BINARY(8) NULL, -- Highest shipment row_version covered by the batch
+        [watermark_shipped_date] DATE NULL; -- Latest Shipped_Date covered (informational)
+    PRINT 'Added watermark columns to reconciliation_batch';
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_reconciliation_batch_watermark')
+    CREATE INDEX [IX_reconciliation_batch_watermark] ON [dbo].[reconciliation_batch]
+        ([customer_name], [po_number], [status], [id]) INCLUDE ([watermark_row_version]);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_enhanced_matching_results_shipment')
+    CREATE INDEX [IX_enhanced_matching_results_shipment] ON [dbo].[enhanced_matching_results] ([shipment_id]);
+
+PRINT 'Incremental watermark columns are ready for use.';
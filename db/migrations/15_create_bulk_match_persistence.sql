@@ -0,0 +1,161 @@
+-- 15_create_bulk_match_persistence.sql
+-- Session staging table and set-based procedure used by EnhancedMatchingEngine.store_matches
+-- Matches are staged in one bulk insert, then results and reconciliation movement
+-- events are written in a single transaction (replaces one INSERT + one
+-- sp_capture_reconciliation_event call per match)
+
+IF OBJECT_ID('dbo.enhanced_matching_results_staging', 'U') IS NULL
+BEGIN
+    CREATE TABLE [dbo].[enhanced_matching_results_staging] (
+        [matching_session_id] VARCHAR(100) NOT NULL,
+        [row_number] INT NOT NULL,
+        [customer_name] VARCHAR(255) NOT NULL,
+        [po_number] VARCHAR(100) NOT NULL,
+        [shipment_id] VARCHAR(100) NOT NULL,
+        [order_id] VARCHAR(100) NOT NULL,
+        [match_layer] VARCHAR(20) NOT NULL,
+        [match_confidence] DECIMAL(5,4) NULL,
+        [style_match] VARCHAR(10) NOT NULL,
+        [color_match] VARCHAR(10) NOT NULL,
+        [delivery_match] VARCHAR(10) NOT NULL,
+        [shipment_style_code] VARCHAR(255) NULL,
+        [order_style_code] VARCHAR(255) NULL,
+        [shipment_color_description] VARCHAR(255) NULL,
+        [order_color_description] VARCHAR(255) NULL,
+        [shipment_delivery_method] VARCHAR(255) NULL,
+        [order_delivery_method] VARCHAR(255) NULL,
+        [shipment_quantity] INT NULL,
+        [order_quantity] INT NULL,
+        [quantity_difference_percent] DECIMAL(7,2) NULL,
+        [quantity_check_result] VARCHAR(10) NULL,
+        [quantity_variance] INT NULL,
+        [match_group_id] NVARCHAR(255) NOT NULL,
+
+        CONSTRAINT [PK_enhanced_matching_results_staging] PRIMARY KEY ([matching_session_id], [row_number])
+    );
+
+    PRINT 'Created enhanced_matching_results_staging table';
+END
+GO
+
+CREATE OR ALTER PROCEDURE [dbo].[sp_store_enhanced_matches]
+    @session_id VARCHAR(100),
+    @batch_id INT = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    BEGIN TRY
+        BEGIN TRANSACTION;
+
+        -- Clear previous results for this session
+        DELETE FROM [dbo].[enhanced_matching_results]
+        WHERE [matching_session_id] = @session_id;
+
+        INSERT INTO [dbo].[enhanced_matching_results] (
+            customer_name, po_number, shipment_id, order_id,
+            match_layer, match_confidence,
+            style_match, color_match, delivery_match,
+            shipment_style_code, order_style_code,
+            shipment_color_description, order_color_description,
+            shipment_delivery_method, order_delivery_method,
+            shipment_quantity, order_quantity,
+            quantity_difference_percent, quantity_check_result,
+            matching_session_id, created_at
+        )
+        SELECT
+            customer_name, po_number, shipment_id, order_id,
+            match_layer, match_confidence,
+            style_match, color_match, delivery_match,
+            shipment_style_code, order_style_code,
+            shipment_color_description, order_color_description,
+            shipment_delivery_method, order_delivery_method,
+            shipment_quantity, order_quantity,
+            quantity_difference_percent, quantity_check_result,
+            matching_session_id, GETDATE()
+        FROM [dbo].[enhanced_matching_results_staging]
+        WHERE [matching_session_id] = @session_id
+        ORDER BY [row_number];
+
+        DECLARE @stored_count INT = @@ROWCOUNT;
+
+        -- Reconciliation status on existing movements (as sp_capture_reconciliation_event)
+        UPDATE fom
+        SET reconciliation_status = 'MATCHED',
+            reconciliation_confidence = s.match_confidence,
+            reconciliation_method = s.match_layer,
+            reconciliation_date = GETDATE(),
+            updated_at = GETDATE()
+        FROM dbo.fact_order_movements fom
+        INNER JOIN [dbo].[enhanced_matching_results_staging] s
+            ON s.matching_session_id = @session_id
+           AND fom.order_id = s.order_id
+           AND fom.match_group_id = s.match_group_id;
+
+        UPDATE fom
+        SET reconciliation_status = 'MATCHED',
+            reconciliation_confidence = s.match_confidence,
+            reconciliation_method = s.match_layer,
+            reconciliation_date = GETDATE(),
+            quantity_variance = s.quantity_variance,
+            quantity_variance_percent = CASE
+                WHEN fom.order_quantity > 0 THEN (s.quantity_variance * 100.0 / fom.order_quantity)
+                ELSE NULL
+            END,
+            updated_at = GETDATE()
+        FROM dbo.fact_order_movements fom
+        INNER JOIN [dbo].[enhanced_matching_results_staging] s
+            ON s.matching_session_id = @session_id
+           AND fom.shipment_id = TRY_CAST(s.shipment_id AS INT)
+           AND fom.match_group_id = s.match_group_id;
+
+        -- One RECONCILED movement event per match
+        INSERT INTO dbo.fact_order_movements (
+            order_id, shipment_id, customer_name, po_number,
+            movement_type, movement_date, movement_status,
+            match_group_id, reconciliation_status, reconciliation_confidence,
+            reconciliation_method, quantity_variance, batch_id, source_system
+        )
+        SELECT
+            s.order_id, TRY_CAST(s.shipment_id AS INT), grp.customer_name, grp.po_number,
+            'RECONCILED', GETDATE(), 'COMPLETED',
+            s.match_group_id, 'MATCHED', s.match_confidence,
+            s.match_layer, s.quantity_variance, @batch_id, 'RECONCILIATION_ENGINE'
+        FROM [dbo].[enhanced_matching_results_staging] s
+        OUTER APPLY (
+            SELECT TOP 1 fom.customer_name, fom.po_number
+            FROM dbo.fact_order_movements fom
+            WHERE fom.match_group_id = s.match_group_id
+        ) grp
+        WHERE s.matching_session_id = @session_id
+        ORDER BY s.[row_number];
+
+        DECLARE @event_count INT = @@ROWCOUNT;
+
+        DELETE FROM [dbo].[enhanced_matching_results_staging]
+        WHERE [matching_session_id] = @session_id;
+
+        COMMIT TRANSACTION;
+
+        SELECT @stored_count as stored_count, @event_count as event_count;
+        RETURN 0; -- Success
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+
+        DELETE FROM [dbo].[enhanced_matching_results_staging]
+        WHERE [matching_session_id] = @session_id;
+
+        DECLARE @ErrorMessage NVARCHAR(4000) = ERROR_MESSAGE();
+        DECLARE @ErrorSeverity INT = ERROR_SEVERITY();
+        DECLARE @ErrorState INT = ERROR_STATE();
+
+        RAISERROR(@ErrorMessage, @ErrorSeverity, @ErrorState);
+
+        RETURN -1; -- Error
+    END CATCH;
+END;
+GO
+
+PRINT 'Bulk match persistence objects are ready for use.';
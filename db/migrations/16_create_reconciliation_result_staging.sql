@@ -0,0 +1,137 @@
+-- 16_create_reconciliation_result_staging.sql
+-- Staging tables and merge procedure used by the batched RecordLinkageMatcher writer
+-- (src/utils/db.py ReconciliationResultWriter). Each flush stages results, attribute
+-- scores and HITL queue entries under one load_id, then sp_merge_reconciliation_results
+-- inserts them set-based and links child rows to the new reconciliation_result ids.
+
+IF OBJECT_ID('dbo.reconciliation_result_staging', 'U') IS NULL
+BEGIN
+    CREATE TABLE [dbo].[reconciliation_result_staging] (
+        [load_id] VARCHAR(36) NOT NULL,
+        [row_key] INT NOT NULL,
+        [customer_name] NVARCHAR(255) NOT NULL,
+        [order_id] INT NULL,
+        [shipment_id] INT NULL,
+        [po_number] NVARCHAR(50) NOT NULL,
+        [match_status] NVARCHAR(20) NOT NULL,
+        [confidence_score] FLOAT NULL,
+        [match_method] NVARCHAR(50) NOT NULL,
+        [match_details] NVARCHAR(MAX) NULL,
+        [is_split_shipment] BIT NOT NULL DEFAULT 0,
+        [split_group_id] NVARCHAR(100) NULL,
+
+        CONSTRAINT [PK_reconciliation_result_staging] PRIMARY KEY ([load_id], [row_key])
+    );
+
+    PRINT 'Created reconciliation_result_staging table';
+END
+
+IF OBJECT_ID('dbo.match_attribute_score_staging', 'U') IS NULL
+BEGIN
+    CREATE TABLE [dbo].[match_attribute_score_staging] (
+        [load_id] VARCHAR(36) NOT NULL,
+        [row_key] INT NOT NULL,
+        [attribute_name] NVARCHAR(100) NOT NULL,
+        [order_value] NVARCHAR(255) NULL,
+        [shipment_value] NVARCHAR(255) NULL,
+        [match_score] FLOAT NOT NULL,
+        [match_method] NVARCHAR(50) NOT NULL,
+        [is_key_attribute] BIT NOT NULL DEFAULT 0,
+        [weight] FLOAT NOT NULL DEFAULT 1.0
+    );
+
+    CREATE CLUSTERED INDEX [IX_match_attribute_score_staging_load] ON [dbo].[match_attribute_score_staging] ([load_id], [row_key]);
+
+    PRINT 'Created match_attribute_score_staging table';
+END
+
+IF OBJECT_ID('dbo.hitl_queue_staging', 'U') IS NULL
+BEGIN
+    CREATE TABLE [dbo].[hitl_queue_staging] (
+        [load_id] VARCHAR(36) NOT NULL,
+        [row_key] INT NOT NULL,
+        [priority] INT NOT NULL DEFAULT 5,
+
+        CONSTRAINT [PK_hitl_queue_staging] PRIMARY KEY ([load_id], [row_key])
+    );
+
+    PRINT 'Created hitl_queue_staging table';
+END
+GO
+
+CREATE OR ALTER PROCEDURE [dbo].[sp_merge_reconciliation_results]
+    @load_id VARCHAR(36)
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @ids TABLE ([row_key] INT PRIMARY KEY, [reconciliation_id] INT NOT NULL);
+
+    BEGIN TRY
+        -- Joins the caller's transaction when the writer runs all-or-nothing
+        BEGIN TRANSACTION;
+
+        -- MERGE (rather than INSERT ... SELECT) can OUTPUT the staging row_key
+        -- alongside each new identity value
+        MERGE INTO [dbo].[reconciliation_result] AS target
+        USING (
+            SELECT * FROM [dbo].[reconciliation_result_staging] WHERE [load_id] = @load_id
+        ) AS source
+        ON 1 = 0
+        WHEN NOT MATCHED THEN
+            INSERT (
+                customer_name, order_id, shipment_id, po_number, match_status,
+                confidence_score, match_method, match_details, is_split_shipment, split_group_id
+            )
+            VALUES (
+                source.customer_name, source.order_id, source.shipment_id, source.po_number, source.match_status,
+                source.confidence_score, source.match_method, source.match_details, source.is_split_shipment, source.split_group_id
+            )
+        OUTPUT source.row_key, inserted.id INTO @ids ([row_key], [reconciliation_id]);
+
+        INSERT INTO [dbo].[match_attribute_score] (
+            reconciliation_id, attribute_name, order_value, shipment_value,
+            match_score, match_method, is_key_attribute, weight
+        )
+        SELECT
+            ids.reconciliation_id, s.attribute_name, s.order_value, s.shipment_value,
+            s.match_score, s.match_method, s.is_key_attribute, s.weight
+        FROM [dbo].[match_attribute_score_staging] s
+        INNER JOIN @ids ids ON ids.row_key = s.row_key
+        WHERE s.load_id = @load_id;
+
+        DECLARE @score_count INT = @@ROWCOUNT;
+
+        INSERT INTO [dbo].[hitl_queue] (reconciliation_id, priority, status)
+        SELECT ids.reconciliation_id, q.priority, 'pending'
+        FROM [dbo].[hitl_queue_staging] q
+        INNER JOIN @ids ids ON ids.row_key = q.row_key
+        WHERE q.load_id = @load_id;
+
+        DECLARE @queue_count INT = @@ROWCOUNT;
+
+        DELETE FROM [dbo].[reconciliation_result_staging] WHERE [load_id] = @load_id;
+        DELETE FROM [dbo].[match_attribute_score_staging] WHERE [load_id] = @load_id;
+        DELETE FROM [dbo].[hitl_queue_staging] WHERE [load_id] = @load_id;
+
+        COMMIT TRANSACTION;
+
+        SELECT (SELECT COUNT(*) FROM @ids) as result_count, @score_count as score_count, @queue_count as queue_count;
+        RETURN 0; -- Success
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+
+        DECLARE @ErrorMessage NVARCHAR(4000) = ERROR_MESSAGE();
+        DECLARE @ErrorSeverity INT = ERROR_SEVERITY();
+        DECLARE @ErrorState INT = ERROR_STATE();
+
+        RAISERROR(@ErrorMessage, @ErrorSeverity, @ErrorState);
+
+        RETURN -1; -- Error
+    END CATCH;
+END;
+GO
+
+PRINT 'Reconciliation result staging objects are ready for use.';
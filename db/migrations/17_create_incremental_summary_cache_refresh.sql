@@ -0,0 +1,271 @@
+-- 17_create_incremental_summary_cache_refresh.sql
+-- Incremental refresh of shipment_summary_cache for the shipments a matching
+-- session touched. Ids arrive as a table-valued parameter (no string-built SQL),
+-- the affected customers are renumbered in place, and every refresh is logged
+-- with its timing and row counts.
+
+IF TYPE_ID('dbo.ShipmentIdList') IS NULL
+BEGIN
+    CREATE TYPE [dbo].[ShipmentIdList] AS TABLE (
+        [shipment_id] INT NOT NULL PRIMARY KEY
+    );
+
+    PRINT 'Created ShipmentIdList table type';
+END
+
+IF OBJECT_ID('dbo.shipment_summary_cache_refresh_log', 'U') IS NULL
+BEGIN
+    CREATE TABLE [dbo].[shipment_summary_cache_refresh_log] (
+        [id] INT IDENTITY(1,1) PRIMARY KEY,
+        [refresh_mode] NVARCHAR(20) NOT NULL, -- FULL, CUSTOMER, INCREMENTAL
+        [customer_name] NVARCHAR(100) NULL,
+        [matching_session_id] VARCHAR(100) NULL, -- Latest session in the refresh
+        [coalesced_requests] INT NULL, -- Refresh requests merged into this refresh
+        [requested_shipments] INT NULL,
+        [rows_processed] INT NOT NULL DEFAULT 0,
+        [rows_updated] INT NOT NULL DEFAULT 0,
+        [rows_inserted] INT NOT NULL DEFAULT 0,
+        [rows_deleted] INT NOT NULL DEFAULT 0,
+        [rows_renumbered] INT NOT NULL DEFAULT 0,
+        [duration_ms] INT NULL,
+        [status] NVARCHAR(20) NOT NULL,
+        [error_message] NVARCHAR(4000) NULL,
+        [started_at] DATETIME2 NOT NULL,
+        [finished_at] DATETIME2 NULL
+    );
+
+    CREATE INDEX [IX_shipment_summary_cache_refresh_log_started] ON [dbo].[shipment_summary_cache_refresh_log] ([started_at] DESC);
+
+    PRINT 'Created shipment_summary_cache_refresh_log table';
+END
+GO
+
+CREATE OR ALTER PROCEDURE [dbo].[sp_refresh_shipment_summary_cache_ids]
+    @shipment_ids [dbo].[ShipmentIdList] READONLY,
+    @matching_session_id VARCHAR(100) = NULL,
+    @coalesced_requests INT = 1,
+    @debug BIT = 0
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @start_time DATETIME2 = SYSDATETIME();
+    DECLARE @requested INT = (SELECT COUNT(*) FROM @shipment_ids);
+    DECLARE @rows_processed INT = 0;
+    DECLARE @rows_updated INT = 0;
+    DECLARE @rows_inserted INT = 0;
+    DECLARE @rows_deleted INT = 0;
+    DECLARE @rows_renumbered INT = 0;
+
+    CREATE TABLE #summary (
+        shipment_id INT PRIMARY KEY,
+        customer_name NVARCHAR(100),
+        style_code NVARCHAR(50),
+        color_description NVARCHAR(100),
+        delivery_method NVARCHAR(50),
+        quantity INT,
+        style_match_indicator CHAR(1),
+        color_match_indicator CHAR(1),
+        delivery_match_indicator CHAR(1),
+        quantity_match_indicator CHAR(1),
+        match_count INT,
+        match_layers NVARCHAR(50),
+        best_confidence DECIMAL(5,2),
+        avg_confidence DECIMAL(5,2),
+        total_matched_order_qty INT,
+        quantity_variance INT,
+        shipment_status NVARCHAR(20)
+    );
+    CREATE TABLE #affected_customers (customer_name NVARCHAR(100));
+
+    BEGIN TRY
+        -- Same aggregation as sp_refresh_shipment_summary_cache, for the given shipments only
+        INSERT INTO #summary
+        SELECT
+            s.shipment_id,
+            s.customer_name,
+            s.style_code,
+            s.color_description,
+            s.delivery_method,
+            s.quantity,
+            CASE
+                WHEN MAX(CASE WHEN emr.style_match = 'MATCH' THEN 1 ELSE 0 END) = 1 THEN 'Y'
+                WHEN MAX(CASE WHEN emr.style_match = 'FUZZY' THEN 1 ELSE 0 END) = 1 THEN 'P'
+                WHEN COUNT(emr.id) > 0 THEN 'N'
+                ELSE 'U'
+            END,
+            CASE
+                WHEN MAX(CASE WHEN emr.color_match = 'MATCH' THEN 1 ELSE 0 END) = 1 THEN 'Y'
+                WHEN MAX(CASE WHEN emr.color_match = 'FUZZY' THEN 1 ELSE 0 END) = 1 THEN 'P'
+                WHEN COUNT(emr.id) > 0 THEN 'N'
+                ELSE 'U'
+            END,
+            CASE
+                WHEN MAX(CASE WHEN emr.delivery_match = 'MISMATCH' THEN 1 ELSE 0 END) = 1 THEN 'N'
+                WHEN MAX(CASE WHEN emr.delivery_match = 'MATCH' THEN 1 ELSE 0 END) = 1 THEN 'Y'
+                WHEN COUNT(emr.id) > 0 THEN 'P'
+                ELSE 'U'
+            END,
+            CASE
+                WHEN s.quantity - ISNULL(SUM(emr.order_quantity), 0) = 0 THEN 'Y'
+                WHEN ABS(s.quantity - ISNULL(SUM(emr.order_quantity), 0)) <= s.quantity * 0.1 THEN 'P'
+                WHEN COUNT(emr.id) > 0 THEN 'N'
+                ELSE 'U'
+            END,
+            COUNT(emr.id),
+            CASE
+                WHEN COUNT(emr.id) = 0 THEN NULL
+                WHEN MIN(emr.match_layer) = MAX(emr.match_layer) THEN MIN(emr.match_layer)
+                ELSE MIN(emr.match_layer) + '-' + MAX(emr.match_layer)
+            END,
+            ISNULL(MAX(emr.match_confidence), 0.00),
+            ISNULL(AVG(emr.match_confidence), 0.00),
+            ISNULL(SUM(emr.order_quantity), 0),
+            s.quantity - ISNULL(SUM(emr.order_quantity), 0),
+            CASE
+                WHEN COUNT(emr.id) = 0 THEN 'UNMATCHED'
+                WHEN COUNT(CASE WHEN emr.quantity_check_result = 'FAIL' THEN 1 END) > 0 THEN 'QUANTITY_ISSUES'
+                WHEN COUNT(CASE WHEN emr.delivery_match = 'MISMATCH' THEN 1 END) > 0 THEN 'DELIVERY_ISSUES'
+                ELSE 'GOOD'
+            END
+        FROM stg_fm_orders_shipped_table s
+        INNER JOIN @shipment_ids ids ON ids.shipment_id = s.shipment_id
+        -- Cast the shipment side so the seek on enhanced_matching_results.shipment_id is kept
+        LEFT JOIN enhanced_matching_results emr ON emr.shipment_id = CAST(s.shipment_id AS VARCHAR(100))
+        GROUP BY s.shipment_id, s.customer_name, s.style_code, s.color_description, s.delivery_method, s.quantity;
+
+        SET @rows_processed = @@ROWCOUNT;
+
+        BEGIN TRANSACTION;
+
+        UPDATE ssc
+        SET
+            customer_name = t.customer_name,
+            style_code = t.style_code,
+            color_description = t.color_description,
+            delivery_method = t.delivery_method,
+            quantity = t.quantity,
+            style_match_indicator = t.style_match_indicator,
+            color_match_indicator = t.color_match_indicator,
+            delivery_match_indicator = t.delivery_match_indicator,
+            quantity_match_indicator = t.quantity_match_indicator,
+            match_count = t.match_count,
+            match_layers = t.match_layers,
+            best_confidence = t.best_confidence,
+            avg_confidence = t.avg_confidence,
+            total_matched_order_qty = t.total_matched_order_qty,
+            quantity_variance = t.quantity_variance,
+            shipment_status = t.shipment_status,
+            last_updated = GETDATE(),
+            source_last_modified = GETDATE()
+        OUTPUT deleted.customer_name INTO #affected_customers
+        FROM dbo.shipment_summary_cache ssc
+        INNER JOIN #summary t ON t.shipment_id = ssc.shipment_id;
+
+        SET @rows_updated = @@ROWCOUNT;
+
+        -- row_number is assigned below, once the customer's rows are all in place
+        INSERT INTO dbo.shipment_summary_cache (
+            shipment_id, customer_name, row_number, style_code, color_description, delivery_method, quantity,
+            style_match_indicator, color_match_indicator, delivery_match_indicator, quantity_match_indicator,
+            match_count, match_layers, best_confidence, avg_confidence, total_matched_order_qty, quantity_variance,
+            shipment_status, outstanding_reviews, last_updated, source_last_modified
+        )
+        OUTPUT inserted.customer_name INTO #affected_customers
+        SELECT
+            t.shipment_id, t.customer_name, 0, t.style_code, t.color_description, t.delivery_method, t.quantity,
+            t.style_match_indicator, t.color_match_indicator, t.delivery_match_indicator, t.quantity_match_indicator,
+            t.match_count, t.match_layers, t.best_confidence, t.avg_confidence, t.total_matched_order_qty, t.quantity_variance,
+            t.shipment_status, 0, GETDATE(), GETDATE()
+        FROM #summary t
+        WHERE NOT EXISTS (SELECT 1 FROM dbo.shipment_summary_cache ssc WHERE ssc.shipment_id = t.shipment_id);
+
+        SET @rows_inserted = @@ROWCOUNT;
+
+        -- Requested shipments no longer in the source
+        DELETE ssc
+        OUTPUT deleted.customer_name INTO #affected_customers
+        FROM dbo.shipment_summary_cache ssc
+        INNER JOIN @shipment_ids ids ON ids.shipment_id = ssc.shipment_id
+        WHERE NOT EXISTS (SELECT 1 FROM #summary t WHERE t.shipment_id = ssc.shipment_id);
+
+        SET @rows_deleted = @@ROWCOUNT;
+
+        -- Problem shipments first, then by shipment id (as the full refresh numbers them)
+        ;WITH ranked AS (
+            SELECT
+                ssc.row_number,
+                ROW_NUMBER() OVER (
+                    PARTITION BY ssc.customer_name
+                    ORDER BY
+                        CASE ssc.shipment_status
+                            WHEN 'QUANTITY_ISSUES' THEN 1
+                            WHEN 'DELIVERY_ISSUES' THEN 2
+                            ELSE 3
+                        END,
+                        ssc.shipment_id
+                ) as new_row_number
+            FROM dbo.shipment_summary_cache ssc
+            WHERE ssc.customer_name IN (SELECT DISTINCT customer_name FROM #affected_customers)
+        )
+        UPDATE ranked
+        SET row_number = new_row_number
+        WHERE row_number <> new_row_number;
+
+        SET @rows_renumbered = @@ROWCOUNT;
+
+        COMMIT TRANSACTION;
+
+        DECLARE @duration_ms INT = DATEDIFF(MILLISECOND, @start_time, SYSDATETIME());
+
+        INSERT INTO [dbo].[shipment_summary_cache_refresh_log] (
+            refresh_mode, matching_session_id, coalesced_requests, requested_shipments,
+            rows_processed, rows_updated, rows_inserted, rows_deleted, rows_renumbered,
+            duration_ms, status, started_at, finished_at
+        )
+        VALUES (
+            'INCREMENTAL', @matching_session_id, @coalesced_requests, @requested,
+            @rows_processed, @rows_updated, @rows_inserted, @rows_deleted, @rows_renumbered,
+            @duration_ms, 'SUCCESS', @start_time, SYSDATETIME()
+        );
+
+        IF @debug = 1
+            PRINT 'Incremental cache refresh: ' + CAST(@requested AS VARCHAR(10)) + ' shipments in '
+                + CAST(@duration_ms AS VARCHAR(10)) + 'ms';
+
+        SELECT
+            @duration_ms as duration_ms,
+            @requested as requested_shipments,
+            @rows_processed as rows_processed,
+            @rows_updated as rows_updated,
+            @rows_inserted as rows_inserted,
+            @rows_deleted as rows_deleted,
+            @rows_renumbered as rows_renumbered,
+            'SUCCESS' as status;
+        RETURN 0; -- Success
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+
+        DECLARE @ErrorMessage NVARCHAR(4000) = ERROR_MESSAGE();
+        DECLARE @ErrorSeverity INT = ERROR_SEVERITY();
+        DECLARE @ErrorState INT = ERROR_STATE();
+
+        INSERT INTO [dbo].[shipment_summary_cache_refresh_log] (
+            refresh_mode, matching_session_id, coalesced_requests, requested_shipments,
+            duration_ms, status, error_message, started_at, finished_at
+        )
+        VALUES (
+            'INCREMENTAL', @matching_session_id, @coalesced_requests, @requested,
+            DATEDIFF(MILLISECOND, @start_time, SYSDATETIME()), 'ERROR', @ErrorMessage, @start_time, SYSDATETIME()
+        );
+
+        RAISERROR(@ErrorMessage, @ErrorSeverity, @ErrorState);
+
+        RETURN -1; -- Error
+    END CATCH;
+END;
+GO
+
+PRINT 'Incremental shipment summary cache refresh is ready for use.';
@@ -223,7 +223,19 @@ BEGIN
         
         DECLARE @end_time DATETIME2 = GETDATE();
         DECLARE @duration_ms INT = DATEDIFF(MILLISECOND, @start_time, @end_time);
-        
+
+        -- Refresh history (table created by migration 17)
+        IF OBJECT_ID('dbo.shipment_summary_cache_refresh_log', 'U') IS NOT NULL
+            INSERT INTO dbo.shipment_summary_cache_refresh_log (
+                refresh_mode, customer_name, rows_processed, rows_updated, rows_inserted,
+                duration_ms, status, started_at, finished_at
+            )
+            VALUES (
+                CASE WHEN @incremental = 1 THEN 'INCREMENTAL' WHEN @customer_name IS NULL THEN 'FULL' ELSE 'CUSTOMER' END,
+                @customer_name, @rows_processed, @rows_updated, @rows_inserted,
+                @duration_ms, 'SUCCESS', @start_time, @end_time
+            );
+
         -- Log results
         PRINT 'Cache refresh completed successfully:';
         PRINT '  Duration: ' + CAST(@duration_ms AS VARCHAR(10)) + 'ms';
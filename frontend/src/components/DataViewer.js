@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { 
   Table, 
   Select, 
@@ -36,11 +36,14 @@ const DataViewer = () => {
   const [availableTables, setAvailableTables] = useState([]);
   const [selectedTable, setSelectedTable] = useState('');
   const [tableSchema, setTableSchema] = useState([]);
+  // Rows are loaded a page at a time by primary key (keyset), so scrolling
+  // deep into large tables costs the same per page
   const [pagination, setPagination] = useState({
-    current: 1,
-    pageSize: 50,
-    total: 0
+    pageSize: 100,
+    total: 0,
+    nextCursor: null
   });
+  const loadMoreRef = useRef(null);
   const [filters, setFilters] = useState({});
   const [searchText, setSearchText] = useState('');
   
@@ -61,7 +64,20 @@ const DataViewer = () => {
       loadTableData();
       loadTableSchema();
     }
-  }, [selectedTable, pagination.current, pagination.pageSize, filters]);
+  }, [selectedTable, filters]);
+
+  // Load the next page when the end of the table scrolls into view
+  useEffect(() => {
+    const sentinel = loadMoreRef.current;
+    if (!sentinel || !pagination.nextCursor) return undefined;
+    const observer = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting && !loading) {
+        loadTableData(false);
+      }
+    });
+    observer.observe(sentinel);
+    return () => observer.disconnect();
+  }, [pagination.nextCursor, loading]);
 
   const loadAvailableTables = async () => {
     try {
@@ -75,22 +91,28 @@ const DataViewer = () => {
     }
   };
 
-  const loadTableData = async () => {
+  const loadTableData = async (reset = true) => {
     if (!selectedTable) return;
     
     try {
       setLoading(true);
       const response = await ApiService.getTableData(
         selectedTable, 
-        pagination.current, 
+        1, 
         pagination.pageSize, 
-        { ...filters, search: searchText }
+        {
+          ...filters,
+          search: searchText,
+          ...(reset || !pagination.nextCursor ? {} : { after: pagination.nextCursor })
+        }
       );
       
-      setTableData(response.data || []);
+      const rows = response.data || [];
+      setTableData(prev => (reset ? rows : [...prev, ...rows]));
       setPagination(prev => ({
         ...prev,
-        total: response.total || 0
+        total: response.total || 0,
+        nextCursor: response.next_cursor ?? null
       }));
     } catch (error) {
       message.error('Failed to load table data');
@@ -114,22 +136,14 @@ const DataViewer = () => {
   const handleTableChange = (value) => {
     setSelectedTable(value);
     setTableData([]);
-    setPagination({ current: 1, pageSize: 50, total: 0 });
+    setPagination({ pageSize: 100, total: 0, nextCursor: null });
     setFilters({});
     setSearchText('');
   };
 
-  const handlePaginationChange = (page, size) => {
-    setPagination(prev => ({
-      ...prev,
-      current: page,
-      pageSize: size
-    }));
-  };
-
   const handleSearch = (value) => {
     setSearchText(value);
-    setPagination(prev => ({ ...prev, current: 1 }));
+    setFilters(prev => ({ ...prev }));
   };
 
   const handleEdit = (record) => {
@@ -177,21 +191,16 @@ const DataViewer = () => {
     setDetailDrawerVisible(true);
   };
 
-  const handleExport = async () => {
-    try {
-      const blob = await ApiService.exportData(selectedTable, 'csv', filters);
-      const url = window.URL.createObjectURL(blob);
-      const a = document.createElement('a');
-      a.href = url;
-      a.download = `${selectedTable}_export.csv`;
-      document.body.appendChild(a);
-      a.click();
-      window.URL.revokeObjectURL(url);
-      document.body.removeChild(a);
-      message.success('Data exported successfully');
-    } catch (error) {
-      message.error('Failed to export data');
-    }
+  const handleExport = () => {
+    // The server streams the table in chunks; let the browser download it
+    // directly rather than buffering the whole export in memory
+    const a = document.createElement('a');
+    a.href = ApiService.getExportUrl(selectedTable, 'csv', filters);
+    a.download = `${selectedTable}_export.csv`;
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
+    message.success('Export started');
   };
 
   // Generate table columns from schema
@@ -322,7 +331,7 @@ const DataViewer = () => {
             <Space wrap>
               <Button 
                 icon={<ReloadOutlined />} 
-                onClick={loadTableData}
+                onClick={() => loadTableData()}
                 loading={loading}
               >
                 Refresh
@@ -353,21 +362,19 @@ const DataViewer = () => {
           columns={generateColumns()}
           dataSource={tableData}
           loading={loading}
-          pagination={{
-            current: pagination.current,
-            pageSize: pagination.pageSize,
-            total: pagination.total,
-            showSizeChanger: true,
-            showQuickJumper: true,
-            showTotal: (total, range) => 
-              `${range[0]}-${range[1]} of ${total} records`,
-            onChange: handlePaginationChange,
-            onShowSizeChange: handlePaginationChange,
-          }}
+          pagination={false}
           scroll={{ x: 1000 }}
           size="small"
           rowKey="id"
+          footer={() => `${tableData.length} of ~${pagination.total} records`}
         />
+        {pagination.nextCursor && (
+          <div ref={loadMoreRef} style={{ textAlign: 'center', padding: '12px' }}>
+            <Button onClick={() => loadTableData(false)} loading={loading}>
+              Load more
+            </Button>
+          </div>
+        )}
       </Card>
 
       {/* Edit Modal */}
@@ -72,31 +72,19 @@ const MatchingEngine = () => {
       addLog('Starting enhanced matching engine...', 'info');
       setProgress(10);
 
-      const result = await ApiService.runMatching(
+      // The run is queued on the server; poll the job for per-layer progress
+      const job = await ApiService.runMatching(
         values.customer_name, 
         values.po_number,
         {
           options: values.options || {}
         }
       );
-
-      // Simulate progress updates (in real implementation, this would come from backend)
-      const progressSteps = [
-        { progress: 25, message: 'Loading orders and shipments...' },
-        { progress: 40, message: 'Running Layer 0: Perfect matching...' },
-        { progress: 55, message: 'Running Layer 1: Style+Color exact...' },
-        { progress: 70, message: 'Running Layer 2: Fuzzy matching...' },
-        { progress: 85, message: 'Running Layer 3: Quantity resolution...' },
-        { progress: 95, message: 'Storing results and updating movement table...' },
-        { progress: 100, message: 'Matching completed successfully!' }
-      ];
-
-      for (const step of progressSteps) {
-        await new Promise(resolve => setTimeout(resolve, 500));
-        setProgress(step.progress);
-        addLog(step.message, 'info');
+      if (job.deduplicated) {
+        addLog(`A run for ${values.customer_name}${values.po_number ? ` PO ${values.po_number}` : ''} is already in progress, following it`, 'warning');
       }
 
+      const result = await waitForJob(job.job_id);
       setCurrentResults(result);
       
       if (result.status === 'SUCCESS') {
@@ -125,6 +113,38 @@ const MatchingEngine = () => {
     }
   };
 
+  const stageMessages = {
+    STARTED: 'Matching job started',
+    LOADED: 'Loaded orders and shipments',
+    LAYER_0: 'Layer 0: Perfect matching done',
+    LAYER_1: 'Layer 1: Style+Color exact done',
+    LAYER_2: 'Layer 2: Fuzzy matching done',
+    LAYER_3: 'Layer 3: Quantity resolution done',
+    STORED: 'Stored results and updated movement table'
+  };
+
+  const waitForJob = async (jobId, intervalMs = 1000) => {
+    let reported = 0;
+    for (;;) {
+      const job = await ApiService.getMatchingJob(jobId);
+      job.stages.slice(reported).forEach((stage) => {
+        const counts = stage.total_matches !== undefined ? ` (${stage.total_matches} matches)` : '';
+        addLog((stageMessages[stage.stage] || stage.stage) + counts, 'info');
+      });
+      reported = job.stages.length;
+      setProgress(job.progress);
+
+      if (job.status === 'SUCCEEDED') {
+        const finished = await ApiService.getMatchingJob(jobId, true);
+        return finished.result;
+      }
+      if (job.status === 'FAILED') {
+        throw new Error(job.error || 'Matching job failed');
+      }
+      await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+  };
+
   const addLog = (message, type = 'info') => {
     const timestamp = new Date().toLocaleTimeString();
     setLogs(prev => [...prev, { timestamp, message, type }]);
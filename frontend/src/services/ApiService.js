@@ -118,6 +118,16 @@ class ApiService {
     });
   }
 
+  async getMatchingJob(jobId, includeResult = false) {
+    return this.client.get(`/matching/jobs/${jobId}`, {
+      params: includeResult ? { include_result: 1 } : {}
+    });
+  }
+
+  async getMatchingJobs(limit = 50) {
+    return this.client.get('/matching/jobs', { params: { limit } });
+  }
+
   async getMatchingHistory(limit = 50) {
     return this.client.get('/matching/history', { params: { limit } });
   }
@@ -204,6 +214,11 @@ class ApiService {
   }
 
   // Export/Import Operations
+  getExportUrl(tableName, format = 'ndjson', filters = {}) {
+    const params = new URLSearchParams({ format, ...filters });
+    return `${API_BASE_URL}/export/${tableName}?${params.toString()}`;
+  }
+
   async exportData(tableName, format = 'csv', filters = {}) {
     return this.client.get(`/export/${tableName}`, {
       params: { format, ...filters },
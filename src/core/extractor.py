@@ -13,9 +13,17 @@ from datetime import datetime, timedelta
 
 # Add utils to path
 sys.path.append(str(Path(__file__).parent.parent.parent / "utils"))
-from db_helper import run_query
+from db_helper import run_query, iter_query
 import pandas as pd
 
+# Columns the normalise/match stages always need, besides the customer's map
+ORDER_BASE_COLUMNS = ["CUSTOMER NAME", "PO NUMBER", "CUSTOMER STYLE", "CUSTOMER COLOUR DESCRIPTION"]
+# shipment_id first: match stages treat the first shipment column as its ID
+SHIPMENT_BASE_COLUMNS = ["shipment_id", "Customer", "Customer_PO", "Style", "Color", "Size",
+                         "Shipping_Method", "Quantity", "Shipped_Date"]
+
+_TABLE_COLUMNS = {}
+
 def _sql_in(values) -> str:
     """Return a single‑quoted, comma‑separated list, SQL‑escaped."""
     return ", ".join("'" + v.replace("'", "''") + "'" for v in values)
@@ -81,4 +89,100 @@ def shipments_by_date_range(customer_aliases, date_from, date_to) -> pd.DataFram
     ORDER BY Shipped_Date DESC, Customer_PO
     """
     return run_query(sql, db_key="shipments", params=())
+
+# ---------------------------------------------------------------------
+# Streaming extraction: projected columns, chunked reads, PO partitions
+# ---------------------------------------------------------------------
+def table_columns(table, db_key) -> list:
+    """Column names of a table, in table order (cached per process)."""
+    if (table, db_key) not in _TABLE_COLUMNS:
+        cols = run_query(
+            "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = ? ORDER BY ORDINAL_POSITION",
+            db_key=db_key, params=(table,)
+        )
+        _TABLE_COLUMNS[(table, db_key)] = cols["COLUMN_NAME"].tolist()
+    return _TABLE_COLUMNS[(table, db_key)]
+
+def projected_columns(cfg, side, available=None) -> list:
+    """
+    Columns referenced by a customer's map / key configs for one side
+    ("orders" or "shipments"), deduplicated in first-seen order and limited
+    to the columns that exist when `available` is given.
+    """
+    if side == "orders":
+        wanted = ORDER_BASE_COLUMNS + list(cfg.get("map", {}).keys())
+        key_cfg = cfg.get("order_key_config", {})
+    else:
+        wanted = SHIPMENT_BASE_COLUMNS + list(cfg.get("map", {}).values())
+        key_cfg = cfg.get("shipment_key_config", {})
+    wanted += key_cfg.get("unique_keys", []) + key_cfg.get("extra_checks", [])
+
+    columns = list(dict.fromkeys(wanted))
+    if available is not None:
+        available = set(available)
+        columns = [c for c in columns if c in available]
+    return columns
+
+def _select_list(columns) -> str:
+    return ", ".join("[" + c.replace("]", "]]") + "]" for c in columns)
+
+def _po_key(value) -> str:
+    """Partition key; NULL and '' POs share one partition, as they sort together"""
+    return "" if value is None or (isinstance(value, float) and value != value) else str(value)
+
+def _partition_sorted(chunks, key_col):
+    """Regroup a stream of key-sorted chunks into one DataFrame per key."""
+    carry = None
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        keys = chunk[key_col].map(_po_key)
+        # Rows of the last key may continue in the next chunk
+        last_key = keys.iloc[-1]
+        tail_start = len(keys) - int((keys.iloc[::-1] != last_key).cumsum().eq(0).sum())
+        head = chunk.iloc[:tail_start]
+        carry = chunk.iloc[tail_start:]
+        for key, group in head.groupby(keys.iloc[:tail_start], sort=False):
+            yield key, group.reset_index(drop=True)
+    if carry is not None and not carry.empty:
+        yield _po_key(carry[key_col].iloc[0]), carry.reset_index(drop=True)
+
+def stream_po_partitions(cfg, order_customer_names, date_from=None, date_to=None, chunksize=50_000):
+    """
+    Yield (po, orders_df, shipments_df) one PO at a time, in PO order.
+
+    Only the projected columns are selected. Both tables are read in chunks
+    ordered by PO cast to text with a binary collation (the order Python
+    compares str keys in), so the two sorted streams can be merge-joined; at most one PO's rows per side (plus one chunk)
+    are held in memory. POs with shipments but no orders get an empty
+    orders frame.
+    """
+    order_cols = projected_columns(cfg, "orders", table_columns("ORDERS_UNIFIED", "orders"))
+    ship_cols = projected_columns(cfg, "shipments", table_columns("FM_orders_shipped", "shipments"))
+
+    order_sql = f"""
+    SELECT {_select_list(order_cols)}
+    FROM ORDERS_UNIFIED
+    WHERE [CUSTOMER NAME] IN ({_sql_in(order_customer_names)})
+    ORDER BY CAST([PO NUMBER] AS NVARCHAR(255)) COLLATE Latin1_General_BIN2
+    """
+    ship_sql = f"""
+    SELECT {_select_list(ship_cols)}
+    FROM FM_orders_shipped
+    WHERE Customer IN ({_sql_in(cfg["aliases"])}){_format_date_filter(date_from, date_to, "Shipped_Date")}
+    ORDER BY CAST(Customer_PO AS NVARCHAR(255)) COLLATE Latin1_General_BIN2, Shipped_Date DESC
+    """
+
+    order_parts = _partition_sorted(iter_query(order_sql, db_key="orders", chunksize=chunksize), "PO NUMBER")
+    current = next(order_parts, None)
+    for po, ships in _partition_sorted(iter_query(ship_sql, db_key="shipments", chunksize=chunksize), "Customer_PO"):
+        while current is not None and current[0] < po:
+            current = next(order_parts, None)
+        if current is not None and current[0] == po:
+            orders_df = current[1]
+        else:
+            orders_df = pd.DataFrame(columns=order_cols)
+        yield po, orders_df, ships
 # ─────────────────────────────────────────────────────────────────────
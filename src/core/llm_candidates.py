@@ -0,0 +1,157 @@
+"""
+Candidate retrieval for LLM matching: a precomputed order index that picks
+the top-k plausible orders per shipment (PO, style n-grams, colour), and
+packing of shipments that share candidates into bounded prompts.
+"""
+import heapq
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+import sys
+
+import pandas as pd
+
+# Add project root to path for imports
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.reconciliation.similarity_cache import get_similarity_cache
+
+# Order column -> shipment columns to look for, used when no customer map is given
+DEFAULT_FIELDS = {
+    "PO NUMBER": ["PO NUMBER", "Customer_PO"],
+    "CUSTOMER STYLE": ["CUSTOMER STYLE", "Style"],
+    "CUSTOMER COLOUR DESCRIPTION": ["CUSTOMER COLOUR DESCRIPTION", "Color"],
+}
+
+# Score weights: PO equality, style n-gram overlap, colour similarity
+WEIGHTS = {"po": 0.5, "style": 0.3, "colour": 0.2}
+
+def _text(value):
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    return re.sub(r"\s+", " ", str(value).upper()).strip()
+
+def _ngrams(value, n=3):
+    """Character n-grams of the alphanumeric part of a style code"""
+    text = re.sub(r"[^A-Z0-9]", "", value)
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+def ship_columns(ships, field_map=None):
+    """Shipment column for each retrieval field (order column name -> shipment column or None)"""
+    columns = {}
+    for order_col, options in DEFAULT_FIELDS.items():
+        if field_map and order_col in field_map:
+            options = [field_map[order_col]] + options
+        columns[order_col] = next((col for col in options if col in ships.columns), None)
+    return columns
+
+class CandidateIndex:
+    """
+    Inverted index over one order book. Orders sharing a PO or a style n-gram
+    with a shipment are scored; colour similarity is only computed for the
+    best of those, so retrieval never scans the whole order book per shipment.
+    """
+
+    def __init__(self, orders, top_k=5, min_score=0.3):
+        self.top_k = top_k
+        self.min_score = min_score
+        self.po = [_text(v) for v in self._column(orders, "PO NUMBER")]
+        self.style = [_text(v) for v in self._column(orders, "CUSTOMER STYLE")]
+        self.colour = [_text(v) for v in self._column(orders, "CUSTOMER COLOUR DESCRIPTION")]
+        self.style_grams = [len(_ngrams(style)) for style in self.style]
+
+        self.po_postings = defaultdict(list)
+        self.gram_postings = defaultdict(list)
+        for position, (po, style) in enumerate(zip(self.po, self.style)):
+            if po:
+                self.po_postings[po].append(position)
+            for gram in _ngrams(style):
+                self.gram_postings[gram].append(position)
+
+        self.similarity = get_similarity_cache()
+        self._memo = {}
+
+    @staticmethod
+    def _column(orders, column):
+        return orders[column].tolist() if column in orders.columns else [None] * len(orders)
+
+    def candidates(self, po, style, colour):
+        """Top-k (score, order position) pairs, best first, for one shipment's values"""
+        key = (_text(po), _text(style), _text(colour))
+        if key not in self._memo:
+            self._memo[key] = self._search(*key)
+        return self._memo[key]
+
+    def _search(self, po, style, colour):
+        grams = _ngrams(style)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.gram_postings.get(gram, ()))
+        po_hits = set(self.po_postings.get(po, ())) if po else set()
+
+        # PO and style first; colour refines the strongest of those
+        partial = {}
+        for position in po_hits.union(shared):
+            overlap = shared.get(position, 0)
+            union = len(grams) + self.style_grams[position] - overlap
+            style_score = overlap / union if union else 0.0
+            partial[position] = WEIGHTS["po"] * (position in po_hits) + WEIGHTS["style"] * style_score
+        shortlist = heapq.nlargest(self.top_k * 4, partial.items(), key=lambda item: item[1])
+
+        scored = []
+        for position, score in shortlist:
+            if colour and self.colour[position]:
+                score += WEIGHTS["colour"] * self.similarity.score(colour, self.colour[position]) / 100
+            if score >= self.min_score:
+                scored.append((score, position))
+        return heapq.nlargest(self.top_k, scored)
+
+    def retrieve(self, ships, field_map=None):
+        """Candidate list per shipment row (positional), best first"""
+        values = [ships[col].tolist() if col else [None] * len(ships)
+                  for col in ship_columns(ships, field_map).values()]
+        return [self.candidates(po, style, colour) for po, style, colour in zip(*values)]
+
+def pack_prompts(candidates, max_shipments=20, max_orders=25, max_calls=None):
+    """
+    Group shipments with identical candidate sets, then pack groups into
+    prompts of at most max_shipments shipments and max_orders distinct
+    orders. Returns (prompts, skipped) where each prompt is
+    (shipment positions, order positions); with max_calls set the prompts
+    holding the strongest candidates are kept and the rest are skipped.
+    """
+    groups = defaultdict(list)
+    best = {}
+    for ship_position, found in enumerate(candidates):
+        if not found:
+            continue
+        orders = tuple(sorted(position for _, position in found))
+        groups[orders].append(ship_position)
+        best[orders] = max(best.get(orders, 0.0), found[0][0])
+
+    prompts = []
+    ships, orders, score = [], set(), 0.0
+    # Sorted candidate sets put overlapping groups next to each other
+    for group_orders in sorted(groups):
+        for start in range(0, len(groups[group_orders]), max_shipments):
+            chunk = groups[group_orders][start:start + max_shipments]
+            merged = orders.union(group_orders)
+            if ships and (len(ships) + len(chunk) > max_shipments or len(merged) > max_orders):
+                prompts.append((ships, sorted(orders), score))
+                ships, orders, score = [], set(), 0.0
+                merged = set(group_orders)
+            ships = ships + chunk
+            orders = merged
+            score = max(score, best[group_orders])
+    if ships:
+        prompts.append((ships, sorted(orders), score))
+
+    skipped = []
+    if max_calls is not None and len(prompts) > max_calls:
+        prompts.sort(key=lambda prompt: prompt[2], reverse=True)
+        skipped = [position for prompt in prompts[max_calls:] for position in prompt[0]]
+        prompts = prompts[:max_calls]
+    return [(ships, orders) for ships, orders, _ in prompts], skipped
@@ -1,8 +1,37 @@
 from rapidfuzz import fuzz, process
 import pandas as pd
+from pathlib import Path
+import sys
 
-def match(orders, ships, cfg):
+# Add project root to path for imports
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.reconciliation.similarity_cache import get_similarity_cache
+
+def prepare(orders):
+    """
+    Order-side fuzzy state shared across match() calls against the same order
+    book: the colour and delivery-method palettes plus memoised extractOne
+    results per shipment value.
+    """
+    context = {"color_mapping": {}, "shipping_mapping": {}}
+    if "CUSTOMER COLOUR DESCRIPTION" in orders.columns:
+        context["color_palette"] = orders["CUSTOMER COLOUR DESCRIPTION"].unique()
+    if "PLANNED DELIVERY METHOD" in orders.columns:
+        context["shipping_palette"] = orders["PLANNED DELIVERY METHOD"].unique()
+    return context
+
+def _best_matches(values, palette, mapping):
+    """extractOne per distinct value, reusing results already in mapping"""
+    for value in values:
+        if value not in mapping:
+            mapping[value] = process.extractOne(value, palette, scorer=fuzz.token_set_ratio)
+    return mapping
+
+def match(orders, ships, cfg, context=None):
     thresh = cfg.get("fuzzy_threshold", 0.9)
+    context = context if context is not None else prepare(orders)
     
     # If no ships to process, return empty results
     if ships.empty:
@@ -13,7 +42,7 @@ def match(orders, ships, cfg):
     fuzzy_matches_made = False
     
     # 1. Fuzzy matching for colors
-    color_palette = orders["CUSTOMER COLOUR DESCRIPTION"].unique()
+    color_palette = context["color_palette"] if "color_palette" in context else orders["CUSTOMER COLOUR DESCRIPTION"].unique()
     color_col = None
     for col in ["CUSTOMER COLOUR DESCRIPTION", "COLOR", "Color"]:
         if col in ships_processed.columns:
@@ -21,8 +50,9 @@ def match(orders, ships, cfg):
             break
     
     if color_col is not None:
-        color_mapping = {c: process.extractOne(c, color_palette, scorer=fuzz.token_set_ratio) 
-                        for c in ships_processed[color_col].unique()}
+        # Interned key columns are categorical; correct them as plain values
+        ships_processed[color_col] = ships_processed[color_col].astype(object)
+        color_mapping = _best_matches(ships_processed[color_col].unique(), color_palette, context["color_mapping"])
         ships_processed["Color_fuzzy"] = ships_processed[color_col].map(
             lambda c: color_mapping[c][0] if color_mapping[c][1]/100 >= thresh else None)
         
@@ -34,7 +64,7 @@ def match(orders, ships, cfg):
         ships_processed = ships_processed.drop("Color_fuzzy", axis=1)
     
     # 2. Fuzzy matching for shipping methods
-    shipping_palette = orders["PLANNED DELIVERY METHOD"].unique()
+    shipping_palette = context["shipping_palette"] if "shipping_palette" in context else orders["PLANNED DELIVERY METHOD"].unique()
     shipping_col = None
     for col in ["PLANNED DELIVERY METHOD", "Shipping_Method"]:
         if col in ships_processed.columns:
@@ -42,8 +72,7 @@ def match(orders, ships, cfg):
             break
     
     if shipping_col is not None:
-        shipping_mapping = {s: process.extractOne(s, shipping_palette, scorer=fuzz.token_set_ratio) 
-                           for s in ships_processed[shipping_col].unique()}
+        shipping_mapping = _best_matches(ships_processed[shipping_col].unique(), shipping_palette, context["shipping_mapping"])
         ships_processed["Shipping_fuzzy"] = ships_processed[shipping_col].map(
             lambda s: shipping_mapping[s][0] if shipping_mapping[s][1]/100 >= thresh else None)
         
@@ -71,13 +100,14 @@ def match(orders, ships, cfg):
     
     # Calculate confidence based on fuzzy matches made
     if not m.empty:
+        cache = get_similarity_cache()
         confidences = []
         for _, row in m.iterrows():
             scores = []
             if color_col and color_col+"_o" in m.columns and color_col+"_s" in m.columns:
-                scores.append(fuzz.token_set_ratio(row[color_col+"_o"], row[color_col+"_s"]))
+                scores.append(cache.score(row[color_col+"_o"], row[color_col+"_s"]))
             if shipping_col and shipping_col+"_o" in m.columns and shipping_col+"_s" in m.columns:
-                scores.append(fuzz.token_set_ratio(row[shipping_col+"_o"], row[shipping_col+"_s"]))
+                scores.append(cache.score(row[shipping_col+"_o"], row[shipping_col+"_s"]))
             confidences.append(sum(scores) / len(scores) / 100 if scores else 0.0)
         m["confidence"] = confidences
     else:
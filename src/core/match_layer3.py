@@ -4,7 +4,6 @@ Layer 3 Matching: Quantity Variance Resolution
 Links additional ACTIVE orders to shipments to resolve >10% quantity variances
 """
 import pandas as pd
-import pyodbc
 from typing import Dict, List, Tuple
 from pathlib import Path
 import sys
@@ -14,6 +13,8 @@ project_root = Path(__file__).parent.parent.parent
 sys.path.append(str(project_root))
 
 from auth_helper import get_connection_string
+from utils import db_pool
+from src.reconciliation.split_solver import DEFAULT_MAX_ORDERS, RemainingQuantityIndex, classify_gap_fill
 
 class Layer3Matcher:
     """
@@ -24,12 +25,14 @@ class Layer3Matcher:
     Solution: Find unmatched ACTIVE orders with same style/color to close gaps
     """
     
-    def __init__(self):
+    def __init__(self, max_orders: int = DEFAULT_MAX_ORDERS):
         self.connection_string = get_connection_string()
+        # Maximum number of additional orders linked to one shipment
+        self.max_orders = max_orders
     
     def get_connection(self):
-        """Get database connection"""
-        return pyodbc.connect(self.connection_string)
+        """Get a pooled database connection"""
+        return db_pool.connect(self.connection_string)
     
     def get_quantity_failures(self, customer: str, po_number: str) -> pd.DataFrame:
         """
@@ -80,54 +83,50 @@ class Layer3Matcher:
     def find_layer3_matches(self, customer: str, po_number: str) -> List[Dict]:
         """
         Find Layer 3 matches: unmatched ACTIVE orders that could resolve quantity gaps
+        
+        Each failure gets the combination of up to max_orders unmatched orders
+        (same style/color) whose quantities best close its gap, one row per
+        additional order. Orders linked to one shipment are not offered to the next.
         """
         failures = self.get_quantity_failures(customer, po_number)
         unmatched = self.get_unmatched_orders(customer, po_number)
         
         layer3_matches = []
+        if failures.empty or unmatched.empty:
+            return layer3_matches
+        
+        index = RemainingQuantityIndex(unmatched['style_code'], unmatched['color_description'], unmatched['quantity'])
+        orders = unmatched.to_dict('records')
         
-        for _, failure in failures.iterrows():
-            # Calculate quantity gap
+        for failure in failures.to_dict('records'):
+            # Calculate quantity gap; only shortfalls can be closed by linking orders
             qty_gap = failure['shipment_quantity'] - failure['current_order_quantity']
+            if qty_gap <= 0:
+                continue
             
             # Find unmatched orders with same style/color
-            candidates = unmatched[
-                (unmatched['style_code'] == failure['shipment_style_code']) &
-                (unmatched['color_description'] == failure['shipment_color_description'])
-            ].copy()
-            
+            candidates = index.exact_candidates(failure['shipment_style_code'], failure['shipment_color_description'])
             if len(candidates) == 0:
                 continue
-                
-            # Sort candidates by how well they fill the gap
-            candidates['gap_fit_score'] = candidates['quantity'].apply(
-                lambda x: 100 - abs((x - qty_gap) / qty_gap * 100) if qty_gap > 0 else 0
-            )
-            candidates = candidates.sort_values('gap_fit_score', ascending=False)
             
-            # Evaluate delivery method compatibility
-            for _, candidate in candidates.iterrows():
+            # Best combination of additional orders to fill the gap
+            picked, added_qty = index.solve(candidates, qty_gap, self.max_orders)
+            if len(picked) == 0:
+                continue
+            index.consume(picked, added_qty)
+            
+            # Calculate variance after linking the whole combination
+            new_total_qty = failure['current_order_quantity'] + added_qty
+            gap_after = failure['shipment_quantity'] - new_total_qty
+            variance_after = gap_after / failure['shipment_quantity'] * 100
+            match_quality = classify_gap_fill(qty_gap, added_qty, abs(variance_after))
+            gap_fit_score = 100 - abs((added_qty - qty_gap) / qty_gap * 100)
+            
+            for order_pos in picked:
+                candidate = orders[order_pos]
+                # Evaluate delivery method compatibility
                 delivery_match = "MATCH" if candidate['delivery_method'] == failure['shipment_delivery_method'] else "MISMATCH"
                 
-                # Calculate variance after linking
-                new_total_qty = failure['current_order_quantity'] + candidate['quantity']
-                variance_after = abs((failure['shipment_quantity'] - new_total_qty) / failure['shipment_quantity'] * 100)
-                
-                # Determine match quality based on gap filling and final variance
-                if qty_gap <= 20:  # Small gaps - be careful about overshooting
-                    if candidate['quantity'] <= qty_gap * 1.5 and variance_after <= 15:
-                        match_quality = "EXCELLENT"
-                    elif candidate['quantity'] <= qty_gap * 2.0 and variance_after <= 25:
-                        match_quality = "GOOD"
-                    else:
-                        match_quality = "PARTIAL"
-                elif candidate['quantity'] >= qty_gap * 0.9 and variance_after <= 10:  # Large gaps - prioritize closure
-                    match_quality = "EXCELLENT"
-                elif candidate['quantity'] >= qty_gap * 0.7 and variance_after <= 20:
-                    match_quality = "GOOD"
-                else:
-                    match_quality = "PARTIAL"
-                
                 layer3_match = {
                     'shipment_id': failure['shipment_id'],
                     'current_order_id': failure['current_order_id'],
@@ -137,17 +136,19 @@ class Layer3Matcher:
                     'shipment_quantity': failure['shipment_quantity'],
                     'current_order_quantity': failure['current_order_quantity'],
                     'additional_order_quantity': candidate['quantity'],
-                    'total_order_quantity': failure['current_order_quantity'] + candidate['quantity'],
+                    'combined_additional_quantity': added_qty,
+                    'combination_size': len(picked),
+                    'total_order_quantity': new_total_qty,
                     'quantity_gap': qty_gap,
-                    'gap_after_linking': failure['shipment_quantity'] - (failure['current_order_quantity'] + candidate['quantity']),
+                    'gap_after_linking': gap_after,
                     'variance_before': failure['quantity_difference_percent'],
-                    'variance_after': ((failure['shipment_quantity'] - (failure['current_order_quantity'] + candidate['quantity'])) / failure['shipment_quantity'] * 100),
+                    'variance_after': variance_after,
                     'shipment_delivery': failure['shipment_delivery_method'],
                     'current_order_delivery': failure['order_delivery_method'],
                     'additional_order_delivery': candidate['delivery_method'],
                     'delivery_match': delivery_match,
                     'match_quality': match_quality,
-                    'gap_fit_score': candidate['gap_fit_score']
+                    'gap_fit_score': gap_fit_score
                 }
                 
                 layer3_matches.append(layer3_match)
@@ -229,7 +230,8 @@ class Layer3Matcher:
         
         if not matches:
             print("❌ No Layer 3 matches found")
-            return {"matches_found": 0, "matches_applied": 0}
+            return {"matches_found": 0, "excellent_matches": 0, "good_matches": 0,
+                    "partial_matches": 0, "matches_applied": 0}
         
         # Group by shipment for reporting
         shipment_groups = {}
@@ -251,7 +253,9 @@ class Layer3Matcher:
                 quality_icon = {"EXCELLENT": "🟢", "GOOD": "🟡", "PARTIAL": "🟠"}[match['match_quality']]
                 
                 print(f"  {quality_icon} {match['match_quality']}: {match['style_code']} {match['color_description']}")
-                print(f"    Gap: {match['quantity_gap']} units → Additional order: {match['additional_order_quantity']} units")
+                print(f"    Gap: {match['quantity_gap']} units → Additional order: {match['additional_order_quantity']} units"
+                      + (f" ({match['combination_size']} orders, {match['combined_additional_quantity']:g} units total)"
+                         if match['combination_size'] > 1 else ""))
                 print(f"    Variance: {match['variance_before']:.1f}% → {match['variance_after']:.1f}%")
                 print(f"    Delivery: {match['delivery_match']} ({match['additional_order_delivery']})")
                 
@@ -282,10 +286,12 @@ def main():
     parser.add_argument('--customer', required=True, help='Customer name')
     parser.add_argument('--po', required=True, help='PO number')
     parser.add_argument('--auto-apply', action='store_true', help='Automatically apply high-quality matches')
+    parser.add_argument('--max-orders', type=int, default=DEFAULT_MAX_ORDERS,
+                        help='Maximum number of additional orders linked to one shipment')
     
     args = parser.parse_args()
     
-    matcher = Layer3Matcher()
+    matcher = Layer3Matcher(max_orders=args.max_orders)
     result = matcher.run_layer3_matching(args.customer, args.po, args.auto_apply)
     
     print(f"\n📊 LAYER 3 MATCHING SUMMARY:")
@@ -2,17 +2,34 @@ import pandas as pd
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from llm_client import propose_links
+from llm_client import CallBudget, candidate_index, propose_links
 
-def match(orders, ships):
-    links = propose_links(orders, ships)
+def prepare(orders, budget=None):
+    """
+    LLM matching state shared across match() calls in one run: the candidate
+    index over this order book and the run's call budget (pass one budget to
+    share it between order books).
+    """
+    return {"index": candidate_index(orders), "budget": budget if budget is not None else CallBudget()}
+
+def match(orders, ships, cfg=None, context=None):
+    field_map = cfg.get("map") if cfg else None
+    context = context if context is not None else prepare(orders)
+    links = propose_links(orders, ships, field_map=field_map, index=context["index"], budget=context["budget"])
     if not links:
         return pd.DataFrame(), ships
-    rows = []
+    # Keep the most confident link per shipment
+    best = {}
     for link in links:
+        current = best.get(link["shipment_index"])
+        if current is None or link.get("confidence", 0) > current.get("confidence", 0):
+            best[link["shipment_index"]] = link
+    rows = []
+    for link in best.values():
         o = orders.iloc[link["order_index"]].to_dict()
         s = ships.iloc[link["shipment_index"]].to_dict()
         rows.append({**o, **s, "method":"llm", "confidence":link["confidence"]})
     matched = pd.DataFrame(rows)
-    ships_left = ships.drop(index=[l["shipment_index"] for l in links])
+    # Link indexes are positions; ships keeps its original (non-contiguous) index
+    ships_left = ships.drop(index=ships.index[list(best)])
     return matched, ships_left
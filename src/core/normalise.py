@@ -7,18 +7,26 @@ yaml = YAML(typ="safe")
 project_root = Path(__file__).parent.parent.parent
 RULES = yaml.load((project_root / "config" / "customer_rules.yaml").read_text())
 
+# Key columns normalised on each side; pairs share one interned vocabulary
+ORDER_KEYS = ["CUSTOMER NAME", "CUSTOMER STYLE", "CUSTOMER COLOUR DESCRIPTION"]
+SHIPMENT_KEYS = ["Customer", "Style", "Color"]
+
+# Normalised order book per customer: (row count, checksum, frame)
+_ORDER_BOOK_CACHE = {}
+
 def _upper_trim(x): return re.sub(r"\s+", " ", str(x).upper()).strip()
 
+def _upper_trim_series(s: pd.Series) -> pd.Series:
+    """Vectorised _upper_trim, returned as a category-typed column"""
+    text = s.astype(str).str.upper().str.replace(r"\s+", " ", regex=True).str.strip()
+    return text.astype("category")
+
 def orders(df: pd.DataFrame, cust: str):
-    df["CUSTOMER NAME"] = df["CUSTOMER NAME"].map(_upper_trim)
-    df["CUSTOMER STYLE"] = df["CUSTOMER STYLE"].map(_upper_trim)
-    df["CUSTOMER COLOUR DESCRIPTION"] = df["CUSTOMER COLOUR DESCRIPTION"].map(_upper_trim)
+    df = df.assign(**{col: _upper_trim_series(df[col]) for col in ORDER_KEYS})
     return _drop_sizes(df, cust)
 
 def shipments(df: pd.DataFrame, cust: str):
-    df["Customer"] = df["Customer"].map(_upper_trim)
-    df["Style"] = df["Style"].map(_upper_trim)
-    df["Color"] = df["Color"].map(_upper_trim)
+    df = df.assign(**{col: _upper_trim_series(df[col]) for col in SHIPMENT_KEYS})
     return _drop_sizes(df, cust)
 
 def _drop_sizes(df, cust):
@@ -27,3 +35,38 @@ def _drop_sizes(df, cust):
         df = df[~df["Size"].astype(str).str.upper().isin(excl)]
     # Don't reset index to preserve original row tracking
     return df
+
+def _checksum(df: pd.DataFrame) -> int:
+    """Content hash of a frame (values and index)"""
+    return int(pd.util.hash_pandas_object(df, index=True).sum()) if len(df) else 0
+
+def order_book(df: pd.DataFrame, cust: str):
+    """
+    Normalised orders for a customer, cached across calls. The cache entry is
+    rebuilt when the source row count or content checksum changes.
+    """
+    key = (len(df), _checksum(df))
+    cached = _ORDER_BOOK_CACHE.get(cust)
+    if cached is None or cached[0] != key:
+        cached = (key, orders(df, cust))
+        _ORDER_BOOK_CACHE[cust] = cached
+    return cached[1].copy()
+
+def intern_keys(orders_df: pd.DataFrame, ships_df: pd.DataFrame):
+    """
+    Give each order/shipment key pair the same category vocabulary so joins
+    compare integer codes. Order codes are kept; new shipment values are appended.
+    """
+    orders_df, ships_df = orders_df.copy(), ships_df.copy()
+    for order_col, ship_col in zip(ORDER_KEYS, SHIPMENT_KEYS):
+        order_values = orders_df[order_col].astype("category")
+        ship_values = ships_df[ship_col].astype("category")
+        known = order_values.cat.categories
+        vocab = known.append(ship_values.cat.categories.difference(known, sort=False))
+        orders_df[order_col] = order_values.cat.set_categories(vocab)
+        ships_df[ship_col] = ship_values.cat.set_categories(vocab)
+    return orders_df, ships_df
+
+def prepare(orders_df: pd.DataFrame, ships_df: pd.DataFrame, cust: str):
+    """Normalise both sides (orders via the cached order book) with shared key vocabularies"""
+    return intern_keys(order_book(orders_df, cust), shipments(ships_df, cust))
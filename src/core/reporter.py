@@ -3,14 +3,40 @@
 Comprehensive reporting for order-shipment reconciliation.
 Generates markdown reports with detailed breakdowns.
 """
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
 
+def _partial_key(value):
+    """Comparison form of a join value (None for missing values)"""
+    return str(value).strip() if pd.notna(value) else None
+
 def analyze_partial_matches(unmatched_ships, orders, join_cols):
-    """Analyze unmatched shipments to see which columns do match"""
+    """
+    Analyze unmatched shipments to see which columns do match.
+    
+    For each shipment the best partial match is the first order (in order
+    book order) agreeing on the most join columns. Orders are indexed once
+    per column (value -> order positions), so each shipment only visits
+    the orders sharing one of its values; shipments with the same join
+    values share one lookup.
+    """
     partial_matches = []
+    if unmatched_ships.empty:
+        return partial_matches
+    
+    cols = [col for col in join_cols if col in unmatched_ships.columns and col in orders.columns]
+    order_keys = {col: [_partial_key(value) for value in orders[col]] for col in cols}
+    postings = {}
+    for col in cols:
+        positions = {}
+        for position, key in enumerate(order_keys[col]):
+            if key is not None:
+                positions.setdefault(key, []).append(position)
+        postings[col] = {key: np.array(found) for key, found in positions.items()}
     
+    best_by_keys = {}
     for _, ship in unmatched_ships.iterrows():
         best_match = {"ship_id": ship.iloc[0], "matching_cols": [], "ship_data": {}}
         
@@ -19,18 +45,18 @@ def analyze_partial_matches(unmatched_ships, orders, join_cols):
             if col in ship.index:
                 best_match["ship_data"][col] = ship[col]
         
-        # Check each order to see which columns match
-        for _, order in orders.iterrows():
+        ship_keys = tuple(_partial_key(ship[col]) for col in cols)
+        if ship_keys not in best_by_keys:
+            hits = [postings[col][key] for col, key in zip(cols, ship_keys)
+                    if key is not None and key in postings[col]]
             matching_cols = []
-            for col in join_cols:
-                if col in ship.index and col in order.index:
-                    if pd.notna(ship[col]) and pd.notna(order[col]):
-                        if str(ship[col]).strip() == str(order[col]).strip():
-                            matching_cols.append(col)
-            
-            # Keep track of best partial match for this shipment
-            if len(matching_cols) > len(best_match["matching_cols"]):
-                best_match["matching_cols"] = matching_cols
+            if hits:
+                # argmax takes the first order with the highest count
+                best = int(np.bincount(np.concatenate(hits)).argmax())
+                matching_cols = [col for col, key in zip(cols, ship_keys)
+                                 if key is not None and order_keys[col][best] == key]
+            best_by_keys[ship_keys] = matching_cols
+        best_match["matching_cols"] = list(best_by_keys[ship_keys])
         
         partial_matches.append(best_match)
     
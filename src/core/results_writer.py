@@ -0,0 +1,240 @@
+# ── src/core/results_writer.py ────────────────────────────────────────
+"""
+Columnar reconciliation results.
+Streams exact, fuzzy and unmatched rows to Parquet (or Arrow IPC) files
+partitioned by customer, PO and shipment date, and summarises a run from
+counts aggregated as the frames are written.
+
+Layout (hive-style, so pd.read_parquet / pyarrow.dataset read the
+partition keys back as columns):
+
+    <root>/<kind>/customer=<customer>/po=<po>/ship_date=<date>/part-0000.parquet
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for columnar reports
+    pa = pq = None
+
+RESULT_KINDS = ("exact", "fuzzy", "unmatched")
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# Columns partitioning the rows, first one present wins (orders' names after a
+# match join, the shipment names on unmatched rows)
+PO_COLUMNS = ["PO NUMBER", "PO NUMBER_s", "Customer_PO"]
+DATE_COLUMNS = ["Shipped_Date", "Shipped_Date_s"]
+
+# Partition value for rows without a PO or date
+MISSING = "__none__"
+
+def _partition_value(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return MISSING
+    text = str(value.date() if isinstance(value, pd.Timestamp) else value).strip()
+    return text.replace("/", "_").replace("\\", "_").replace("=", "_") or MISSING
+
+def _arrow_frame(df):
+    """
+    String column names; object/category columns as strings so mixed values
+    convert, and all-null columns as strings so the schema they fix accepts
+    whatever values later frames bring
+    """
+    df = df.copy()
+    df.columns = [str(col) for col in df.columns]
+    for col in df.columns:
+        if (df[col].dtype == object or isinstance(df[col].dtype, pd.CategoricalDtype)
+                or df[col].isna().all()):
+            df[col] = df[col].astype("string")
+    return df
+
+def _first_present(df, columns):
+    return next((col for col in columns if col in df.columns), None)
+
+class ResultsWriter:
+    """
+    Appends result frames to one open writer per (kind, partition). The first
+    frame of a kind fixes that kind's schema, so every partition file of it
+    reads back as one dataset. At most max_open files are open at once; a
+    partition written to again after its file was closed gets a new part
+    file. Row counts per partition are kept for the run summary. Safe to share
+    between the by-date worker threads.
+    """
+
+    def __init__(self, root, fmt="parquet", max_open=64):
+        if pa is None:
+            raise ImportError("pyarrow is required for columnar reports (pip install pyarrow)")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown results format: {fmt}")
+        self.root = Path(root)
+        self.fmt = fmt
+        self.max_open = max_open
+        self._writers = OrderedDict()  # partition dir -> writer
+        self._schemas = {}
+        self._parts = {}
+        self._counts = []
+        self._confidence = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def write(self, kind, df, customer):
+        """Append a result frame, split into its PO/date partitions"""
+        if kind not in RESULT_KINDS:
+            raise ValueError(f"Unknown result kind: {kind}")
+        if df is None or df.empty:
+            return
+        po_col, date_col = _first_present(df, PO_COLUMNS), _first_present(df, DATE_COLUMNS)
+        keys = pd.DataFrame({
+            "po": df[po_col].map(_partition_value) if po_col else MISSING,
+            "ship_date": pd.to_datetime(df[date_col], errors="coerce").dt.date.map(_partition_value) if date_col else MISSING,
+        }, index=df.index).reset_index(drop=True)
+        frame = _arrow_frame(df).reset_index(drop=True)
+
+        counts = keys.value_counts().rename("rows").reset_index()
+        counts["kind"], counts["customer"] = kind, customer
+        confidence = df["confidence"] if kind == "fuzzy" and "confidence" in df.columns else None
+
+        # One Arrow conversion per frame; partitions are zero-copy slices of
+        # the table sorted by partition key
+        codes, uniques = pd.MultiIndex.from_frame(keys).factorize()
+        order = np.argsort(codes, kind="stable")
+        table = pa.Table.from_pandas(frame, preserve_index=False).take(pa.array(order))
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        starts, stops = np.r_[0, bounds], np.r_[bounds, len(order)]
+
+        with self._lock:
+            schema = self._schemas.setdefault(kind, table.schema)
+            if not table.schema.equals(schema):
+                table = self._conform(table, schema)
+            for start, stop in zip(starts, stops):
+                po, ship_date = uniques[codes[order[start]]]
+                self._append(kind, customer, po, ship_date, table.slice(start, stop - start))
+            self._counts.append(counts)
+            if confidence is not None:
+                self._confidence.append(pd.to_numeric(confidence, errors="coerce"))
+
+    def _append(self, kind, customer, po, ship_date, table):
+        directory = (self.root / kind / f"customer={_partition_value(customer)}"
+                     / f"po={po}" / f"ship_date={ship_date}")
+        writer = self._writers.get(directory)
+        if writer is None:
+            writer = self._open(directory, table.schema)
+        else:
+            self._writers.move_to_end(directory)
+        writer.write_table(table)
+
+    def _open(self, directory, schema):
+        while len(self._writers) >= self.max_open:
+            _, writer = self._writers.popitem(last=False)
+            writer.close()
+        directory.mkdir(parents=True, exist_ok=True)
+        part = self._parts.get(directory, 0)
+        self._parts[directory] = part + 1
+        path = directory / f"part-{part:04d}{FORMATS[self.fmt]}"
+        writer = pq.ParquetWriter(str(path), schema) if self.fmt == "parquet" else pa.ipc.new_file(str(path), schema)
+        self._writers[directory] = writer
+        return writer
+
+    @staticmethod
+    def _conform(table, schema):
+        """Later frames follow the kind's first frame columns; missing ones are null, extra ones dropped"""
+        columns = []
+        for field in schema:
+            if field.name in table.column_names:
+                columns.append(table[field.name].cast(field.type, safe=False))
+            else:
+                columns.append(pa.nulls(table.num_rows, type=field.type))
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    def close(self):
+        with self._lock:
+            while self._writers:
+                _, writer = self._writers.popitem(last=False)
+                writer.close()
+
+    def partition_counts(self):
+        """Rows per customer/PO/date with one column per result kind"""
+        if not self._counts:
+            return pd.DataFrame(columns=["customer", "po", "ship_date", *RESULT_KINDS])
+        counts = (pd.concat(self._counts, ignore_index=True)
+                  .pivot_table(index=["customer", "po", "ship_date"], columns="kind", values="rows",
+                               aggfunc="sum", fill_value=0)
+                  .reindex(columns=list(RESULT_KINDS), fill_value=0)
+                  .reset_index())
+        counts.columns.name = None
+        return counts
+
+    def summary_markdown(self, customer, identifier, top=10):
+        """Run summary built from the aggregated partition counts"""
+        counts = self.partition_counts()
+        totals = counts[list(RESULT_KINDS)].sum()
+        total = int(totals.sum())
+        matched = int(totals["exact"] + totals["fuzzy"])
+
+        def pct(n):
+            return f"{n / total * 100:,.1f}%" if total else "0.0%"
+
+        lines = [
+            "# Order-Shipment Reconciliation Summary",
+            "",
+            f"**Customer:** {customer}  ",
+            f"**Scope:** {identifier}  ",
+            f"**Generated:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}  ",
+            f"**Results:** `{self.root}` ({self.fmt}, partitioned by customer/po/ship_date)",
+            "",
+            "## Summary",
+            "",
+            "| Metric | Count | Percentage |",
+            "|--------|-------|------------|",
+            f"| **Total Shipment Lines** | {total:,} | 100.0% |",
+            f"| **Total Matched** | {matched:,} | {pct(matched)} |",
+            f"| **Exact Matches** | {int(totals['exact']):,} | {pct(totals['exact'])} |",
+            f"| **Fuzzy Matches** | {int(totals['fuzzy']):,} | {pct(totals['fuzzy'])} |",
+            f"| **No Matches** | {int(totals['unmatched']):,} | {pct(totals['unmatched'])} |",
+        ]
+
+        if self._confidence:
+            confidence = pd.concat(self._confidence).dropna()
+            if not confidence.empty:
+                lines += ["", "### Fuzzy Match Confidence", "",
+                          f"- **Mean:** {confidence.mean():.1%}",
+                          f"- **Min / Median / Max:** {confidence.min():.1%} / {confidence.median():.1%} / {confidence.max():.1%}"]
+
+        by_date = counts.groupby("ship_date")[list(RESULT_KINDS)].sum()
+        if not by_date.empty:
+            by_date["total"] = by_date.sum(axis=1)
+            by_date["rate"] = (by_date["exact"] + by_date["fuzzy"]) / by_date["total"] * 100
+            lines += ["", "## By Shipment Date", "",
+                      "| Date | Shipments | Exact | Fuzzy | Unmatched | Match Rate |",
+                      "|------|-----------|-------|-------|-----------|------------|"]
+            lines += [f"| {row.Index} | {row.total:,} | {row.exact:,} | {row.fuzzy:,} | {row.unmatched:,} | {row.rate:.1f}% |"
+                      for row in by_date.sort_index().itertuples()]
+
+        by_po = counts.groupby("po")[list(RESULT_KINDS)].sum()
+        by_po = by_po[by_po["unmatched"] > 0].sort_values("unmatched", ascending=False).head(top)
+        if not by_po.empty:
+            lines += ["", f"## POs With Most Unmatched Shipments (top {top})", "",
+                      "| PO | Unmatched | Matched |", "|----|-----------|---------|"]
+            lines += [f"| {row.Index} | {row.unmatched:,} | {row.exact + row.fuzzy:,} |" for row in by_po.itertuples()]
+
+        lines += ["", "---", "*Report generated by Order-Shipment Reconciliation System*", ""]
+        return "\n".join(lines)
+
+    def write_summary(self, path, customer, identifier):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self.summary_markdown(customer, identifier), encoding="utf-8")
+        return path
@@ -1,10 +1,14 @@
-import requests, json, pandas as pd
+import requests, json, time, pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from ruamel.yaml import YAML
 from pathlib import Path
 from datetime import datetime
 
+from llm_response_cache import get_llm_response_cache, usage_summary, USAGE_COUNTERS
+
 CFG = YAML(typ="safe").load((Path(__file__).parent.parent / "config" / "config.yaml").read_text())
 LLM_CFG = CFG["llm_analysis"]  # Use separate analysis config
+REPORTS_ROOT = Path(__file__).parent.parent / "reports"
 
 def analyze_reconciliation_patterns(customer: str, results_data: dict, date_range: str = None):
     """
@@ -56,11 +60,11 @@ def analyze_by_po_batches(customer: str, results_data: dict, analysis_summary: d
     po_groups = unmatched.groupby('PO NUMBER')
     po_batches = list(po_groups)
     
-    print(f"   📦 Processing {len(po_batches)} PO batches...")
+    max_in_flight = max(1, LLM_CFG.get("max_in_flight", 4))
+    print(f"   📦 Processing {len(po_batches)} PO batches ({max_in_flight} in flight)...")
     
-    # Analyze each PO batch
-    batch_results = []
-    for po_number, po_shipments in po_batches:
+    def analyze_batch(batch):
+        po_number, po_shipments = batch
         print(f"   📋 Analyzing PO {po_number} ({len(po_shipments)} shipments)...")
         
         # Create batch-specific results data
@@ -77,19 +81,30 @@ def analyze_by_po_batches(customer: str, results_data: dict, analysis_summary: d
         # Analyze this batch
         batch_result = analyze_single_batch(customer, batch_data, analysis_summary, batch_date_range)
         if batch_result:
-            batch_results.append({
+            return {
                 "po_number": po_number,
                 "shipment_count": len(po_shipments),
-                "analysis": batch_result["analysis"]
-            })
+                "analysis": batch_result["analysis"],
+                "llm_usage": batch_result["llm_usage"]
+            }
+        return None
+    
+    # Batches run concurrently; results keep PO order
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        batch_results = [result for result in pool.map(analyze_batch, po_batches) if result]
     
+    # Only this run's calls; the cache's own counters are shared by the whole process
+    usage = usage_summary({key: sum(batch["llm_usage"][key] for batch in batch_results) for key in USAGE_COUNTERS})
     print(f"   ✅ LLM batch analysis completed for {len(batch_results)} POs")
+    print(f"   💾 Response cache: {usage['hits']} hits, {usage['misses']} misses, "
+          f"{usage['tokens_per_second']:.1f} tokens/s generated")
     
     # Combine results into comprehensive report
     combined_analysis = combine_po_analyses(batch_results, analysis_summary)
     
     # Generate combined markdown report
-    markdown_content = generate_batched_markdown_report(customer, analysis_summary, combined_analysis, date_range, len(po_batches))
+    markdown_content = generate_batched_markdown_report(customer, analysis_summary, combined_analysis, date_range,
+                                                        len(po_batches), usage)
     report_path = save_analysis_report(customer, markdown_content, analysis_summary)
     
     print(f"📄 Combined analysis report: {report_path}")
@@ -98,6 +113,7 @@ def analyze_by_po_batches(customer: str, results_data: dict, analysis_summary: d
         "batch_results": batch_results,
         "combined_analysis": combined_analysis,
         "summary": analysis_summary,
+        "llm_usage": usage,
         "report_path": report_path
     }
 
@@ -260,63 +276,94 @@ At the end of your response, provide a JSON object with suggested mappings in th
         ]
     }
     
+    content, usage = complete(body)
+    usage = usage_summary(usage)
+    if content is None:
+        return None
+    
+    # Extract markdown analysis and JSON mappings
+    markdown_analysis, json_mappings = extract_analysis_and_mappings(content)
+    
+    # Save JSON mappings if found
+    json_path = None
+    if json_mappings:
+        json_path = save_mapping_suggestions(customer, json_mappings, analysis_summary, date_range)
+        print(f"   📄 JSON mappings saved: {json_path}")
+    
+    # For single batch, create simple markdown report
+    if "PO" not in date_range:  # Not a PO batch, generate full report
+        markdown_content = generate_simple_markdown_report(customer, analysis_summary, markdown_analysis, date_range,
+                                                           usage)
+        report_path = save_analysis_report(customer, markdown_content, analysis_summary)
+        print("✅ LLM analysis completed successfully")
+        print(f"📄 Analysis report: {report_path}")
+        
+        return {
+            "analysis": markdown_analysis,
+            "json_mappings": json_mappings,
+            "summary": analysis_summary,
+            "report_path": report_path,
+            "json_path": json_path,
+            "llm_usage": usage
+        }
+    else:
+        # For PO batch, just return the analysis content
+        return {
+            "analysis": markdown_analysis,
+            "json_mappings": json_mappings,
+            "summary": analysis_summary,
+            "llm_usage": usage
+        }
+
+
+def complete(body: dict):
+    """
+    Response content for a chat completion request, with this call's usage
+    (hit or miss, generated tokens and seconds). Responses are served from
+    the on-disk cache when the same model, temperature and (whitespace
+    normalised) prompt were answered before; otherwise LM Studio is called and
+    the response is cached with its token count and generation time.
+    """
+    cache = get_llm_response_cache()
+    content = cache.get(body)
+    if content is not None:
+        print("   💾 Using cached LLM response")
+        return content, {'hits': 1, 'misses': 0, 'completion_tokens': 0, 'generation_seconds': 0.0}
+    
+    usage = {'hits': 0, 'misses': 1, 'completion_tokens': 0, 'generation_seconds': 0.0}
+    
     try:
         print("   📡 Sending analysis request to LLM...")
         print(f"   🔍 Debug: Request URL: {LLM_CFG['url']}")
         print(f"   🔍 Debug: Model: {LLM_CFG['model']}")
-        print(f"   🔍 Debug: Prompt preview: {prompt['content'][:200]}...")
+        started = time.perf_counter()
         r = requests.post(LLM_CFG["url"], json=body, timeout=300)  # Increased to 5 minutes
         r.raise_for_status()
     except requests.exceptions.ConnectionError:
         print(f"❌ Could not connect to LLM service at {LLM_CFG['url']}")
-        return None
+        return None, usage
     except requests.exceptions.Timeout:
         print(f"❌ LLM analysis request timed out after 300 seconds")
-        return None
+        return None, usage
     except requests.exceptions.HTTPError as e:
         print(f"❌ LLM service returned HTTP error: {e}")
-        return None
+        return None, usage
     
+    elapsed = time.perf_counter() - started
     response_data = r.json()
     print(f"   🔍 Debug: Raw LLM response keys: {list(response_data.keys())}")
     
-    if "choices" in response_data and response_data["choices"]:
-        content = response_data["choices"][0]["message"]["content"]
-        print(f"   🔍 Debug: Response content preview: {content[:200]}...")
-        
-        # Extract markdown analysis and JSON mappings
-        markdown_analysis, json_mappings = extract_analysis_and_mappings(content)
-        
-        # Save JSON mappings if found
-        json_path = None
-        if json_mappings:
-            json_path = save_mapping_suggestions(customer, json_mappings, analysis_summary)
-            print(f"   📄 JSON mappings saved: {json_path}")
-        
-        # For single batch, create simple markdown report
-        if "PO" not in date_range:  # Not a PO batch, generate full report
-            markdown_content = generate_simple_markdown_report(customer, analysis_summary, markdown_analysis, date_range)
-            report_path = save_analysis_report(customer, markdown_content, analysis_summary)
-            print("✅ LLM analysis completed successfully")
-            print(f"📄 Analysis report: {report_path}")
-            
-            return {
-                "analysis": markdown_analysis,
-                "json_mappings": json_mappings,
-                "summary": analysis_summary,
-                "report_path": report_path,
-                "json_path": json_path
-            }
-        else:
-            # For PO batch, just return the analysis content
-            return {
-                "analysis": markdown_analysis,
-                "json_mappings": json_mappings,
-                "summary": analysis_summary
-            }
-    else:
+    if not ("choices" in response_data and response_data["choices"]):
         print(f"❌ Unexpected LLM response format. Available keys: {list(response_data.keys())}")
-        return None
+        return None, usage
+    
+    content = response_data["choices"][0]["message"]["content"]
+    print(f"   🔍 Debug: Response content preview: {content[:200]}...")
+    # LM Studio reports usage; otherwise estimate roughly 4 characters per token
+    tokens = (response_data.get("usage") or {}).get("completion_tokens") or len(content) // 4
+    cache.put(body, content, tokens, elapsed)
+    usage.update(completion_tokens=tokens, generation_seconds=elapsed)
+    return content, usage
 
 
 def extract_analysis_and_mappings(content: str):
@@ -342,17 +389,19 @@ def extract_analysis_and_mappings(content: str):
     return markdown_analysis, json_mappings
 
 
-def save_mapping_suggestions(customer: str, json_mappings: dict, summary: dict) -> str:
-    """Save JSON mapping suggestions to file"""
+def save_mapping_suggestions(customer: str, json_mappings: dict, summary: dict, date_range: str = None) -> str:
+    """
+    Save JSON mapping suggestions to file. PO batches pass their own date
+    range (with the PO) so concurrent batches never share a filename.
+    """
     
     # Create reports directory structure
-    project_root = Path(__file__).parent.parent
-    mappings_dir = project_root / "reports" / customer / "mapping_suggestions"
+    mappings_dir = REPORTS_ROOT / customer / "mapping_suggestions"
     mappings_dir.mkdir(parents=True, exist_ok=True)
     
     # Generate filename with timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    date_range = summary.get("date_range", "unknown")
+    date_range = date_range or summary.get("date_range", "unknown")
     report_id = date_range.replace(" ", "_").replace("shipped_", "") if date_range else "unknown"
     filename = f"mappings_{report_id}_{timestamp}.json"
     
@@ -377,7 +426,17 @@ def save_mapping_suggestions(customer: str, json_mappings: dict, summary: dict)
     return json_path
 
 
-def generate_simple_markdown_report(customer, summary, llm_analysis, date_range):
+def usage_markdown(usage):
+    """LLM Usage section of a report: response cache hits/misses and generation speed"""
+    if not usage:
+        return ""
+    return f"""
+## LLM Usage
+- **LLM Calls:** {usage['calls']} ({usage['hits']} cached, {usage['misses']} generated, {usage['hit_rate']:.0%} hit rate)
+- **Generated Tokens:** {usage['completion_tokens']} in {usage['generation_seconds']:.1f}s ({usage['tokens_per_second']:.1f} tokens/s)
+"""
+
+def generate_simple_markdown_report(customer, summary, llm_analysis, date_range, usage=None):
     """Generate a simple markdown report from LLM analysis"""
     
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -395,7 +454,7 @@ def generate_simple_markdown_report(customer, summary, llm_analysis, date_range)
 - **Exact Matches:** {summary.get('exact_matches', 0)}
 - **Fuzzy Matches:** {summary.get('fuzzy_matches', 0)}
 - **Unmatched:** {summary.get('unmatched', 0)}
-
+{usage_markdown(usage)}
 ## LLM Analysis
 
 {llm_analysis}
@@ -429,7 +488,7 @@ def combine_po_analyses(batch_results, analysis_summary):
     
     return combined
 
-def generate_batched_markdown_report(customer, summary, combined_analysis, date_range, num_batches):
+def generate_batched_markdown_report(customer, summary, combined_analysis, date_range, num_batches, usage=None):
     """Generate markdown report for batched analysis"""
     
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -452,7 +511,7 @@ def generate_batched_markdown_report(customer, summary, combined_analysis, date_
 ## PO Batch Summary
 - **PO Numbers Analyzed:** {num_batches}
 - **Shipments in Batches:** {summary.get('unmatched', 0)}
-
+{usage_markdown(usage)}
 ## LLM Analysis by PO
 
 {combined_analysis}
@@ -466,8 +525,7 @@ def save_analysis_report(customer, markdown_content, summary):
     """Save analysis report to file"""
     
     # Create reports directory structure
-    project_root = Path(__file__).parent.parent
-    reports_dir = project_root / "reports" / customer / "llm_analysis"
+    reports_dir = REPORTS_ROOT / customer / "llm_analysis"
     reports_dir.mkdir(parents=True, exist_ok=True)
     
     # Generate filename
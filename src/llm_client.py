@@ -1,39 +1,108 @@
-import requests, json, pandas as pd
+import requests, json, threading, pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from ruamel.yaml import YAML
 from pathlib import Path
 
+from core.llm_candidates import CandidateIndex, pack_prompts
+
 CFG = YAML(typ="safe").load((Path(__file__).parent.parent / "config" / "config.yaml").read_text())["llm"]
 
-def propose_links(orders: pd.DataFrame, ships: pd.DataFrame, sample=None):
-    """Ask LM Studio to map unmatched ship rows to order rows."""
-    # For daily processing, we work with the actual shipment count (usually small)
-    # and limit orders to a reasonable sample to fit context window
-    actual_ships = len(ships)
-    max_orders_for_context = min(10, len(orders))  # Much smaller sample for faster processing
+# Only send relevant columns to LLM to reduce token usage
+RELEVANT_ORDER_COLS = [
+    'PO NUMBER', 'PLANNED DELIVERY METHOD', 'CUSTOMER STYLE', 
+    'CUSTOMER COLOUR DESCRIPTION', 'AAG ORDER NUMBER', 'ORDER TYPE',
+    'CUSTOMER NAME', 'ORDER DATE PO RECEIVED'
+]
+RELEVANT_SHIP_COLS = [
+    'PO NUMBER', 'PLANNED DELIVERY METHOD', 'CUSTOMER STYLE',
+    'CUSTOMER COLOUR DESCRIPTION', 'Customer', 'Customer_PO', 'Style', 'Color',
+    'Shipping_Method', 'Shipped_Date', 'Qty'
+]
+
+class CallBudget:
+    """
+    LM Studio calls allowed in one run, and the requests in flight at once,
+    shared by every propose_links call of the run (date slices on threads,
+    PO partitions in streaming mode). Defaults come from the llm config;
+    max_calls: null there means no limit.
+    """
     
-    # Only send relevant columns to LLM to reduce token usage
-    relevant_order_cols = [
-        'PO NUMBER', 'PLANNED DELIVERY METHOD', 'CUSTOMER STYLE', 
-        'CUSTOMER COLOUR DESCRIPTION', 'AAG ORDER NUMBER', 'ORDER TYPE',
-        'CUSTOMER NAME', 'ORDER DATE PO RECEIVED'
-    ]
-    relevant_ship_cols = [
-        'PO NUMBER', 'PLANNED DELIVERY METHOD', 'CUSTOMER STYLE',
-        'CUSTOMER COLOUR DESCRIPTION', 'Customer', 'Shipped_Date', 'Qty'
-    ]
+    def __init__(self, max_calls=None, concurrency=None):
+        self.max_calls = CFG.get("max_calls", 20) if max_calls is None else max_calls
+        self.slots = threading.BoundedSemaphore(max(1, CFG.get("concurrency", 2) if concurrency is None else concurrency))
+        self.used = 0
+        self._lock = threading.Lock()
     
-    # Filter to only relevant columns that exist
-    order_cols = [col for col in relevant_order_cols if col in orders.columns]
-    ship_cols = [col for col in relevant_ship_cols if col in ships.columns]
+    def claim(self, calls):
+        """Reserve up to calls from what is left of the budget; returns the number granted"""
+        with self._lock:
+            granted = calls if self.max_calls is None else max(0, min(calls, self.max_calls - self.used))
+            self.used += granted
+            return granted
+
+def candidate_index(orders: pd.DataFrame) -> CandidateIndex:
+    """Candidate index over an order book with the configured top_k and score floor"""
+    return CandidateIndex(orders, top_k=CFG.get("top_k", 5), min_score=CFG.get("min_candidate_score", 0.3))
+
+def propose_links(orders: pd.DataFrame, ships: pd.DataFrame, sample=None, field_map=None, index=None, budget=None):
+    """
+    Ask LM Studio to map unmatched ship rows to order rows.
     
-    orders_sample = orders[order_cols].head(max_orders_for_context)
-    ships_sample = ships[ship_cols]  # Use all shipments (daily chunks are small)
+    Each shipment is only shown its top-k candidate orders from a
+    CandidateIndex over the order book (pass index, built over this same
+    orders frame, to reuse one across calls); shipments sharing candidates
+    are packed into one prompt. Prompts are claimed from budget, shared by the
+    whole run, which also bounds concurrent requests; without one this call
+    gets its own. Returns links with positional shipment_index/order_index
+    into ships/orders.
+    """
+    index = index if index is not None else candidate_index(orders)
+    budget = budget if budget is not None else CallBudget()
+    candidates = index.retrieve(ships, field_map)
+    pack = dict(max_shipments=CFG.get("max_shipments_per_prompt", 20), max_orders=CFG.get("max_orders_per_prompt", 25))
+    prompts, _ = pack_prompts(candidates, **pack)
+    granted = budget.claim(len(prompts))
+    skipped = []
+    if granted < len(prompts):
+        # Keep the prompts holding the strongest candidates
+        prompts, skipped = pack_prompts(candidates, max_calls=granted, **pack)
     
+    without_candidates = sum(1 for found in candidates if not found)
     print(f"🧠 LLM Daily Analysis:")
-    print(f"   Analyzing {len(ships_sample)} shipments against {len(orders_sample)} orders")
-    print(f"   Using {len(order_cols)} order columns: {order_cols}")
-    print(f"   Using {len(ship_cols)} shipment columns: {ship_cols}")
+    print(f"   {len(ships)} shipments, {len(orders)} orders: top-{index.top_k} candidates in {len(prompts)} prompt(s)")
+    if without_candidates:
+        print(f"   {without_candidates} shipments have no plausible candidate and are not sent")
+    if skipped:
+        print(f"   {len(skipped)} shipments over the run's {budget.max_calls}-call budget are not sent")
+    if not prompts:
+        return []
     
+    order_cols = [col for col in RELEVANT_ORDER_COLS if col in orders.columns]
+    ship_cols = [col for col in RELEVANT_SHIP_COLS if col in ships.columns]
+    
+    def run(prompt):
+        ship_positions, order_positions = prompt
+        with budget.slots:
+            links = _request_links(orders[order_cols].iloc[order_positions], ships[ship_cols].iloc[ship_positions])
+        # Map prompt-local indexes back to positions in the full frames
+        mapped = []
+        for link in links:
+            try:
+                mapped.append({**link,
+                               "shipment_index": ship_positions[int(link["shipment_index"])],
+                               "order_index": order_positions[int(link["order_index"])]})
+            except (KeyError, IndexError, TypeError, ValueError):
+                print(f"   ⚠️  Ignoring link outside the prompt: {link}")
+        return mapped
+    
+    with ThreadPoolExecutor(max_workers=min(len(prompts), max(1, CFG.get("concurrency", 2)))) as pool:
+        results = list(pool.map(run, prompts))
+    links = [link for batch in results for link in batch]
+    print(f"✅ LLM found {len(links)} potential matches from {len(prompts)} call(s)")
+    return links
+
+def _request_links(orders_sample: pd.DataFrame, ships_sample: pd.DataFrame):
+    """One LM Studio call for a packed prompt; indexes in the reply are local to the samples"""
     # Create a more focused prompt for daily reconciliation
     prompt = {
         "role": "user",
@@ -47,6 +116,7 @@ def propose_links(orders: pd.DataFrame, ships: pd.DataFrame, sample=None):
             "4. PLANNED DELIVERY METHOD vs Shipping_Method (shipping methods like 'SEA-FB' might match 'FAST BOAT')\n\n"
             "Output ONLY a JSON array of match objects:\n"
             "[{\"shipment_index\":0, \"order_index\":5, \"confidence\":0.95, \"reason\":\"PO+Style+Color match\"}]\n"
+            "shipment_index and order_index are positions in the lists below, starting at 0.\n"
             "Only include matches with confidence ≥ 0.85.\n\n"
             f"ORDERS ({len(orders_sample)} available):\n{orders_sample.to_json(orient='records', indent=1)}\n\n"
             f"SHIPMENTS ({len(ships_sample)} to match):\n{ships_sample.to_json(orient='records', indent=1)}"
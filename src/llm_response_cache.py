@@ -0,0 +1,184 @@
+"""
+LLM Response Cache
+Content-addressed on-disk cache of chat completion responses for the analysis client
+"""
+
+import os
+import re
+import json
+import time
+import atexit
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+project_root = Path(__file__).parent.parent
+
+# Set LLM_CACHE_PATH to an empty string to disable caching
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", str(project_root / "cache" / "llm_responses.sqlite"))
+DEFAULT_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+# Counters a single request contributes to; see usage_summary
+USAGE_COUNTERS = ('hits', 'misses', 'completion_tokens', 'generation_seconds')
+
+
+def usage_summary(counts: Dict) -> Dict:
+    """Usage counters with the call count, hit rate and tokens per second added"""
+    usage = {key: counts.get(key, 0) for key in USAGE_COUNTERS}
+    calls = usage['hits'] + usage['misses']
+    usage['calls'] = calls
+    usage['hit_rate'] = usage['hits'] / calls if calls else 0.0
+    usage['tokens_per_second'] = (usage['completion_tokens'] / usage['generation_seconds']
+                                  if usage['generation_seconds'] else 0.0)
+    return usage
+
+
+def prompt_hash(body: Dict) -> str:
+    """
+    SHA-256 of the request's messages and max_tokens with whitespace runs
+    collapsed, so re-indented or re-wrapped prompts share an entry.
+    """
+    messages = [{'role': m.get('role'), 'content': re.sub(r"\s+", " ", str(m.get('content', ''))).strip()}
+                for m in body.get('messages', [])]
+    payload = json.dumps({'messages': messages, 'max_tokens': body.get('max_tokens')}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Stores response content keyed on (model, temperature, prompt hash) in a
+    local SQLite file. Once the stored content grows past max_bytes the least
+    recently used responses are evicted. Counters cover hits, misses and the
+    tokens and seconds spent generating the missed responses.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path) if path else None
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self.stats = {'hits': 0, 'misses': 0, 'completion_tokens': 0, 'generation_seconds': 0.0, 'evictions': 0}
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Open (or reopen after a fork) the cache file"""
+        if self.path is None:
+            return None
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    model TEXT NOT NULL,
+                    temperature REAL NOT NULL,
+                    prompt_hash TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    completion_tokens INTEGER NOT NULL,
+                    generation_seconds REAL NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, temperature, prompt_hash)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_last_used ON llm_responses (last_used)")
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM response cache unavailable ({self.path}): {e}")
+            self.path = None
+            return None
+
+        self._conn, self._conn_pid = conn, os.getpid()
+        return conn
+
+    @staticmethod
+    def key(body: Dict):
+        return (str(body.get('model')), float(body.get('temperature') or 0.0), prompt_hash(body))
+
+    def get(self, body: Dict) -> Optional[str]:
+        """Cached content for a request body, or None (counted as a miss)"""
+        with self._lock:
+            conn = self._connection()
+            row = None
+            if conn is not None:
+                key = self.key(body)
+                row = conn.execute(
+                    "SELECT content FROM llm_responses WHERE model = ? AND temperature = ? AND prompt_hash = ?", key
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE llm_responses SET last_used = ? WHERE model = ? AND temperature = ? AND prompt_hash = ?",
+                        (time.time(), *key)
+                    )
+                    conn.commit()
+            self.stats['hits' if row is not None else 'misses'] += 1
+            return row[0] if row is not None else None
+
+    def put(self, body: Dict, content: str, completion_tokens: int, generation_seconds: float):
+        """Store a generated response and evict the oldest entries past max_bytes"""
+        with self._lock:
+            self.stats['completion_tokens'] += completion_tokens
+            self.stats['generation_seconds'] += generation_seconds
+            conn = self._connection()
+            if conn is None:
+                return
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (model, temperature, prompt_hash, content, bytes, "
+                "completion_tokens, generation_seconds, created, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*self.key(body), content, len(content.encode('utf-8')), completion_tokens, generation_seconds, now, now)
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM llm_responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute("SELECT model, temperature, prompt_hash, bytes FROM llm_responses ORDER BY last_used").fetchall()
+        doomed = []
+        for model, temperature, digest, size in rows:
+            if total <= self.max_bytes:
+                break
+            doomed.append((model, temperature, digest))
+            total -= size
+        conn.executemany("DELETE FROM llm_responses WHERE model = ? AND temperature = ? AND prompt_hash = ?", doomed)
+        self.stats['evictions'] += len(doomed)
+
+    def snapshot(self) -> Dict:
+        """Copy of the process-wide counters; concurrent callers all count towards them"""
+        with self._lock:
+            return dict(self.stats)
+
+    def usage_since(self, before: Dict) -> Dict:
+        """Hits, misses, generated tokens and tokens per second since a snapshot"""
+        now = self.snapshot()
+        return usage_summary({key: now[key] - before.get(key, 0) for key in USAGE_COUNTERS})
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._conn_pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+def get_llm_response_cache() -> LLMResponseCache:
+    """Process-wide cache shared by the analysis clients; closed at interpreter exit"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = LLMResponseCache()
+            atexit.register(_shared_cache.close)
+        return _shared_cache
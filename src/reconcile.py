@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
-import argparse, datetime as dt
+import argparse, contextlib, io, sys, threading, datetime as dt
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
 from ruamel.yaml import YAML
 import pandas as pd
 from tqdm import tqdm
 
 from core import extractor, normalise, match_exact, match_fuzzy, match_llm, reporter
+from core.results_writer import ResultsWriter
 from llm_analysis_client_batched import analyze_reconciliation_patterns
+from llm_client import CallBudget
 
 yaml = YAML(typ="safe")
 # Get the path to the project root from this file's location
@@ -48,88 +51,83 @@ def parse_date(date_str):
             continue
     raise ValueError(f"Unable to parse date: {date_str}")
 
-def reconcile_by_individual_dates(customer, date_from, date_to, use_llm=False, llm_analysis=False):
-    """Reconcile a customer by individual shipment dates, creating one report per date"""
+def _results_writer(customer, report_id, report_format):
+    """
+    Columnar results writer for one run, used as a context manager so its
+    files are closed (and readable) even when the run fails. Yields None for
+    the markdown/CSV reports.
+    """
+    if report_format == "markdown":
+        return contextlib.nullcontext()
+    stamp = dt.date.today().strftime("%Y%m%d")
+    return ResultsWriter(Path(CFG["report_root"]) / customer / f"{report_id}_{stamp}_results", report_format)
+
+def _write_results(writer, customer, exact, fuzzy_matches, ships_left):
+    writer.write("exact", exact, customer)
+    writer.write("fuzzy", fuzzy_matches, customer)
+    writer.write("unmatched", ships_left, customer)
+
+def _finish_results(writer, customer, identifier):
+    """Close the writer's files and write the summary next to the results directory"""
+    writer.close()
+    summary_file = writer.write_summary(writer.root.with_name(f"{writer.root.name}_summary.md"), customer, identifier)
+    print(f"📦 {writer.fmt.title()} results saved: {writer.root}")
+    print(f"📄 Summary saved: {summary_file}")
+
+def _reconcile_date_slice(customer, cfg, ship_date, ships_for_date, orders_norm, fuzzy_context, use_llm=False, writer=None,
+                          llm_context=None):
+    """
+    Match and report one shipment date against the shared order book; returns
+    its summary row. With a results writer the rows go to the shared columnar
+    output instead of per-date markdown and CSV files. llm_context (from
+    match_llm.prepare) shares the candidate index and LLM call budget between
+    the dates of a run.
+    """
+    date_str = ship_date.strftime('%Y-%m-%d')
+    print(f"\n📅 Processing {customer} for {date_str}")
     
-    # Parse dates
-    start_date = dt.datetime.strptime(parse_date(date_from), '%Y-%m-%d')
-    end_date = dt.datetime.strptime(parse_date(date_to), '%Y-%m-%d')
+    print(f"   {len(ships_for_date)} shipments on {date_str}")
     
-    print(f"🗓️  Processing {customer} by individual dates: {date_from} to {date_to}")
+    # Normalize shipments against the shared, already normalised order book
+    orders_norm, ships_norm = normalise.intern_keys(orders_norm, normalise.shipments(ships_for_date, customer))
     
-    cfg = get_cfg(customer)
+    print(f"   After normalization: {len(ships_norm)} shipments remaining")
     
-    # Get all shipments in the date range first
-    all_ships = extractor.shipments_by_date_range(cfg["aliases"], date_from, date_to)
+    # Get join columns for reporting
+    ships_for_join_check = ships_norm.rename(columns={v: k for k, v in cfg["map"].items()})
+    join_cols = [order_col for order_col in cfg["map"].keys() 
+                 if order_col in orders_norm.columns and order_col in ships_for_join_check.columns]
     
-    if len(all_ships) == 0:
-        print(f"No shipments found for {customer} in date range {date_from} to {date_to}")
-        return
+    print(f"   Join columns: {join_cols}")
+    print(f"   Orders available: {len(orders_norm)}")
     
-    # Get unique shipment dates
-    all_ships['Shipped_Date_parsed'] = pd.to_datetime(all_ships['Shipped_Date']).dt.date
-    unique_dates = sorted(all_ships['Shipped_Date_parsed'].unique())
+    # Matching stages
+    exact, ships_left = match_exact.match(orders_norm, ships_norm, cfg)
+    print(f"   After exact matching: {len(exact)} matched, {len(ships_left)} remaining")
     
-    print(f"Found shipments on {len(unique_dates)} dates: {', '.join(str(d) for d in unique_dates)}")
+    fuzzy, ships_left = match_fuzzy.match(orders_norm, ships_left, cfg, context=fuzzy_context)
+    print(f"   After fuzzy matching: {len(fuzzy)} fuzzy matched, {len(ships_left)} remaining")
     
-    # Get all orders for the customer (no date filter on orders)
-    # Use master_order_list if available, otherwise fall back to aliases
-    order_customer_names = [cfg.get("master_order_list")] if cfg.get("master_order_list") else cfg["aliases"]
-    orders = extractor.orders(order_customer_names)
-    print(f"   Querying orders for: {order_customer_names}")
-    print(f"   Found {len(orders)} orders")
+    llm = pd.DataFrame()
+    if use_llm and not ships_left.empty:
+        llm, ships_left = match_llm.match(orders_norm, ships_left, cfg, context=llm_context)
     
-    total_processed = 0
-    results_summary = []
+    # Prepare results for reporting
+    results_data = {
+        "exact_matches": exact,
+        "fuzzy_matches": pd.concat([fuzzy, llm], ignore_index=True) if len(llm) > 0 else fuzzy,
+        "unmatched": ships_left,
+        "orders": orders_norm,
+        "join_cols": join_cols
+    }
     
-    for ship_date in unique_dates:
-        date_str = ship_date.strftime('%Y-%m-%d')
-        print(f"\n📅 Processing {customer} for {date_str}")
-        
-        # Filter shipments for this specific date
-        ships_for_date = all_ships[all_ships['Shipped_Date_parsed'] == ship_date].copy()
-        ships_for_date = ships_for_date.drop('Shipped_Date_parsed', axis=1)  # Remove helper column
-        
-        print(f"   {len(ships_for_date)} shipments on {date_str}")
-        
-        # Normalize data
-        orders_norm = normalise.orders(orders, customer)
-        ships_norm = normalise.shipments(ships_for_date, customer)
-        
-        print(f"   After normalization: {len(ships_norm)} shipments remaining")
-        
-        # Get join columns for reporting
-        ships_for_join_check = ships_norm.rename(columns={v: k for k, v in cfg["map"].items()})
-        join_cols = [order_col for order_col in cfg["map"].keys() 
-                     if order_col in orders_norm.columns and order_col in ships_for_join_check.columns]
-        
-        print(f"   Join columns: {join_cols}")
-        print(f"   Orders available: {len(orders_norm)}")
-        
-        # Matching stages
-        exact, ships_left = match_exact.match(orders_norm, ships_norm, cfg)
-        print(f"   After exact matching: {len(exact)} matched, {len(ships_left)} remaining")
-        
-        fuzzy, ships_left = match_fuzzy.match(orders_norm, ships_left, cfg)
-        print(f"   After fuzzy matching: {len(fuzzy)} fuzzy matched, {len(ships_left)} remaining")
-        
-        llm = pd.DataFrame()
-        if use_llm and not ships_left.empty:
-            llm, ships_left = match_llm.match(orders_norm, ships_left)
-        
-        # Prepare results for reporting
-        results_data = {
-            "exact_matches": exact,
-            "fuzzy_matches": pd.concat([fuzzy, llm], ignore_index=True) if len(llm) > 0 else fuzzy,
-            "unmatched": ships_left,
-            "orders": orders_norm,
-            "join_cols": join_cols
-        }
-        
-        # Generate report with date-specific identifier
-        identifier = f"shipped {date_str}"
-        reporter.print_summary(customer, identifier, results_data)
-        
+    # Generate report with date-specific identifier
+    identifier = f"shipped {date_str}"
+    reporter.print_summary(customer, identifier, results_data)
+    
+    if writer is not None:
+        _write_results(writer, customer, exact, results_data["fuzzy_matches"], ships_left)
+    else:
         # Create date-specific report
         report_id = f"shipped_{date_str}"
         report_file = reporter.generate_markdown_report(customer, report_id, results_data)
@@ -151,21 +149,125 @@ def reconcile_by_individual_dates(customer, date_from, date_to, use_llm=False, l
             csv_file = out_dir / f"{report_id}_unmatched.csv"
             ships_left.to_csv(csv_file, index=False)
             print(f"💾 CSV unmatched saved: {csv_file}")
-        
-        # Collect summary for overall report
-        total_shipments = len(exact) + len(fuzzy) + len(llm) + len(ships_left)
-        total_matched = len(exact) + len(fuzzy) + len(llm)
-        
-        results_summary.append({
-            "date": date_str,
-            "total_shipments": total_shipments,
-            "exact_matches": len(exact),
-            "fuzzy_matches": len(fuzzy) + len(llm),
-            "unmatched": len(ships_left),
-            "match_rate": (total_matched / total_shipments * 100) if total_shipments > 0 else 0
-        })
-        
-        total_processed += 1
+    
+    # Collect summary for overall report
+    total_shipments = len(exact) + len(fuzzy) + len(llm) + len(ships_left)
+    total_matched = len(exact) + len(fuzzy) + len(llm)
+    
+    return {
+        "date": date_str,
+        "total_shipments": total_shipments,
+        "exact_matches": len(exact),
+        "fuzzy_matches": len(fuzzy) + len(llm),
+        "unmatched": len(ships_left),
+        "match_rate": (total_matched / total_shipments * 100) if total_shipments > 0 else 0
+    }
+
+
+class _ThreadOutput(io.TextIOBase):
+    """sys.stdout proxy that sends a worker thread's prints to its own buffer"""
+    def __init__(self, target):
+        self.target = target
+        self.local = threading.local()
+
+    def _stream(self):
+        buffer = getattr(self.local, "buffer", None)
+        return self.target if buffer is None else buffer
+
+    def write(self, text):
+        return self._stream().write(text)
+
+    def flush(self):
+        self._stream().flush()
+
+def _run_date_slices_parallel(slices, workers, *args):
+    """
+    Run _reconcile_date_slice for every (date, shipments) slice on a thread
+    pool sharing the precomputed order book. Each slice's console output is
+    captured and printed in date order; summary rows come back in date order.
+    """
+    proxy = _ThreadOutput(sys.stdout)
+
+    def run(ship_date, ships_for_date):
+        proxy.local.buffer = io.StringIO()
+        try:
+            return _reconcile_date_slice(*args[:2], ship_date, ships_for_date, *args[2:]), proxy.local.buffer.getvalue()
+        finally:
+            proxy.local.buffer = None
+
+    with contextlib.redirect_stdout(proxy), ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run, ship_date, ships_for_date) for ship_date, ships_for_date in slices]
+        results = []
+        for future in futures:
+            summary, output = future.result()
+            proxy.target.write(output)
+            results.append(summary)
+    return results
+
+def reconcile_by_individual_dates(customer, date_from, date_to, use_llm=False, llm_analysis=False, workers=1,
+                                  report_format="markdown"):
+    """
+    Reconcile a customer by individual shipment dates, creating one report per date.
+    The normalised order book and fuzzy palettes are prepared once; with
+    workers > 1 the date slices are matched and reported on a thread pool.
+    With a parquet/arrow report format every date streams into one partitioned
+    results directory with a single summary for the range.
+    """
+    
+    # Parse dates
+    start_date = dt.datetime.strptime(parse_date(date_from), '%Y-%m-%d')
+    end_date = dt.datetime.strptime(parse_date(date_to), '%Y-%m-%d')
+    
+    print(f"🗓️  Processing {customer} by individual dates: {date_from} to {date_to}")
+    
+    cfg = get_cfg(customer)
+    
+    # Get all shipments in the date range first
+    all_ships = extractor.shipments_by_date_range(cfg["aliases"], date_from, date_to)
+    
+    if len(all_ships) == 0:
+        print(f"No shipments found for {customer} in date range {date_from} to {date_to}")
+        return
+    
+    # Get unique shipment dates
+    all_ships['Shipped_Date_parsed'] = pd.to_datetime(all_ships['Shipped_Date']).dt.date
+    unique_dates = sorted(all_ships['Shipped_Date_parsed'].unique())
+    
+    print(f"Found shipments on {len(unique_dates)} dates: {', '.join(str(d) for d in unique_dates)}")
+    
+    # Get all orders for the customer (no date filter on orders)
+    # Use master_order_list if available, otherwise fall back to aliases
+    order_customer_names = [cfg.get("master_order_list")] if cfg.get("master_order_list") else cfg["aliases"]
+    orders = extractor.orders(order_customer_names)
+    print(f"   Querying orders for: {order_customer_names}")
+    print(f"   Found {len(orders)} orders")
+    
+    # Shared precompute: normalised order book, fuzzy palettes and the LLM
+    # candidate index and call budget are built once for all dates
+    orders_norm = normalise.order_book(orders, customer)
+    fuzzy_context = match_fuzzy.prepare(orders_norm)
+    llm_context = match_llm.prepare(orders_norm) if use_llm else None
+    
+    slices = [
+        (ship_date, group.drop('Shipped_Date_parsed', axis=1))  # Remove helper column
+        for ship_date, group in all_ships.groupby('Shipped_Date_parsed', sort=True)
+    ]
+    
+    with _results_writer(customer, f"bydate_{start_date:%Y-%m-%d}_{end_date:%Y-%m-%d}", report_format) as writer:
+        if workers > 1:
+            print(f"   Processing {len(slices)} dates with {workers} threads")
+            results_summary = _run_date_slices_parallel(
+                slices, workers, customer, cfg, orders_norm, fuzzy_context, use_llm, writer, llm_context
+            )
+        else:
+            results_summary = [
+                _reconcile_date_slice(customer, cfg, ship_date, ships_for_date, orders_norm, fuzzy_context, use_llm, writer,
+                                      llm_context)
+                for ship_date, ships_for_date in slices
+            ]
+        if writer is not None:
+            _finish_results(writer, customer, f"shipped {date_from} to {date_to} by date")
+    total_processed = len(results_summary)
     
     # Print overall summary
     print(f"\n🎯 {customer} Date Range Summary ({date_from} to {date_to}):")
@@ -181,8 +283,196 @@ def reconcile_by_individual_dates(customer, date_from, date_to, use_llm=False, l
         for result in results_summary:
             print(f"     {result['date']}: {result['total_shipments']} ships, {result['match_rate']:.1f}% matched")
 
-def reconcile_all_customers_by_date(date_from=None, date_to=None, use_llm=False, llm_analysis=False):
-    """Reconcile all customers for a given date range"""
+def _append_csv(df, path, columns):
+    """Append rows to a CSV, writing the header on first use and keeping its column order"""
+    if path.exists():
+        df.reindex(columns=columns).to_csv(path, mode="a", header=False, index=False)
+        return columns
+    df.to_csv(path, index=False)
+    return list(df.columns)
+
+def reconcile_streaming(customer, date_from=None, date_to=None, use_llm=False, chunksize=50_000,
+                        report_format="markdown"):
+    """
+    Reconcile a customer's date range one PO at a time with bounded memory.
+
+    Orders and shipments are streamed with projected columns and partitioned by
+    PO; each PO runs through the match stages on its own and its matches and
+    unmatched shipments are appended to the CSV outputs (or, with a
+    parquet/arrow report format, to the partitioned results writer), so only
+    per-PO counts are kept across the range. Markdown and enhanced CSV reports
+    need the full result set and are only produced by the in-memory mode.
+    """
+    if date_from:
+        date_from = parse_date(date_from)
+    if date_to:
+        date_to = parse_date(date_to)
+
+    cfg = get_cfg(customer)
+    if "PO NUMBER" not in cfg.get("map", {}):
+        raise ValueError(f"Streaming mode partitions by PO; {customer} map has no PO NUMBER column")
+
+    order_customer_names = [cfg.get("master_order_list")] if cfg.get("master_order_list") else cfg["aliases"]
+    identifier = f"shipped {date_from or 'start'} to {date_to or 'end'}"
+    print(f"🌊 Streaming {customer} {identifier} by PO (chunks of {chunksize:,} rows)")
+
+    out_dir = Path(CFG["report_root"]) / customer
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stamp = dt.date.today().strftime("%Y%m%d")
+    report_id = f"daterange_{date_from or 'start'}_{date_to or 'end'}"
+    matches_file = out_dir / f"{report_id}_{stamp}_stream_matches.csv"
+    unmatched_file = out_dir / f"{report_id}_{stamp}_stream_unmatched.csv"
+    for stale in (matches_file, unmatched_file):
+        stale.unlink(missing_ok=True)
+    match_cols = unmatched_cols = None
+
+    po_summary = []
+    # One LLM call budget for the whole range; each PO partition has its own order book
+    llm_budget = CallBudget() if use_llm else None
+    with _results_writer(customer, f"{report_id}_stream", report_format) as writer:
+        for po, orders_po, ships_po in extractor.stream_po_partitions(cfg, order_customer_names, date_from, date_to, chunksize):
+            orders_po, ships_po = normalise.intern_keys(normalise.orders(orders_po, customer),
+                                                        normalise.shipments(ships_po, customer))
+            if ships_po.empty:
+                continue
+            if orders_po.empty:
+                po_summary.append({"po": po, "shipments": len(ships_po), "exact_matches": 0,
+                                   "fuzzy_matches": 0, "unmatched": len(ships_po)})
+                if writer is not None:
+                    writer.write("unmatched", ships_po, customer)
+                else:
+                    unmatched_cols = _append_csv(ships_po, unmatched_file, unmatched_cols)
+                continue
+
+            exact, ships_left = match_exact.match(orders_po, ships_po, cfg)
+            fuzzy, ships_left = match_fuzzy.match(orders_po, ships_left, cfg)
+            llm = pd.DataFrame()
+            if use_llm and not ships_left.empty:
+                llm, ships_left = match_llm.match(orders_po, ships_left, cfg,
+                                                  context=match_llm.prepare(orders_po, llm_budget))
+
+            if writer is not None:
+                _write_results(writer, customer, exact, pd.concat([fuzzy, llm], ignore_index=True), ships_left)
+            else:
+                matched = pd.concat([exact, fuzzy, llm], ignore_index=True)
+                if len(matched) > 0:
+                    match_cols = _append_csv(matched, matches_file, match_cols)
+                if not ships_left.empty:
+                    unmatched_cols = _append_csv(ships_left, unmatched_file, unmatched_cols)
+
+            po_summary.append({
+                "po": po,
+                "shipments": len(ships_po),
+                "exact_matches": len(exact),
+                "fuzzy_matches": len(fuzzy) + len(llm),
+                "unmatched": len(ships_left)
+            })
+        if writer is not None:
+            _finish_results(writer, customer, identifier)
+
+    total_ships = sum(r["shipments"] for r in po_summary)
+    total_matched = sum(r["exact_matches"] + r["fuzzy_matches"] for r in po_summary)
+    print(f"\n🎯 {customer} Streaming Summary ({identifier}):")
+    print(f"   POs processed: {len(po_summary)}")
+    if total_ships > 0:
+        print(f"   Total shipments: {total_ships:,}")
+        print(f"   Total matched: {total_matched:,} ({total_matched/total_ships*100:.1f}%)")
+        print("   Top POs by shipment count:")
+        for r in sorted(po_summary, key=lambda r: r["shipments"], reverse=True)[:5]:
+            print(f"     PO {r['po']}: {r['shipments']} ships, {r['exact_matches'] + r['fuzzy_matches']} matched")
+    if match_cols:
+        print(f"[CSV] CSV matches saved: {matches_file}")
+    if unmatched_cols:
+        print(f"[CSV] CSV unmatched saved: {unmatched_file}")
+    return po_summary
+
+def _available_memory_mb():
+    """Available system memory in MB, or None when it cannot be determined"""
+    try:
+        import psutil
+        return psutil.virtual_memory().available / 2**20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def _reconcile_customer_task(customer_name, date_from, date_to, use_llm, llm_analysis):
+    """
+    Process-pool task: reconcile one customer with its console output captured.
+    Runs in its own process, so it opens its own DB connections.
+    """
+    result = {"customer": customer_name, "shipments": 0, "processed": False, "error": None}
+    buffer = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(buffer):
+            cfg = get_cfg(customer_name)
+            if "map" not in cfg:
+                print(f"⚠️  Skipping {customer_name}: No map configuration")
+            else:
+                ships = extractor.shipments_by_date_range(cfg["aliases"], date_from, date_to)
+                if len(ships) > 0:
+                    print(f"\n📦 Processing {customer_name}: {len(ships)} shipments")
+                    reconcile(customer_name, None, date_from, date_to, use_llm, llm_analysis)
+                    result.update(shipments=len(ships), processed=True)
+    except Exception as e:
+        result["error"] = str(e)
+    result["output"] = buffer.getvalue()
+    return result
+
+def _reconcile_customers_parallel(customer_names, date_from, date_to, use_llm, llm_analysis,
+                                  workers, error_message="❌ Error processing {customer}: {error}",
+                                  min_free_mb=1024):
+    """
+    Fan customers out to a process pool and return one result per customer,
+    in input order. Each customer's console output is replayed as one block,
+    in input order, as soon as every earlier customer has finished (followed
+    by error_message if it failed, as the sequential loop prints). New tasks
+    are only submitted while fewer than `workers` are in flight and at least
+    `min_free_mb` of memory is available (when that can be measured).
+    """
+    results = [None] * len(customer_names)
+    next_to_print = 0
+    pending = {}
+    queue = list(enumerate(customer_names))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+         tqdm(total=len(customer_names), desc="Processing customers") as progress:
+        while queue or pending:
+            while queue and len(pending) < workers:
+                free_mb = _available_memory_mb()
+                if pending and free_mb is not None and free_mb < min_free_mb:
+                    break  # Backpressure: wait for a running customer to finish
+                i, name = queue.pop(0)
+                pending[pool.submit(_reconcile_customer_task, name, date_from, date_to, use_llm, llm_analysis)] = i
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                try:
+                    results[i] = future.result()
+                except Exception as e:  # Worker process died (e.g. out of memory)
+                    results[i] = {"customer": customer_names[i], "shipments": 0, "processed": False,
+                                  "error": f"worker failed: {e}", "output": ""}
+                progress.update(1)
+
+            while next_to_print < len(results) and results[next_to_print] is not None:
+                result = results[next_to_print]
+                if result["output"]:
+                    tqdm.write(result["output"].rstrip("\n"))
+                if result["error"]:
+                    tqdm.write(error_message.format(**result))
+                next_to_print += 1
+
+    return results
+
+def reconcile_all_customers_by_date(date_from=None, date_to=None, use_llm=False, llm_analysis=False, workers=1):
+    """Reconcile all customers for a given date range (in a process pool when workers > 1)"""
     
     # Parse dates
     if date_from:
@@ -203,45 +493,55 @@ def reconcile_all_customers_by_date(date_from=None, date_to=None, use_llm=False,
     total_processed = 0
     results_summary = []
     
-    for customer_cfg in tqdm(valid_customers, desc="Processing customers"):
-        customer_name = customer_cfg["canonical"]
-        
-        try:
-            # Get enriched config with global fallbacks
-            cfg = get_cfg(customer_name)
-            
-            # Check if customer has required mapping
-            if "map" not in cfg:
-                print(f"⚠️  Skipping {customer_name}: No map configuration")
-                continue
-            
-            # Get shipments for this customer in date range
-            ships = extractor.shipments_by_date_range(cfg["aliases"], date_from, date_to)
+    if workers > 1:
+        print(f"Using {workers} worker processes")
+        results = _reconcile_customers_parallel([c["canonical"] for c in valid_customers],
+                                                date_from, date_to, use_llm, llm_analysis, workers)
+        for result in results:
+            if result["processed"]:
+                total_processed += 1
+                results_summary.append({"customer": result["customer"], "shipments": result["shipments"]})
+    else:
+        for customer_cfg in tqdm(valid_customers, desc="Processing customers"):
+            customer_name = customer_cfg["canonical"]
             
-            if len(ships) == 0:
-                continue
+            try:
+                # Get enriched config with global fallbacks
+                cfg = get_cfg(customer_name)
                 
-            print(f"\n📦 Processing {customer_name}: {len(ships)} shipments")
-            
-            # Process this customer
-            reconcile(customer_name, None, date_from, date_to, use_llm, llm_analysis)
-            
-            total_processed += 1
-            results_summary.append({
-                "customer": customer_name,
-                "shipments": len(ships)
-            })
-            
-        except Exception as e:
-            print(f"❌ Error processing {customer_name}: {e}")
-            continue
+                # Check if customer has required mapping
+                if "map" not in cfg:
+                    print(f"⚠️  Skipping {customer_name}: No map configuration")
+                    continue
+                
+                # Get shipments for this customer in date range
+                ships = extractor.shipments_by_date_range(cfg["aliases"], date_from, date_to)
+                
+                if len(ships) == 0:
+                    continue
+                    
+                print(f"\n📦 Processing {customer_name}: {len(ships)} shipments")
+                
+                # Process this customer
+                reconcile(customer_name, None, date_from, date_to, use_llm, llm_analysis)
+                
+                total_processed += 1
+                results_summary.append({
+                    "customer": customer_name,
+                    "shipments": len(ships)
+                })
+                
+            except Exception as e:
+                print(f"❌ Error processing {customer_name}: {e}")
+                continue
     
     print(f"\n✅ Completed processing {total_processed} customers")
     print("\n📊 Summary:")
     for result in sorted(results_summary, key=lambda x: x["shipments"], reverse=True):
         print(f"   {result['customer']}: {result['shipments']} shipments")
 
-def reconcile(customer=None, po=None, date_from=None, date_to=None, use_llm=False, llm_analysis=False):
+def reconcile(customer=None, po=None, date_from=None, date_to=None, use_llm=False, llm_analysis=False, workers=1,
+              report_format="markdown"):
     # Parse and validate dates
     if date_from:
         date_from = parse_date(date_from)
@@ -260,19 +560,24 @@ def reconcile(customer=None, po=None, date_from=None, date_to=None, use_llm=Fals
         
         # Process each customer that has shipments in the date range
         processed_customers = 0
-        for customer_name in all_customers:
-            try:
-                cfg = get_cfg(customer_name)
-                ships_in_range = extractor.shipments_by_date_range(cfg["aliases"], date_from, date_to)
+        if workers > 1:
+            results = _reconcile_customers_parallel(all_customers, date_from, date_to, use_llm, llm_analysis, workers,
+                                                    error_message="⚠️  Error processing {customer}: {error}")
+            processed_customers = sum(result["processed"] for result in results)
+        else:
+            for customer_name in all_customers:
+                try:
+                    cfg = get_cfg(customer_name)
+                    ships_in_range = extractor.shipments_by_date_range(cfg["aliases"], date_from, date_to)
                 
-                if len(ships_in_range) > 0:
-                    print(f"\n📦 Processing {customer_name}: {len(ships_in_range)} shipments")
-                    reconcile(customer_name, None, date_from, date_to, use_llm, llm_analysis)
-                    processed_customers += 1
+                    if len(ships_in_range) > 0:
+                        print(f"\n📦 Processing {customer_name}: {len(ships_in_range)} shipments")
+                        reconcile(customer_name, None, date_from, date_to, use_llm, llm_analysis)
+                        processed_customers += 1
                     
-            except Exception as e:
-                print(f"⚠️  Error processing {customer_name}: {e}")
-                continue
+                except Exception as e:
+                    print(f"⚠️  Error processing {customer_name}: {e}")
+                    continue
         
         print(f"\n✅ Completed reconciliation for {processed_customers} customers with shipments in date range")
         return
@@ -308,8 +613,7 @@ def reconcile(customer=None, po=None, date_from=None, date_to=None, use_llm=Fals
         return
 
     # 2. Normalise
-    orders = normalise.orders(orders, customer)
-    ships = normalise.shipments(ships, customer)
+    orders, ships = normalise.prepare(orders, ships, customer)
 
     # Get join columns for reporting
     ships_for_join_check = ships.rename(columns={v: k for k, v in cfg["map"].items()})
@@ -322,7 +626,7 @@ def reconcile(customer=None, po=None, date_from=None, date_to=None, use_llm=Fals
 
     llm = pd.DataFrame()
     if use_llm and not ships_left.empty:
-        llm, ships_left = match_llm.match(orders, ships_left)
+        llm, ships_left = match_llm.match(orders, ships_left, cfg)
 
     # 4. Prepare results for comprehensive reporting
     results_data = {
@@ -344,26 +648,33 @@ def reconcile(customer=None, po=None, date_from=None, date_to=None, use_llm=Fals
     else:
         report_id = f"daterange_{date_from or 'start'}_{date_to or 'end'}"
     
-    report_file = reporter.generate_markdown_report(customer, report_id, results_data)
+    if report_format != "markdown":
+        # Columnar results with a summary from aggregated counts replace the
+        # markdown, enhanced CSV and CSV outputs
+        with _results_writer(customer, report_id, report_format) as writer:
+            _write_results(writer, customer, exact, results_data["fuzzy_matches"], ships_left)
+            _finish_results(writer, customer, identifier)
+    else:
+        report_file = reporter.generate_markdown_report(customer, report_id, results_data)
 
-    # Generate enhanced CSV report
-    enhanced_csv_file = reporter.generate_enhanced_csv_report(customer, report_id, results_data)
+        # Generate enhanced CSV report
+        enhanced_csv_file = reporter.generate_enhanced_csv_report(customer, report_id, results_data)
 
-    # 6. Also save traditional CSV outputs
-    matched = pd.concat([exact, fuzzy, llm], ignore_index=True)
-    out_dir = Path(CFG["report_root"]) / customer
-    out_dir.mkdir(parents=True, exist_ok=True)
-    stamp = dt.date.today().strftime("%Y%m%d")
-    
-    if len(matched) > 0:
-        csv_file = out_dir / f"{report_id}_{stamp}_matches.csv"
-        matched.to_csv(csv_file, index=False)
-        print(f"[CSV] CSV matches saved: {csv_file}")
+        # 6. Also save traditional CSV outputs
+        matched = pd.concat([exact, fuzzy, llm], ignore_index=True)
+        out_dir = Path(CFG["report_root"]) / customer
+        out_dir.mkdir(parents=True, exist_ok=True)
+        stamp = dt.date.today().strftime("%Y%m%d")
         
-    if not ships_left.empty:
-        csv_file = out_dir / f"{report_id}_{stamp}_unmatched.csv"
-        ships_left.to_csv(csv_file, index=False)
-        print(f"[CSV] CSV unmatched saved: {csv_file}")
+        if len(matched) > 0:
+            csv_file = out_dir / f"{report_id}_{stamp}_matches.csv"
+            matched.to_csv(csv_file, index=False)
+            print(f"[CSV] CSV matches saved: {csv_file}")
+            
+        if not ships_left.empty:
+            csv_file = out_dir / f"{report_id}_{stamp}_unmatched.csv"
+            ships_left.to_csv(csv_file, index=False)
+            print(f"[CSV] CSV unmatched saved: {csv_file}")
 
     # Show some useful statistics for date-based reconciliation
     if not po and len(ships) > 0:
@@ -397,23 +708,37 @@ if __name__ == "__main__":
     p.add_argument("--by-date", action="store_true", help="Generate one report per shipment date (requires --customer and date range)")
     p.add_argument("--use-llm", action="store_true", help="Use LLM for additional matching")
     p.add_argument("--llm-analysis", action="store_true", help="Use LLM for pattern analysis and customer insights")
+    p.add_argument("--stream", action="store_true", help="Stream a customer's date range PO by PO with bounded memory (CSV, or --report-format parquet/arrow; no markdown report)")
+    p.add_argument("--chunksize", type=int, default=50_000, help="Rows per database fetch in --stream mode")
+    p.add_argument("--workers", type=int, default=1, help="Reconcile customers in N worker processes (all-customers mode), or dates in N threads (--by-date)")
+    p.add_argument("--report-format", choices=["markdown", "parquet", "arrow"], default="markdown",
+                   help="markdown/CSV reports, or results partitioned by customer/PO/date as Parquet or Arrow IPC (single customer only)")
     
     args = p.parse_args()
     
+    # Handle streaming processing
+    if args.stream:
+        if not args.customer or args.po:
+            p.error("--stream requires --customer and a date range (not --po)")
+        if not (args.date_from or args.date_to):
+            p.error("--stream requires date range (--date-from and/or --date-to)")
+        reconcile_streaming(args.customer, args.date_from, args.date_to, args.use_llm, args.chunksize, args.report_format)
     # Handle by-date processing
-    if args.by_date:
+    elif args.by_date:
         if not args.customer:
             p.error("--by-date requires --customer to be specified")
         if not (args.date_from or args.date_to):
             p.error("--by-date requires date range (--date-from and/or --date-to)")
-        reconcile_by_individual_dates(args.customer, args.date_from, args.date_to, args.use_llm, args.llm_analysis)
+        reconcile_by_individual_dates(args.customer, args.date_from, args.date_to, args.use_llm, args.llm_analysis, args.workers,
+                                      args.report_format)
     elif not args.customer:
         # Process all customers by date range
         if not (args.date_from or args.date_to):
             p.error("When no customer specified, must provide date range (--date-from/--date-to)")
-        reconcile_all_customers_by_date(args.date_from, args.date_to, args.use_llm, args.llm_analysis)
+        reconcile_all_customers_by_date(args.date_from, args.date_to, args.use_llm, args.llm_analysis, args.workers)
     else:
         # Single customer processing
         if not args.po and not (args.date_from or args.date_to):
             p.error("When specifying --customer, must also specify either --po or date range (--date-from/--date-to)")
-        reconcile(args.customer, args.po, args.date_from, args.date_to, args.use_llm, args.llm_analysis)
+        reconcile(args.customer, args.po, args.date_from, args.date_to, args.use_llm, args.llm_analysis,
+                  report_format=args.report_format)
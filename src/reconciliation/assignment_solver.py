@@ -0,0 +1,170 @@
+"""
+Capacity-Aware Assignment Solver
+Globally optimal shipment-to-order assignment within style/color blocks
+"""
+
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+
+logger = logging.getLogger(__name__)
+
+# Cost for pairs that are not allowed (no candidate, no capacity, below threshold)
+INFEASIBLE_COST = 1e9
+
+# Tie-break nudge so equal scores prefer the earliest order, as the greedy scan does
+TIE_BREAK_EPSILON = 1e-9
+
+
+class CapacityAssignmentSolver:
+    """
+    Assigns shipments to orders block by block, treating order quantities as capacities.
+
+    Candidate pairs come from the key join of each layer and are grouped into
+    blocks (one per style/color key). Within a block, successive rounds of
+    scipy.optimize.linear_sum_assignment pick the assignment with the highest
+    total score; after every round the assigned shipment quantities are drawn
+    down from the orders' remaining capacity, so a later round (or a later layer
+    sharing this solver) only sees orders that still have open quantity.
+    """
+
+    def __init__(self, order_quantities, max_rounds: int = 50, max_block_cells: int = 25_000_000):
+        self.remaining = np.asarray(order_quantities, dtype=np.float64).copy()
+        self.max_rounds = max_rounds
+        self.max_block_cells = max_block_cells
+        self.block_stats: List[Dict] = []
+
+    def assign(self, pairs: pd.DataFrame, shipment_quantities,
+               score_fn: Callable[[pd.DataFrame, np.ndarray], np.ndarray],
+               min_score: float = -np.inf, block_col: str = 'code',
+               block_names: Optional[Sequence] = None, layer: str = '') -> pd.DataFrame:
+        """
+        Solve the assignment for every block of candidate pairs.
+
+        Args:
+            pairs: Candidate pairs with ship_pos, order_pos and block_col columns
+                (plus any columns score_fn needs)
+            shipment_quantities: Quantities indexed by ship_pos
+            score_fn: Callable (pairs subset, remaining capacity per row) -> scores,
+                higher is better
+            min_score: Pairs scoring below this are never assigned
+            block_names: Optional labels indexed by block code, used in block_stats
+            layer: Layer label recorded in block_stats
+
+        Returns:
+            The chosen pairs (one row per assigned shipment) with a 'score' column
+        """
+        if pairs.empty:
+            return pairs.assign(score=pd.Series(dtype=np.float64))
+
+        shipment_quantities = np.asarray(shipment_quantities, dtype=np.float64)
+        chosen = []
+
+        for block, block_pairs in pairs.groupby(block_col, sort=False):
+            start = time.perf_counter()
+            n_ships = block_pairs['ship_pos'].nunique()
+            n_orders = block_pairs['order_pos'].nunique()
+
+            if n_ships * n_orders > self.max_block_cells:
+                logger.warning(f"Block {block} too large for assignment ({n_ships}x{n_orders}), using greedy selection")
+                picked, rounds = self._greedy_block(block_pairs, shipment_quantities, score_fn, min_score), 0
+            else:
+                picked, rounds = self._solve_block(block_pairs, shipment_quantities, score_fn, min_score)
+            chosen.append(picked)
+
+            self.block_stats.append({
+                'layer': layer,
+                'block': block_names[block] if block_names is not None else block,
+                'shipments': n_ships,
+                'orders': n_orders,
+                'assigned': len(picked),
+                'rounds': rounds,
+                'solve_seconds': time.perf_counter() - start
+            })
+
+        result = pd.concat(chosen, ignore_index=True)
+        return result.sort_values('ship_pos', kind='stable').reset_index(drop=True)
+
+    def _solve_block(self, block_pairs: pd.DataFrame, shipment_quantities: np.ndarray,
+                     score_fn: Callable, min_score: float):
+        """Run capacity-constrained assignment rounds for one block"""
+        assigned = np.zeros(0, dtype=np.int64)
+        picked = []
+        rounds = 0
+
+        for _ in range(self.max_rounds):
+            active = block_pairs[
+                ~block_pairs['ship_pos'].isin(assigned) &
+                (self.remaining[block_pairs['order_pos'].to_numpy()] > 0)
+            ]
+            if active.empty:
+                break
+
+            scores = np.asarray(score_fn(active, self.remaining[active['order_pos'].to_numpy()]), dtype=np.float64)
+            feasible = scores >= min_score
+            if not feasible.any():
+                break
+            active = active[feasible].assign(score=scores[feasible])
+
+            # Dense cost matrix over the block's open shipments x open orders
+            ship_ids, ship_local = np.unique(active['ship_pos'].to_numpy(), return_inverse=True)
+            order_ids, order_local = np.unique(active['order_pos'].to_numpy(), return_inverse=True)
+            cost = np.full((len(ship_ids), len(order_ids)), INFEASIBLE_COST)
+            cost[ship_local, order_local] = -active['score'].to_numpy() + order_local * TIE_BREAK_EPSILON
+            pair_row = np.full(cost.shape, -1, dtype=np.int64)
+            pair_row[ship_local, order_local] = np.arange(len(active))
+
+            rows, cols = linear_sum_assignment(cost)
+            valid = cost[rows, cols] < INFEASIBLE_COST
+            if not valid.any():
+                break
+            rounds += 1
+
+            round_picks = active.iloc[pair_row[rows[valid], cols[valid]]]
+            picked.append(round_picks)
+            assigned = np.concatenate([assigned, round_picks['ship_pos'].to_numpy()])
+
+            # Draw down capacity; each order appears at most once per round
+            order_pos = round_picks['order_pos'].to_numpy()
+            drawn = self.remaining[order_pos] - shipment_quantities[round_picks['ship_pos'].to_numpy()]
+            self.remaining[order_pos] = np.maximum(0.0, drawn)
+
+        if not picked:
+            return block_pairs.iloc[0:0].assign(score=pd.Series(dtype=np.float64)), rounds
+        return pd.concat(picked), rounds
+
+    def _greedy_block(self, block_pairs: pd.DataFrame, shipment_quantities: np.ndarray,
+                      score_fn: Callable, min_score: float) -> pd.DataFrame:
+        """Shipment-order greedy fallback for blocks too large to solve densely"""
+        picked = []
+        for ship_pos, candidates in block_pairs.groupby('ship_pos', sort=True):
+            candidates = candidates[self.remaining[candidates['order_pos'].to_numpy()] > 0]
+            if candidates.empty:
+                continue
+            scores = np.asarray(score_fn(candidates, self.remaining[candidates['order_pos'].to_numpy()]), dtype=np.float64)
+            best = int(np.argmax(scores))
+            if scores[best] < min_score:
+                continue
+            picked.append(candidates.iloc[[best]].assign(score=scores[best]))
+            order_pos = candidates['order_pos'].iloc[best]
+            self.remaining[order_pos] = max(0.0, self.remaining[order_pos] - shipment_quantities[ship_pos])
+
+        if not picked:
+            return block_pairs.iloc[0:0].assign(score=pd.Series(dtype=np.float64))
+        return pd.concat(picked)
+
+    def summary(self) -> Dict:
+        """Aggregate block statistics for session results"""
+        if not self.block_stats:
+            return {'blocks': 0, 'total_solve_seconds': 0.0, 'slowest_blocks': []}
+        stats = sorted(self.block_stats, key=lambda s: s['solve_seconds'], reverse=True)
+        return {
+            'blocks': len(stats),
+            'total_solve_seconds': sum(s['solve_seconds'] for s in stats),
+            'slowest_blocks': stats[:5],
+            'block_stats': self.block_stats
+        }
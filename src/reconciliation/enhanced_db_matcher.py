@@ -4,7 +4,6 @@ Uses the new configuration database to perform order-shipment matching
 Implements proper exclusion rules and canonical customer configurations
 """
 
-import pyodbc
 import pandas as pd
 import json
 import logging
@@ -17,18 +16,33 @@ project_root = Path(__file__).parent.parent.parent
 sys.path.append(str(project_root))
 
 from auth_helper import get_connection_string
+from utils import db_pool
+from src.reconciliation.fuzzy_scoring import quantity_scores
+from src.reconciliation.key_index import CompositeKeyIndex, normalized_key
+from src.reconciliation.similarity_cache import get_similarity_cache
+from src.reconciliation.summary_cache_refresh import get_summary_cache_refresher
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class DatabaseDrivenMatcher:
-    def __init__(self):
+    def __init__(self, assignment_mode='greedy'):
         self.connection_string = get_connection_string()
+        
+        # 'greedy' takes the first order per key; 'optimal' solves a
+        # capacity-aware assignment per key block
+        if assignment_mode not in ('greedy', 'optimal'):
+            raise ValueError(f"Unknown assignment mode: {assignment_mode}")
+        self.assignment_mode = assignment_mode
+        self.assignment_solver = None
+        
+        # Fuzzy scores are cached in-process and on disk across runs
+        self.similarity_cache = get_similarity_cache()
     
     def get_connection(self):
-        """Get database connection"""
-        return pyodbc.connect(self.connection_string)
+        """Get a pooled database connection"""
+        return db_pool.connect(self.connection_string)
     
     def get_customer_config(self, customer_name):
         """Get customer configuration from database"""
@@ -145,6 +159,11 @@ class DatabaseDrivenMatcher:
         
         logger.info(f"Using primary fields for matching: {primary_fields} (mapped from {primary_fields_config})")
         
+        # Optimal mode shares one capacity ledger across the exact layers
+        if self.assignment_mode == 'optimal':
+            from src.reconciliation.assignment_solver import CapacityAssignmentSolver
+            self.assignment_solver = CapacityAssignmentSolver(orders_df['quantity'])
+        
         # Layer 0: Exact Matching
         exact_matches, unmatched_after_layer0 = self._layer0_exact_matching(
             orders_df, shipments_df, primary_fields, quantity_tolerance
@@ -176,82 +195,59 @@ class DatabaseDrivenMatcher:
         matches = []
         unmatched_shipments = []
         
-        # Create lookup dictionaries for fast matching
-        order_lookup = {}
-        for _, order in orders_df.iterrows():
-            # Create composite key from primary fields
-            key_parts = []
-            for field in primary_fields:
-                if field in order and pd.notna(order[field]):
-                    # Normalize for exact matching (trim, uppercase, normalize spaces)
-                    value = str(order[field]).strip().upper()
-                    value = ' '.join(value.split())  # Normalize spaces
-                    key_parts.append(value)
-            
-            if key_parts:
-                composite_key = '|'.join(key_parts)
-                if composite_key not in order_lookup:
-                    order_lookup[composite_key] = []
-                order_lookup[composite_key].append(order)
-        
-        logger.info(f"Created order lookup with {len(order_lookup)} unique keys")
-        
-        # Match shipments to orders
-        matched_shipment_ids = set()
-        for _, shipment in shipments_df.iterrows():
-            # Create composite key from shipment (with same normalization)
-            key_parts = []
-            for field in primary_fields:
-                if field in shipment and pd.notna(shipment[field]):
-                    # Apply same normalization as orders
-                    value = str(shipment[field]).strip().upper()
-                    value = ' '.join(value.split())  # Normalize spaces
-                    key_parts.append(value)
-            
-            if not key_parts:
-                unmatched_shipments.append(shipment)
+        # Index orders on the normalized composite key (trim, uppercase, normalize spaces)
+        order_keys = normalized_key(orders_df, primary_fields)
+        order_index = CompositeKeyIndex(order_keys)
+        
+        logger.info(f"Created order lookup with {len(order_index)} unique keys")
+        
+        # Join shipments to orders with the same normalization; first order per key wins
+        shipment_keys = normalized_key(shipments_df, primary_fields)
+        pairs = self._select_pairs(order_index, order_index.join(shipment_keys), shipments_df, 'LAYER_0')
+        best = dict(zip(pairs['ship_pos'], pairs['order_pos']))
+        
+        order_records = orders_df.to_dict('records')
+        shipment_key_values = shipment_keys.tolist()
+        
+        for pos, shipment in enumerate(shipments_df.to_dict('records')):
+            if pos not in best:
+                unmatched_shipments.append(shipments_df.iloc[pos])
                 continue
             
-            composite_key = '|'.join(key_parts)
+            order = order_records[best[pos]]
+            composite_key = shipment_key_values[pos]
             
-            # Look for exact match
-            if composite_key in order_lookup:
-                for order in order_lookup[composite_key]:
-                    # Check quantity tolerance with better logic
-                    order_qty = order['quantity']
-                    shipment_qty = shipment['quantity']
-                    
-                    # Calculate percentage difference (more robust)
-                    if order_qty > 0:
-                        qty_diff_percent = abs(order_qty - shipment_qty) / order_qty * 100
-                    else:
-                        qty_diff_percent = 100.0 if shipment_qty > 0 else 0.0
-                    
-                    # Apply stricter tolerance - 5% default, but never allow >50% difference
-                    tolerance_percent = min(quantity_tolerance * 100, 50.0)
-                    qty_within_tolerance = qty_diff_percent <= tolerance_percent
-                    
-                    match = {
-                        'shipment_id': shipment['shipment_id'],
-                        'order_id': order['order_id'],
-                        'match_type': 'LAYER0_EXACT',
-                        'confidence': 1.0,
-                        'match_reason': f'Exact match on {", ".join(primary_fields)}',
-                        'quantity_check': qty_within_tolerance,
-                        'quantity_diff_percent': qty_diff_percent,
-                        'order_qty': order_qty,
-                        'shipment_qty': shipment_qty,
-                        'style_code': shipment['style_code'],
-                        'color_description': shipment['color_description'],
-                        'order_delivery_method': order.get('delivery_method', 'N/A'),
-                        'shipment_delivery_method': shipment.get('delivery_method', 'N/A'),
-                        'match_key': composite_key
-                    }
-                    matches.append(match)
-                    matched_shipment_ids.add(shipment['shipment_id'])
-                    break
+            # Check quantity tolerance with better logic
+            order_qty = order['quantity']
+            shipment_qty = shipment['quantity']
+            
+            # Calculate percentage difference (more robust)
+            if order_qty > 0:
+                qty_diff_percent = abs(order_qty - shipment_qty) / order_qty * 100
             else:
-                unmatched_shipments.append(shipment)
+                qty_diff_percent = 100.0 if shipment_qty > 0 else 0.0
+            
+            # Apply stricter tolerance - 5% default, but never allow >50% difference
+            tolerance_percent = min(quantity_tolerance * 100, 50.0)
+            qty_within_tolerance = qty_diff_percent <= tolerance_percent
+            
+            match = {
+                'shipment_id': shipment['shipment_id'],
+                'order_id': order['order_id'],
+                'match_type': 'LAYER0_EXACT',
+                'confidence': 1.0,
+                'match_reason': f'Exact match on {", ".join(primary_fields)}',
+                'quantity_check': qty_within_tolerance,
+                'quantity_diff_percent': qty_diff_percent,
+                'order_qty': order_qty,
+                'shipment_qty': shipment_qty,
+                'style_code': shipment['style_code'],
+                'color_description': shipment['color_description'],
+                'order_delivery_method': order.get('delivery_method', 'N/A'),
+                'shipment_delivery_method': shipment.get('delivery_method', 'N/A'),
+                'match_key': composite_key
+            }
+            matches.append(match)
         
         return matches, unmatched_shipments
     
@@ -269,8 +265,14 @@ class DatabaseDrivenMatcher:
             logger.info(f"Starting Layer 1 matching for {len(unmatched_shipments)} unmatched shipments")
             logger.info("Layer 1 Rules: Exact style + color, flexible delivery, quantity classification")
             
-            # For each unmatched shipment, find exact style+color matches
-            for shipment in unmatched_shipments:
+            # Index orders on exact style + color and join the unmatched shipments
+            unmatched_df = pd.DataFrame(unmatched_shipments).reset_index(drop=True)
+            order_index = CompositeKeyIndex(self._style_color_key(orders_df))
+            pairs = self._select_pairs(order_index, order_index.join(self._style_color_key(unmatched_df)), unmatched_df, 'LAYER_1')
+            first_order = dict(zip(pairs['ship_pos'], pairs['order_pos']))  # Take first exact style+color match
+            order_records = orders_df.to_dict('records')
+            
+            for pos, shipment in enumerate(unmatched_shipments):
                 best_match = None
                 best_reasons = []
                 
@@ -279,37 +281,24 @@ class DatabaseDrivenMatcher:
                 ship_color = str(shipment.get('color_description', '')).strip().upper()
                 ship_delivery = str(shipment.get('delivery_method', '')).strip().upper()
                 
-                # Find orders with exact style and color match
-                for _, order in orders_df.iterrows():
-                    ord_style = str(order.get('style_code', '')).strip().upper()
-                    ord_color = str(order.get('color_description', '')).strip().upper()
+                if pos in first_order:
+                    order = order_records[first_order[pos]]
                     ord_delivery = str(order.get('delivery_method', '')).strip().upper()
                     
-                    # Layer 1 Requirement: EXACT style and color match
-                    style_match = (ship_style == ord_style) if ship_style and ord_style else False
-                    color_match = (ship_color == ord_color) if ship_color and ord_color else False
+                    # Core match achieved - now evaluate delivery and quantity
+                    delivery_match = (ship_delivery == ord_delivery) if ship_delivery and ord_delivery else False
                     
-                    if style_match and color_match:
-                        # Core match achieved - now evaluate delivery and quantity
-                        delivery_match = (ship_delivery == ord_delivery) if ship_delivery and ord_delivery else False
-                        
-                        # Quantity classification
-                        order_qty = order['quantity']
-                        shipment_qty = shipment['quantity']
-                        qty_result = self._classify_quantity_difference(order_qty, shipment_qty)
-                        
-                        # Determine overall approval status
-                        approval_status = self._determine_layer1_approval(delivery_match, qty_result)
-                        
-                        # This is a valid Layer 1 match
-                        best_match = order
-                        best_reasons = [
-                            f"Style: EXACT ({ship_style})",
-                            f"Color: EXACT ({ship_color})",
-                            f"Delivery: {'MATCH' if delivery_match else 'MISMATCH'} ({ship_delivery} vs {ord_delivery})",
-                            f"Quantity: {qty_result['status']} ({qty_result['diff_percent']:.1f}%)"
-                        ]
-                        break  # Take first exact style+color match
+                    # Quantity classification
+                    qty_result = self._classify_quantity_difference(order['quantity'], shipment['quantity'])
+                    
+                    # This is a valid Layer 1 match
+                    best_match = order
+                    best_reasons = [
+                        f"Style: EXACT ({ship_style})",
+                        f"Color: EXACT ({ship_color})",
+                        f"Delivery: {'MATCH' if delivery_match else 'MISMATCH'} ({ship_delivery} vs {ord_delivery})",
+                        f"Quantity: {qty_result['status']} ({qty_result['diff_percent']:.1f}%)"
+                    ]
                 
                 if best_match is not None:
                     # Calculate overall confidence for Layer 1
@@ -350,14 +339,36 @@ class DatabaseDrivenMatcher:
             logger.warning("rapidfuzz not available, skipping Layer 1 matching")
             return [], unmatched_shipments
     
+    def _select_pairs(self, order_index, pairs, shipments_df, layer):
+        """Pick one order per shipment: first per key, or the block assignment in optimal mode"""
+        if self.assignment_solver is None:
+            return CompositeKeyIndex.first_per_shipment(pairs)
+        
+        ship_qty = shipments_df['quantity'].to_numpy(dtype=float)
+        return self.assignment_solver.assign(
+            pairs, ship_qty,
+            lambda p, remaining: quantity_scores(remaining, ship_qty[p['ship_pos'].to_numpy()]),
+            block_names=order_index.vocabulary, layer=layer
+        )
+    
+    def _style_color_key(self, df):
+        """Exact (trimmed, uppercased) style|color key; NaN unless both parts are present"""
+        def _part(column):
+            if column not in df.columns:
+                return pd.Series('', index=df.index)
+            return df[column].astype(str).str.strip().str.upper()
+        
+        style = _part('style_code')
+        color = _part('color_description')
+        # Layer 1 Requirement: EXACT style and color match, both non-empty
+        return (style + '|' + color).where((style != '') & (color != ''))
+    
     def _layer2_fuzzy_matching(self, orders_df, unmatched_shipments, primary_fields, fuzzy_threshold, quantity_tolerance):
         """Layer 2: Fuzzy style + color matching for data entry variations"""
         if not unmatched_shipments:
             return [], []
         
         try:
-            from rapidfuzz import fuzz
-            
             matches = []
             still_unmatched = []
             
@@ -385,11 +396,11 @@ class DatabaseDrivenMatcher:
                     
                     if ship_style and ord_style:
                         # Use token_set_ratio for better handling of variations like "ARCTIC / BLUE" vs "ARCTIC/BLUE"
-                        style_similarity = fuzz.token_set_ratio(ship_style, ord_style) / 100.0
+                        style_similarity = self.similarity_cache.score(ship_style, ord_style) / 100.0
                     
                     if ship_color and ord_color:
                         # Handle color variations like "WOLF BLUE" vs "BLUE WOLF"
-                        color_similarity = fuzz.token_set_ratio(ship_color, ord_color) / 100.0
+                        color_similarity = self.similarity_cache.score(ship_color, ord_color) / 100.0
                     
                     # Layer 2 Requirements: Both style and color must meet fuzzy threshold
                     if style_similarity >= fuzzy_threshold and color_similarity >= fuzzy_threshold:
@@ -421,8 +432,8 @@ class DatabaseDrivenMatcher:
                     quantity_check = qty_result['status'] in ['PASS', 'CONDITIONAL']
                     
                     # Determine match types for storage
-                    style_sim = fuzz.token_set_ratio(ship_style, str(best_match.get('style_code', '')).strip().upper()) / 100.0
-                    color_sim = fuzz.token_set_ratio(ship_color, str(best_match.get('color_description', '')).strip().upper()) / 100.0
+                    style_sim = self.similarity_cache.score(ship_style, str(best_match.get('style_code', '')).strip().upper()) / 100.0
+                    color_sim = self.similarity_cache.score(ship_color, str(best_match.get('color_description', '')).strip().upper()) / 100.0
                     
                     match = {
                         'shipment_id': shipment['shipment_id'],
@@ -533,27 +544,40 @@ class DatabaseDrivenMatcher:
             'config_used': config
         }
         
+        if self.assignment_solver is not None:
+            results['assignment_stats'] = self.assignment_solver.summary()
+            logger.info(f"Assignment solver: {results['assignment_stats']['blocks']} blocks in "
+                        f"{results['assignment_stats']['total_solve_seconds']:.2f}s")
+        
+        self.similarity_cache.flush()
+        results['similarity_cache'] = self.similarity_cache.summary()
+        logger.info(f"Similarity cache: {results['similarity_cache']['hit_rate']:.1%} hit rate over "
+                    f"{results['similarity_cache']['lookups']} lookups")
+        
         logger.info(f"✅ Matching completed: {matched_count}/{total_shipments} ({match_rate:.1f}%)")
         
         # Store results for HITL interface
-        self._store_matching_results(customer_name, po_number, matches)
+        self._store_matching_results(customer_name, po_number, matches, shipments_df['shipment_id'].tolist())
         
         return results
     
-    def _store_matching_results(self, customer_name, po_number, matches):
+    def _store_matching_results(self, customer_name, po_number, matches, shipment_ids=()):
         """Store matching results in database for HITL interface consumption"""
         try:
-            conn = pyodbc.connect(self.connection_string)
+            conn = self.get_connection()
             cursor = conn.cursor()
             
             # Generate session ID for this matching run
             session_id = f"{customer_name}_{po_number}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
             
-            # Clear previous results for this customer/PO combination
+            # Clear previous results for this customer/PO combination, keeping
+            # the shipments they covered so their summary rows are refreshed too
             cursor.execute("""
                 DELETE FROM enhanced_matching_results 
+                OUTPUT deleted.shipment_id
                 WHERE customer_name = ? AND po_number = ?
             """, customer_name, po_number)
+            retired_ids = [row[0] for row in cursor.fetchall()]
             
             # Insert new results
             for match in matches:
@@ -601,6 +625,9 @@ class DatabaseDrivenMatcher:
             conn.commit()
             logger.info(f"📊 Stored {len(matches)} matching results for HITL review")
             
+            touched_ids = list(shipment_ids) + retired_ids + [match['shipment_id'] for match in matches]
+            get_summary_cache_refresher().request(touched_ids, session_id=session_id)
+            
         except Exception as e:
             logger.error(f"Failed to store matching results: {str(e)}")
         finally:
@@ -708,12 +735,15 @@ def main():
     parser.add_argument("--customer", required=True, help="Customer name")
     parser.add_argument("--po", required=True, help="PO number")
     parser.add_argument("--output-dir", default="reports/enhanced_matching", help="Output directory for reports")
+    parser.add_argument("--assignment-mode", choices=['greedy', 'optimal'], default='greedy',
+                        help="First order per key or capacity-aware optimal assignment per key block")
     
     args = parser.parse_args()
     
     try:
-        matcher = DatabaseDrivenMatcher()
+        matcher = DatabaseDrivenMatcher(assignment_mode=args.assignment_mode)
         results = matcher.run_enhanced_matching(args.customer, args.po)
+        get_summary_cache_refresher().flush()
         
         if results:
             report_file = matcher.generate_report(results, args.output_dir)
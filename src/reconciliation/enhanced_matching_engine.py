@@ -4,25 +4,55 @@ Implements improved 4-layer matching with movement table integration
 """
 
 import pandas as pd
+import numpy as np
 import pyodbc
 import json
+import time
 import logging
 from datetime import datetime
 from pathlib import Path
 import sys
 import uuid
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Callable, Dict, List, Tuple, Optional, Any
 
 # Add project root to path
 project_root = Path(__file__).parent.parent.parent
 sys.path.append(str(project_root))
 
 from auth_helper import get_connection_string
+from utils import db_pool
+from src.reconciliation.fuzzy_scoring import quantity_scores
+from src.reconciliation.key_index import CompositeKeyIndex, factorize_values, format_key, pairwise_apply
+from src.reconciliation.similarity_cache import get_similarity_cache
+from src.reconciliation.split_solver import DEFAULT_MAX_ORDERS, RemainingQuantityIndex
+from src.reconciliation.summary_cache_refresh import get_summary_cache_refresher
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# SQL Server caps a statement at 2100 parameters
+SQL_PARAM_CHUNK = 1000
+
+def prior_allocations(prior_matches: pd.DataFrame, order_ids: pd.Series) -> np.ndarray:
+    """
+    Quantity already drawn from each order by stored matches, aligned to order_ids.
+    A shipment stored against several orders (a Layer 3 split) is apportioned
+    across them in proportion to their order quantities.
+    """
+    if prior_matches.empty:
+        return np.zeros(len(order_ids))
+    
+    shipment_qty = prior_matches['shipment_quantity'].astype(float).fillna(0)
+    order_qty = prior_matches['order_quantity'].astype(float).fillna(0)
+    by_shipment = prior_matches.groupby('shipment_id')
+    total_order_qty = order_qty.groupby(prior_matches['shipment_id']).transform('sum')
+    links = by_shipment['order_id'].transform('size')
+    share = np.where(total_order_qty > 0, order_qty / total_order_qty.where(total_order_qty > 0, 1), 1 / links)
+    
+    consumed = (shipment_qty * share).groupby(prior_matches['order_id'].astype(str)).sum()
+    return order_ids.astype(str).map(consumed).fillna(0).to_numpy(dtype='float64')
+
 class EnhancedMatchingEngine:
     """
     Enhanced matching engine with 4-layer approach and movement table integration
@@ -34,14 +64,52 @@ class EnhancedMatchingEngine:
     - Layer 3: Quantity resolution and split shipment detection
     """
     
-    def __init__(self):
+    def __init__(self, assignment_mode: str = 'greedy', max_split_orders: int = DEFAULT_MAX_ORDERS,
+                 progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None):
         self.connection_string = get_connection_string()
         self.session_id = f"ENHANCED_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:8]}"
         self.batch_id = None
         
+        # 'greedy' picks the best order per shipment in shipment order;
+        # 'optimal' solves a capacity-aware assignment per style/color block
+        if assignment_mode not in ('greedy', 'optimal'):
+            raise ValueError(f"Unknown assignment mode: {assignment_mode}")
+        self.assignment_mode = assignment_mode
+        self.assignment_solver = None
+        
+        # Layer 3 may split one shipment across up to this many orders
+        self.max_split_orders = max_split_orders
+        
+        # Fuzzy scores are cached in-process and on disk across runs
+        self.similarity_cache = get_similarity_cache()
+        
+        # Row count, round trips and elapsed time of the last store_matches call
+        self.persistence_stats = None
+        
+        # Incremental runs: quantity per order (aligned to orders_df) already
+        # allocated by matches stored in earlier batches
+        self.prior_allocated = None
+        
+        # Called as progress_callback(stage, details) when each stage of a run
+        # finishes (LOADED, LAYER_0..LAYER_3, STORED), e.g. by the API job queue
+        self.progress_callback = progress_callback
+        
+        # Debounced incremental refresh of shipment_summary_cache for the
+        # shipments each session re-matched; shared by every engine in the process
+        self.summary_refresher = get_summary_cache_refresher()
+        
+    def report_progress(self, stage: str, **details):
+        """Pass a finished stage to the progress callback; callback errors never stop a run"""
+        if self.progress_callback is None:
+            return
+        try:
+            self.progress_callback(stage, details)
+        except Exception as e:
+            logger.warning(f"Progress callback failed at {stage}: {str(e)}")
+        
     def get_connection(self):
-        """Get database connection"""
-        return pyodbc.connect(self.connection_string)
+        """Get a pooled database connection"""
+        return db_pool.connect(self.connection_string)
     
     def start_matching_session(self, customer_name: str, po_number: str = None, description: str = None):
         """Start a new matching session and create batch record"""
@@ -80,6 +148,101 @@ class EnhancedMatchingEngine:
             
             logger.info(f"Ended matching session {self.session_id}: {status} - {matched_count} matched, {unmatched_count} unmatched")
     
+    def get_current_watermark(self, customer_name: str) -> Optional[bytes]:
+        """
+        Highest shipment row_version for the customer right now. Read before
+        extraction so shipments arriving during the run are picked up next time.
+        Returns None when the watermark migration has not been applied.
+        """
+        try:
+            with self.get_connection() as conn:
+                row = conn.cursor().execute(
+                    "SELECT MAX(row_version) FROM FM_orders_shipped WHERE Customer LIKE ?", f"{customer_name}%"
+                ).fetchone()
+        except pyodbc.Error as e:
+            logger.warning(f"Shipment row_version unavailable, watermarks disabled: {e}")
+            return None
+        return bytes(row[0]) if row and row[0] is not None else None
+    
+    def get_last_watermark(self, customer_name: str, po_number: str = None) -> Optional[bytes]:
+        """Watermark of the latest completed batch for this customer/PO, if any"""
+        with self.get_connection() as conn:
+            row = conn.cursor().execute("""
+                SELECT TOP 1 watermark_row_version
+                FROM reconciliation_batch
+                WHERE customer_name = ? AND ISNULL(po_number, '') = ?
+                  AND status = 'COMPLETED' AND watermark_row_version IS NOT NULL
+                ORDER BY id DESC
+            """, customer_name, po_number or '').fetchone()
+        return bytes(row[0]) if row else None
+    
+    def record_watermark(self, customer_name: str, po_number: str, watermark: bytes,
+                         run_mode: str, shipments_df: pd.DataFrame) -> None:
+        """Store the batch scope and high-water mark on the current batch record"""
+        if not self.batch_id or watermark is None:
+            return
+        
+        latest_shipped = None
+        if not shipments_df.empty and 'Shipped_Date' in shipments_df.columns:
+            latest_shipped = pd.to_datetime(shipments_df['Shipped_Date']).max()
+            latest_shipped = None if pd.isna(latest_shipped) else latest_shipped.date()
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE reconciliation_batch
+                SET customer_name = ?, po_number = ?, run_mode = ?,
+                    watermark_row_version = ?, watermark_shipped_date = ?, updated_at = GETDATE()
+                WHERE id = ?
+            """, customer_name, po_number, run_mode, watermark, latest_shipped, self.batch_id)
+            conn.commit()
+    
+    def get_prior_matches(self, customer_name: str, po_number: str = None) -> pd.DataFrame:
+        """Stored matches from each shipment's most recent matching session"""
+        query = """
+        WITH latest AS (
+            SELECT 
+                emr.shipment_id,
+                emr.order_id,
+                emr.shipment_quantity,
+                emr.order_quantity,
+                DENSE_RANK() OVER (PARTITION BY emr.shipment_id ORDER BY emr.matching_session_id DESC) as session_rank
+            FROM enhanced_matching_results emr
+            WHERE emr.customer_name LIKE ? AND emr.match_layer <> 'UNMATCHED'
+        """
+        params = [f"{customer_name}%"]
+        if po_number:
+            query += " AND emr.po_number = ?"
+            params.append(po_number)
+        query += """
+        )
+        SELECT shipment_id, order_id, shipment_quantity, order_quantity
+        FROM latest
+        WHERE session_rank = 1
+        """
+        
+        with self.get_connection() as conn:
+            prior_df = pd.read_sql(query, conn, params=params)
+        
+        logger.info(f"Loaded {len(prior_df)} stored matches for {prior_df['shipment_id'].nunique() if not prior_df.empty else 0} shipments")
+        return prior_df
+    
+    def retire_previous_results(self, shipment_ids: List) -> None:
+        """Remove stored results of earlier sessions for shipments being re-matched"""
+        ids = [str(shipment_id) for shipment_id in shipment_ids]
+        if not ids:
+            return
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(ids), SQL_PARAM_CHUNK):
+                chunk = ids[start:start + SQL_PARAM_CHUNK]
+                cursor.execute(f"""
+                    DELETE FROM enhanced_matching_results
+                    WHERE matching_session_id <> ? AND shipment_id IN ({', '.join('?' * len(chunk))})
+                """, self.session_id, *chunk)
+            conn.commit()
+    
     def get_orders_for_matching(self, customer_name: str, po_number: str = None) -> pd.DataFrame:
         """Get orders for matching with enhanced canonicalization"""
         query = """
@@ -119,8 +282,13 @@ class EnhancedMatchingEngine:
         logger.info(f"Loaded {len(orders_df)} orders for matching")
         return orders_df
     
-    def get_shipments_for_matching(self, customer_name: str, po_number: str = None) -> pd.DataFrame:
-        """Get shipments for matching with enhanced canonicalization"""
+    def get_shipments_for_matching(self, customer_name: str, po_number: str = None,
+                                   since_watermark: Optional[bytes] = None) -> pd.DataFrame:
+        """
+        Get shipments for matching with enhanced canonicalization. With
+        since_watermark, only shipments inserted or updated after that row
+        version are returned.
+        """
         query = """
         SELECT 
             fmos.shipment_id,
@@ -148,6 +316,9 @@ class EnhancedMatchingEngine:
         if po_number:
             query += " AND fmos.Customer_PO = ?"
             params.append(po_number)
+        if since_watermark is not None:
+            query += " AND fmos.row_version > ?"
+            params.append(since_watermark)
         
         query += " ORDER BY fmos.Shipped_Date DESC, fmos.shipment_id"
         
@@ -163,61 +334,64 @@ class EnhancedMatchingEngine:
         Highest confidence, auto-approved matches
         """
         matches = []
-        unmatched_indices = []
+        unmatched_positions = []
         
         logger.info("Starting Layer 0: Perfect exact matching")
         
-        # Create lookup dictionary for orders
-        order_lookup = {}
-        for idx, order in orders_df.iterrows():
-            # Create composite key: style + color + delivery
-            key = f"{order['canonical_style']}|{order['canonical_color']}|{order['canonical_delivery']}"
-            if key not in order_lookup:
-                order_lookup[key] = []
-            order_lookup[key].append(order.to_dict())
+        # Index orders on the composite key: style + color + delivery
+        key_columns = ['canonical_style', 'canonical_color', 'canonical_delivery']
+        order_index = CompositeKeyIndex(format_key(orders_df, key_columns))
+        pairs = order_index.join(format_key(shipments_df, key_columns))
+        
+        # Find best quantity match within each perfect match group
+        order_qty = orders_df['order_quantity'].to_numpy(dtype=float)
+        ship_qty = shipments_df['shipment_quantity'].to_numpy(dtype=float)
+        if self.assignment_solver is not None:
+            # Score against each order's remaining capacity and solve per key block
+            chosen = self.assignment_solver.assign(
+                pairs, ship_qty,
+                lambda p, remaining: quantity_scores(remaining, ship_qty[p['ship_pos'].to_numpy()]),
+                block_names=order_index.vocabulary, layer='LAYER_0'
+            ).rename(columns={'score': 'qty_score'})
+        else:
+            pairs['qty_score'] = quantity_scores(order_qty[pairs['order_pos']], ship_qty[pairs['ship_pos']])
+            chosen = CompositeKeyIndex.best_per_shipment(pairs, 'qty_score')
+        best = chosen.set_index('ship_pos').to_dict('index')
+        
+        order_records = orders_df.to_dict('records')
         
         # Match shipments to orders
-        for idx, shipment in shipments_df.iterrows():
-            key = f"{shipment['canonical_style']}|{shipment['canonical_color']}|{shipment['canonical_delivery']}"
-            
-            if key in order_lookup:
-                # Find best quantity match within this perfect match group
-                best_match = None
-                best_qty_score = -1
+        for pos, shipment in enumerate(shipments_df.to_dict('records')):
+            if pos in best:
+                best_match = order_records[int(best[pos]['order_pos'])]
+                best_qty_score = float(best[pos]['qty_score'])
                 
-                for order in order_lookup[key]:
-                    qty_score = self._calculate_quantity_score(order['order_quantity'], shipment['shipment_quantity'])
-                    if qty_score > best_qty_score:
-                        best_qty_score = qty_score
-                        best_match = order
+                match = {
+                    'shipment_id': shipment['shipment_id'],
+                    'order_id': best_match['order_id'],
+                    'match_layer': 'LAYER_0',
+                    'match_type': 'PERFECT_EXACT',
+                    'confidence': 1.0,
+                    'style_match': 'EXACT',
+                    'color_match': 'EXACT',
+                    'delivery_match': 'EXACT',
+                    'quantity_score': best_qty_score,
+                    'order_quantity': best_match['order_quantity'],
+                    'shipment_quantity': shipment['shipment_quantity'],
+                    'quantity_variance': shipment['shipment_quantity'] - best_match['order_quantity'],
+                    'quantity_variance_percent': ((shipment['shipment_quantity'] - best_match['order_quantity']) / best_match['order_quantity'] * 100) if best_match['order_quantity'] > 0 else 0,
+                    'match_reason': 'Perfect match: style + color + delivery + quantity tolerance',
+                    'customer_name': shipment['customer_name'],
+                    'po_number': shipment['po_number'],
+                    'style_code': shipment['style_code'],
+                    'color_description': shipment['color_description']
+                }
+                matches.append(match)
+                continue
                 
-                if best_match:
-                    match = {
-                        'shipment_id': shipment['shipment_id'],
-                        'order_id': best_match['order_id'],
-                        'match_layer': 'LAYER_0',
-                        'match_type': 'PERFECT_EXACT',
-                        'confidence': 1.0,
-                        'style_match': 'EXACT',
-                        'color_match': 'EXACT',
-                        'delivery_match': 'EXACT',
-                        'quantity_score': best_qty_score,
-                        'order_quantity': best_match['order_quantity'],
-                        'shipment_quantity': shipment['shipment_quantity'],
-                        'quantity_variance': shipment['shipment_quantity'] - best_match['order_quantity'],
-                        'quantity_variance_percent': ((shipment['shipment_quantity'] - best_match['order_quantity']) / best_match['order_quantity'] * 100) if best_match['order_quantity'] > 0 else 0,
-                        'match_reason': 'Perfect match: style + color + delivery + quantity tolerance',
-                        'customer_name': shipment['customer_name'],
-                        'po_number': shipment['po_number'],
-                        'style_code': shipment['style_code'],
-                        'color_description': shipment['color_description']
-                    }
-                    matches.append(match)
-                    continue
-                    
-            unmatched_indices.append(idx)
+            unmatched_positions.append(pos)
         
-        unmatched_shipments = shipments_df.iloc[unmatched_indices].copy() if unmatched_indices else pd.DataFrame()
+        unmatched_shipments = shipments_df.iloc[unmatched_positions].copy() if unmatched_positions else pd.DataFrame()
         
         logger.info(f"Layer 0 completed: {len(matches)} perfect matches, {len(unmatched_shipments)} remaining")
         return matches, unmatched_shipments
@@ -228,46 +402,50 @@ class EnhancedMatchingEngine:
         High confidence matches requiring style and color to be identical
         """
         matches = []
-        unmatched_indices = []
+        unmatched_positions = []
         
         logger.info("Starting Layer 1: Exact style + color, flexible delivery")
         
-        # Create lookup dictionary for orders (style + color only)
-        order_lookup = {}
-        for idx, order in orders_df.iterrows():
-            key = f"{order['canonical_style']}|{order['canonical_color']}"
-            if key not in order_lookup:
-                order_lookup[key] = []
-            order_lookup[key].append(order.to_dict())
+        # Index orders on style + color only
+        key_columns = ['canonical_style', 'canonical_color']
+        order_index = CompositeKeyIndex(format_key(orders_df, key_columns))
+        pairs = order_index.join(format_key(shipments_df, key_columns))
+        
+        # Score every candidate pair: delivery similarity and quantity score
+        order_qty = orders_df['order_quantity'].to_numpy(dtype=float)
+        ship_qty = shipments_df['shipment_quantity'].to_numpy(dtype=float)
+        pairs['delivery_similarity'] = pairwise_apply(
+            self._calculate_delivery_similarity,
+            orders_df['canonical_delivery'].iloc[pairs['order_pos']].reset_index(drop=True),
+            shipments_df['canonical_delivery'].iloc[pairs['ship_pos']].reset_index(drop=True)
+        )
+        
+        # Combined score (70% quantity, 30% delivery)
+        def combined_score(p, reference_qty):
+            qty_score = quantity_scores(reference_qty, ship_qty[p['ship_pos'].to_numpy()])
+            return (qty_score * 0.7) + (p['delivery_similarity'].to_numpy() * 0.3)
+        
+        if self.assignment_solver is not None:
+            chosen = self.assignment_solver.assign(
+                pairs, ship_qty, combined_score, min_score=0.6,
+                block_names=order_index.vocabulary, layer='LAYER_1'
+            ).rename(columns={'score': 'combined_score'})
+        else:
+            pairs['combined_score'] = combined_score(pairs, order_qty[pairs['order_pos'].to_numpy()])
+            chosen = CompositeKeyIndex.best_per_shipment(pairs, 'combined_score')
+        best = chosen.set_index('ship_pos').to_dict('index')
+        
+        order_records = orders_df.to_dict('records')
         
         # Match shipments to orders
-        for idx, shipment in shipments_df.iterrows():
-            key = f"{shipment['canonical_style']}|{shipment['canonical_color']}"
-            
-            if key in order_lookup:
-                # Find best match considering delivery similarity and quantity
-                best_match = None
-                best_score = -1
-                
-                for order in order_lookup[key]:
-                    # Calculate delivery similarity
-                    delivery_similarity = self._calculate_delivery_similarity(
-                        order['canonical_delivery'], 
-                        shipment['canonical_delivery']
-                    )
-                    
-                    # Calculate quantity score
-                    qty_score = self._calculate_quantity_score(order['order_quantity'], shipment['shipment_quantity'])
-                    
-                    # Combined score (70% quantity, 30% delivery)
-                    combined_score = (qty_score * 0.7) + (delivery_similarity * 0.3)
-                    
-                    if combined_score > best_score:
-                        best_score = combined_score
-                        best_match = order
-                        best_match['delivery_similarity'] = delivery_similarity
+        for pos, shipment in enumerate(shipments_df.to_dict('records')):
+            if pos in best:
+                pick = best[pos]
+                best_score = float(pick['combined_score'])
                 
-                if best_match and best_score >= 0.6:  # Minimum threshold for Layer 1
+                if best_score >= 0.6:  # Minimum threshold for Layer 1
+                    best_match = order_records[int(pick['order_pos'])]
+                    delivery_similarity = float(pick['delivery_similarity'])
                     match = {
                         'shipment_id': shipment['shipment_id'],
                         'order_id': best_match['order_id'],
@@ -276,14 +454,14 @@ class EnhancedMatchingEngine:
                         'confidence': min(0.95, 0.85 + (best_score * 0.1)),  # 0.85-0.95 range
                         'style_match': 'EXACT',
                         'color_match': 'EXACT',
-                        'delivery_match': 'EXACT' if best_match['delivery_similarity'] >= 0.9 else 'SIMILAR',
-                        'delivery_similarity': best_match['delivery_similarity'],
+                        'delivery_match': 'EXACT' if delivery_similarity >= 0.9 else 'SIMILAR',
+                        'delivery_similarity': delivery_similarity,
                         'quantity_score': self._calculate_quantity_score(best_match['order_quantity'], shipment['shipment_quantity']),
                         'order_quantity': best_match['order_quantity'],
                         'shipment_quantity': shipment['shipment_quantity'],
                         'quantity_variance': shipment['shipment_quantity'] - best_match['order_quantity'],
                         'quantity_variance_percent': ((shipment['shipment_quantity'] - best_match['order_quantity']) / best_match['order_quantity'] * 100) if best_match['order_quantity'] > 0 else 0,
-                        'match_reason': f'Exact style+color match, delivery similarity: {best_match["delivery_similarity"]:.2f}',
+                        'match_reason': f'Exact style+color match, delivery similarity: {delivery_similarity:.2f}',
                         'customer_name': shipment['customer_name'],
                         'po_number': shipment['po_number'],
                         'style_code': shipment['style_code'],
@@ -292,9 +470,9 @@ class EnhancedMatchingEngine:
                     matches.append(match)
                     continue
                     
-            unmatched_indices.append(idx)
+            unmatched_positions.append(pos)
         
-        unmatched_shipments = shipments_df.iloc[unmatched_indices].copy() if unmatched_indices else pd.DataFrame()
+        unmatched_shipments = shipments_df.iloc[unmatched_positions].copy() if unmatched_positions else pd.DataFrame()
         
         logger.info(f"Layer 1 completed: {len(matches)} style+color matches, {len(unmatched_shipments)} remaining")
         return matches, unmatched_shipments
@@ -305,87 +483,63 @@ class EnhancedMatchingEngine:
         Medium confidence matches using fuzzy string matching
         """
         try:
-            from rapidfuzz import fuzz
+            from src.reconciliation.fuzzy_scoring import BatchFuzzyScorer
         except ImportError:
             logger.warning("rapidfuzz not available, skipping Layer 2 fuzzy matching")
             return [], shipments_df
         
         matches = []
-        unmatched_indices = []
+        unmatched_positions = []
         
         logger.info("Starting Layer 2: Fuzzy style + color matching")
         
         fuzzy_threshold = 0.8  # 80% similarity required
         
-        for idx, shipment in shipments_df.iterrows():
-            best_match = None
-            best_score = -1
-            best_style_sim = 0
-            best_color_sim = 0
-            
-            for _, order in orders_df.iterrows():
-                # Calculate fuzzy similarities
-                style_similarity = fuzz.token_set_ratio(
-                    shipment['canonical_style'], 
-                    order['canonical_style']
-                ) / 100.0
-                
-                color_similarity = fuzz.token_set_ratio(
-                    shipment['canonical_color'], 
-                    order['canonical_color']
-                ) / 100.0
-                
-                # Both style and color must meet threshold
-                if style_similarity >= fuzzy_threshold and color_similarity >= fuzzy_threshold:
-                    # Calculate delivery similarity
-                    delivery_similarity = self._calculate_delivery_similarity(
-                        order['canonical_delivery'], 
-                        shipment['canonical_delivery']
-                    )
-                    
-                    # Calculate quantity score
-                    qty_score = self._calculate_quantity_score(order['order_quantity'], shipment['shipment_quantity'])
-                    
-                    # Combined score (40% style, 30% color, 20% quantity, 10% delivery)
-                    combined_score = (style_similarity * 0.4) + (color_similarity * 0.3) + (qty_score * 0.2) + (delivery_similarity * 0.1)
-                    
-                    if combined_score > best_score:
-                        best_score = combined_score
-                        best_match = order.to_dict()
-                        best_style_sim = style_similarity
-                        best_color_sim = color_similarity
-                        best_match['delivery_similarity'] = delivery_similarity
-            
-            if best_match and best_score >= 0.7:  # Minimum threshold for Layer 2
-                match = {
-                    'shipment_id': shipment['shipment_id'],
-                    'order_id': best_match['order_id'],
-                    'match_layer': 'LAYER_2',
-                    'match_type': 'FUZZY_STYLE_COLOR',
-                    'confidence': min(0.85, 0.6 + (best_score * 0.25)),  # 0.6-0.85 range
-                    'style_match': 'EXACT' if best_style_sim >= 0.99 else 'FUZZY',
-                    'color_match': 'EXACT' if best_color_sim >= 0.99 else 'FUZZY',
-                    'delivery_match': 'EXACT' if best_match['delivery_similarity'] >= 0.9 else 'SIMILAR',
-                    'style_similarity': best_style_sim,
-                    'color_similarity': best_color_sim,
-                    'delivery_similarity': best_match['delivery_similarity'],
-                    'quantity_score': self._calculate_quantity_score(best_match['order_quantity'], shipment['shipment_quantity']),
-                    'order_quantity': best_match['order_quantity'],
-                    'shipment_quantity': shipment['shipment_quantity'],
-                    'quantity_variance': shipment['shipment_quantity'] - best_match['order_quantity'],
-                    'quantity_variance_percent': ((shipment['shipment_quantity'] - best_match['order_quantity']) / best_match['order_quantity'] * 100) if best_match['order_quantity'] > 0 else 0,
-                    'match_reason': f'Fuzzy match - Style: {best_style_sim:.2f}, Color: {best_color_sim:.2f}',
-                    'customer_name': shipment['customer_name'],
-                    'po_number': shipment['po_number'],
-                    'style_code': shipment['style_code'],
-                    'color_description': shipment['color_description']
-                }
-                matches.append(match)
+        # Score all shipment x order pairs at once on the unique style/color vocabularies
+        scorer = BatchFuzzyScorer(fuzzy_threshold=fuzzy_threshold, min_score=0.7)  # Minimum threshold for Layer 2
+        best = scorer.best_matches(shipments_df, orders_df, self._calculate_delivery_similarity)
+        
+        logger.info(f"Layer 2 scored {scorer.stats['pairs_scored']:,} pairs "
+                    f"({scorer.stats['pairs_per_second']:,.0f} pairs/sec)")
+        
+        order_records = orders_df.to_dict('records')
+        
+        for pos, (shipment, pick) in enumerate(zip(shipments_df.to_dict('records'), best.itertuples(index=False))):
+            if pick.order_pos < 0:
+                unmatched_positions.append(pos)
                 continue
-                
-            unmatched_indices.append(idx)
+            
+            best_match = order_records[pick.order_pos]
+            best_score = pick.best_score
+            best_style_sim = pick.style_similarity
+            best_color_sim = pick.color_similarity
+            
+            match = {
+                'shipment_id': shipment['shipment_id'],
+                'order_id': best_match['order_id'],
+                'match_layer': 'LAYER_2',
+                'match_type': 'FUZZY_STYLE_COLOR',
+                'confidence': min(0.85, 0.6 + (best_score * 0.25)),  # 0.6-0.85 range
+                'style_match': 'EXACT' if best_style_sim >= 0.99 else 'FUZZY',
+                'color_match': 'EXACT' if best_color_sim >= 0.99 else 'FUZZY',
+                'delivery_match': 'EXACT' if pick.delivery_similarity >= 0.9 else 'SIMILAR',
+                'style_similarity': best_style_sim,
+                'color_similarity': best_color_sim,
+                'delivery_similarity': pick.delivery_similarity,
+                'quantity_score': self._calculate_quantity_score(best_match['order_quantity'], shipment['shipment_quantity']),
+                'order_quantity': best_match['order_quantity'],
+                'shipment_quantity': shipment['shipment_quantity'],
+                'quantity_variance': shipment['shipment_quantity'] - best_match['order_quantity'],
+                'quantity_variance_percent': ((shipment['shipment_quantity'] - best_match['order_quantity']) / best_match['order_quantity'] * 100) if best_match['order_quantity'] > 0 else 0,
+                'match_reason': f'Fuzzy match - Style: {best_style_sim:.2f}, Color: {best_color_sim:.2f}',
+                'customer_name': shipment['customer_name'],
+                'po_number': shipment['po_number'],
+                'style_code': shipment['style_code'],
+                'color_description': shipment['color_description']
+            }
+            matches.append(match)
         
-        unmatched_shipments = shipments_df.iloc[unmatched_indices].copy() if unmatched_indices else pd.DataFrame()
+        unmatched_shipments = shipments_df.iloc[unmatched_positions].copy() if unmatched_positions else pd.DataFrame()
         
         logger.info(f"Layer 2 completed: {len(matches)} fuzzy matches, {len(unmatched_shipments)} remaining")
         return matches, unmatched_shipments
@@ -393,61 +547,86 @@ class EnhancedMatchingEngine:
     def layer3_quantity_resolution(self, orders_df: pd.DataFrame, shipments_df: pd.DataFrame, existing_matches: List[Dict]) -> Tuple[List[Dict], pd.DataFrame]:
         """
         Layer 3: Quantity resolution and split shipment detection
-        Attempts to resolve quantity discrepancies through split shipment detection
+        Attempts to resolve quantity discrepancies through split shipment detection.
+        Each shipment is linked to the combination of up to max_split_orders
+        compatible orders whose remaining quantity best closes its quantity.
         """
         matches = []
-        unmatched_indices = []
+        unmatched_positions = []
         
         logger.info("Starting Layer 3: Quantity resolution and split shipment detection")
         
-        # Group existing matches by order to understand what's already matched
-        order_matches = {}
-        for match in existing_matches:
-            order_id = match['order_id']
-            if order_id not in order_matches:
-                order_matches[order_id] = []
-            order_matches[order_id].append(match)
+        # Remaining quantity per order after the earlier layers, grouped by style/color
+        matched_qty = pd.Series(
+            [match['shipment_quantity'] for match in existing_matches],
+            index=[match['order_id'] for match in existing_matches],
+            dtype='float64'
+        ).groupby(level=0).sum()
+        remaining = orders_df['order_quantity'].to_numpy(dtype='float64') - \
+            orders_df['order_id'].map(matched_qty).fillna(0).to_numpy(dtype='float64')
+        if self.prior_allocated is not None:
+            remaining = remaining - self.prior_allocated
+        index = RemainingQuantityIndex(orders_df['canonical_style'], orders_df['canonical_color'], remaining)
+        
+        # Style/color compatibility (exact or fuzzy) scored once per vocabulary pair
+        ship_style_codes, ship_styles = factorize_values(shipments_df['canonical_style'])
+        ship_color_codes, ship_colors = factorize_values(shipments_df['canonical_color'])
+        style_ok = self._vocabulary_compatibility(ship_styles, index.style_vocab)
+        color_ok = self._vocabulary_compatibility(ship_colors, index.color_vocab)
         
-        # Analyze remaining shipments for potential split shipment opportunities
-        for idx, shipment in shipments_df.iterrows():
+        order_records = orders_df.to_dict('records')
+        for pos, shipment in enumerate(shipments_df.to_dict('records')):
             best_split_match = self._find_split_shipment_opportunity(
-                shipment, orders_df, order_matches
+                shipment, index, style_ok[ship_style_codes[pos]], color_ok[ship_color_codes[pos]]
             )
             
-            if best_split_match:
+            if best_split_match is None:
+                unmatched_positions.append(pos)
+                continue
+            
+            picked, total_remaining, qty_score = best_split_match
+            remaining_before = index.remaining[picked].copy()
+            allocated = index.consume(picked, shipment['shipment_quantity'])
+            
+            for order_pos, remaining_qty, allocated_qty in zip(picked, remaining_before, allocated):
+                order = order_records[order_pos]
+                delivery_similarity = self._calculate_delivery_similarity(
+                    order['canonical_delivery'], 
+                    shipment['canonical_delivery']
+                )
+                confidence = min(0.75, (qty_score * 0.6) + (delivery_similarity * 0.2) + 0.2)
+                
+                reason = f'Split shipment resolution - remaining qty: {total_remaining:g}, shipment qty: {shipment["shipment_quantity"]}'
+                if len(picked) > 1:
+                    reason += f' across {len(picked)} orders'
+                
                 match = {
                     'shipment_id': shipment['shipment_id'],
-                    'order_id': best_split_match['order_id'],
+                    'order_id': order['order_id'],
                     'match_layer': 'LAYER_3',
                     'match_type': 'QUANTITY_RESOLUTION',
-                    'confidence': best_split_match['confidence'],
-                    'style_match': best_split_match['style_match'],
-                    'color_match': best_split_match['color_match'],
-                    'delivery_match': best_split_match['delivery_match'],
-                    'quantity_score': best_split_match['quantity_score'],
-                    'order_quantity': best_split_match['order_quantity'],
+                    'confidence': confidence,
+                    'style_match': 'EXACT' if shipment['canonical_style'] == order['canonical_style'] else 'FUZZY',
+                    'color_match': 'EXACT' if shipment['canonical_color'] == order['canonical_color'] else 'FUZZY',
+                    'delivery_match': 'EXACT' if delivery_similarity >= 0.9 else 'SIMILAR',
+                    'quantity_score': qty_score,
+                    'order_quantity': order['order_quantity'],
                     'shipment_quantity': shipment['shipment_quantity'],
-                    'quantity_variance': shipment['shipment_quantity'] - best_split_match['remaining_quantity'],
-                    'quantity_variance_percent': ((shipment['shipment_quantity'] - best_split_match['remaining_quantity']) / best_split_match['remaining_quantity'] * 100) if best_split_match['remaining_quantity'] > 0 else 0,
-                    'match_reason': best_split_match['reason'],
+                    'allocated_quantity': float(allocated_qty),
+                    'quantity_variance': shipment['shipment_quantity'] - total_remaining,
+                    'quantity_variance_percent': ((shipment['shipment_quantity'] - total_remaining) / total_remaining * 100) if total_remaining > 0 else 0,
+                    'match_reason': reason,
                     'split_shipment_flag': True,
-                    'remaining_order_quantity': best_split_match['remaining_quantity'],
+                    'split_order_count': len(picked),
+                    'remaining_order_quantity': float(remaining_qty),
                     'customer_name': shipment['customer_name'],
                     'po_number': shipment['po_number'],
                     'style_code': shipment['style_code'],
                     'color_description': shipment['color_description']
                 }
                 matches.append(match)
-                
-                # Update order matches to reflect this new match
-                if best_split_match['order_id'] not in order_matches:
-                    order_matches[best_split_match['order_id']] = []
-                order_matches[best_split_match['order_id']].append(match)
-                continue
-                
-            unmatched_indices.append(idx)
         
-        unmatched_shipments = shipments_df.iloc[unmatched_indices].copy() if unmatched_indices else pd.DataFrame()
+        unmatched_shipments = shipments_df.iloc[unmatched_positions].copy() if unmatched_positions else pd.DataFrame()
         
         logger.info(f"Layer 3 completed: {len(matches)} quantity resolution matches, {len(unmatched_shipments)} remaining")
         return matches, unmatched_shipments
@@ -493,188 +672,286 @@ class EnhancedMatchingEngine:
                 return 0.8
         
         # Fuzzy similarity as fallback
-        try:
-            from rapidfuzz import fuzz
-            return fuzz.token_set_ratio(delivery1, delivery2) / 100.0
-        except ImportError:
-            return 0.3  # Low similarity if no fuzzy matching available
+        return self.similarity_cache.score(delivery1, delivery2) / 100.0
     
-    def _find_split_shipment_opportunity(self, shipment: pd.Series, orders_df: pd.DataFrame, order_matches: Dict) -> Optional[Dict]:
-        """Find potential split shipment opportunities for unmatched shipments"""
+    def _find_split_shipment_opportunity(self, shipment: Dict, index: RemainingQuantityIndex,
+                                         style_ok, color_ok) -> Optional[Tuple]:
+        """
+        Find the best split shipment opportunity for an unmatched shipment.
+        Returns (order positions, their total remaining quantity, quantity score)
+        or None when no combination reaches a 40% quantity match.
+        """
+        candidates = index.candidates(style_ok, color_ok)
+        if len(candidates) == 0:
+            return None
         
-        for _, order in orders_df.iterrows():
-            order_id = order['order_id']
-            
-            # Calculate total quantity already matched to this order
-            matched_qty = sum(match['shipment_quantity'] for match in order_matches.get(order_id, []))
-            remaining_qty = order['order_quantity'] - matched_qty
-            
-            if remaining_qty <= 0:
-                continue  # Order fully satisfied
-            
-            # Check if style and color match (exact or fuzzy)
-            style_match = self._check_style_match(shipment['canonical_style'], order['canonical_style'])
-            color_match = self._check_color_match(shipment['canonical_color'], order['canonical_color'])
-            
-            if not style_match or not color_match:
+        # Best single order first; only split when a combination scores strictly better,
+        # so orders are not used up for marginal gains
+        best = None
+        for max_orders in sorted({1, self.max_split_orders}):
+            picked, total_remaining = index.solve(candidates, shipment['shipment_quantity'], max_orders)
+            if len(picked) == 0:
                 continue
             
-            # Check if shipment quantity makes sense for remaining quantity
-            qty_score = self._calculate_quantity_score(remaining_qty, shipment['shipment_quantity'])
-            
-            if qty_score >= 0.4:  # At least 40% quantity match
-                delivery_similarity = self._calculate_delivery_similarity(
-                    order['canonical_delivery'], 
-                    shipment['canonical_delivery']
-                )
-                
-                confidence = min(0.75, (qty_score * 0.6) + (delivery_similarity * 0.2) + 0.2)
-                
-                return {
-                    'order_id': order_id,
-                    'confidence': confidence,
-                    'style_match': 'EXACT' if style_match == 1.0 else 'FUZZY',
-                    'color_match': 'EXACT' if color_match == 1.0 else 'FUZZY',
-                    'delivery_match': 'EXACT' if delivery_similarity >= 0.9 else 'SIMILAR',
-                    'quantity_score': qty_score,
-                    'order_quantity': order['order_quantity'],
-                    'remaining_quantity': remaining_qty,
-                    'reason': f'Split shipment resolution - remaining qty: {remaining_qty}, shipment qty: {shipment["shipment_quantity"]}'
-                }
+            # Check if shipment quantity makes sense for the combined remaining quantity
+            qty_score = self._calculate_quantity_score(total_remaining, shipment['shipment_quantity'])
+            if best is None or qty_score > best[2]:
+                best = (picked, total_remaining, qty_score)
+            if qty_score == 1.0:
+                break
         
-        return None
+        if best is None or best[2] < 0.4:  # At least 40% quantity match
+            return None
+        return best
+    
+    def _vocabulary_compatibility(self, queries: List, choices: List):
+        """Boolean matrix of exact-or-fuzzy (>= 80) matches between two vocabularies"""
+        exact = np.zeros((len(queries), len(choices)), dtype=bool)
+        positions = {choice: j for j, choice in enumerate(choices) if choice == choice}
+        for i, query in enumerate(queries):
+            j = positions.get(query) if query == query else None
+            if j is not None:
+                exact[i, j] = True
+        try:
+            from src.reconciliation.fuzzy_scoring import BatchFuzzyScorer
+            return exact | (BatchFuzzyScorer(fuzzy_threshold=0.8).score_vocabulary(queries, choices) >= 0.8)
+        except ImportError:
+            return exact
     
     def _check_style_match(self, style1: str, style2: str) -> bool:
         """Check if styles match (exact or fuzzy)"""
         if style1 == style2:
             return True
         
-        try:
-            from rapidfuzz import fuzz
-            return fuzz.token_set_ratio(style1, style2) >= 80
-        except ImportError:
-            return False
+        return self.similarity_cache.score(style1, style2) >= 80
     
     def _check_color_match(self, color1: str, color2: str) -> bool:
         """Check if colors match (exact or fuzzy)"""
         if color1 == color2:
             return True
         
-        try:
-            from rapidfuzz import fuzz
-            return fuzz.token_set_ratio(color1, color2) >= 80
-        except ImportError:
-            return False
+        return self.similarity_cache.score(color1, color2) >= 80
+    
+    def _result_rows(self, matches: List[Dict]) -> List[tuple]:
+        """Staging rows for matches, in enhanced_matching_results_staging column order"""
+        def as_int(value):
+            return None if value is None or pd.isna(value) else int(round(float(value)))
+        
+        rows = []
+        for row_number, match in enumerate(matches):
+            variance_percent = float(match['quantity_variance_percent'])
+            rows.append((
+                self.session_id, row_number,
+                str(match['customer_name']), str(match['po_number']),
+                str(match['shipment_id']), str(match['order_id']),
+                match['match_layer'], float(match['confidence']),
+                match['style_match'], match['color_match'], match['delivery_match'],
+                match['style_code'], match['style_code'],  # Using shipment style for both
+                match['color_description'], match['color_description'],  # Using shipment color for both
+                match.get('delivery_method', ''), match.get('delivery_method', ''),
+                as_int(match['shipment_quantity']), as_int(match['order_quantity']),
+                round(variance_percent, 2),
+                'PASS' if abs(variance_percent) <= 10 else 'FAIL',
+                as_int(match['quantity_variance']),
+                f"{match['customer_name']}_{match['po_number']}_{match['order_id']}_{match['shipment_id']}"
+            ))
+        return rows
     
-    def store_matches(self, matches: List[Dict]) -> None:
-        """Store matches in enhanced_matching_results table and movement table"""
+    def store_matches(self, matches: List[Dict], bulk: bool = True) -> None:
+        """
+        Store matches in enhanced_matching_results table and movement table.
+        
+        The bulk path stages every match with one fast_executemany insert and
+        lets sp_store_enhanced_matches write the results and the RECONCILED
+        movement events in a single transaction. bulk=False keeps the original
+        per-match INSERT + sp_capture_reconciliation_event round trips.
+        """
         if not matches:
             return
         
+        start_time = time.perf_counter()
+        rows = self._result_rows(matches)
+        
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            round_trips = self._store_rows_bulk(cursor, rows) if bulk else self._store_rows_each(cursor, rows)
+            conn.commit()
+            round_trips += 1
+        
+        elapsed = time.perf_counter() - start_time
+        self.persistence_stats = {
+            'mode': 'bulk' if bulk else 'row_by_row',
+            'rows': len(rows),
+            'round_trips': round_trips,
+            'elapsed_seconds': elapsed,
+            'rows_per_second': len(rows) / elapsed if elapsed > 0 else 0.0
+        }
+        logger.info(f"Stored {len(matches)} matches in database "
+                    f"({round_trips} round trips, {elapsed:.2f}s)")
+    
+    def _store_rows_bulk(self, cursor, rows: List[tuple]) -> int:
+        """Stage rows and apply them set-based; returns the number of round trips"""
+        cursor.execute("DELETE FROM enhanced_matching_results_staging WHERE matching_session_id = ?", self.session_id)
+        
+        cursor.fast_executemany = True
+        cursor.executemany("""
+            INSERT INTO enhanced_matching_results_staging (
+                matching_session_id, row_number,
+                customer_name, po_number, shipment_id, order_id,
+                match_layer, match_confidence,
+                style_match, color_match, delivery_match,
+                shipment_style_code, order_style_code,
+                shipment_color_description, order_color_description,
+                shipment_delivery_method, order_delivery_method,
+                shipment_quantity, order_quantity,
+                quantity_difference_percent, quantity_check_result,
+                quantity_variance, match_group_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        
+        cursor.execute("EXEC sp_store_enhanced_matches @session_id = ?, @batch_id = ?", self.session_id, self.batch_id)
+        return 3
+    
+    def _store_rows_each(self, cursor, rows: List[tuple]) -> int:
+        """Original per-match writes; returns the number of round trips"""
+        # Clear previous results for this session
+        cursor.execute("""
+            DELETE FROM enhanced_matching_results 
+            WHERE matching_session_id = ?
+        """, self.session_id)
+        
+        for row in rows:
+            (session_id, _, customer_name, po_number, shipment_id, order_id, match_layer, confidence,
+             style_match, color_match, delivery_match, *values, quantity_variance, match_group_id) = row
             
-            # Clear previous results for this session
+            # Insert new match
             cursor.execute("""
-                DELETE FROM enhanced_matching_results 
-                WHERE matching_session_id = ?
-            """, self.session_id)
-            
-            # Insert new matches
-            for match in matches:
-                cursor.execute("""
-                    INSERT INTO enhanced_matching_results (
-                        customer_name, po_number, shipment_id, order_id,
-                        match_layer, match_confidence,
-                        style_match, color_match, delivery_match,
-                        shipment_style_code, order_style_code,
-                        shipment_color_description, order_color_description,
-                        shipment_delivery_method, order_delivery_method,
-                        shipment_quantity, order_quantity,
-                        quantity_difference_percent, quantity_check_result,
-                        matching_session_id, created_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, GETDATE())
-                """, 
-                    match['customer_name'], match['po_number'],
-                    match['shipment_id'], match['order_id'],
-                    match['match_layer'], match['confidence'],
-                    match['style_match'], match['color_match'], match['delivery_match'],
-                    match['style_code'], match['style_code'],  # Using shipment style for both
-                    match['color_description'], match['color_description'],  # Using shipment color for both
-                    match.get('delivery_method', ''), match.get('delivery_method', ''),
-                    match['shipment_quantity'], match['order_quantity'],
-                    match['quantity_variance_percent'], 
-                    'PASS' if abs(match['quantity_variance_percent']) <= 10 else 'FAIL',
-                    self.session_id
-                )
-                
-                # Create movement table entries for reconciliation
-                match_group_id = f"{match['customer_name']}_{match['po_number']}_{match['order_id']}_{match['shipment_id']}"
-                
-                cursor.execute("""
-                    EXEC sp_capture_reconciliation_event 
-                        @order_id = ?, @shipment_id = ?, @match_group_id = ?,
-                        @reconciliation_status = ?, @reconciliation_confidence = ?,
-                        @reconciliation_method = ?, @quantity_variance = ?, @batch_id = ?
-                """, 
-                    str(match['order_id']), match['shipment_id'], match_group_id,
-                    'MATCHED', match['confidence'], match['match_layer'],
-                    match['quantity_variance'], self.batch_id
-                )
+                INSERT INTO enhanced_matching_results (
+                    customer_name, po_number, shipment_id, order_id,
+                    match_layer, match_confidence,
+                    style_match, color_match, delivery_match,
+                    shipment_style_code, order_style_code,
+                    shipment_color_description, order_color_description,
+                    shipment_delivery_method, order_delivery_method,
+                    shipment_quantity, order_quantity,
+                    quantity_difference_percent, quantity_check_result,
+                    matching_session_id, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, GETDATE())
+            """, customer_name, po_number, shipment_id, order_id, match_layer, confidence,
+                style_match, color_match, delivery_match, *values, session_id)
             
-            conn.commit()
-            logger.info(f"Stored {len(matches)} matches in database")
+            # Create movement table entries for reconciliation
+            cursor.execute("""
+                EXEC sp_capture_reconciliation_event 
+                    @order_id = ?, @shipment_id = ?, @match_group_id = ?,
+                    @reconciliation_status = ?, @reconciliation_confidence = ?,
+                    @reconciliation_method = ?, @quantity_variance = ?, @batch_id = ?
+            """, order_id, shipment_id, match_group_id,
+                'MATCHED', confidence, match_layer, quantity_variance, self.batch_id)
+        
+        return 1 + 2 * len(rows)
     
-    def run_enhanced_matching(self, customer_name: str, po_number: str = None) -> Dict[str, Any]:
-        """Run the complete enhanced 4-layer matching process"""
-        logger.info(f"Starting enhanced matching for {customer_name}" + (f" PO {po_number}" if po_number else ""))
+    def run_enhanced_matching(self, customer_name: str, po_number: str = None, incremental: bool = False) -> Dict[str, Any]:
+        """
+        Run the complete enhanced 4-layer matching process.
+        
+        Every run records a shipment row_version high-water mark on its batch.
+        With incremental=True only shipments above the last completed batch's
+        mark are matched, against order quantities already drawn down by the
+        matches stored for earlier shipments; without a previous mark the run
+        falls back to a full match.
+        """
+        logger.info(f"Starting enhanced matching for {customer_name}" + (f" PO {po_number}" if po_number else "")
+                    + (" (incremental)" if incremental else ""))
         
         # Start matching session
         self.start_matching_session(customer_name, po_number)
         
         try:
+            watermark = self.get_current_watermark(customer_name)
+            since_watermark = None
+            if incremental and watermark is not None:
+                since_watermark = self.get_last_watermark(customer_name, po_number)
+                if since_watermark is None:
+                    logger.info("No previous watermark for this scope, running a full match")
+            run_mode = 'INCREMENTAL' if since_watermark is not None else 'FULL'
+            
             # Load data
             orders_df = self.get_orders_for_matching(customer_name, po_number)
-            shipments_df = self.get_shipments_for_matching(customer_name, po_number)
+            shipments_df = self.get_shipments_for_matching(customer_name, po_number, since_watermark)
+            self.report_progress('LOADED', orders=len(orders_df), shipments=len(shipments_df), run_mode=run_mode)
             
             if orders_df.empty or shipments_df.empty:
                 logger.warning("No orders or shipments found for matching")
+                if not orders_df.empty:
+                    # Nothing new since the last mark: advance the mark and stop
+                    self.record_watermark(customer_name, po_number, watermark, run_mode, shipments_df)
                 self.end_matching_session('COMPLETED', 0, len(shipments_df))
                 return {
                     'status': 'NO_DATA',
+                    'run_mode': run_mode,
                     'total_orders': len(orders_df),
                     'total_shipments': len(shipments_df),
                     'matches': []
                 }
             
+            # Seed order quantities with what earlier batches already matched
+            self.prior_allocated = None
+            if run_mode == 'INCREMENTAL':
+                prior_df = self.get_prior_matches(customer_name, po_number)
+                prior_df = prior_df[~prior_df['shipment_id'].astype(str).isin(shipments_df['shipment_id'].astype(str))]
+                self.prior_allocated = prior_allocations(prior_df, orders_df['order_id'])
+                logger.info(f"Incremental run: {len(shipments_df)} new/changed shipments, "
+                            f"{self.prior_allocated.sum():,.0f} units already allocated to "
+                            f"{int((self.prior_allocated > 0).sum())} orders")
+            
             all_matches = []
             remaining_shipments = shipments_df.copy()
             
+            # Optimal mode shares one capacity ledger across the exact layers
+            if self.assignment_mode == 'optimal':
+                from src.reconciliation.assignment_solver import CapacityAssignmentSolver
+                capacity = orders_df['order_quantity'].to_numpy(dtype='float64')
+                if self.prior_allocated is not None:
+                    capacity = capacity - self.prior_allocated
+                self.assignment_solver = CapacityAssignmentSolver(capacity)
+            
             # Layer 0: Perfect exact matches
             layer0_matches, remaining_shipments = self.layer0_perfect_matching(orders_df, remaining_shipments)
             all_matches.extend(layer0_matches)
+            self.report_progress('LAYER_0', total_matches=len(all_matches), remaining=len(remaining_shipments))
             
             # Layer 1: Exact style + color, flexible delivery
             if not remaining_shipments.empty:
                 layer1_matches, remaining_shipments = self.layer1_style_color_exact(orders_df, remaining_shipments)
                 all_matches.extend(layer1_matches)
+            self.report_progress('LAYER_1', total_matches=len(all_matches), remaining=len(remaining_shipments))
             
             # Layer 2: Fuzzy style + color matching
             if not remaining_shipments.empty:
                 layer2_matches, remaining_shipments = self.layer2_fuzzy_matching(orders_df, remaining_shipments)
                 all_matches.extend(layer2_matches)
+            self.report_progress('LAYER_2', total_matches=len(all_matches), remaining=len(remaining_shipments))
             
             # Layer 3: Quantity resolution and split shipment detection
             if not remaining_shipments.empty:
                 layer3_matches, remaining_shipments = self.layer3_quantity_resolution(orders_df, remaining_shipments, all_matches)
                 all_matches.extend(layer3_matches)
+            self.report_progress('LAYER_3', total_matches=len(all_matches), remaining=len(remaining_shipments))
             
-            # Store all matches
+            # Store all matches; re-matched shipments replace their earlier results
+            if run_mode == 'INCREMENTAL':
+                self.retire_previous_results(shipments_df['shipment_id'].tolist())
             self.store_matches(all_matches)
+            self.report_progress('STORED', total_matches=len(all_matches))
             
             # Update session
+            self.record_watermark(customer_name, po_number, watermark, run_mode, shipments_df)
             self.end_matching_session('COMPLETED', len(all_matches), len(remaining_shipments))
             
+            # Only the shipments this session matched (or left unmatched) need new summary rows
+            summary_refresh_pending = self.summary_refresher.request(shipments_df['shipment_id'], session_id=self.session_id)
+            
             # Generate summary
             layer_summary = {
                 'LAYER_0': len([m for m in all_matches if m['match_layer'] == 'LAYER_0']),
@@ -683,10 +960,13 @@ class EnhancedMatchingEngine:
                 'LAYER_3': len([m for m in all_matches if m['match_layer'] == 'LAYER_3'])
             }
             
-            match_rate = (len(all_matches) / len(shipments_df) * 100) if len(shipments_df) > 0 else 0
+            # Layer 3 can link one shipment to several orders, so count shipments
+            matched_shipments = len({m['shipment_id'] for m in all_matches})
+            match_rate = (matched_shipments / len(shipments_df) * 100) if len(shipments_df) > 0 else 0
             
             results = {
                 'status': 'SUCCESS',
+                'run_mode': run_mode,
                 'customer_name': customer_name,
                 'po_number': po_number,
                 'session_id': self.session_id,
@@ -694,6 +974,7 @@ class EnhancedMatchingEngine:
                 'total_orders': len(orders_df),
                 'total_shipments': len(shipments_df),
                 'total_matches': len(all_matches),
+                'matched_shipments': matched_shipments,
                 'unmatched_shipments': len(remaining_shipments),
                 'match_rate': match_rate,
                 'layer_summary': layer_summary,
@@ -701,7 +982,27 @@ class EnhancedMatchingEngine:
                 'unmatched_shipment_ids': remaining_shipments['shipment_id'].tolist() if not remaining_shipments.empty else []
             }
             
-            logger.info(f"Enhanced matching completed: {len(all_matches)}/{len(shipments_df)} matches ({match_rate:.1f}%)")
+            if self.assignment_solver is not None:
+                assignment_summary = self.assignment_solver.summary()
+                results['assignment_stats'] = assignment_summary
+                logger.info(f"Assignment solver: {assignment_summary['blocks']} blocks in {assignment_summary['total_solve_seconds']:.2f}s")
+                for block in assignment_summary['slowest_blocks']:
+                    logger.info(f"   {block['layer']} {block['block']}: {block['shipments']}x{block['orders']}, "
+                                f"{block['assigned']} assigned in {block['rounds']} rounds, {block['solve_seconds']*1000:.1f}ms")
+            
+            if self.persistence_stats is not None:
+                results['persistence'] = self.persistence_stats
+            
+            results['summary_cache_refresh'] = {'pending_shipments': summary_refresh_pending}
+            
+            self.similarity_cache.flush()
+            cache_summary = self.similarity_cache.summary()
+            results['similarity_cache'] = cache_summary
+            logger.info(f"Similarity cache: {cache_summary['lookups']} lookups, {cache_summary['hit_rate']:.1%} hit rate "
+                        f"({cache_summary['memory_hits']} memory, {cache_summary['disk_hits']} disk, {cache_summary['misses']} computed)")
+            
+            logger.info(f"Enhanced matching completed: {matched_shipments}/{len(shipments_df)} shipments matched "
+                        f"with {len(all_matches)} matches ({match_rate:.1f}%)")
             logger.info(f"Layer distribution: {layer_summary}")
             
             return results
@@ -718,13 +1019,25 @@ def main():
     parser = argparse.ArgumentParser(description="Enhanced matching engine with 4-layer approach")
     parser.add_argument("--customer", required=True, help="Customer name")
     parser.add_argument("--po", help="PO number (optional)")
+    parser.add_argument("--assignment-mode", choices=['greedy', 'optimal'], default='greedy',
+                        help="Greedy per-shipment selection or capacity-aware optimal assignment per style/color block")
+    parser.add_argument("--max-split-orders", type=int, default=DEFAULT_MAX_ORDERS,
+                        help="Maximum number of orders one shipment can be split across in Layer 3")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Match only shipments added or changed since the last completed batch")
     
     args = parser.parse_args()
     
     try:
-        engine = EnhancedMatchingEngine()
-        results = engine.run_enhanced_matching(args.customer, args.po)
-        
+        engine = EnhancedMatchingEngine(assignment_mode=args.assignment_mode, max_split_orders=args.max_split_orders)
+        results = engine.run_enhanced_matching(args.customer, args.po, incremental=args.incremental)
+        engine.summary_refresher.flush()
+
+        if results['status'] == 'NO_DATA':
+            print(f"\nℹ️  Nothing to match ({results['run_mode'].lower()} run): "
+                  f"{results['total_orders']} orders, {results['total_shipments']} shipments")
+            return 0
+
         print(f"\n🎉 Enhanced matching completed!")
         print(f"📊 Results: {results['total_matches']}/{results['total_shipments']} matches ({results['match_rate']:.1f}%)")
         print(f"🎯 Layer Distribution:")
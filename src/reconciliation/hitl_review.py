@@ -23,7 +23,7 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent.parent))
 from auth_helper import get_connection_string
-import pyodbc
+from utils import db_pool
 
 # Configure logging
 logging.basicConfig(
@@ -36,7 +36,7 @@ logger = logging.getLogger(__name__)
 def execute_query_with_auth(query: str, params: list = None):
     """Execute query using auth_helper connection"""
     try:
-        with pyodbc.connect(get_connection_string()) as conn:
+        with db_pool.connect(get_connection_string()) as conn:
             df = pd.read_sql(query, conn, params=params or [])
             return df.to_dict('records') if not df.empty else []
     except Exception as e:
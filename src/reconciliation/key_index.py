@@ -0,0 +1,125 @@
+"""
+Composite Key Index
+Columnar, integer-coded key join shared by the exact-match layers
+"""
+
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+
+def format_key(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+    """
+    Build 'A|B|C' keys exactly as f"{row[a]}|{row[b]}|{row[c]}" would,
+    including the 'None'/'nan' renderings of missing values.
+    """
+    key = df[columns[0]].astype(str)
+    for column in columns[1:]:
+        key = key + '|' + df[column].astype(str)
+    return key
+
+
+def normalized_key(df: pd.DataFrame, fields: List[str]) -> pd.Series:
+    """
+    Build composite keys with trim/upper/space-collapse normalization.
+    Fields absent from the frame and missing values are skipped; rows without
+    any key part get NaN.
+    """
+    key = pd.Series(np.nan, index=df.index, dtype=object)
+    for field in fields:
+        if field not in df.columns:
+            continue
+        values = df[field]
+        part = values.astype(str).str.strip().str.upper().str.split().str.join(' ')
+        part = part.where(values.notna())
+        joined = key + '|' + part
+        key = joined.where(key.notna() & part.notna(), key.fillna(part))
+    return key
+
+
+def factorize_values(values: pd.Series):
+    """
+    Factorize a column keeping missing values as their own vocabulary entry.
+    The vocabulary holds the original objects (None stays None rather than
+    becoming NaN) so callers see exactly what a row loop would have seen.
+    """
+    codes, _ = pd.factorize(values, use_na_sentinel=False)
+    _, first_seen = np.unique(codes, return_index=True)
+    return codes, list(np.asarray(values, dtype=object)[first_seen])
+
+
+def pairwise_apply(func: Callable, left: pd.Series, right: pd.Series) -> np.ndarray:
+    """
+    Evaluate func(left[i], right[i]) once per unique (left, right) value pair
+    and broadcast the results back to every row.
+    """
+    if len(left) == 0:
+        return np.zeros(0, dtype=np.float64)
+
+    left_codes, left_vocab = factorize_values(left)
+    right_codes, right_vocab = factorize_values(right)
+    combined = left_codes.astype(np.int64) * len(right_vocab) + right_codes
+    unique_pairs, inverse = np.unique(combined, return_inverse=True)
+
+    values = np.array([
+        func(left_vocab[code // len(right_vocab)], right_vocab[code % len(right_vocab)])
+        for code in unique_pairs
+    ], dtype=np.float64)
+    return values[inverse.reshape(-1)]
+
+
+class CompositeKeyIndex:
+    """
+    Integer-coded index over order keys.
+
+    Order keys are factorized once; shipment keys are resolved to the same codes
+    with a single hash lookup and the shipment/order pairs are produced by one
+    merge on the integer codes, instead of building per-row dictionaries.
+    """
+
+    def __init__(self, order_keys: pd.Series):
+        codes, uniques = pd.factorize(order_keys)
+        self.vocabulary = pd.Index(uniques)
+        self.order_codes = pd.DataFrame({
+            'code': codes,
+            'order_pos': np.arange(len(codes), dtype=np.int64)
+        })
+        self.order_codes = self.order_codes[self.order_codes['code'] >= 0]
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def join(self, shipment_keys: pd.Series) -> pd.DataFrame:
+        """
+        Return every (ship_pos, order_pos) pair sharing a key, sorted by
+        shipment position and then order position (the original scan order).
+        The shared key's integer code is kept in 'code' so callers can block on it.
+        """
+        codes = self.vocabulary.get_indexer(shipment_keys) if len(self.vocabulary) else \
+            np.full(len(shipment_keys), -1)
+        ships = pd.DataFrame({
+            'code': codes,
+            'ship_pos': np.arange(len(shipment_keys), dtype=np.int64)
+        })
+        ships = ships[ships['code'] >= 0]
+
+        pairs = ships.merge(self.order_codes, on='code', how='inner')
+        pairs = pairs.sort_values(['ship_pos', 'order_pos'], kind='stable').reset_index(drop=True)
+        return pairs[['ship_pos', 'order_pos', 'code']]
+
+    @staticmethod
+    def first_per_shipment(pairs: pd.DataFrame) -> pd.DataFrame:
+        """Keep the first order (in frame order) for each shipment"""
+        return pairs.drop_duplicates(subset=['ship_pos'], keep='first').reset_index(drop=True)
+
+    @staticmethod
+    def best_per_shipment(pairs: pd.DataFrame, score_col: str) -> pd.DataFrame:
+        """
+        Keep the highest scoring order for each shipment; ties go to the
+        earliest order, as with a strict '>' scan.
+        """
+        if pairs.empty:
+            return pairs
+        best_rows = pairs.groupby('ship_pos', sort=True)[score_col].idxmax()
+        return pairs.loc[best_rows.to_numpy()].reset_index(drop=True)
@@ -192,6 +192,7 @@ def main():
     parser.add_argument("--customer", required=True, help="Customer name")
     parser.add_argument("--po", help="PO number (optional)")
     parser.add_argument("--fuzzy-threshold", type=float, default=0.85, help="Threshold for fuzzy matching (0.0-1.0)")
+    parser.add_argument("--max-candidate-pairs", type=int, default=250000, help="Candidate pair budget for the blocking passes")
     args = parser.parse_args()
     
     try:
@@ -229,7 +230,10 @@ def main():
                 'color': '2.0',
                 'size': '1.0'
             },
-            'key_attributes': ['style', 'color']
+            'key_attributes': ['style', 'color'],
+            'blocking': {
+                'max_candidate_pairs': str(args.max_candidate_pairs)
+            }
         }
         
         # Run reconciliation
@@ -255,6 +259,11 @@ def main():
         print(f"Matched: {results['matched_count']} ({results['match_percentage']}%)")
         print(f"Uncertain: {results['uncertain_count']}")
         print(f"Unmatched: {results['unmatched_count']}")
+        indexing = results['indexing']
+        print(f"Candidate Pairs: {indexing['candidate_pairs']} of {indexing['full_pairs']} "
+              f"(reduction ratio {indexing['reduction_ratio']:.4f})")
+        if indexing['exact_match_recall'] is not None:
+            print(f"Exact Match Recall: {indexing['exact_match_recall']:.1%} of {indexing['exact_matches']}")
         
     except Exception as e:
         logger.error(f"Error in reconciliation: {e}", exc_info=True)
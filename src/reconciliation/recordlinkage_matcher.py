@@ -12,7 +12,8 @@ from src.utils.db import (
     get_customer_match_config,
     save_reconciliation_result,
     save_attribute_scores,
-    add_to_hitl_queue
+    add_to_hitl_queue,
+    ReconciliationResultWriter
 )
 
 # Configure logging
@@ -22,6 +23,45 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Multi-pass indexing settings, overridden per customer by 'blocking' rows in
+# customer_match_config. exact_blocks is a comma-separated list of passes, '+'
+# joining the columns of one pass; a style_window or color_ngram of 0 turns
+# that pass off.
+BLOCKING_DEFAULTS = {
+    'exact_blocks': 'style',
+    'style_window': '7',
+    'color_ngram': '3',
+    'color_min_shared': '2',
+    'color_block_on': 'po_number',
+    'max_candidate_pairs': '250000',
+    'full_comparison_below': '10000'
+}
+
+# Attributes that must all agree for a pair to count as a known exact match
+EXACT_MATCH_ATTRIBUTES = ['po_number', 'style', 'color', 'size']
+
+
+def _alphanumeric(values: pd.Series) -> pd.Series:
+    return values.fillna('').astype(str).str.upper().str.replace(r'[^A-Z0-9]', '', regex=True)
+
+
+def _ngram_keys(values: pd.Series, n: int) -> pd.Series:
+    """One row per (record, character n-gram); values shorter than n are their own key"""
+    grams = _alphanumeric(values).map(
+        lambda text: sorted({text[i:i + n] for i in range(len(text) - n + 1)}) if len(text) > n else [text] if text else []
+    )
+    return grams.explode().dropna()
+
+
+def _present(df: pd.DataFrame) -> pd.Series:
+    """Rows where every column has a non-empty value"""
+    return (df.notna() & df.ne('')).all(axis=1)
+
+
+def _pair_index(order_ids, shipment_ids) -> pd.MultiIndex:
+    """Candidate pairs with the unnamed levels recordlinkage indexers produce"""
+    return pd.MultiIndex.from_arrays([order_ids, shipment_ids], names=[None, None])
+
 
 class RecordLinkageMatcher:
     """
@@ -53,8 +93,21 @@ class RecordLinkageMatcher:
         for key, value in self.config.get('attribute_weight', {}).items():
             self.weights[key] = float(value)
         
+        # Extract multi-pass indexing settings from config
+        blocking = {**BLOCKING_DEFAULTS, **self.config.get('blocking', {})}
+        self.blocking = {
+            'exact_blocks': [[column.strip() for column in block.split('+') if column.strip()]
+                             for block in str(blocking['exact_blocks']).split(',') if block.strip()],
+            'style_window': int(blocking['style_window']),
+            'color_ngram': int(blocking['color_ngram']),
+            'color_min_shared': int(blocking['color_min_shared']),
+            'color_block_on': [column.strip() for column in str(blocking['color_block_on']).split('+') if column.strip()],
+            'max_candidate_pairs': int(blocking['max_candidate_pairs']),
+            'full_comparison_below': int(blocking['full_comparison_below'])
+        }
+        self.indexing_stats = {}
+        
         # Initialize recordlinkage
-        self.indexer = recordlinkage.Index()
         self.compare = recordlinkage.Compare()
     
     def prepare_data(self, orders_df: pd.DataFrame, shipments_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
@@ -92,40 +145,175 @@ class RecordLinkageMatcher:
         
         return orders, shipments
     
-    def build_comparison_space(self, orders_df: pd.DataFrame, shipments_df: pd.DataFrame) -> recordlinkage.Index:
+    def build_comparison_space(self, orders_df: pd.DataFrame, shipments_df: pd.DataFrame) -> pd.MultiIndex:
         """
         Build the comparison space (candidate pairs) for matching.
         
+        Small inputs are compared in full. Otherwise the candidates are the
+        union of the indexing passes: exact blocks, a sorted-neighbourhood
+        window over the normalized style, and blocks on shared colour n-grams
+        (within the same PO). Past max_candidate_pairs, pairs found by the most
+        passes are kept, and a full comparison larger than the budget is never
+        built. Pair counts, the reduction ratio and recall against the known
+        exact matches are kept in indexing_stats.
+        
         Args:
             orders_df: DataFrame with orders data
             shipments_df: DataFrame with shipments data
             
         Returns:
-            Indexer with candidate pairs
+            MultiIndex of (order index, shipment index) candidate pairs
         """
         logger.info(f"Building comparison space for {len(orders_df)} orders and {len(shipments_df)} shipments")
         
-        # If PO numbers are available in both datasets, use them for blocking
-        if 'po_number' in orders_df.columns and 'po_number' in shipments_df.columns:
-            self.indexer.block('po_number')
-            logger.info("Using PO number for blocking")
-        
-        # Add style blocking if available
-        if 'style' in orders_df.columns and 'style' in shipments_df.columns:
-            self.indexer.block('style')
-            logger.info("Using style for blocking")
-        
-        # If few records or no blocking keys available, use full comparison
-        if len(orders_df) * len(shipments_df) < 10000 or len(self.indexer.algorithms) == 0:
-            self.indexer.full()
+        full_pairs = len(orders_df) * len(shipments_df)
+        passes = []
+        if full_pairs >= self.blocking['full_comparison_below']:
+            passes = self._index_passes(orders_df, shipments_df)
+        
+        # If few records or no blocking keys available, use full comparison,
+        # unless the full product alone would exceed the candidate pair budget
+        if not passes and full_pairs <= self.blocking['max_candidate_pairs']:
+            full = recordlinkage.Index()
+            full.full()
+            passes = [('full', full.index(orders_df, shipments_df))]
             logger.info("Using full comparison space")
         
-        # Build pairs
-        candidate_pairs = self.indexer.index(orders_df, shipments_df)
-        logger.info(f"Generated {len(candidate_pairs)} candidate pairs")
+        if passes:
+            candidate_pairs, dropped = self._union_within_budget(passes)
+        else:
+            logger.warning(f"No indexing pass applies for {self.customer_name} and the full comparison space of "
+                           f"{full_pairs} pairs exceeds the budget of {self.blocking['max_candidate_pairs']}; "
+                           f"no pairs will be compared")
+            candidate_pairs, dropped = _pair_index([], []), full_pairs
+        
+        self.indexing_stats = {
+            'passes': {name: len(pairs) for name, pairs in passes},
+            'candidate_pairs': len(candidate_pairs),
+            'dropped_by_budget': dropped,
+            'full_pairs': full_pairs,
+            'reduction_ratio': 1 - len(candidate_pairs) / full_pairs if full_pairs else 0.0,
+            **self._exact_match_recall(orders_df, shipments_df, candidate_pairs)
+        }
+        
+        stats = self.indexing_stats
+        logger.info(f"Generated {stats['candidate_pairs']} candidate pairs from "
+                    + ", ".join(f"{name}: {count}" for name, count in stats['passes'].items())
+                    + f" (reduction ratio {stats['reduction_ratio']:.4f})")
+        if stats['exact_match_recall'] is not None:
+            logger.info(f"Candidate pairs cover {stats['exact_match_recall']:.1%} of "
+                        f"{stats['exact_matches']} known exact matches")
+        if dropped:
+            logger.warning(f"Candidate pair budget of {self.blocking['max_candidate_pairs']} "
+                           f"for {self.customer_name} dropped {dropped} pairs")
         
         return candidate_pairs
     
+    def _index_passes(self, orders_df: pd.DataFrame, shipments_df: pd.DataFrame) -> List[Tuple[str, pd.MultiIndex]]:
+        """Candidate pairs of each configured indexing pass, most specific first"""
+        passes = []
+        
+        # Exact blocks; empty keys never block together
+        for columns in self.blocking['exact_blocks']:
+            if not all(column in orders_df.columns and column in shipments_df.columns for column in columns):
+                continue
+            indexer = recordlinkage.Index()
+            indexer.block(columns)
+            orders, shipments = orders_df[columns], shipments_df[columns]
+            pairs = indexer.index(orders[_present(orders)], shipments[_present(shipments)])
+            passes.append(('block:' + '+'.join(columns), pairs))
+        
+        # Sorted neighbourhood on style without punctuation or spacing, so
+        # near-identical (typo'd) styles land in the same window
+        window = self.blocking['style_window']
+        if window > 0 and 'style' in orders_df.columns and 'style' in shipments_df.columns:
+            indexer = recordlinkage.Index()
+            indexer.sortedneighbourhood('style_key', window=window if window % 2 else window + 1)
+            orders = _alphanumeric(orders_df['style']).to_frame('style_key')
+            shipments = _alphanumeric(shipments_df['style']).to_frame('style_key')
+            pairs = indexer.index(orders[_present(orders)], shipments[_present(shipments)])
+            passes.append(('sorted_neighbourhood:style', pairs))
+        
+        if self.blocking['color_ngram'] > 0 and 'color' in orders_df.columns and 'color' in shipments_df.columns:
+            passes.append(('ngram:color', self._color_ngram_pairs(orders_df, shipments_df)))
+        
+        return passes
+    
+    def _color_ngram_pairs(self, orders_df: pd.DataFrame, shipments_df: pd.DataFrame) -> pd.MultiIndex:
+        """
+        Pairs sharing at least color_min_shared colour n-grams (or every n-gram
+        of the shorter colour), within the same color_block_on values.
+        """
+        n = self.blocking['color_ngram']
+        scope = [column for column in self.blocking['color_block_on']
+                 if column in orders_df.columns and column in shipments_df.columns]
+        
+        # Without a scope the n-grams are merged across the whole book
+        full_pairs = len(orders_df) * len(shipments_df)
+        if not scope and full_pairs > self.blocking['max_candidate_pairs']:
+            logger.warning(f"Skipping colour n-gram pass for {self.customer_name}: no color_block_on column "
+                           f"is present and the {full_pairs} pair product exceeds the candidate pair budget")
+            return _pair_index([], [])
+        
+        keys = []
+        for df, id_column in ((orders_df, 'order_id'), (shipments_df, 'shipment_id')):
+            grams = _ngram_keys(df['color'], n)
+            frame = pd.DataFrame({id_column: grams.index, 'gram': grams.to_numpy()})
+            frame[f'{id_column}_grams'] = frame.groupby(id_column)['gram'].transform('size')
+            for column in scope:
+                frame[column] = df.loc[grams.index, column].to_numpy()
+            keys.append(frame[_present(frame[scope])])
+        
+        shared = keys[0].merge(keys[1], on=['gram', *scope])
+        if shared.empty:
+            return _pair_index([], [])
+        counts = shared.groupby(['order_id', 'shipment_id'], sort=False).agg(
+            shared=('gram', 'size'), order_grams=('order_id_grams', 'first'), shipment_grams=('shipment_id_grams', 'first')
+        )
+        required = np.minimum(self.blocking['color_min_shared'],
+                              np.minimum(counts['order_grams'], counts['shipment_grams']))
+        counts = counts[counts['shared'] >= required]
+        return _pair_index(counts.index.get_level_values(0), counts.index.get_level_values(1))
+    
+    def _union_within_budget(self, passes: List[Tuple[str, pd.MultiIndex]]) -> Tuple[pd.MultiIndex, int]:
+        """
+        Union of the passes' pairs. Over max_candidate_pairs, pairs found by
+        more passes are kept first, then those from earlier passes.
+        """
+        if len(passes) == 1 and len(passes[0][1]) <= self.blocking['max_candidate_pairs']:
+            return passes[0][1], 0
+        
+        found = pd.concat([
+            pd.DataFrame({'order_id': pairs.get_level_values(0), 'shipment_id': pairs.get_level_values(1), 'pass': rank})
+            for rank, (_, pairs) in enumerate(passes)
+        ], ignore_index=True)
+        votes = found.groupby(['order_id', 'shipment_id'], sort=False)['pass'].agg(['size', 'min'])
+        
+        dropped = max(len(votes) - self.blocking['max_candidate_pairs'], 0)
+        if dropped:
+            votes = votes.sort_values(['size', 'min'], ascending=[False, True], kind='stable')
+            votes = votes.iloc[:self.blocking['max_candidate_pairs']]
+        return _pair_index(votes.index.get_level_values(0), votes.index.get_level_values(1)), dropped
+    
+    @staticmethod
+    def _exact_match_recall(orders_df: pd.DataFrame, shipments_df: pd.DataFrame,
+                            candidate_pairs: pd.MultiIndex) -> Dict[str, Any]:
+        """Known exact matches (all present EXACT_MATCH_ATTRIBUTES equal) and the share of them that are candidates"""
+        columns = [column for column in EXACT_MATCH_ATTRIBUTES
+                   if column in orders_df.columns and column in shipments_df.columns]
+        if not columns:
+            return {'exact_matches': 0, 'exact_match_recall': None}
+        
+        orders = orders_df.loc[_present(orders_df[columns]), columns]
+        shipments = shipments_df.loc[_present(shipments_df[columns]), columns]
+        known = orders.rename_axis('order_id').reset_index().merge(
+            shipments.rename_axis('shipment_id').reset_index(), on=columns)
+        if known.empty:
+            return {'exact_matches': 0, 'exact_match_recall': None}
+        
+        found = _pair_index(known['order_id'], known['shipment_id']).isin(candidate_pairs)
+        return {'exact_matches': len(known), 'exact_match_recall': float(found.mean())}
+    
     def configure_comparisons(self) -> None:
         """
         Configure the comparison methods for different attributes.
@@ -271,8 +459,35 @@ class RecordLinkageMatcher:
         
         return matches, uncertain, unmatched_shipments
     
+    def _attribute_scores(self, score_columns: List[str], scores: np.ndarray,
+                          order_data: Dict, shipment_data: Dict) -> List[Dict[str, Any]]:
+        """Per-attribute score rows for one compared pair"""
+        attribute_scores = []
+        for column, score in zip(score_columns, scores):
+            attribute_name = column.split('_')[0]
+            attribute_scores.append({
+                'attribute_name': attribute_name,
+                'order_value': str(order_data.get(attribute_name, '')),
+                'shipment_value': str(shipment_data.get(attribute_name, '')),
+                'match_score': float(score),
+                'match_method': column.split('_')[1] if '_' in column else 'exact',
+                'is_key_attribute': attribute_name in self.config.get('key_attributes', []),
+                'weight': self.weights.get(attribute_name, 1.0)
+            })
+        return attribute_scores
+    
+    def _save_result_immediately(self, attribute_scores: Optional[List[Dict[str, Any]]] = None,
+                                 hitl_priority: Optional[int] = None, **result) -> None:
+        """Unbatched path: one result, its scores and queue entry, each in its own round trip"""
+        reconciliation_id = save_reconciliation_result(**result)
+        if attribute_scores is not None:
+            save_attribute_scores(reconciliation_id, attribute_scores)
+        if hitl_priority is not None:
+            add_to_hitl_queue(reconciliation_id, hitl_priority)
+    
     def save_results(self, matches: pd.DataFrame, uncertain: pd.DataFrame, unmatched: pd.DataFrame, 
-                    orders_df: pd.DataFrame, shipments_df: pd.DataFrame, po_number: str) -> Dict[str, int]:
+                    orders_df: pd.DataFrame, shipments_df: pd.DataFrame, po_number: str,
+                    batched: bool = True, flush_size: int = 5000, transactional: bool = False) -> Dict[str, int]:
         """
         Save matching results to the database.
         
@@ -283,6 +498,10 @@ class RecordLinkageMatcher:
             orders_df: Original orders DataFrame
             shipments_df: Original shipments DataFrame
             po_number: PO number for this reconciliation
+            batched: Buffer rows and write them in bulk through one connection
+                (False writes each result, score list and queue entry separately)
+            flush_size: Results per bulk flush
+            transactional: Commit all batched flushes together, or none on failure
             
         Returns:
             Dictionary with counts of saved records
@@ -296,120 +515,78 @@ class RecordLinkageMatcher:
             'hitl_queue': 0
         }
         
-        # Save matches
-        for (order_idx, shipment_idx), row in matches.iterrows():
-            order_data = orders_df.loc[order_idx].to_dict()
-            shipment_data = shipments_df.loc[shipment_idx].to_dict()
-            
-            # Create match details
-            match_details = {
-                'overall_score': float(row['overall_score']),
-                'order_data': {k: v for k, v in order_data.items() if k != 'id'},
-                'shipment_data': {k: v for k, v in shipment_data.items() if k != 'id'}
-            }
-            
-            # Save reconciliation result
-            reconciliation_id = save_reconciliation_result(
-                customer_name=self.customer_name,
-                order_id=order_data.get('id'),
-                shipment_id=shipment_data.get('id'),
-                po_number=po_number,
-                match_status='matched',
-                confidence_score=float(row['overall_score']),
-                match_method=row['match_method'],
-                match_details=match_details
-            )
-            
-            # Save attribute scores
-            attribute_scores = []
-            for column in row.index:
-                if column not in ['match_status', 'match_method', 'overall_score'] and not column.endswith('_weighted'):
-                    attribute_name = column.split('_')[0]
-                    attribute_scores.append({
-                        'attribute_name': attribute_name,
-                        'order_value': str(order_data.get(attribute_name, '')),
-                        'shipment_value': str(shipment_data.get(attribute_name, '')),
-                        'match_score': float(row[column]),
-                        'match_method': column.split('_')[1] if '_' in column else 'exact',
-                        'is_key_attribute': attribute_name in self.config.get('key_attributes', []),
-                        'weight': self.weights.get(attribute_name, 1.0)
-                    })
-            
-            save_attribute_scores(reconciliation_id, attribute_scores)
-            saved_counts['matched'] += 1
-        
-        # Save uncertain matches and add to HITL queue
-        for (order_idx, shipment_idx), row in uncertain.iterrows():
-            order_data = orders_df.loc[order_idx].to_dict()
-            shipment_data = shipments_df.loc[shipment_idx].to_dict()
-            
-            # Create match details
-            match_details = {
-                'overall_score': float(row['overall_score']),
-                'order_data': {k: v for k, v in order_data.items() if k != 'id'},
-                'shipment_data': {k: v for k, v in shipment_data.items() if k != 'id'}
-            }
-            
-            # Save reconciliation result
-            reconciliation_id = save_reconciliation_result(
-                customer_name=self.customer_name,
-                order_id=order_data.get('id'),
-                shipment_id=shipment_data.get('id'),
-                po_number=po_number,
-                match_status='uncertain',
-                confidence_score=float(row['overall_score']),
-                match_method='recordlinkage',
-                match_details=match_details
-            )
-            
-            # Save attribute scores
-            attribute_scores = []
-            for column in row.index:
-                if column not in ['match_status', 'match_method', 'overall_score'] and not column.endswith('_weighted'):
-                    attribute_name = column.split('_')[0]
-                    attribute_scores.append({
-                        'attribute_name': attribute_name,
-                        'order_value': str(order_data.get(attribute_name, '')),
-                        'shipment_value': str(shipment_data.get(attribute_name, '')),
-                        'match_score': float(row[column]),
-                        'match_method': column.split('_')[1] if '_' in column else 'exact',
-                        'is_key_attribute': attribute_name in self.config.get('key_attributes', []),
-                        'weight': self.weights.get(attribute_name, 1.0)
-                    })
-            
-            save_attribute_scores(reconciliation_id, attribute_scores)
-            
-            # Calculate priority based on confidence score
-            # Higher scores get higher priority
-            priority = min(int(row['overall_score'] * 10), 9) + 1
-            
-            # Add to HITL queue
-            add_to_hitl_queue(reconciliation_id, priority)
-            
-            saved_counts['uncertain'] += 1
-            saved_counts['hitl_queue'] += 1
-        
-        # Save unmatched shipments
-        for idx, row in unmatched.iterrows():
-            shipment_data = row.to_dict()
-            
-            # Save reconciliation result
-            reconciliation_id = save_reconciliation_result(
-                customer_name=self.customer_name,
-                order_id=None,
-                shipment_id=shipment_data.get('id'),
-                po_number=po_number,
-                match_status='unmatched',
-                confidence_score=0.0,
-                match_method='recordlinkage',
-                match_details={'shipment_data': shipment_data}
-            )
+        writer = ReconciliationResultWriter(flush_size, transactional) if batched else None
+        save = writer.add_result if batched else self._save_result_immediately
+        
+        try:
+            # Save matches, and uncertain matches with a HITL queue entry
+            for match_status, pairs in (('matched', matches), ('uncertain', uncertain)):
+                if pairs.empty:
+                    continue
+                
+                score_columns = [column for column in pairs.columns
+                                 if column not in ['match_status', 'match_method', 'overall_score']
+                                 and not column.endswith('_weighted')]
+                order_records = orders_df.loc[pairs.index.get_level_values(0)].to_dict('records')
+                shipment_records = shipments_df.loc[pairs.index.get_level_values(1)].to_dict('records')
+                overall_scores = pairs['overall_score'].to_numpy(dtype=float)
+                score_values = pairs[score_columns].to_numpy(dtype=float)
+                methods = pairs['match_method'].tolist() if match_status == 'matched' else ['recordlinkage'] * len(pairs)
+                
+                for order_data, shipment_data, overall_score, scores, method in zip(
+                        order_records, shipment_records, overall_scores, score_values, methods):
+                    # Create match details
+                    match_details = {
+                        'overall_score': float(overall_score),
+                        'order_data': {k: v for k, v in order_data.items() if k != 'id'},
+                        'shipment_data': {k: v for k, v in shipment_data.items() if k != 'id'}
+                    }
+                    
+                    # Higher scores get higher HITL priority
+                    priority = min(int(overall_score * 10), 9) + 1 if match_status == 'uncertain' else None
+                    
+                    save(
+                        customer_name=self.customer_name,
+                        order_id=order_data.get('id'),
+                        shipment_id=shipment_data.get('id'),
+                        po_number=po_number,
+                        match_status=match_status,
+                        confidence_score=float(overall_score),
+                        match_method=method,
+                        match_details=match_details,
+                        attribute_scores=self._attribute_scores(score_columns, scores, order_data, shipment_data),
+                        hitl_priority=priority
+                    )
+                    
+                    saved_counts[match_status] += 1
+                    if priority is not None:
+                        saved_counts['hitl_queue'] += 1
             
-            # Add to HITL queue with low priority
-            add_to_hitl_queue(reconciliation_id, 3)
+            # Save unmatched shipments, queued for review with low priority
+            for shipment_data in unmatched.to_dict('records'):
+                save(
+                    customer_name=self.customer_name,
+                    order_id=None,
+                    shipment_id=shipment_data.get('id'),
+                    po_number=po_number,
+                    match_status='unmatched',
+                    confidence_score=0.0,
+                    match_method='recordlinkage',
+                    match_details={'shipment_data': shipment_data},
+                    hitl_priority=3
+                )
+                
+                saved_counts['unmatched'] += 1
+                saved_counts['hitl_queue'] += 1
             
-            saved_counts['unmatched'] += 1
-            saved_counts['hitl_queue'] += 1
+            if writer is not None:
+                write_stats = writer.close()
+                logger.info(f"Wrote {write_stats['results']} results, {write_stats['scores']} attribute scores in "
+                            f"{write_stats['flushes']} flushes ({write_stats['round_trips']} round trips)")
+        except Exception:
+            if writer is not None:
+                writer.abort()
+            raise
         
         logger.info(f"Saved {saved_counts['matched']} matches, {saved_counts['uncertain']} uncertain, "
                    f"{saved_counts['unmatched']} unmatched, {saved_counts['hitl_queue']} to HITL queue")
@@ -455,7 +632,8 @@ def reconcile_with_recordlinkage(
         'uncertain_count': len(uncertain),
         'unmatched_count': len(unmatched),
         'match_percentage': round(len(matches) / len(shipments_df) * 100, 2) if len(shipments_df) > 0 else 0,
-        'saved_counts': saved_counts
+        'saved_counts': saved_counts,
+        'indexing': matcher.indexing_stats
     }
     
     logger.info(f"Reconciliation complete for {customer_name}, PO: {po_number}")
@@ -0,0 +1,293 @@
+"""
+Similarity Cache
+Two-tier (in-process LRU + local SQLite) cache for fuzzy string similarity scores
+"""
+
+import os
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+import sys
+
+from rapidfuzz import fuzz, process
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+logger = logging.getLogger(__name__)
+
+# Disk tier location; set SIMILARITY_CACHE_PATH to an empty string for memory only
+DEFAULT_CACHE_PATH = os.getenv(
+    "SIMILARITY_CACHE_PATH",
+    str(project_root / "cache" / "similarity_cache.sqlite")
+)
+
+_shared_cache = None
+
+
+def _normalize(value, scorer_name: str) -> str:
+    """
+    Cache-key form of a compared value. Missing values become '' (rapidfuzz
+    scores None/NaN as 0, as it does ''); token-based scorers split on
+    whitespace, so runs of whitespace are collapsed for them without changing
+    the score.
+    """
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    text = str(value)
+    if scorer_name.startswith('token_'):
+        text = ' '.join(text.split())
+    return text
+
+
+class SimilarityCache:
+    """
+    Caches scorer(a, b) results keyed on (scorer name, normalized a, normalized b).
+
+    Lookups go to an in-process LRU dictionary first, then to a local SQLite
+    table that persists across runs, and only then to rapidfuzz. New scores are
+    buffered and written in batches; the disk tier evicts its least recently
+    used rows once it grows past max_disk_entries. Pairs are stored in sorted
+    order because the scorers used here are symmetric.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH, max_memory_entries: int = 200_000,
+                 max_disk_entries: int = 5_000_000, flush_every: int = 5_000):
+        self.path = Path(path) if path else None
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.flush_every = flush_every
+
+        self._memory: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._pending: Dict[Tuple[str, str, str], float] = {}
+        self._touched = set()
+        self._lock = threading.RLock()
+        self._conn = None
+        self._conn_pid = None
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0,
+                      'memory_evictions': 0, 'disk_evictions': 0}
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Open (or reopen after a fork) the SQLite tier"""
+        if self.path is None:
+            return None
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS similarity_cache (
+                    scorer TEXT NOT NULL,
+                    a TEXT NOT NULL,
+                    b TEXT NOT NULL,
+                    score REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (scorer, a, b)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_similarity_cache_last_used ON similarity_cache (last_used)")
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Similarity cache disk tier unavailable ({self.path}): {e}")
+            self.path = None
+            return None
+
+        self._conn, self._conn_pid = conn, os.getpid()
+        return conn
+
+    def key(self, a, b, scorer: Callable = fuzz.token_set_ratio) -> Tuple[str, str, str]:
+        """Normalized cache key for one comparison"""
+        name = scorer.__name__
+        a, b = _normalize(a, name), _normalize(b, name)
+        return (name, a, b) if a <= b else (name, b, a)
+
+    def score(self, a, b, scorer: Callable = fuzz.token_set_ratio) -> float:
+        """Return scorer(a, b) on rapidfuzz's 0-100 scale, from cache when possible"""
+        key = self.key(a, b, scorer)
+
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return cached
+
+            conn = self._connection()
+            if conn is not None:
+                row = conn.execute(
+                    "SELECT score FROM similarity_cache WHERE scorer = ? AND a = ? AND b = ?", key
+                ).fetchone()
+                if row is not None:
+                    self.stats['disk_hits'] += 1
+                    self._touched.add(key)
+                    self._remember(key, row[0])
+                    return row[0]
+
+            self.stats['misses'] += 1
+
+        value = float(scorer(key[1], key[2]))
+        with self._lock:
+            self._remember(key, value)
+            if self.path is not None:
+                self._pending[key] = value
+                if len(self._pending) >= self.flush_every:
+                    self.flush()
+        return value
+
+    def _remember(self, key: Tuple[str, str, str], value: float):
+        """Insert into the LRU tier, evicting the least recently used entries"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats['memory_evictions'] += 1
+
+    def preload(self, queries: Iterable, choices: Iterable, scorer: Callable = fuzz.token_set_ratio) -> int:
+        """
+        Score two vocabularies against each other with rapidfuzz.process.cdist
+        and write every pair to the disk tier. Returns the number of pairs stored.
+        """
+        name = scorer.__name__
+        queries = sorted({_normalize(q, name) for q in queries})
+        choices = sorted({_normalize(c, name) for c in choices})
+        if not queries or not choices:
+            return 0
+
+        matrix = process.cdist(queries, choices, scorer=scorer, workers=-1)
+        stored = 0
+        with self._lock:
+            for i, query in enumerate(queries):
+                for j, choice in enumerate(choices):
+                    key = (name, query, choice) if query <= choice else (name, choice, query)
+                    self._pending[key] = float(matrix[i, j])
+                stored += len(choices)
+                if len(self._pending) >= self.flush_every:
+                    self.flush(evict=False)
+            self.flush()
+        return stored
+
+    def flush(self, evict: bool = True):
+        """Write buffered scores and last-used times to disk, then evict if over capacity"""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                self._pending.clear()
+                self._touched.clear()
+                return
+
+            now = time.time()
+            if self._pending:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO similarity_cache (scorer, a, b, score, last_used) VALUES (?, ?, ?, ?, ?)",
+                    [(*key, value, now) for key, value in self._pending.items()]
+                )
+                self._pending.clear()
+            if self._touched:
+                conn.executemany(
+                    "UPDATE similarity_cache SET last_used = ? WHERE scorer = ? AND a = ? AND b = ?",
+                    [(now, *key) for key in self._touched]
+                )
+                self._touched.clear()
+
+            if evict:
+                total = conn.execute("SELECT COUNT(*) FROM similarity_cache").fetchone()[0]
+                excess = total - self.max_disk_entries
+                if excess > 0:
+                    conn.execute("""
+                        DELETE FROM similarity_cache WHERE (scorer, a, b) IN (
+                            SELECT scorer, a, b FROM similarity_cache ORDER BY last_used LIMIT ?
+                        )
+                    """, (excess,))
+                    self.stats['disk_evictions'] += excess
+            conn.commit()
+
+    def summary(self) -> Dict:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            lookups = self.stats['memory_hits'] + self.stats['disk_hits'] + self.stats['misses']
+            disk_entries = None
+            conn = self._connection()
+            if conn is not None:
+                disk_entries = conn.execute("SELECT COUNT(*) FROM similarity_cache").fetchone()[0] + len(self._pending)
+            return {
+                **self.stats,
+                'lookups': lookups,
+                'hit_rate': (lookups - self.stats['misses']) / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'disk_entries': disk_entries
+            }
+
+    def close(self):
+        """Flush pending writes and close the SQLite tier"""
+        with self._lock:
+            if self._conn is not None and self._conn_pid == os.getpid():
+                self.flush()
+                self._conn.close()
+            self._conn = None
+
+
+def get_similarity_cache() -> SimilarityCache:
+    """Process-wide cache shared by the matchers; flushed at interpreter exit"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = SimilarityCache()
+        atexit.register(_shared_cache.close)
+    return _shared_cache
+
+
+def warm_customer(customer_name: str, po_number: str = None, cache: SimilarityCache = None) -> Dict:
+    """
+    Preload the style, color and delivery vocabularies of a customer's
+    shipments against its orders into the disk tier.
+    """
+    from src.reconciliation.enhanced_matching_engine import EnhancedMatchingEngine
+
+    cache = cache or get_similarity_cache()
+    engine = EnhancedMatchingEngine()
+    orders_df = engine.get_orders_for_matching(customer_name, po_number)
+    shipments_df = engine.get_shipments_for_matching(customer_name, po_number)
+
+    stored = {}
+    for column in ['canonical_style', 'canonical_color', 'canonical_delivery']:
+        if column in orders_df.columns and column in shipments_df.columns:
+            stored[column] = cache.preload(shipments_df[column].dropna().unique(), orders_df[column].dropna().unique())
+            logger.info(f"Warmed {column}: {stored[column]} pairs")
+    return stored
+
+
+def main():
+    """Warm up the similarity cache for a customer, or report its statistics"""
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Similarity cache maintenance")
+    parser.add_argument("--customer", help="Customer whose style/color/delivery vocabularies to preload")
+    parser.add_argument("--po", help="PO number (optional)")
+    parser.add_argument("--path", default=DEFAULT_CACHE_PATH, help="SQLite cache file")
+    parser.add_argument("--max-entries", type=int, default=5_000_000, help="Disk tier capacity")
+    args = parser.parse_args()
+
+    cache = SimilarityCache(path=args.path, max_disk_entries=args.max_entries)
+    if args.customer:
+        stored = warm_customer(args.customer, args.po, cache)
+        print(f"Preloaded {sum(stored.values())} pairs for {args.customer}")
+    cache.flush()
+    summary = cache.summary()
+    print(f"Cache: {summary['disk_entries']} entries on disk at {cache.path}")
+    cache.close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,173 @@
+"""
+Split Shipment Solver
+Bounded subset-sum search over per-(style, color) remaining order quantities
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.reconciliation.key_index import factorize_values
+
+# Default limits for the bounded search
+DEFAULT_MAX_ORDERS = 3
+DEFAULT_MAX_NODES = 50_000
+
+
+def best_subset(quantities, target: float, max_items: int = DEFAULT_MAX_ORDERS,
+                max_nodes: int = DEFAULT_MAX_NODES) -> Tuple[Tuple[int, ...], float]:
+    """
+    Find up to max_items quantities whose sum is closest to target.
+
+    Depth-first search over the quantities sorted largest first. A branch is
+    pruned when it already overshoots by more than the best gap found so far, or
+    when even the largest quantities still available cannot bring it within that
+    gap. The search stops on an exact fit or after max_nodes expansions and
+    returns the best combination seen. Ties prefer fewer items, then the larger
+    (earlier) quantities.
+
+    Args:
+        quantities: Candidate quantities; non-positive values are ignored
+        target: Quantity to close
+        max_items: Maximum number of quantities to combine
+        max_nodes: Expansion budget for the search
+
+    Returns:
+        (positions into quantities, their total); an empty tuple when no
+        combination gets closer to target than taking nothing
+    """
+    values = np.asarray(quantities, dtype=np.float64)
+    positions = np.flatnonzero(values > 0)
+    if target <= 0 or len(positions) == 0 or max_items <= 0:
+        return (), 0.0
+
+    order = positions[np.argsort(-values[positions], kind='stable')]
+    q = values[order]
+    n = len(q)
+    # cumulative[j] - cumulative[i] is the most q[i:j] can still add to a branch
+    cumulative = np.concatenate([[0.0], np.cumsum(q)])
+
+    # Seed with the best single order so equal-gap combinations never displace it
+    single = int(np.argmin(np.abs(q - target)))
+    best = {'gap': float(target), 'items': (), 'nodes': 0}
+    if abs(q[single] - target) < target:
+        best['gap'], best['items'] = float(abs(q[single] - target)), (single,)
+
+    def search(start: int, depth: int, partial: float, chosen: Tuple[int, ...]):
+        for i in range(start, n):
+            if best['gap'] == 0 or best['nodes'] >= max_nodes:
+                return
+            total = partial + q[i]
+            if total - target > best['gap']:
+                continue  # overshoots; smaller quantities follow
+            left = max_items - depth
+            if partial + cumulative[min(n, i + left)] - cumulative[i] < target - best['gap']:
+                return  # the largest remaining quantities cannot close the gap
+            best['nodes'] += 1
+            items = chosen + (i,)
+            gap = abs(target - total)
+            if gap < best['gap'] or (gap == best['gap'] and len(items) < len(best['items'])):
+                best['gap'], best['items'] = gap, items
+            if depth + 1 < max_items and total < target:
+                search(i + 1, depth + 1, total, items)
+
+    search(0, 0, 0.0, ())
+    picked = tuple(int(order[i]) for i in best['items'])
+    return picked, float(values[list(picked)].sum()) if picked else 0.0
+
+
+class RemainingQuantityIndex:
+    """
+    Remaining order quantity grouped by (style, color).
+
+    Orders are factorized once into style and color vocabularies and grouped by
+    their (style, color) codes, so each shipment only looks at the orders in the
+    groups its style and color are compatible with. Remaining quantities live in
+    one array that is drawn down as shipments are linked.
+    """
+
+    def __init__(self, styles: pd.Series, colors: pd.Series, remaining):
+        self.remaining = np.asarray(remaining, dtype=np.float64).copy()
+        style_codes, self.style_vocab = factorize_values(pd.Series(styles))
+        color_codes, self.color_vocab = factorize_values(pd.Series(colors))
+
+        groups = pd.DataFrame({
+            'style': style_codes,
+            'color': color_codes,
+            'order_pos': np.arange(len(self.remaining), dtype=np.int64)
+        }).groupby(['style', 'color'], sort=False)['order_pos']
+        keys, self.group_positions = [], []
+        for key, positions in groups:
+            keys.append(key)
+            self.group_positions.append(positions.to_numpy())
+        self.group_keys = np.array(keys, dtype=np.int64).reshape(-1, 2)
+        self._lookup: Dict[Tuple, int] = {
+            (self.style_vocab[s], self.color_vocab[c]): g
+            for g, (s, c) in enumerate(self.group_keys)
+        } if len(self.group_keys) else {}
+
+    def __len__(self):
+        return len(self.group_positions)
+
+    def candidates(self, style_ok: np.ndarray, color_ok: np.ndarray) -> np.ndarray:
+        """
+        Order positions with open quantity in every group whose style and color
+        are flagged compatible (boolean masks over style_vocab and color_vocab),
+        in frame order.
+        """
+        if not len(self.group_positions):
+            return np.zeros(0, dtype=np.int64)
+        groups = np.flatnonzero(style_ok[self.group_keys[:, 0]] & color_ok[self.group_keys[:, 1]])
+        if len(groups) == 0:
+            return np.zeros(0, dtype=np.int64)
+        positions = np.sort(np.concatenate([self.group_positions[g] for g in groups]))
+        return positions[self.remaining[positions] > 0]
+
+    def exact_candidates(self, style, color) -> np.ndarray:
+        """Order positions with open quantity for one exact (style, color) key"""
+        group = self._lookup.get((style, color))
+        if group is None:
+            return np.zeros(0, dtype=np.int64)
+        positions = self.group_positions[group]
+        return positions[self.remaining[positions] > 0]
+
+    def solve(self, positions: np.ndarray, target: float, max_orders: int = DEFAULT_MAX_ORDERS,
+              max_nodes: int = DEFAULT_MAX_NODES) -> Tuple[np.ndarray, float]:
+        """Best combination of up to max_orders candidate orders for target quantity"""
+        picked, total = best_subset(self.remaining[positions], target, max_orders, max_nodes)
+        return positions[list(picked)], total
+
+    def consume(self, positions: np.ndarray, quantity: float) -> np.ndarray:
+        """
+        Draw quantity down from the given orders in turn; returns the amount
+        allocated to each order (the last order absorbs any overshoot).
+        """
+        allocated = np.zeros(len(positions), dtype=np.float64)
+        left = float(quantity)
+        for i, pos in enumerate(positions):
+            take = left if i == len(positions) - 1 else min(left, self.remaining[pos])
+            allocated[i] = take
+            self.remaining[pos] = max(0.0, self.remaining[pos] - take)
+            left -= take
+        return allocated
+
+
+def classify_gap_fill(quantity_gap: float, added_quantity: float, variance_after: float) -> str:
+    """
+    Layer 3 match quality for closing a quantity gap with added order quantity.
+
+    Small gaps (<= 20 units) are careful about overshooting; larger gaps
+    prioritize closure. variance_after is the absolute percent variance left.
+    """
+    if quantity_gap <= 20:
+        if added_quantity <= quantity_gap * 1.5 and variance_after <= 15:
+            return "EXCELLENT"
+        if added_quantity <= quantity_gap * 2.0 and variance_after <= 25:
+            return "GOOD"
+        return "PARTIAL"
+    if added_quantity >= quantity_gap * 0.9 and variance_after <= 10:
+        return "EXCELLENT"
+    if added_quantity >= quantity_gap * 0.7 and variance_after <= 20:
+        return "GOOD"
+    return "PARTIAL"
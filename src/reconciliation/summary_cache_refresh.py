@@ -0,0 +1,170 @@
+"""
+Summary Cache Refresh
+Debounced, coalescing incremental refresh of shipment_summary_cache after matching sessions
+"""
+
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+import sys
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from auth_helper import get_connection_string
+from utils import db_pool
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for further requests before refreshing; overlapping sessions
+# (e.g. API jobs for several customers) are merged into one refresh
+DEFAULT_DEBOUNCE_SECONDS = float(os.getenv("SUMMARY_CACHE_DEBOUNCE", "2"))
+
+# Shipment ids per procedure call
+REFRESH_CHUNK = 5000
+
+_shared_refresher = None
+_shared_lock = threading.Lock()
+
+
+def shipment_id_list(shipment_ids: Iterable) -> List[int]:
+    """Integer shipment ids (the cache's key type), skipping values that are not integers"""
+    ids = set()
+    for value in shipment_ids:
+        try:
+            ids.add(int(str(value).strip()))
+        except (TypeError, ValueError):
+            continue
+    return sorted(ids)
+
+
+class SummaryCacheRefresher:
+    """
+    Collects the shipment ids touched by matching sessions and refreshes their
+    shipment_summary_cache rows with sp_refresh_shipment_summary_cache_ids,
+    passing the ids as a table-valued parameter.
+
+    request() only records ids and (re)starts a debounce timer; requests that
+    arrive while a refresh is running are refreshed right after it, so at most
+    one refresh runs at a time and no id is dropped. flush() refreshes
+    everything pending immediately.
+    """
+
+    def __init__(self, connect: Optional[Callable] = None, debounce_seconds: float = DEFAULT_DEBOUNCE_SECONDS,
+                 history: int = 50):
+        self.connect = connect or (lambda: db_pool.connect(get_connection_string()))
+        self.debounce_seconds = debounce_seconds
+
+        self._pending = set()
+        self._pending_requests = 0
+        self._pending_session = None
+        self._timer = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+        # Timing and row counts of recent refreshes, newest last
+        self.history = deque(maxlen=history)
+
+    def request(self, shipment_ids: Iterable, session_id: str = None) -> int:
+        """Queue shipments for refresh; returns the number of ids now pending"""
+        ids = shipment_id_list(shipment_ids)
+        if not ids:
+            return 0
+        with self._lock:
+            self._pending.update(ids)
+            self._pending_requests += 1
+            self._pending_session = session_id or self._pending_session
+            if self._timer is not None:
+                self._timer.cancel()
+            if self.debounce_seconds > 0:
+                self._timer = threading.Timer(self.debounce_seconds, self._refresh_pending)
+                self._timer.daemon = True
+                self._timer.start()
+            pending = len(self._pending)
+        if self.debounce_seconds <= 0:
+            self._refresh_pending()
+        return pending
+
+    def flush(self) -> Optional[Dict]:
+        """Refresh everything pending now (e.g. before a CLI run exits)"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return self._refresh_pending()
+
+    def _take_pending(self):
+        with self._lock:
+            ids = sorted(self._pending)
+            requests, session_id = self._pending_requests, self._pending_session
+            self._pending = set()
+            self._pending_requests = 0
+            self._pending_session = None
+            return ids, requests, session_id
+
+    def _refresh_pending(self) -> Optional[Dict]:
+        # Requests made during a refresh wait here and are merged into the next one
+        with self._refresh_lock:
+            ids, requests, session_id = self._take_pending()
+            if not ids:
+                return None
+            try:
+                stats = self.refresh(ids, session_id=session_id, coalesced_requests=requests)
+            except Exception as e:
+                logger.error(f"Summary cache refresh of {len(ids)} shipments failed: {str(e)}")
+                return None
+            logger.info(f"Summary cache refreshed: {stats['requested_shipments']} shipments from "
+                        f"{requests} request(s) in {stats['seconds']:.2f}s "
+                        f"({stats['rows_updated']} updated, {stats['rows_inserted']} inserted, "
+                        f"{stats['rows_deleted']} deleted)")
+            return stats
+
+    def refresh(self, shipment_ids: List[int], session_id: str = None, coalesced_requests: int = 1) -> Dict:
+        """Refresh the given shipments now; one procedure call per REFRESH_CHUNK ids"""
+        started = time.perf_counter()
+        totals = {'requested_shipments': 0, 'rows_processed': 0, 'rows_updated': 0,
+                  'rows_inserted': 0, 'rows_deleted': 0, 'rows_renumbered': 0, 'calls': 0}
+
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(shipment_ids), REFRESH_CHUNK):
+                rows = [(shipment_id,) for shipment_id in shipment_ids[start:start + REFRESH_CHUNK]]
+                cursor.execute(
+                    "EXEC sp_refresh_shipment_summary_cache_ids @shipment_ids = ?, "
+                    "@matching_session_id = ?, @coalesced_requests = ?",
+                    rows, session_id, coalesced_requests
+                )
+                result = cursor.fetchone()
+                totals['calls'] += 1
+                if result is not None:
+                    columns = [column[0] for column in cursor.description]
+                    for column, value in zip(columns, result):
+                        if column in totals:
+                            totals[column] += value or 0
+                conn.commit()
+
+        totals['seconds'] = time.perf_counter() - started
+        totals['session_id'] = session_id
+        totals['coalesced_requests'] = coalesced_requests
+        self.history.append(totals)
+        return totals
+
+    def close(self):
+        """Refresh what is still pending; registered at interpreter exit"""
+        self.flush()
+
+
+def get_summary_cache_refresher() -> SummaryCacheRefresher:
+    """Process-wide refresher shared by the matching engines; flushed at interpreter exit"""
+    global _shared_refresher
+    with _shared_lock:
+        if _shared_refresher is None:
+            _shared_refresher = SummaryCacheRefresher()
+            atexit.register(_shared_refresher.close)
+        return _shared_refresher
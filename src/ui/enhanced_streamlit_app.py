@@ -42,9 +42,9 @@ class EnhancedConfigManager:
         self.connection_string = get_connection_string()
         
     def get_connection(self):
-        """Get database connection"""
-        import pyodbc
-        return pyodbc.connect(self.connection_string)
+        """Get a pooled database connection"""
+        from utils import db_pool
+        return db_pool.connect(self.connection_string)
     
     def execute_query(self, query, params=None):
         """Execute query and return results as DataFrame"""
@@ -5,7 +5,6 @@ User-friendly interface for managing order-shipment matching configurations
 
 import streamlit as st
 import pandas as pd
-import pyodbc
 import json
 import yaml
 from datetime import datetime
@@ -16,6 +15,7 @@ import sys
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
 from auth_helper import get_connection_string
+from utils import db_pool, query_cache
 
 # Import enhanced matching tabs
 try:
@@ -33,10 +33,12 @@ except ImportError:
 class ConfigurationManager:
     def __init__(self):
         self.connection_string = get_connection_string()
+        # Shared across reruns; cleared when a matching session finishes
+        self.cache = query_cache.get_cache(self.connection_string)
         
     def get_connection(self):
-        """Get database connection"""
-        return pyodbc.connect(self.connection_string)
+        """Get a pooled database connection"""
+        return db_pool.connect(self.connection_string)
     
     def get_customers(self):
         """Get all customers with their configurations"""
@@ -107,6 +109,7 @@ class ConfigurationManager:
                 customer_data['id'] = result[0]
             
             conn.commit()
+            self.cache.invalidate()
             return customer_data['id']
     
     def save_column_mappings(self, customer_id, mappings):
@@ -126,6 +129,7 @@ class ConfigurationManager:
                     mapping.get('priority', 1), 'streamlit_user', 'streamlit_user')
             
             conn.commit()
+            self.cache.invalidate()
     
     def save_exclusion_rules(self, customer_id, rules):
         """Save exclusion rules for a customer"""
@@ -145,6 +149,7 @@ class ConfigurationManager:
                     rule.get('description', ''), 'streamlit_user', 'streamlit_user')
             
             conn.commit()
+            self.cache.invalidate()
     
     def save_value_mapping(self, customer_id, field_name, source_value, target_value, justification, created_by='streamlit_user'):
         """Save a value mapping for field standardization"""
@@ -155,6 +160,7 @@ class ConfigurationManager:
                 VALUES (?, ?, ?, ?, ?, 'active', ?, ?)
             """, customer_id, field_name, source_value, target_value, justification, created_by, created_by)
             conn.commit()
+            self.cache.invalidate()
     
     def get_value_mappings(self, customer_id=None, field_name=None):
         """Get value mappings with optional filtering"""
@@ -189,6 +195,7 @@ class ConfigurationManager:
                 VALUES (?, ?, ?, ?, ?, ?, ?)
             """, match_type, shipment_id, order_id, decision, justification, created_by, created_by)
             conn.commit()
+            self.cache.invalidate()
     
     def get_enhanced_matching_results(self, customer_name=None, status_filter=None):
         """Get enhanced matching results with full context for HITL review"""
@@ -325,6 +332,18 @@ class ConfigurationManager:
             else:
                 return pd.read_sql(query, conn)
     
+    def get_data_version(self):
+        """Last batch end time and newest stored result id, used to invalidate cached results"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            return tuple(cursor.execute(query_cache.DATA_VERSION_QUERY).fetchone())
+    
+    def cached_query(self, query, params=None):
+        """Execute a dashboard query through the shared result cache"""
+        self.cache.check_version(self.get_data_version)
+        return self.cache.get_or_load(query_cache.make_key(query, params),
+                                      lambda: self.execute_query(query, params))
+    
     # === ENHANCED DASHBOARD ANALYTICS METHODS ===
     
     def get_customer_summary(self):
@@ -337,7 +356,7 @@ class ConfigurationManager:
         GROUP BY status
         ORDER BY customer_count DESC
         """
-        return self.execute_query(query)
+        return self.cached_query(query)
     
     def get_shipment_summary(self):
         """Get shipment summary with match status - FIXED to count unique shipments"""
@@ -351,7 +370,7 @@ class ConfigurationManager:
         FROM stg_fm_orders_shipped_table s
         LEFT JOIN enhanced_matching_results emr ON s.shipment_id = emr.shipment_id
         """
-        return self.execute_query(query)
+        return self.cached_query(query)
     
     def get_layer_distribution(self):
         """Get match layer distribution - showing both unique shipments AND total matches"""
@@ -374,7 +393,7 @@ class ConfigurationManager:
                 ELSE 99
             END
         """
-        return self.execute_query(query)
+        return self.cached_query(query)
     
     def get_review_queue_summary(self):
         """Get items requiring human review by status - FIXED to count unique shipments"""
@@ -402,7 +421,7 @@ class ConfigurationManager:
             END
         ORDER BY affected_shipments DESC
         """
-        return self.execute_query(query)
+        return self.cached_query(query)
     
     def get_system_health_metrics(self):
         """Get system health and recent activity metrics"""
@@ -416,7 +435,7 @@ class ConfigurationManager:
             AVG(match_confidence) as avg_confidence
         FROM enhanced_matching_results
         """
-        return self.execute_query(query)
+        return self.cached_query(query)
     
     def get_customer_breakdown(self):
         """Get detailed customer activity breakdown"""
@@ -438,7 +457,7 @@ class ConfigurationManager:
         GROUP BY c.canonical_name, c.status
         ORDER BY total_matches DESC, c.canonical_name
         """
-        return self.execute_query(query)
+        return self.cached_query(query)
     
     def get_shipment_level_summary(self, customer_filter=None):
         """Get ENHANCED one-row-per-shipment summary with match indicators, confidence, and consolidated layers"""
@@ -515,7 +534,7 @@ class ConfigurationManager:
         GROUP BY s.shipment_id, s.style_code, s.color_description, s.delivery_method, s.quantity
         """
         
-        return self.execute_query(query, params)
+        return self.cached_query(query, params)
 
 def main():
     st.set_page_config(
@@ -34,17 +34,19 @@ get_connection_string = auth_helper.get_connection_string
 # Import enhanced matching engine
 sys.path.append(str(Path(project_root) / 'src' / 'reconciliation'))
 from enhanced_matching_engine import EnhancedMatchingEngine
+from utils import db_pool, query_cache
 
 class UnifiedDataManager:
     """Unified data manager for all application data needs"""
     
     def __init__(self):
         self.connection_string = get_connection_string()
+        # Shared across reruns; cleared when a matching session finishes
+        self.cache = query_cache.get_cache(self.connection_string)
         
     def get_connection(self):
-        """Get database connection"""
-        import pyodbc
-        return pyodbc.connect(self.connection_string)
+        """Get a pooled database connection"""
+        return db_pool.connect(self.connection_string)
     
     def execute_query(self, query, params=None):
         """Execute query and return results as DataFrame"""
@@ -59,8 +61,21 @@ class UnifiedDataManager:
             cursor = conn.cursor()
             cursor.execute(query, params or [])
             conn.commit()
+            self.cache.invalidate()
             return cursor.rowcount
     
+    def get_data_version(self):
+        """Last batch end time and newest stored result id, used to invalidate cached results"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            return tuple(cursor.execute(query_cache.DATA_VERSION_QUERY).fetchone())
+    
+    def cached_query(self, query, params=None):
+        """Execute a dashboard query through the shared result cache"""
+        self.cache.check_version(self.get_data_version)
+        return self.cache.get_or_load(query_cache.make_key(query, params),
+                                      lambda: self.execute_query(query, params))
+    
     # Dashboard Analytics Methods
     def get_system_overview(self):
         """Get high-level system overview metrics"""
@@ -88,7 +103,7 @@ class UnifiedDataManager:
             (SELECT MAX(last_updated) FROM shipment_summary_cache) as last_cache_update
         """
         
-        return self.execute_query(query).iloc[0].to_dict()
+        return self.cached_query(query).iloc[0].to_dict()
     
     def get_movement_analytics(self):
         """Get movement table analytics"""
@@ -138,7 +153,7 @@ class UnifiedDataManager:
                 ELSE 99
             END
         """
-        return self.execute_query(query)
+        return self.cached_query(query)
     
     def get_customer_performance(self, limit=10):
         """Get customer performance breakdown"""
@@ -157,7 +172,7 @@ class UnifiedDataManager:
         GROUP BY customer_name
         ORDER BY total_matches DESC
         """
-        return self.execute_query(query, [limit])
+        return self.cached_query(query, [limit])
     
     def get_hitl_queue(self, customer_filter=None):
         """Get items requiring human review"""
@@ -199,12 +214,15 @@ class UnifiedDataManager:
         FROM fact_order_movements
         ORDER BY customer_name
         """
-        return self.execute_query(query)['customer_name'].tolist()
+        return self.cached_query(query)['customer_name'].tolist()
     
     def run_enhanced_matching(self, customer_name, po_number=None):
         """Run enhanced matching using the engine"""
         engine = EnhancedMatchingEngine()
-        return engine.run_enhanced_matching(customer_name, po_number)
+        try:
+            return engine.run_enhanced_matching(customer_name, po_number)
+        finally:
+            self.cache.invalidate()
 
 
 def setup_page_config():
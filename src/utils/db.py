@@ -2,12 +2,14 @@
 Database connection and utility functions.
 """
 import os
-import pyodbc
+import uuid
 import pandas as pd
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Union, Tuple
 import logging
 
+from utils import db_pool
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -26,7 +28,7 @@ DB_CONFIG = {
 
 def get_connection():
     """
-    Get a connection to the database.
+    Get a pooled connection to the database.
     """
     try:
         conn_str = (
@@ -35,7 +37,7 @@ def get_connection():
             f"DATABASE={DB_CONFIG['database']};"
             f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
         )
-        return pyodbc.connect(conn_str)
+        return db_pool.connect(conn_str)
     except Exception as e:
         logger.error(f"Error connecting to database: {e}")
         raise
@@ -336,6 +338,164 @@ def add_to_hitl_queue(
         logger.error(f"Error adding to HITL queue: {e}")
         raise
 
+class ReconciliationResultWriter:
+    """
+    Buffered writer for reconciliation results, their attribute scores and
+    HITL queue entries.
+
+    Rows are collected in columnar buffers and flushed every flush_size
+    results: each flush stages the three buffers with fast_executemany and
+    runs sp_merge_reconciliation_results, so a flush costs four round trips
+    regardless of its size. All flushes share one connection. With
+    transactional=True nothing is committed until close(), and any failure
+    rolls back every flush; otherwise each flush commits on its own.
+
+    Use as a context manager, or call close() (commit) / abort() (rollback).
+    """
+
+    RESULT_COLUMNS = ['row_key', 'customer_name', 'order_id', 'shipment_id', 'po_number', 'match_status',
+                      'confidence_score', 'match_method', 'match_details', 'is_split_shipment', 'split_group_id']
+    SCORE_COLUMNS = ['row_key', 'attribute_name', 'order_value', 'shipment_value', 'match_score',
+                     'match_method', 'is_key_attribute', 'weight']
+    QUEUE_COLUMNS = ['row_key', 'priority']
+
+    def __init__(self, flush_size: int = 5000, transactional: bool = False):
+        self.flush_size = flush_size
+        self.transactional = transactional
+        self.load_id = str(uuid.uuid4())
+        self.conn = None
+        self.stats = {'results': 0, 'scores': 0, 'hitl_queue': 0, 'flushes': 0, 'round_trips': 0}
+        self._next_key = 0
+        self._reset_buffers()
+
+    def _reset_buffers(self):
+        self.results = {col: [] for col in self.RESULT_COLUMNS}
+        self.scores = {col: [] for col in self.SCORE_COLUMNS}
+        self.queue = {col: [] for col in self.QUEUE_COLUMNS}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def add_result(
+        self,
+        customer_name: str,
+        order_id: Optional[int],
+        shipment_id: int,
+        po_number: str,
+        match_status: str,
+        confidence_score: Optional[float],
+        match_method: str,
+        match_details: Optional[Dict] = None,
+        is_split_shipment: bool = False,
+        split_group_id: Optional[str] = None,
+        attribute_scores: Optional[List[Dict[str, Any]]] = None,
+        hitl_priority: Optional[int] = None
+    ) -> int:
+        """
+        Buffer one reconciliation result (same fields as save_reconciliation_result)
+        with its attribute scores and, if hitl_priority is given, a HITL queue entry.
+
+        Returns:
+            Buffer key of the result within this writer
+        """
+        row_key = self._next_key
+        self._next_key += 1
+
+        values = [row_key, customer_name, order_id, shipment_id, po_number, match_status, confidence_score,
+                  match_method, str(match_details) if match_details else None,
+                  1 if is_split_shipment else 0, split_group_id]
+        for col, value in zip(self.RESULT_COLUMNS, values):
+            self.results[col].append(value)
+
+        for score in attribute_scores or []:
+            values = [row_key, score['attribute_name'], score['order_value'], score['shipment_value'],
+                      score['match_score'], score['match_method'],
+                      1 if score.get('is_key_attribute', False) else 0, score.get('weight', 1.0)]
+            for col, value in zip(self.SCORE_COLUMNS, values):
+                self.scores[col].append(value)
+
+        if hitl_priority is not None:
+            self.queue['row_key'].append(row_key)
+            self.queue['priority'].append(hitl_priority)
+
+        if len(self.results['row_key']) >= self.flush_size:
+            self.flush()
+        return row_key
+
+    def _connection(self):
+        if self.conn is None:
+            self.conn = get_connection()
+        return self.conn
+
+    @staticmethod
+    def _rows(load_id: str, buffer: Dict[str, List]) -> List[tuple]:
+        return [(load_id, *row) for row in zip(*buffer.values())]
+
+    def flush(self) -> None:
+        """Stage the buffered rows and merge them into the target tables"""
+        if not self.results['row_key']:
+            return
+
+        conn = self._connection()
+        cursor = conn.cursor()
+        cursor.fast_executemany = True
+        try:
+            for table, buffer in (('reconciliation_result_staging', self.results),
+                                  ('match_attribute_score_staging', self.scores),
+                                  ('hitl_queue_staging', self.queue)):
+                rows = self._rows(self.load_id, buffer)
+                if rows:
+                    columns = ', '.join(['load_id', *buffer.keys()])
+                    placeholders = ', '.join('?' * (len(buffer) + 1))
+                    cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", rows)
+                    self.stats['round_trips'] += 1
+
+            cursor.execute("EXEC sp_merge_reconciliation_results @load_id = ?", self.load_id)
+            self.stats['round_trips'] += 1
+            if not self.transactional:
+                conn.commit()
+                self.stats['round_trips'] += 1
+        except Exception as e:
+            logger.error(f"Error flushing reconciliation results: {e}")
+            self.abort()
+            raise
+
+        self.stats['results'] += len(self.results['row_key'])
+        self.stats['scores'] += len(self.scores['row_key'])
+        self.stats['hitl_queue'] += len(self.queue['row_key'])
+        self.stats['flushes'] += 1
+        self._reset_buffers()
+
+    def close(self) -> Dict[str, int]:
+        """Flush what is left, commit, and release the connection"""
+        try:
+            self.flush()
+            if self.conn is not None and self.transactional:
+                self.conn.commit()
+                self.stats['round_trips'] += 1
+        finally:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+        return self.stats
+
+    def abort(self) -> None:
+        """Roll back anything not yet committed and drop the buffers"""
+        if self.conn is not None:
+            try:
+                self.conn.rollback()
+            finally:
+                self.conn.close()
+                self.conn = None
+        self._reset_buffers()
+
 def get_unmatched_shipments(
     customer_name: Optional[str] = None,
     po_number: Optional[str] = None,
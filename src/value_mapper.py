@@ -11,10 +11,98 @@ from typing import Dict, List, Tuple, Optional, Union
 import re
 from difflib import SequenceMatcher
 import logging
+import numpy as np
 import pandas as pd
+from rapidfuzz import fuzz, process
 
 logger = logging.getLogger(__name__)
 
+# Fuzzy rule patterns that compare normalised forms for equality; any other
+# pattern is a similarity rule scored against the section's threshold
+RULE_NORMALIZERS = {
+    "case_insensitive": lambda v: v.upper(),
+    "remove_spaces_dashes": lambda v: re.sub(r'[\s\-_]', '', v.upper()),
+    "extract_color_name": lambda v: re.sub(r'^\d+\s*-\s*', '', v).strip().upper(),
+    "normalize_punctuation": lambda v: re.sub(r'[^\w\s]', ' ', v.upper()).strip(),
+    "remove_leading_zeros": lambda v: v.lstrip('0') or '0',
+}
+
+
+class FuzzyRuleEngine:
+    """
+    Fuzzy rules of one mapping section and direction, compiled once.
+    
+    Equality rules become hash maps from the normalised mapping value to the
+    first mapping producing it; similarity rules score all unknown values
+    against the mapping vocabulary in one rapidfuzz cdist call. As with a
+    scan over mappings then rules, the earliest mapping wins and, for that
+    mapping, the earliest matching rule supplies the confidence. Results are
+    memoised per input value.
+    """
+    
+    def __init__(self, fuzzy_rules: Dict, mappings: List[Dict], direction: str):
+        self.threshold = fuzzy_rules.get("threshold", 0.80)
+        self.rules = [(rule.get("pattern", ""), rule.get("confidence", 0.5)) for rule in fuzzy_rules.get("rules", [])]
+        
+        targets, self.results = [], []
+        for mapping in mappings:
+            if direction == "order_to_shipment":
+                target_val = mapping.get("order_value", "")
+                result_vals = mapping.get("shipment_values", [])
+            else:
+                target_val = (mapping.get("shipment_values") or [""])[0]  # Use first shipment value
+                result_vals = [mapping.get("order_value", "")]
+            # Mappings without a result value can never be returned
+            if result_vals and result_vals[0]:
+                targets.append(str(target_val))
+                self.results.append(result_vals[0])
+        
+        self.vocabulary = [target.upper() for target in targets]
+        self.rule_lookups = []
+        for pattern, _ in self.rules:
+            normalize = RULE_NORMALIZERS.get(pattern)
+            lookup = None
+            if normalize is not None:
+                lookup = {}
+                for position, target in enumerate(targets):
+                    lookup.setdefault(normalize(target), position)
+            self.rule_lookups.append(lookup)
+        self.similarity_rule = next((i for i, lookup in enumerate(self.rule_lookups) if lookup is None), None)
+        self._memo: Dict[str, Tuple[Optional[str], float]] = {}
+    
+    def resolve(self, values: List[str]) -> Dict[str, Tuple[Optional[str], float]]:
+        """(mapped value, rule confidence) or (None, 0.0) for each value"""
+        pending = [value for value in dict.fromkeys(values) if value not in self._memo]
+        if pending:
+            best = dict.fromkeys(pending)
+            for rule_no, lookup in enumerate(self.rule_lookups):
+                if lookup is None:
+                    continue
+                normalize = RULE_NORMALIZERS[self.rules[rule_no][0]]
+                for value in pending:
+                    position = lookup.get(normalize(value))
+                    if position is not None and (best[value] is None or (position, rule_no) < best[value]):
+                        best[value] = (position, rule_no)
+            
+            if self.similarity_rule is not None and self.vocabulary:
+                cutoff = self.threshold * 100
+                scores = process.cdist([value.upper() for value in pending], self.vocabulary,
+                                       scorer=fuzz.ratio, score_cutoff=cutoff, workers=-1)
+                hits = scores >= cutoff
+                first = hits.argmax(axis=1)
+                for row, value in enumerate(pending):
+                    if hits[row, first[row]]:
+                        candidate = (int(first[row]), self.similarity_rule)
+                        if best[value] is None or candidate < best[value]:
+                            best[value] = candidate
+            
+            for value, found in best.items():
+                if found is None:
+                    self._memo[value] = (None, 0.0)
+                else:
+                    self._memo[value] = (self.results[found[0]], self.rules[found[1]][1])
+        return {value: self._memo[value] for value in values}
+
 class ValueMapper:
     """Handles value mappings between order and shipment systems"""
     
@@ -26,6 +114,7 @@ class ValueMapper:
         
         self.config_path = Path(config_path)
         self.mappings = self._load_mappings()
+        self._compile()
         
     def _load_mappings(self) -> Dict:
         """Load mapping configuration from YAML file"""
@@ -36,6 +125,41 @@ class ValueMapper:
             logger.warning(f"Mapping config not found at {self.config_path}, using empty mappings")
             return {"global_mappings": {}, "customer_specific_mappings": {}}
     
+    def _compile(self):
+        """
+        Build one hash map per (customer, column, direction) from the loaded
+        mappings, keyed on the upper-cased source value. The first mapping
+        listing a value wins, as in a top-to-bottom scan. Global mappings use
+        customer None; sections with fuzzy rules enabled are kept for values
+        the exact index does not resolve.
+        """
+        self._index = {}
+        self._fuzzy = {}
+        
+        sections = [(None, self.mappings.get("global_mappings") or {})]
+        for customer, columns in (self.mappings.get("customer_specific_mappings") or {}).items():
+            sections.append((customer, columns or {}))
+        
+        for customer, columns in sections:
+            for column, config in columns.items():
+                if not isinstance(config, dict):
+                    continue
+                to_shipment = self._index.setdefault((customer, column, "order_to_shipment"), {})
+                to_order = self._index.setdefault((customer, column, "shipment_to_order"), {})
+                for mapping in config.get("mappings") or []:
+                    confidence = mapping.get("confidence", 1.0)
+                    shipment_vals = mapping.get("shipment_values") or []
+                    if shipment_vals:
+                        to_shipment.setdefault(str(mapping.get("order_value", "")).upper(),
+                                               (shipment_vals[0], confidence))
+                    for shipment_val in shipment_vals:
+                        to_order.setdefault(str(shipment_val).upper(), (mapping.get("order_value"), confidence))
+                fuzzy_rules = config.get("fuzzy_rules") or {}
+                if fuzzy_rules.get("enabled", False):
+                    for direction in ("order_to_shipment", "shipment_to_order"):
+                        self._fuzzy[(customer, column, direction)] = FuzzyRuleEngine(
+                            fuzzy_rules, config.get("mappings") or [], direction)
+    
     def save_mappings(self):
         """Save current mappings back to YAML file"""
         with open(self.config_path, 'w', encoding='utf-8') as f:
@@ -67,99 +191,72 @@ class ValueMapper:
     def _check_customer_mappings(self, column: str, value: str, direction: str, 
                                 customer: str) -> Tuple[Optional[str], float]:
         """Check customer-specific mappings"""
-        customer_mappings = self.mappings.get("customer_specific_mappings", {}).get(customer, {})
-        if column not in customer_mappings:
-            return None, 0.0
-            
-        return self._find_mapping_in_config(customer_mappings[column], value, direction)
+        return self._lookup(customer, column, value, direction)
     
     def _check_global_mappings(self, column: str, value: str, direction: str) -> Tuple[Optional[str], float]:
         """Check global mappings"""
-        global_mappings = self.mappings.get("global_mappings", {})
-        if column not in global_mappings:
-            return None, 0.0
-            
-        return self._find_mapping_in_config(global_mappings[column], value, direction)
+        return self._lookup(None, column, value, direction)
     
-    def _find_mapping_in_config(self, config: Dict, value: str, direction: str) -> Tuple[Optional[str], float]:
-        """Find mapping in a specific configuration section"""
-        mappings = config.get("mappings", [])
-        
-        # Check exact mappings first
-        for mapping in mappings:
-            if direction == "order_to_shipment":
-                if mapping.get("order_value", "").upper() == value.upper():
-                    # Return first shipment value (could be multiple)
-                    shipment_vals = mapping.get("shipment_values", [])
-                    if shipment_vals:
-                        return shipment_vals[0], mapping.get("confidence", 1.0)
-            else:  # shipment_to_order
-                shipment_vals = [v.upper() for v in mapping.get("shipment_values", [])]
-                if value.upper() in shipment_vals:
-                    return mapping.get("order_value"), mapping.get("confidence", 1.0)
-        
-        # Check fuzzy rules if enabled
-        fuzzy_rules = config.get("fuzzy_rules", {})
-        if fuzzy_rules.get("enabled", False):
-            return self._apply_fuzzy_rules(fuzzy_rules, mappings, value, direction)
-        
-        return None, 0.0
+    def _lookup(self, customer: Optional[str], column: str, value: str, direction: str) -> Tuple[Optional[str], float]:
+        """Exact mapping from the compiled index, then the section's fuzzy rules if enabled"""
+        return self._lookup_many(customer, column, [value], direction)[value]
     
-    def _apply_fuzzy_rules(self, fuzzy_rules: Dict, mappings: List[Dict], 
-                          value: str, direction: str) -> Tuple[Optional[str], float]:
-        """Apply fuzzy matching rules"""
-        threshold = fuzzy_rules.get("threshold", 0.80)
-        rules = fuzzy_rules.get("rules", [])
+    def _lookup_many(self, customer: Optional[str], column: str, values: List[str],
+                     direction: str) -> Dict[str, Tuple[Optional[str], float]]:
+        """_lookup for many values, with index misses resolved by the fuzzy engine in one batch"""
+        index = self._index.get((customer, column, direction))
+        if index is None:
+            return {value: (None, 0.0) for value in values}
         
-        for mapping in mappings:
-            if direction == "order_to_shipment":
-                target_val = mapping.get("order_value", "")
-                result_vals = mapping.get("shipment_values", [])
+        found, misses = {}, []
+        for value in values:
+            hit = index.get(value.upper())
+            if hit is not None:
+                found[value] = hit
             else:
-                target_val = mapping.get("shipment_values", [""])[0]  # Use first shipment value
-                result_vals = [mapping.get("order_value", "")]
-            
-            # Apply each fuzzy rule
-            for rule in rules:
-                pattern = rule.get("pattern", "")
-                confidence = rule.get("confidence", 0.5)
-                
-                if self._matches_fuzzy_pattern(value, target_val, pattern, threshold):
-                    if result_vals and result_vals[0]:
-                        return result_vals[0], confidence
+                misses.append(value)
         
-        return None, 0.0
+        engine = self._fuzzy.get((customer, column, direction))
+        if engine is not None and misses:
+            found.update(engine.resolve(misses))
+        else:
+            found.update((value, (None, 0.0)) for value in misses)
+        return found
     
-    def _matches_fuzzy_pattern(self, value1: str, value2: str, pattern: str, threshold: float) -> bool:
-        """Check if two values match according to a fuzzy pattern"""
-        if pattern == "case_insensitive":
-            return value1.upper() == value2.upper()
-        
-        elif pattern == "remove_spaces_dashes":
-            clean1 = re.sub(r'[\s\-_]', '', value1.upper())
-            clean2 = re.sub(r'[\s\-_]', '', value2.upper())
-            return clean1 == clean2
+    def map_series(self, series: pd.Series, column: str, direction: str = "order_to_shipment",
+                   customer: str = None) -> Tuple[pd.Series, np.ndarray]:
+        """
+        Map a whole column, resolving each distinct value once
         
-        elif pattern == "extract_color_name":
-            # Extract color name from "CODE - COLOR" format
-            color1 = re.sub(r'^\d+\s*-\s*', '', value1).strip().upper()
-            color2 = re.sub(r'^\d+\s*-\s*', '', value2).strip().upper()
-            return color1 == color2
+        Args:
+            series: Values to map (missing values are left unmapped)
+            column: Mapping column name
+            direction: 'order_to_shipment' or 'shipment_to_order'
+            customer: Customer name for customer-specific mappings
+            
+        Returns:
+            Tuple of (mapped values aligned to series, NaN where no mapping
+            was found; confidence per row, 0.0 where unmapped)
+        """
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype(object)
         
-        elif pattern == "normalize_punctuation":
-            norm1 = re.sub(r'[^\w\s]', ' ', value1.upper()).strip()
-            norm2 = re.sub(r'[^\w\s]', ' ', value2.upper()).strip()
-            return norm1 == norm2
+        keys = {value: str(value) for value in series.dropna().unique()}
+        resolved = {}
+        remaining = list(set(keys.values()))
+        # Customer-specific mappings first, then global ones for what is left
+        for scope in ([customer] if customer else []) + [None]:
+            for value, (mapped_val, confidence) in self._lookup_many(scope, column, remaining, direction).items():
+                if mapped_val:
+                    resolved[value] = (mapped_val, confidence)
+            remaining = [value for value in remaining if value not in resolved]
         
-        elif pattern == "remove_leading_zeros":
-            clean1 = value1.lstrip('0') or '0'
-            clean2 = value2.lstrip('0') or '0'
-            return clean1 == clean2
+        mapped_values = {value: resolved[key][0] for value, key in keys.items() if key in resolved}
+        confidences = {value: resolved[key][1] for value, key in keys.items() if key in resolved}
         
-        else:
-            # Default to sequence matching
-            similarity = SequenceMatcher(None, value1.upper(), value2.upper()).ratio()
-            return similarity >= threshold
+        mapped = series.map(mapped_values)
+        confidence = series.map(confidences).fillna(0.0).to_numpy(dtype="float64")
+        return mapped, confidence
     
     def suggest_mappings(self, unmatched_pairs: List[Tuple[str, str, str]]) -> Dict:
         """
@@ -289,10 +386,13 @@ class ValueMapper:
                 self.mappings["global_mappings"][column] = {"mappings": []}
             
             self.mappings["global_mappings"][column]["mappings"].append(mapping)
+        
+        self._compile()
 
 
 # Utility functions for integration with existing reconciliation system
-def apply_value_mappings(df, column_mappings: Dict[str, str], customer: str = None) -> int:
+def apply_value_mappings(df, column_mappings: Dict[str, str], customer: str = None,
+                         mapper: ValueMapper = None, min_confidence: float = 0.7) -> int:
     """
     Apply value mappings to a DataFrame
     
@@ -300,27 +400,25 @@ def apply_value_mappings(df, column_mappings: Dict[str, str], customer: str = No
         df: DataFrame to modify
         column_mappings: Dict mapping order columns to shipment columns
         customer: Customer name for customer-specific mappings
+        mapper: Mapper to reuse across calls (a new one is loaded otherwise)
+        min_confidence: Only mappings at or above this confidence are applied
         
     Returns:
         Number of values that were mapped
     """
-    mapper = ValueMapper()
+    mapper = mapper or ValueMapper()
     mapped_count = 0
     
     for order_col, shipment_col in column_mappings.items():
         if order_col in df.columns:
-            for idx, value in df[order_col].items():
-                if pd.isna(value):
-                    continue
-                    
-                mapped_val, confidence = mapper.get_mapped_value(
-                    order_col, str(value), "order_to_shipment", customer
-                )
-                
-                if mapped_val and confidence >= 0.7:  # Only apply high-confidence mappings
-                    df.at[idx, order_col] = mapped_val
-                    mapped_count += 1
-                    logger.debug(f"Mapped {order_col}: '{value}' -> '{mapped_val}' (confidence: {confidence})")
+            mapped, confidence = mapper.map_series(df[order_col], order_col, "order_to_shipment", customer)
+            apply = mapped.notna().to_numpy() & (confidence >= min_confidence)
+            if apply.any():
+                if isinstance(df[order_col].dtype, pd.CategoricalDtype):
+                    df[order_col] = df[order_col].astype(object)
+                df.loc[apply, order_col] = mapped[apply]
+                mapped_count += int(apply.sum())
+                logger.debug(f"Mapped {int(apply.sum())} {order_col} values")
     
     return mapped_count
 
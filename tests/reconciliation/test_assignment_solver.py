@@ -0,0 +1,76 @@
+"""
+Unit tests for the capacity-aware block assignment solver.
+"""
+import unittest
+import pandas as pd
+import numpy as np
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.reconciliation.assignment_solver import CapacityAssignmentSolver
+from src.reconciliation.fuzzy_scoring import quantity_scores
+from src.reconciliation.key_index import CompositeKeyIndex
+
+
+class TestCapacityAssignmentSolver(unittest.TestCase):
+    """Test optimal assignment against the greedy per-shipment pick"""
+
+    def setUp(self):
+        # One style/color block: two orders, two shipments
+        self.order_qty = np.array([50.0, 100.0])
+        self.ship_qty = np.array([60.0, 45.0])
+        self.pairs = pd.DataFrame({
+            'ship_pos': [0, 0, 1, 1],
+            'order_pos': [0, 1, 0, 1],
+            'code': [0, 0, 0, 0]
+        })
+
+    def _score(self, pairs, remaining):
+        return quantity_scores(remaining, self.ship_qty[pairs['ship_pos'].to_numpy()])
+
+    def test_greedy_lets_first_shipment_take_the_order(self):
+        """Greedy selection sends both shipments to the same order"""
+        pairs = self.pairs.assign(score=self._score(self.pairs, self.order_qty[self.pairs['order_pos']]))
+        best = CompositeKeyIndex.best_per_shipment(pairs, 'score')
+        self.assertEqual(best['order_pos'].tolist(), [0, 0])
+
+    def test_optimal_assignment_maximizes_total_score(self):
+        """The solver gives the second shipment the order it fits best"""
+        solver = CapacityAssignmentSolver(self.order_qty)
+        chosen = solver.assign(self.pairs, self.ship_qty, self._score)
+        self.assertEqual(list(zip(chosen['ship_pos'], chosen['order_pos'])), [(0, 1), (1, 0)])
+        self.assertAlmostEqual(chosen['score'].sum(), 1.2)
+
+    def test_capacity_is_drawn_down_across_rounds(self):
+        """An order keeps accepting shipments until its quantity is used up"""
+        ship_qty = np.array([30.0, 30.0, 30.0])
+        pairs = pd.DataFrame({'ship_pos': [0, 1, 2], 'order_pos': [0, 0, 0], 'code': [7, 7, 7]})
+        solver = CapacityAssignmentSolver([60.0])
+        chosen = solver.assign(pairs, ship_qty, lambda p, remaining: np.ones(len(p)))
+
+        self.assertEqual(sorted(chosen['ship_pos'].tolist()), [0, 1])
+        self.assertEqual(solver.remaining[0], 0.0)
+        self.assertEqual(solver.block_stats[0]['rounds'], 2)
+
+    def test_min_score_and_block_stats(self):
+        """Pairs below min_score are never assigned and every block is timed"""
+        pairs = pd.concat([self.pairs, self.pairs.assign(code=1, ship_pos=self.pairs['ship_pos'] + 2)])
+        ship_qty = np.concatenate([self.ship_qty, self.ship_qty])
+        solver = CapacityAssignmentSolver([50.0, 100.0])
+        chosen = solver.assign(pairs, ship_qty,
+                               lambda p, remaining: quantity_scores(remaining, ship_qty[p['ship_pos'].to_numpy()]),
+                               min_score=0.7, block_names=['A|RED', 'B|NAVY'])
+
+        self.assertTrue((chosen['score'] >= 0.7).all())
+        summary = solver.summary()
+        self.assertEqual(summary['blocks'], 2)
+        self.assertEqual({s['block'] for s in summary['block_stats']}, {'A|RED', 'B|NAVY'})
+        self.assertTrue(all(s['solve_seconds'] >= 0 for s in summary['block_stats']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Unit tests for the batched Layer 2 fuzzy scoring engine.
+"""
+import unittest
+import pandas as pd
+import numpy as np
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from rapidfuzz import fuzz
+from src.reconciliation.fuzzy_scoring import (
+    BatchFuzzyScorer,
+    quantity_scores,
+    make_synthetic_frames,
+    benchmark
+)
+
+
+def _quantity_score(order_qty, shipment_qty):
+    """Scalar quantity bands as implemented in EnhancedMatchingEngine"""
+    if order_qty <= 0:
+        return 0.0
+    diff_percent = abs(order_qty - shipment_qty) / order_qty * 100
+    if diff_percent <= 5:
+        return 1.0
+    elif diff_percent <= 10:
+        return 0.8
+    elif diff_percent <= 25:
+        return 0.6
+    elif diff_percent <= 50:
+        return 0.4
+    return 0.2
+
+
+def _delivery_similarity(delivery1, delivery2):
+    if not delivery1 or not delivery2:
+        return 0.5
+    if delivery1 == delivery2:
+        return 1.0
+    return fuzz.token_set_ratio(delivery1, delivery2) / 100.0
+
+
+def _row_loop(shipments_df, orders_df):
+    """The original nested iterrows() Layer 2 selection"""
+    picks = []
+    for _, shipment in shipments_df.iterrows():
+        best_pos, best_score, best_style, best_color = -1, -1, 0, 0
+        for pos, (_, order) in enumerate(orders_df.iterrows()):
+            style_similarity = fuzz.token_set_ratio(shipment['canonical_style'], order['canonical_style']) / 100.0
+            color_similarity = fuzz.token_set_ratio(shipment['canonical_color'], order['canonical_color']) / 100.0
+            if style_similarity >= 0.8 and color_similarity >= 0.8:
+                delivery_similarity = _delivery_similarity(order['canonical_delivery'], shipment['canonical_delivery'])
+                qty_score = _quantity_score(order['order_quantity'], shipment['shipment_quantity'])
+                combined = (style_similarity * 0.4) + (color_similarity * 0.3) + (qty_score * 0.2) + (delivery_similarity * 0.1)
+                if combined > best_score:
+                    best_pos, best_score = pos, combined
+                    best_style, best_color = style_similarity, color_similarity
+        if best_score >= 0.7:
+            picks.append((best_pos, best_score, best_style, best_color))
+        else:
+            picks.append((-1, None, None, None))
+    return picks
+
+
+class TestBatchFuzzyScorer(unittest.TestCase):
+    """Test the BatchFuzzyScorer against the row-by-row Layer 2 loop"""
+
+    def test_quantity_scores_match_scalar_bands(self):
+        """Vectorized quantity bands agree with the scalar implementation"""
+        order_qty = np.array([100, 100, 100, 100, 100, 100, 0, -5, 40])
+        shipment_qty = np.array([100, 95, 91, 80, 55, 10, 10, 10, 40])
+        expected = [_quantity_score(o, s) for o, s in zip(order_qty, shipment_qty)]
+        np.testing.assert_array_equal(quantity_scores(order_qty, shipment_qty), expected)
+
+    def test_same_choice_and_confidence_as_row_loop(self):
+        """Best order, combined score and similarities are identical to the row loop"""
+        shipments_df, orders_df = make_synthetic_frames(60, 80, seed=7)
+        shipments_df.loc[3, 'canonical_style'] = None
+        orders_df.loc[5, 'canonical_delivery'] = None
+
+        scorer = BatchFuzzyScorer(max_cells_per_chunk=500)  # force several chunks
+        best = scorer.best_matches(shipments_df, orders_df, _delivery_similarity)
+        expected = _row_loop(shipments_df, orders_df)
+
+        self.assertEqual(list(best['order_pos']), [e[0] for e in expected])
+        for (_, row), (pos, score, style_sim, color_sim) in zip(best.iterrows(), expected):
+            if pos >= 0:
+                self.assertEqual(row['best_score'], score)
+                self.assertEqual(row['style_similarity'], style_sim)
+                self.assertEqual(row['color_similarity'], color_sim)
+
+        self.assertEqual(scorer.stats['pairs_scored'], 60 * 80)
+
+    def test_ties_keep_first_order(self):
+        """Among equally scored orders the first in frame order wins"""
+        orders_df = pd.DataFrame({
+            'canonical_style': ['ABC123', 'ABC123'],
+            'canonical_color': ['NAVY', 'NAVY'],
+            'canonical_delivery': ['AIR', 'AIR'],
+            'order_quantity': [10, 10]
+        })
+        shipments_df = pd.DataFrame({
+            'canonical_style': ['ABC123'],
+            'canonical_color': ['NAVY'],
+            'canonical_delivery': ['AIR'],
+            'shipment_quantity': [10]
+        })
+        best = BatchFuzzyScorer().best_matches(shipments_df, orders_df, _delivery_similarity)
+        self.assertEqual(best.loc[0, 'order_pos'], 0)
+
+    def test_empty_inputs(self):
+        """No orders yields no matches"""
+        shipments_df, orders_df = make_synthetic_frames(5, 5)
+        best = BatchFuzzyScorer().best_matches(shipments_df, orders_df.iloc[0:0], _delivery_similarity)
+        self.assertTrue((best['order_pos'] == -1).all())
+
+    def test_benchmark_reports_throughput(self):
+        """Benchmark exposes pairs per second for both implementations"""
+        results = benchmark(n_shipments=40, n_orders=40, reference_sample=5)
+        self.assertGreater(results['batched_pairs_per_second'], 0)
+        self.assertGreater(results['row_loop_pairs_per_second'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
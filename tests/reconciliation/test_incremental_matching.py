@@ -0,0 +1,124 @@
+"""
+Unit tests for watermark-based incremental enhanced matching.
+"""
+import unittest
+from unittest import mock
+import pandas as pd
+import numpy as np
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.reconciliation.enhanced_matching_engine import EnhancedMatchingEngine, prior_allocations
+
+
+def _orders():
+    return pd.DataFrame({
+        'order_id': [1, 2, 3],
+        'customer_name': ['GREYSON'] * 3,
+        'po_number': ['4755'] * 3,
+        'style_code': ['LJ1', 'LJ1', 'LJ2'],
+        'color_description': ['NAVY', 'NAVY', 'RED'],
+        'order_quantity': [100, 50, 40],
+        'canonical_style': ['LJ1', 'LJ1', 'LJ2'],
+        'canonical_color': ['NAVY', 'NAVY', 'RED'],
+        'canonical_delivery': ['SEA', 'SEA', 'AIR']
+    })
+
+
+def _shipments(ids, quantities):
+    return pd.DataFrame({
+        'shipment_id': ids,
+        'customer_name': ['GREYSON'] * len(ids),
+        'po_number': ['4755'] * len(ids),
+        'style_code': ['LJ1'] * len(ids),
+        'color_description': ['NAVY'] * len(ids),
+        'shipment_quantity': quantities,
+        'canonical_style': ['LJ1'] * len(ids),
+        'canonical_color': ['NAVY'] * len(ids),
+        'canonical_delivery': ['AIR'] * len(ids),
+        'Shipped_Date': ['2025-03-01'] * len(ids)
+    })
+
+
+class TestPriorAllocations(unittest.TestCase):
+    """Test seeding order quantities from stored matches"""
+
+    def test_single_and_split_shipments(self):
+        """Single links draw the full quantity; splits are apportioned by order quantity"""
+        prior = pd.DataFrame({
+            'shipment_id': ['10', '11', '11'],
+            'order_id': ['1', '1', '2'],
+            'shipment_quantity': [30, 60, 60],
+            'order_quantity': [100, 100, 50]
+        })
+        allocated = prior_allocations(prior, _orders()['order_id'])
+        np.testing.assert_allclose(allocated, [70, 20, 0])
+
+    def test_empty(self):
+        """No stored matches leaves every order untouched"""
+        empty = pd.DataFrame(columns=['shipment_id', 'order_id', 'shipment_quantity', 'order_quantity'])
+        np.testing.assert_array_equal(prior_allocations(empty, _orders()['order_id']), [0, 0, 0])
+
+
+class TestIncrementalRun(unittest.TestCase):
+    """Test the incremental run flow with the database calls stubbed out"""
+
+    def setUp(self):
+        with mock.patch('src.reconciliation.enhanced_matching_engine.get_connection_string', return_value=''):
+            self.engine = EnhancedMatchingEngine()
+        patches = {
+            'start_matching_session': mock.DEFAULT,
+            'end_matching_session': mock.DEFAULT,
+            'store_matches': mock.DEFAULT,
+            'retire_previous_results': mock.DEFAULT,
+            'record_watermark': mock.DEFAULT,
+            'summary_refresher': mock.DEFAULT,
+            'get_current_watermark': mock.Mock(return_value=b'\x00' * 7 + b'\x09'),
+            'get_last_watermark': mock.Mock(return_value=b'\x00' * 7 + b'\x05'),
+            'get_orders_for_matching': mock.Mock(return_value=_orders()),
+            'get_prior_matches': mock.Mock(return_value=pd.DataFrame({
+                'shipment_id': ['10', '12'], 'order_id': ['1', '1'],
+                'shipment_quantity': [100, 5], 'order_quantity': [100, 100]
+            }))
+        }
+        patcher = mock.patch.multiple(self.engine, **patches)
+        self.mocks = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.engine.get_shipments_for_matching = mock.Mock(return_value=_shipments([12, 13], [50, 20]))
+
+    def test_only_delta_is_matched_against_seeded_quantities(self):
+        """New shipments are read past the mark and the mark is advanced"""
+        results = self.engine.run_enhanced_matching('GREYSON', incremental=True)
+
+        self.assertEqual(results['run_mode'], 'INCREMENTAL')
+        self.engine.get_shipments_for_matching.assert_called_once_with('GREYSON', None, b'\x00' * 7 + b'\x05')
+        # Shipment 12 is being re-matched, so only shipment 10 counts as allocated
+        np.testing.assert_allclose(self.engine.prior_allocated, [100, 0, 0])
+        self.mocks['retire_previous_results'].assert_called_once_with([12, 13])
+        watermark = self.mocks['record_watermark'].call_args[0][2]
+        self.assertEqual(watermark, b'\x00' * 7 + b'\x09')
+
+    def test_layer3_uses_remaining_quantity(self):
+        """Layer 3 sees order 1 as fully allocated and resolves against order 2"""
+        self.engine.prior_allocated = np.array([100.0, 0.0, 0.0])
+        matches, _ = self.engine.layer3_quantity_resolution(_orders(), _shipments([13], [50]), [])
+        self.assertEqual([m['order_id'] for m in matches], [2])
+
+    def test_falls_back_to_full_run_without_mark(self):
+        """The first incremental run matches everything and records a mark"""
+        self.engine.get_last_watermark.return_value = None
+        results = self.engine.run_enhanced_matching('GREYSON', incremental=True)
+
+        self.assertEqual(results['run_mode'], 'FULL')
+        self.engine.get_shipments_for_matching.assert_called_once_with('GREYSON', None, None)
+        self.engine.get_prior_matches.assert_not_called()
+        self.mocks['retire_previous_results'].assert_not_called()
+        self.mocks['record_watermark'].assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Unit tests for the composite key index used by the exact-match layers.
+"""
+import unittest
+import pandas as pd
+import numpy as np
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.reconciliation.key_index import (
+    CompositeKeyIndex,
+    format_key,
+    normalized_key,
+    pairwise_apply
+)
+
+
+class TestCompositeKeyIndex(unittest.TestCase):
+    """Test key building and the integer-coded join"""
+
+    def setUp(self):
+        self.orders_df = pd.DataFrame({
+            'style': ['ABC', 'ABC', 'DEF', 'ABC'],
+            'color': ['RED', 'RED', 'BLUE', 'NAVY'],
+            'quantity': [10, 12, 5, 7]
+        })
+        self.shipments_df = pd.DataFrame({
+            'style': ['ABC', 'XYZ', 'DEF'],
+            'color': ['RED', 'RED', 'BLUE'],
+            'quantity': [12, 1, 5]
+        })
+
+    def test_format_key_matches_fstring(self):
+        """Keys render exactly like the f-string keys they replace"""
+        df = pd.DataFrame({'a': ['X', None], 'b': ['Y', np.nan]})
+        expected = [f"{row['a']}|{row['b']}" for _, row in df.iterrows()]
+        self.assertEqual(format_key(df, ['a', 'b']).tolist(), expected)
+
+    def test_normalized_key_skips_missing_parts(self):
+        """Missing values and absent fields are skipped; empty keys are NaN"""
+        df = pd.DataFrame({'a': ['  abc   def ', None], 'b': [None, None]})
+        keys = normalized_key(df, ['a', 'b', 'not_a_column'])
+        self.assertEqual(keys[0], 'ABC DEF')
+        self.assertTrue(pd.isna(keys[1]))
+
+    def test_join_returns_pairs_in_scan_order(self):
+        """Every order sharing a key is paired, ordered by shipment then order"""
+        index = CompositeKeyIndex(format_key(self.orders_df, ['style', 'color']))
+        pairs = index.join(format_key(self.shipments_df, ['style', 'color']))
+        self.assertEqual(list(zip(pairs['ship_pos'], pairs['order_pos'])), [(0, 0), (0, 1), (2, 2)])
+        self.assertEqual(len(index), 3)
+
+    def test_best_per_shipment_prefers_first_on_ties(self):
+        """Highest score wins and ties resolve to the earliest order"""
+        pairs = pd.DataFrame({'ship_pos': [0, 0, 0, 1], 'order_pos': [3, 5, 7, 2], 'score': [0.4, 0.9, 0.9, 0.1]})
+        best = CompositeKeyIndex.best_per_shipment(pairs, 'score')
+        self.assertEqual(list(zip(best['ship_pos'], best['order_pos'])), [(0, 5), (1, 2)])
+
+    def test_pairwise_apply_sees_original_values(self):
+        """The callable receives original values (None is not coerced to NaN)"""
+        seen = []
+
+        def func(a, b):
+            seen.append((a, b))
+            return 1.0 if a is None else 0.0
+
+        result = pairwise_apply(func, pd.Series([None, 'AIR', None]), pd.Series(['SEA', 'SEA', 'SEA']))
+        self.assertEqual(result.tolist(), [1.0, 0.0, 1.0])
+        self.assertEqual(len(seen), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Unit tests for bulk persistence of enhanced matching results.
+"""
+import unittest
+from unittest import mock
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.reconciliation.enhanced_matching_engine import EnhancedMatchingEngine
+
+
+def _match(shipment_id, order_id, variance_percent=4.0):
+    return {
+        'shipment_id': shipment_id, 'order_id': order_id,
+        'customer_name': 'GREYSON', 'po_number': '4755',
+        'match_layer': 'LAYER_1', 'confidence': 0.9,
+        'style_match': 'EXACT', 'color_match': 'EXACT', 'delivery_match': 'SIMILAR',
+        'style_code': 'LJ1', 'color_description': 'NAVY',
+        'shipment_quantity': 52, 'order_quantity': 50.0,
+        'quantity_variance': 2.0, 'quantity_variance_percent': variance_percent
+    }
+
+
+class TestStoreMatches(unittest.TestCase):
+    """Test staging rows and the number of database round trips"""
+
+    def setUp(self):
+        with mock.patch('src.reconciliation.enhanced_matching_engine.get_connection_string', return_value=''):
+            self.engine = EnhancedMatchingEngine()
+        self.engine.batch_id = 7
+        self.conn = mock.MagicMock()
+        self.cursor = self.conn.__enter__.return_value.cursor.return_value
+        self.engine.get_connection = mock.Mock(return_value=self.conn)
+        self.matches = [_match(100 + i, i, variance_percent=4.0 if i % 2 else 25.0) for i in range(500)]
+
+    def test_result_rows(self):
+        """Rows carry typed values, the quantity check and the movement group id"""
+        row = self.engine._result_rows(self.matches[:2])[1]
+        self.assertEqual(row[:6], (self.engine.session_id, 1, 'GREYSON', '4755', '101', '1'))
+        self.assertEqual(row[17:], (52, 50, 4.0, 'PASS', 2, 'GREYSON_4755_1_101'))
+
+    def test_bulk_is_constant_round_trips(self):
+        """All matches are staged with one executemany and applied by one procedure call"""
+        self.engine.store_matches(self.matches)
+
+        self.assertTrue(self.cursor.fast_executemany)
+        self.cursor.executemany.assert_called_once()
+        self.assertEqual(len(self.cursor.executemany.call_args[0][1]), 500)
+        self.assertIn('sp_store_enhanced_matches', self.cursor.execute.call_args_list[-1][0][0])
+        self.assertEqual(self.engine.persistence_stats['round_trips'], 4)
+        self.assertEqual(self.engine.persistence_stats['rows'], 500)
+
+    def test_row_by_row_path(self):
+        """The original path makes two calls per match"""
+        self.engine.store_matches(self.matches[:3], bulk=False)
+
+        self.assertEqual(self.cursor.execute.call_count, 7)
+        insert_args = self.cursor.execute.call_args_list[1][0]
+        self.assertEqual(insert_args[0].count('?'), len(insert_args) - 1)
+        self.assertEqual(self.engine.persistence_stats['round_trips'], 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,7 @@
 Unit tests for recordlinkage matching implementation.
 """
 import unittest
+from unittest import mock
 import pandas as pd
 import numpy as np
 from pathlib import Path
@@ -13,6 +14,7 @@ project_root = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(project_root))
 
 from src.reconciliation.recordlinkage_matcher import RecordLinkageMatcher
+from src.utils import db
 
 class TestRecordLinkageMatcher(unittest.TestCase):
     """Test the RecordLinkageMatcher class"""
@@ -212,5 +214,161 @@ class TestRecordLinkageMatcher(unittest.TestCase):
         self.assertEqual(len(matching_rows), 0)
 
 
+class TestSaveResults(unittest.TestCase):
+    """Test batched persistence against the per-row path"""
+    
+    setUp = TestRecordLinkageMatcher.setUp
+    
+    def _match(self):
+        matcher = RecordLinkageMatcher(self.customer_name, self.config)
+        matches, uncertain, unmatched = matcher.match(self.orders_df, self.shipments_df)
+        return matcher, (matches, uncertain, unmatched, self.orders_df, self.shipments_df, '12345')
+    
+    def test_batched_matches_row_by_row(self):
+        """The batched writer stages the same results, scores and queue entries"""
+        matcher, args = self._match()
+        
+        calls = {'results': [], 'scores': [], 'queue': []}
+        def fake_save_result(**result):
+            calls['results'].append(result)
+            return len(calls['results'])
+        with mock.patch('src.reconciliation.recordlinkage_matcher.save_reconciliation_result', side_effect=fake_save_result), \
+             mock.patch('src.reconciliation.recordlinkage_matcher.save_attribute_scores',
+                        side_effect=lambda rid, scores: calls['scores'].extend((rid - 1, s) for s in scores)), \
+             mock.patch('src.reconciliation.recordlinkage_matcher.add_to_hitl_queue',
+                        side_effect=lambda rid, priority: calls['queue'].append((rid - 1, priority))):
+            expected_counts = matcher.save_results(*args, batched=False)
+        
+        conn = mock.MagicMock()
+        with mock.patch.object(db, 'get_connection', return_value=conn):
+            counts = matcher.save_results(*args, flush_size=2)
+        
+        self.assertEqual(counts, expected_counts)
+        cursor = conn.cursor.return_value
+        staged = {}
+        for call in cursor.executemany.call_args_list:
+            table = call[0][0].split()[2]
+            staged.setdefault(table, []).extend(call[0][1])
+        
+        results = [dict(zip(db.ReconciliationResultWriter.RESULT_COLUMNS, row[1:])) for row in staged['reconciliation_result_staging']]
+        self.assertEqual([r['row_key'] for r in results], list(range(len(calls['results']))))
+        for result, expected in zip(results, calls['results']):
+            self.assertEqual(result['match_status'], expected['match_status'])
+            self.assertEqual(result['shipment_id'], expected['shipment_id'])
+            self.assertEqual(result['match_details'], str(expected['match_details']))
+        
+        scores = [(row[1], row[2], row[5]) for row in staged['match_attribute_score_staging']]
+        self.assertEqual(scores, [(key, s['attribute_name'], s['match_score']) for key, s in calls['scores']])
+        self.assertEqual([row[1:] for row in staged['hitl_queue_staging']], calls['queue'])
+        
+        # Two flushes of two results and one of one, each merged and committed
+        merges = [c for c in cursor.execute.call_args_list if 'sp_merge_reconciliation_results' in c[0][0]]
+        self.assertEqual(len(merges), (len(results) + 1) // 2)
+        self.assertEqual(conn.commit.call_count, len(merges))
+    
+    def test_transactional_failure_rolls_back(self):
+        """In all-or-nothing mode nothing is committed when a flush fails"""
+        matcher, args = self._match()
+        conn = mock.MagicMock()
+        conn.cursor.return_value.execute.side_effect = [None, RuntimeError('merge failed')]
+        with mock.patch.object(db, 'get_connection', return_value=conn):
+            with self.assertRaises(RuntimeError):
+                matcher.save_results(*args, flush_size=1, transactional=True)
+        conn.commit.assert_not_called()
+        conn.rollback.assert_called()
+
+
+
+class TestMultiPassIndexing(unittest.TestCase):
+    """Test the blocking passes, the candidate pair budget and the indexing stats"""
+    
+    setUp = TestRecordLinkageMatcher.setUp
+    
+    def _build(self, orders, shipments, **blocking):
+        config = dict(self.config, blocking={'full_comparison_below': '0', **blocking})
+        matcher = RecordLinkageMatcher(self.customer_name, config)
+        orders, shipments = matcher.prepare_data(pd.DataFrame(orders), pd.DataFrame(shipments))
+        return matcher, set(matcher.build_comparison_space(orders, shipments))
+    
+    def test_small_inputs_use_full_comparison(self):
+        """Below full_comparison_below every pair is compared"""
+        matcher = RecordLinkageMatcher(self.customer_name, self.config)
+        orders, shipments = matcher.prepare_data(self.orders_df, self.shipments_df)
+        pairs = matcher.build_comparison_space(orders, shipments)
+        self.assertEqual(len(pairs), 9)
+        self.assertEqual(matcher.indexing_stats['passes'], {'full': 9})
+    
+    def test_typo_styles_are_candidates(self):
+        """Sorted neighbourhood on the normalized style pairs styles exact blocking misses"""
+        orders = {'po_number': ['1', '1', '2'], 'style': ['ABC-123', 'MNO555', 'ZZZ900'], 'color': ['RED', 'BLUE', 'GREEN']}
+        shipments = {'po_number': ['1', '1', '2'], 'style': ['ABC 123', 'MNO556', 'ZZZ900'], 'color': ['RED', 'PINK', 'GREEN']}
+        
+        _, exact_only = self._build(orders, shipments, style_window='0', color_ngram='0')
+        self.assertEqual(exact_only, {(2, 2)})
+        
+        matcher, pairs = self._build(orders, shipments, style_window='3', color_ngram='0')
+        self.assertTrue({(0, 0), (1, 1), (2, 2)} <= pairs)
+        self.assertEqual(set(matcher.indexing_stats['passes']), {'block:style', 'sorted_neighbourhood:style'})
+    
+    def test_color_ngrams_block_within_po(self):
+        """Colours sharing n-grams are paired only inside the same PO"""
+        orders = {'po_number': ['1', '2'], 'style': ['AAA111', 'BBB222'], 'color': ['HEATHER GREY', 'HEATHER GREY']}
+        shipments = {'po_number': ['1'], 'style': ['QQQ999'], 'color': ['HTHR GREY']}
+        
+        _, pairs = self._build(orders, shipments, style_window='0')
+        self.assertEqual(pairs, {(0, 0)})
+    
+    def test_budget_keeps_pairs_found_by_more_passes(self):
+        """Over max_candidate_pairs, pairs agreeing across passes are kept"""
+        orders = {'po_number': ['1'] * 3, 'style': ['ABC123', 'ABC124', 'XYZ999'], 'color': ['NAVY'] * 3}
+        shipments = {'po_number': ['1'] * 2, 'style': ['ABC123', 'XYZ999'], 'color': ['NAVY'] * 2}
+        
+        matcher, pairs = self._build(orders, shipments, style_window='3', max_candidate_pairs='2')
+        self.assertEqual(pairs, {(0, 0), (2, 1)})
+        self.assertEqual(matcher.indexing_stats['candidate_pairs'], 2)
+        self.assertEqual(matcher.indexing_stats['dropped_by_budget'], 4)
+    
+    def test_reduction_ratio_and_recall(self):
+        """Stats report the share of pairs skipped and of known exact matches kept"""
+        orders = {'po_number': ['1', '1'], 'style': ['ABC123', 'DEF456'], 'color': ['RED', 'BLUE'], 'size': ['M', 'L']}
+        shipments = {'po_number': ['1', '1'], 'style': ['ABC123', 'DEF456'], 'color': ['RED', 'BLUE'], 'size': ['M', 'S']}
+        
+        matcher, pairs = self._build(orders, shipments, style_window='0', color_ngram='0')
+        stats = matcher.indexing_stats
+        self.assertEqual(pairs, {(0, 0), (1, 1)})
+        self.assertEqual(stats['full_pairs'], 4)
+        self.assertEqual(stats['reduction_ratio'], 0.5)
+        self.assertEqual(stats['exact_matches'], 1)
+        self.assertEqual(stats['exact_match_recall'], 1.0)
+        
+        matcher, _ = self._build(orders, shipments, exact_blocks='', style_window='0', max_candidate_pairs='0')
+        self.assertEqual(matcher.indexing_stats['exact_match_recall'], 0.0)
+    
+    def test_full_comparison_over_budget_is_not_built(self):
+        """With no pass applying, a full product over max_candidate_pairs is refused, not built and trimmed"""
+        orders = {'po_number': ['1', '2'], 'style': ['ABC123', 'DEF456'], 'color': ['RED', 'BLUE']}
+        shipments = {'po_number': ['1', '2'], 'style': ['ABC123', 'DEF456'], 'color': ['RED', 'BLUE']}
+        
+        with mock.patch('recordlinkage.Index.full') as full:
+            matcher, pairs = self._build(orders, shipments, exact_blocks='', style_window='0', color_ngram='0',
+                                         max_candidate_pairs='3', full_comparison_below='10')
+        full.assert_not_called()
+        self.assertEqual(pairs, set())
+        self.assertEqual(matcher.indexing_stats['passes'], {})
+        self.assertEqual(matcher.indexing_stats['dropped_by_budget'], 4)
+    
+    def test_unscoped_color_ngrams_over_budget_are_skipped(self):
+        """Without a color_block_on column the n-gram pass only runs when the whole product fits the budget"""
+        orders = {'po_number': ['1', '2'], 'style': ['AAA111', 'BBB222'], 'color': ['NAVY', 'NAVY']}
+        shipments = {'po_number': ['1', '2'], 'style': ['QQQ999', 'RRR888'], 'color': ['NAVY', 'NAVY']}
+        
+        _, pairs = self._build(orders, shipments, exact_blocks='', style_window='0', color_block_on='store')
+        self.assertEqual(pairs, {(0, 0), (0, 1), (1, 0), (1, 1)})
+        
+        matcher, pairs = self._build(orders, shipments, exact_blocks='', style_window='0', color_block_on='store',
+                                     max_candidate_pairs='3')
+        self.assertEqual(pairs, set())
+        self.assertEqual(matcher.indexing_stats['passes'], {'ngram:color': 0})
+
 if __name__ == '__main__':
     unittest.main()
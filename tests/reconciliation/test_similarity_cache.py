@@ -0,0 +1,85 @@
+"""
+Unit tests for the two-tier similarity cache.
+"""
+import unittest
+import tempfile
+import numpy as np
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from rapidfuzz import fuzz
+from src.reconciliation.similarity_cache import SimilarityCache
+
+
+class TestSimilarityCache(unittest.TestCase):
+    """Test cached scores, tiers, counters and eviction"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'similarity.sqlite'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_scores_match_rapidfuzz(self):
+        """Cached scores equal direct rapidfuzz calls, including missing values"""
+        cache = SimilarityCache(path=None)
+        pairs = [('WOLF BLUE', 'BLUE WOLF'), ('ARCTIC / BLUE', 'ARCTIC  BLUE'), (None, 'AIR'),
+                 (np.nan, 'SEA'), ('LJ123', 'LJ124'), ('', '')]
+        for a, b in pairs:
+            self.assertEqual(cache.score(a, b), fuzz.token_set_ratio(a, b))
+            self.assertEqual(cache.score(b, a), fuzz.token_set_ratio(b, a))
+
+    def test_memory_tier_counts_hits_and_evicts(self):
+        """Repeated lookups hit memory; the oldest entries are evicted first"""
+        cache = SimilarityCache(path=None, max_memory_entries=2)
+        cache.score('A', 'B')
+        cache.score('B', 'A')
+        cache.score('C', 'D')
+        cache.score('E', 'F')
+        self.assertEqual(cache.stats['memory_hits'], 1)
+        self.assertEqual(cache.stats['misses'], 3)
+        self.assertEqual(cache.stats['memory_evictions'], 1)
+        self.assertNotIn(cache.key('A', 'B'), cache._memory)
+
+    def test_disk_tier_persists_across_instances(self):
+        """A new process-level cache finds earlier scores on disk"""
+        first = SimilarityCache(path=str(self.path))
+        expected = first.score('NAVY BLAZER', 'BLAZER NAVY')
+        first.close()
+
+        second = SimilarityCache(path=str(self.path))
+        self.assertEqual(second.score('BLAZER NAVY', 'NAVY BLAZER'), expected)
+        self.assertEqual(second.stats['disk_hits'], 1)
+        self.assertEqual(second.stats['misses'], 0)
+        second.close()
+
+    def test_disk_eviction_drops_least_recently_used(self):
+        """The disk tier is trimmed to capacity on flush"""
+        cache = SimilarityCache(path=str(self.path), max_disk_entries=3)
+        for i in range(5):
+            cache.score(f'STYLE{i}', 'STYLE')
+            cache.flush()
+        summary = cache.summary()
+        self.assertEqual(summary['disk_entries'], 3)
+        self.assertEqual(summary['disk_evictions'], 2)
+        cache.close()
+
+    def test_preload_warms_disk_tier(self):
+        """Preloaded vocabularies are served from disk without scoring"""
+        cache = SimilarityCache(path=str(self.path))
+        stored = cache.preload(['RED', 'NAVY'], ['RED', 'DARK NAVY', 'BLUE'])
+        self.assertEqual(stored, 6)
+
+        self.assertEqual(cache.score('NAVY', 'DARK NAVY'), fuzz.token_set_ratio('NAVY', 'DARK NAVY'))
+        self.assertEqual(cache.stats['disk_hits'], 1)
+        self.assertEqual(cache.stats['misses'], 0)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Unit tests for the Layer 3 split shipment solver.
+"""
+import unittest
+import itertools
+import pandas as pd
+import numpy as np
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.reconciliation.split_solver import (
+    RemainingQuantityIndex,
+    best_subset,
+    classify_gap_fill
+)
+
+
+def _brute_force_gap(quantities, target, max_items):
+    """Smallest |target - sum| over every combination of up to max_items positive quantities"""
+    positive = [q for q in quantities if q > 0]
+    best = target
+    for size in range(1, max_items + 1):
+        for combo in itertools.combinations(positive, size):
+            best = min(best, abs(target - sum(combo)))
+    return best
+
+
+class TestBestSubset(unittest.TestCase):
+    """Test the bounded subset-sum search"""
+
+    def test_matches_brute_force(self):
+        """The pruned search finds the same closest total as full enumeration"""
+        rng = np.random.default_rng(11)
+        for _ in range(200):
+            quantities = rng.integers(-5, 80, rng.integers(1, 10)).astype(float)
+            target = float(rng.integers(1, 200))
+            max_items = int(rng.integers(1, 4))
+            picked, total = best_subset(quantities, target, max_items)
+            self.assertLessEqual(len(picked), max_items)
+            self.assertAlmostEqual(abs(target - total), _brute_force_gap(quantities, target, max_items))
+
+    def test_exact_single_order_beats_equal_combination(self):
+        """Ties prefer the combination with fewer orders"""
+        picked, total = best_subset([30, 20, 50, 10], 50)
+        self.assertEqual(picked, (2,))
+        self.assertEqual(total, 50.0)
+
+    def test_combines_orders_to_close_gap(self):
+        """Several orders are combined when no single order fits"""
+        picked, total = best_subset([40, 35, 25, 5], 100)
+        self.assertEqual(sorted(picked), [0, 1, 2])
+        self.assertEqual(total, 100.0)
+
+    def test_nothing_to_close(self):
+        """No positive target or no positive quantities gives no combination"""
+        self.assertEqual(best_subset([10, 20], 0), ((), 0.0))
+        self.assertEqual(best_subset([0, -3], 10), ((), 0.0))
+        self.assertEqual(best_subset([500], 10), ((), 0.0))
+
+
+class TestRemainingQuantityIndex(unittest.TestCase):
+    """Test grouped remaining quantities"""
+
+    def setUp(self):
+        self.index = RemainingQuantityIndex(
+            pd.Series(['A', 'A', 'B', 'A']),
+            pd.Series(['RED', 'RED', 'RED', 'NAVY']),
+            [30.0, 20.0, 50.0, 0.0]
+        )
+
+    def test_exact_candidates_skip_filled_orders(self):
+        """Only orders with open quantity for the exact key are returned"""
+        self.assertEqual(self.index.exact_candidates('A', 'RED').tolist(), [0, 1])
+        self.assertEqual(self.index.exact_candidates('A', 'NAVY').tolist(), [])
+        self.assertEqual(self.index.exact_candidates('C', 'RED').tolist(), [])
+
+    def test_candidates_from_compatibility_masks(self):
+        """Compatible groups are merged back into frame order"""
+        style_ok = np.array([True, True])   # A, B
+        color_ok = np.array([True, False])  # RED, NAVY
+        self.assertEqual(self.index.candidates(style_ok, color_ok).tolist(), [0, 1, 2])
+
+    def test_consume_draws_down_in_turn(self):
+        """Allocations fill orders in turn and the last order takes any overshoot"""
+        positions, total = self.index.solve(self.index.exact_candidates('A', 'RED'), 55)
+        self.assertEqual(total, 50.0)
+        allocated = self.index.consume(positions, 55)
+        self.assertEqual(allocated.sum(), 55.0)
+        self.assertEqual(self.index.remaining[[0, 1]].tolist(), [0.0, 0.0])
+        self.assertEqual(self.index.exact_candidates('A', 'RED').tolist(), [])
+
+
+class TestClassifyGapFill(unittest.TestCase):
+    """Test the Layer 3 EXCELLENT/GOOD/PARTIAL bands"""
+
+    def test_small_gap_bands(self):
+        self.assertEqual(classify_gap_fill(10, 12, 2), 'EXCELLENT')
+        self.assertEqual(classify_gap_fill(10, 18, 20), 'GOOD')
+        self.assertEqual(classify_gap_fill(10, 30, 5), 'PARTIAL')
+
+    def test_large_gap_bands(self):
+        self.assertEqual(classify_gap_fill(100, 95, 3), 'EXCELLENT')
+        self.assertEqual(classify_gap_fill(100, 75, 15), 'GOOD')
+        self.assertEqual(classify_gap_fill(100, 40, 30), 'PARTIAL')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+Unit tests for the debounced incremental shipment_summary_cache refresh.
+"""
+import unittest
+import threading
+from unittest import mock
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.reconciliation import summary_cache_refresh
+from src.reconciliation.summary_cache_refresh import SummaryCacheRefresher, shipment_id_list
+
+STATS_COLUMNS = ['requested_shipments', 'rows_processed', 'rows_updated', 'rows_inserted',
+                 'rows_deleted', 'rows_renumbered', 'duration_ms']
+
+
+class FakeConnection:
+    """Records procedure calls and answers each with a stats row"""
+
+    def __init__(self, calls):
+        self.calls = calls
+        self.cursor_obj = mock.Mock()
+        self.cursor_obj.description = [(column,) for column in STATS_COLUMNS]
+        self.cursor_obj.execute.side_effect = self._execute
+        self.cursor_obj.fetchone.side_effect = lambda: self._last_row
+
+    def _execute(self, sql, rows, session_id, coalesced_requests):
+        self.calls.append((rows, session_id, coalesced_requests))
+        self._last_row = (len(rows), len(rows), len(rows) - 1, 1, 0, 2, 5)
+
+    def cursor(self):
+        return self.cursor_obj
+
+    def commit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class TestSummaryCacheRefresher(unittest.TestCase):
+    """Test coalescing, chunked table-valued parameters and summed stats"""
+
+    def setUp(self):
+        self.calls = []
+        self.connect = lambda: FakeConnection(self.calls)
+
+    def test_shipment_id_list(self):
+        """Ids are de-duplicated integers; values that are not integers are skipped"""
+        self.assertEqual(shipment_id_list(['12', 10, 12, ' 11 ', 'ABC', None]), [10, 11, 12])
+
+    def test_requests_are_coalesced_into_one_refresh(self):
+        """Overlapping requests within the debounce window refresh once"""
+        refresher = SummaryCacheRefresher(connect=self.connect, debounce_seconds=60)
+        refresher.request([3, 1], session_id='S1')
+        self.assertEqual(refresher.request([2, 3], session_id='S2'), 3)
+        self.assertEqual(self.calls, [])
+
+        stats = refresher.flush()
+        self.assertEqual(self.calls, [([(1,), (2,), (3,)], 'S2', 2)])
+        self.assertEqual(stats['requested_shipments'], 3)
+        self.assertEqual(stats['coalesced_requests'], 2)
+        self.assertEqual(list(refresher.history), [stats])
+        self.assertIsNone(refresher.flush())
+
+    def test_debounce_timer_refreshes(self):
+        """Pending ids are refreshed once the debounce window passes"""
+        refreshed = threading.Event()
+        refresher = SummaryCacheRefresher(connect=self.connect, debounce_seconds=0.01)
+        original = refresher.refresh
+
+        def refresh(*args, **kwargs):
+            stats = original(*args, **kwargs)
+            refreshed.set()
+            return stats
+
+        refresher.refresh = refresh
+        refresher.request([5])
+        self.assertTrue(refreshed.wait(5))
+        self.assertEqual(self.calls[0][0], [(5,)])
+
+    def test_large_requests_are_chunked(self):
+        """One procedure call per chunk, with row counts summed across calls"""
+        refresher = SummaryCacheRefresher(connect=self.connect, debounce_seconds=60)
+        with mock.patch.object(summary_cache_refresh, 'REFRESH_CHUNK', 2):
+            stats = refresher.refresh([1, 2, 3, 4, 5])
+
+        self.assertEqual([rows for rows, _, _ in self.calls], [[(1,), (2,)], [(3,), (4,)], [(5,)]])
+        self.assertEqual(stats['calls'], 3)
+        self.assertEqual(stats['rows_processed'], 5)
+        self.assertEqual(stats['rows_updated'], 2)
+        self.assertEqual(stats['rows_inserted'], 3)
+        self.assertEqual(stats['rows_renumbered'], 6)
+
+    def test_failed_refresh_is_logged(self):
+        """A database error is logged rather than raised into the matching run"""
+        def connect():
+            raise RuntimeError("database unavailable")
+
+        refresher = SummaryCacheRefresher(connect=connect, debounce_seconds=60)
+        refresher.request([1])
+        with self.assertLogs(summary_cache_refresh.logger, level='ERROR'):
+            self.assertIsNone(refresher.flush())
+
+
+if __name__ == '__main__':
+    unittest.main()
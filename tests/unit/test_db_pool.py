@@ -0,0 +1,146 @@
+"""
+Unit tests for the project-wide connection pool.
+"""
+import unittest
+import threading
+from unittest import mock
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+import pyodbc
+
+from utils import db_pool
+
+
+class FakeConnection:
+    """Connection stand-in that records commits, rollbacks and closes"""
+
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.closed = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        if not self.healthy:
+            raise pyodbc.Error("08S01", "Communication link failure")
+        return mock.MagicMock()
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Test reuse, bounding, recycling and health checks"""
+
+    def setUp(self):
+        self.connections = []
+
+        def connect():
+            conn = FakeConnection()
+            self.connections.append(conn)
+            return conn
+
+        self.pool = db_pool.ConnectionPool(connect, label="test", max_size=2, max_lifetime=60,
+                                           health_check_after=30, timeout=0.2)
+
+    def test_connection_is_reused(self):
+        """Closing returns the connection to the pool, rolled back and still open"""
+        conn = self.pool.acquire()
+        first = conn.raw
+        conn.close()
+        self.assertFalse(first.closed)
+        self.assertEqual(first.rollbacks, 1)
+
+        self.assertIs(self.pool.acquire().raw, first)
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(self.pool.stats["reused"], 1)
+
+    def test_context_manager_commits_and_returns(self):
+        with self.pool.acquire() as conn:
+            raw = conn.raw
+        self.assertEqual(raw.commits, 1)
+        self.assertEqual(self.pool.summary()["idle"], 1)
+        with self.assertRaises(pyodbc.ProgrammingError):
+            conn.cursor()
+
+    def test_bounded_wait_and_timeout(self):
+        """A full pool blocks until a connection is returned, then times out"""
+        held = [self.pool.acquire(), self.pool.acquire()]
+        with self.assertRaises(TimeoutError):
+            self.pool.acquire()
+
+        threading.Timer(0.05, held[0].close).start()
+        conn = self.pool.acquire()
+        self.assertIs(conn.raw, self.connections[0])
+        self.assertEqual(self.pool.stats["waits"], 2)
+
+    def test_max_lifetime_recycling(self):
+        conn = self.pool.acquire()
+        first = conn.raw
+        conn.close()
+        with mock.patch("utils.db_pool.time.monotonic", return_value=db_pool.time.monotonic() + 120):
+            second = self.pool.acquire().raw
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        self.assertEqual(self.pool.stats["recycled"], 1)
+
+    def test_health_check_failure(self):
+        """Idle connections are pinged and replaced when the ping fails"""
+        conn = self.pool.acquire()
+        first = conn.raw
+        conn.close()
+        first.healthy = False
+        with mock.patch("utils.db_pool.time.monotonic", return_value=db_pool.time.monotonic() + 45):
+            second = self.pool.acquire().raw
+        self.assertIsNot(second, first)
+        self.assertEqual(self.pool.stats["health_check_failures"], 1)
+
+    def test_close_all_retires_checked_out(self):
+        conn = self.pool.acquire()
+        idle = self.pool.acquire()
+        idle.close()
+        self.pool.close_all()
+        self.assertTrue(self.connections[1].closed)
+
+        conn.close()
+        self.assertTrue(self.connections[0].closed)
+        self.assertEqual(self.pool.summary()["in_use"], 0)
+
+    def test_registry_is_per_key(self):
+        with mock.patch.dict(db_pool._pools, clear=True):
+            connect = mock.Mock(side_effect=FakeConnection)
+            with db_pool.pooled_connection("orders", connect):
+                pass
+            with db_pool.pooled_connection("orders", connect):
+                pass
+            self.assertEqual(connect.call_count, 1)
+            self.assertEqual(db_pool.pool_stats()["orders"]["reused"], 1)
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_resolve_driver(self):
+        with mock.patch("utils.db_pool.pyodbc.drivers", return_value=["SQL Server"]):
+            db_pool.resolve_driver.cache_clear()
+            self.assertEqual(db_pool.resolve_driver(("{ODBC Driver 17 for SQL Server}", "{SQL Server}")),
+                             "{SQL Server}")
+        db_pool.resolve_driver.cache_clear()
+
+    def test_describe_hides_credentials(self):
+        label = db_pool.describe("Driver={SQL Server};Server=tcp:db.example.net;Database=ORDERS;UID=u;PWD=secret;")
+        self.assertEqual(label, "db.example.net/ORDERS")
+
+
+if __name__ == "__main__":
+    unittest.main()
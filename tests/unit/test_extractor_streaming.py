@@ -0,0 +1,72 @@
+"""
+Unit tests for streaming, column-projected extraction.
+"""
+import unittest
+from unittest import mock
+import pandas as pd
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.core import extractor
+
+
+def _chunks(df, size):
+    return (df.iloc[i:i + size].reset_index(drop=True) for i in range(0, len(df), size))
+
+
+class TestStreamingExtraction(unittest.TestCase):
+    """Test projection, chunk regrouping and the PO merge-join"""
+
+    def setUp(self):
+        self.cfg = {
+            "aliases": ["GREYSON"],
+            "map": {"PO NUMBER": "Customer_PO", "CUSTOMER STYLE": "Style", "COLOUR": "Color"},
+            "order_key_config": {"unique_keys": ["AAG ORDER NUMBER"], "extra_checks": ["PO NUMBER"]}
+        }
+        self.orders = pd.DataFrame({
+            "PO NUMBER": ["100", "100", "200", "300", "300", "300"],
+            "CUSTOMER STYLE": list("ABCDEF")
+        })
+        self.ships = pd.DataFrame({
+            "shipment_id": range(6),
+            "Customer_PO": ["100", "150", "150", "300", "300", "300"],
+            "Style": list("AXYDEF")
+        })
+
+    def test_projected_columns(self):
+        """Only referenced columns that exist are selected, without duplicates"""
+        available = ["CUSTOMER NAME", "PO NUMBER", "CUSTOMER STYLE", "CUSTOMER COLOUR DESCRIPTION",
+                     "AAG ORDER NUMBER", "UNUSED"]
+        self.assertEqual(
+            extractor.projected_columns(self.cfg, "orders", available),
+            ["CUSTOMER NAME", "PO NUMBER", "CUSTOMER STYLE", "CUSTOMER COLOUR DESCRIPTION", "AAG ORDER NUMBER"]
+        )
+        self.assertEqual(extractor.projected_columns(self.cfg, "shipments")[0], "shipment_id")
+
+    def test_partitions_span_chunk_boundaries(self):
+        """A PO split across chunks comes back as one partition"""
+        parts = list(extractor._partition_sorted(_chunks(self.orders, 2), "PO NUMBER"))
+        self.assertEqual([(po, len(df)) for po, df in parts], [("100", 2), ("200", 1), ("300", 3)])
+
+    def test_stream_po_partitions_merge_join(self):
+        """Each shipment PO gets its orders; POs without orders get an empty frame"""
+        def fake_iter_query(sql, db_key, params=None, chunksize=50_000):
+            return _chunks(self.orders if db_key == "orders" else self.ships, chunksize)
+
+        with mock.patch.object(extractor, "iter_query", side_effect=fake_iter_query), \
+             mock.patch.object(extractor, "table_columns",
+                               side_effect=lambda table, db_key: list((self.orders if db_key == "orders" else self.ships).columns)):
+            parts = list(extractor.stream_po_partitions(self.cfg, ["GREYSON"], chunksize=2))
+
+        self.assertEqual([po for po, _, _ in parts], ["100", "150", "300"])
+        self.assertEqual([len(o) for _, o, _ in parts], [2, 0, 3])
+        self.assertEqual([len(s) for _, _, s in parts], [1, 2, 3])
+        self.assertEqual(list(parts[1][1].columns), ["PO NUMBER", "CUSTOMER STYLE"])
+
+
+if __name__ == '__main__':
+    unittest.main()
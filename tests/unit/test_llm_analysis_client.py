@@ -0,0 +1,85 @@
+"""
+Unit tests for the PO-batched LLM analysis client.
+"""
+import unittest
+import tempfile
+import threading
+import json
+from unittest import mock
+import pandas as pd
+from pathlib import Path
+import sys
+
+# Add src to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root / 'src'))
+
+import llm_analysis_client_batched as client
+from llm_response_cache import LLMResponseCache
+
+COLUMNS = ['PO NUMBER', 'CUSTOMER STYLE', 'CUSTOMER COLOUR DESCRIPTION', 'PLANNED DELIVERY METHOD']
+
+
+def _rows(*rows):
+    return pd.DataFrame(list(rows), columns=COLUMNS)
+
+
+class TestPOBatches(unittest.TestCase):
+    """Test that concurrently analysed PO batches keep their own outputs and usage"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.both_in_flight = threading.Barrier(2, timeout=5)
+        self.cache = LLMResponseCache(path=None)
+
+        def post(url, json, timeout):
+            # Both batches wait here, so their responses and files land in the same second
+            self.both_in_flight.wait()
+            # Another analysis in the same process uses the shared cache meanwhile
+            self.cache.get({'model': 'other', 'messages': [{'role': 'user', 'content': 'unrelated'}]})
+            style = 'AAA-1' if 'AAA-1' in json['messages'][1]['content'] else 'BBB-2'
+            content = ('Delivery names differ.\n```json\n'
+                       f'{{"suggested_mappings": [{{"column": "CUSTOMER STYLE", "order_value": "{style}", '
+                       f'"shipment_value": "{style}X", "confidence": 0.9}}]}}\n```')
+            return mock.Mock(**{'json.return_value': {'choices': [{'message': {'content': content}}],
+                                                      'usage': {'completion_tokens': 10}}})
+
+        patches = [
+            mock.patch.object(client, 'REPORTS_ROOT', Path(self.tmp.name)),
+            mock.patch.object(client, 'get_llm_response_cache', return_value=self.cache),
+            mock.patch.object(client.requests, 'post', side_effect=post),
+            mock.patch.dict(client.LLM_CFG, {'max_in_flight': 2}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _analyze(self):
+        unmatched = _rows(['100', 'AAA-1X', 'NAVY', 'SEA'], ['200', 'BBB-2X', 'RED', 'SEA'])
+        orders = _rows(['100', 'AAA-1', 'NAVY', 'FAST BOAT'], ['200', 'BBB-2', 'RED', 'FAST BOAT'])
+        summary = {'customer': 'GREYSON', 'date_range': 'shipped_2025-01', 'total_shipments': 2,
+                   'exact_matches': 0, 'fuzzy_matches': 0, 'unmatched': 2, 'match_rate': 0.0}
+        return client.analyze_by_po_batches('GREYSON', {'unmatched': unmatched, 'orders': orders},
+                                            summary, 'shipped_2025-01')
+
+    def test_concurrent_batches_keep_their_mapping_files(self):
+        result = self._analyze()
+
+        self.assertEqual([batch['po_number'] for batch in result['batch_results']], ['100', '200'])
+        files = sorted((Path(self.tmp.name) / 'GREYSON' / 'mapping_suggestions').glob('*.json'))
+        self.assertEqual(len(files), 2)
+        styles = {json.loads(path.read_text())['mappings']['suggested_mappings'][0]['order_value'] for path in files}
+        self.assertEqual(styles, {'AAA-1', 'BBB-2'})
+
+    def test_usage_counts_only_this_run(self):
+        """Calls made through the shared cache by other analyses stay out of the run's usage"""
+        usage = self._analyze()['llm_usage']
+
+        self.assertEqual((usage['calls'], usage['hits'], usage['misses']), (2, 0, 2))
+        self.assertEqual(usage['completion_tokens'], 20)
+        self.assertEqual(self.cache.stats['misses'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
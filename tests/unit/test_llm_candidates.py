@@ -0,0 +1,61 @@
+"""
+Unit tests for LLM candidate retrieval and prompt packing.
+"""
+import unittest
+import pandas as pd
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.core.llm_candidates import CandidateIndex, pack_prompts
+
+
+def _orders():
+    return pd.DataFrame({
+        'PO NUMBER': ['100', '100', '200', '300', '400'],
+        'CUSTOMER STYLE': ['LGX-1001', 'LGX-1002', 'MSW-2001', 'LGX-1001', 'ZZZ-9'],
+        'CUSTOMER COLOUR DESCRIPTION': ['NAVY', 'RED', 'NAVY', 'ARCTIC BLUE', 'BLACK']
+    })
+
+
+class TestCandidateIndex(unittest.TestCase):
+    """Test that retrieval finds the right orders without scanning unrelated ones"""
+
+    def test_top_candidates(self):
+        """PO, style and colour agreement rank the right order first"""
+        index = CandidateIndex(_orders(), top_k=2)
+        ships = pd.DataFrame({'Customer_PO': ['100', '999'], 'Style': ['LGX1001', 'LGX-1001'],
+                              'Color': ['NAVY', 'BLUE ARCTIC']})
+        found = index.retrieve(ships, {'PO NUMBER': 'Customer_PO'})
+
+        self.assertEqual([position for _, position in found[0]], [0, 1])
+        self.assertEqual(found[1][0][1], 3)
+
+    def test_no_plausible_candidate(self):
+        """Shipments sharing nothing with the order book get no candidates"""
+        index = CandidateIndex(_orders())
+        ships = pd.DataFrame({'Customer_PO': ['555'], 'Style': ['QQ'], 'Color': ['NAVY']})
+        self.assertEqual(index.retrieve(ships), [[]])
+
+
+class TestPackPrompts(unittest.TestCase):
+    """Test grouping by candidate set and the per-prompt and per-run bounds"""
+
+    def test_shared_candidates_share_a_prompt(self):
+        candidates = [[(0.9, 1), (0.5, 2)], [(0.8, 2), (0.4, 1)], [(0.7, 5)], []]
+        prompts, skipped = pack_prompts(candidates, max_shipments=10, max_orders=2)
+        self.assertEqual(prompts, [([0, 1], [1, 2]), ([2], [5])])
+        self.assertEqual(skipped, [])
+
+    def test_call_budget_keeps_strongest(self):
+        candidates = [[(0.4, 1)], [(0.9, 2)], [(0.6, 3)]]
+        prompts, skipped = pack_prompts(candidates, max_shipments=1, max_orders=5, max_calls=2)
+        self.assertEqual(prompts, [([1], [2]), ([2], [3])])
+        self.assertEqual(skipped, [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
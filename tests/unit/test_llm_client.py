@@ -0,0 +1,99 @@
+"""
+Unit tests for the run-level LLM call budget in the matching client.
+"""
+import unittest
+import threading
+import time
+from unittest import mock
+import pandas as pd
+from pathlib import Path
+import sys
+
+# Add project root and src to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / 'src'))
+
+import llm_client
+from core import match_llm
+
+ORDERS = pd.DataFrame({
+    'PO NUMBER': ['100', '200', '300', '400'],
+    'CUSTOMER STYLE': ['LGX-1001', 'MSW-2001', 'KTP-3001', 'RRB-4001'],
+    'CUSTOMER COLOUR DESCRIPTION': ['NAVY', 'RED', 'BLACK', 'WHITE']
+})
+
+
+def _slice(pos, styles):
+    return pd.DataFrame({'Customer_PO': pos, 'Style': styles, 'Color': ['NAVY'] * len(pos)})
+
+
+class TestCallBudget(unittest.TestCase):
+    """Test that every propose_links call of a run shares one budget and one set of request slots"""
+
+    def setUp(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        def request_links(orders_sample, ships_sample):
+            with self.lock:
+                self.calls.append(len(ships_sample))
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            time.sleep(0.02)
+            with self.lock:
+                self.in_flight -= 1
+            return [{'shipment_index': 0, 'order_index': 0, 'confidence': 0.9}]
+
+        patches = [
+            mock.patch.object(llm_client, '_request_links', side_effect=request_links),
+            mock.patch.dict(llm_client.CFG, {'max_shipments_per_prompt': 1, 'concurrency': 2}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_claim(self):
+        budget = llm_client.CallBudget(max_calls=3, concurrency=1)
+        self.assertEqual(budget.claim(2), 2)
+        self.assertEqual(budget.claim(2), 1)
+        self.assertEqual(budget.claim(1), 0)
+        with mock.patch.dict(llm_client.CFG, {'max_calls': None}):
+            self.assertEqual(llm_client.CallBudget().claim(50), 50)
+
+    def test_slices_share_the_run_budget(self):
+        """Two date slices on threads never go over max_calls or the concurrency limit together"""
+        context = match_llm.prepare(ORDERS, llm_client.CallBudget(max_calls=3, concurrency=2))
+        slices = [_slice(['100', '200', '300'], ['LGX-1001', 'MSW-2001', 'KTP-3001']),
+                  _slice(['200', '300', '400'], ['MSW-2001', 'KTP-3001', 'RRB-4001'])]
+        results = []
+
+        def run(ships):
+            results.append(match_llm.match(ORDERS, ships, {'map': {'PO NUMBER': 'Customer_PO'}}, context=context))
+
+        threads = [threading.Thread(target=run, args=(ships,)) for ships in slices]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual(context['budget'].used, 3)
+        self.assertLessEqual(self.max_in_flight, 2)
+        self.assertEqual(sum(len(matched) for matched, _ in results), 3)
+
+    def test_exhausted_budget_sends_nothing(self):
+        budget = llm_client.CallBudget(max_calls=1)
+        index = llm_client.candidate_index(ORDERS)
+        ships = _slice(['100', '200'], ['LGX-1001', 'MSW-2001'])
+
+        first = llm_client.propose_links(ORDERS, ships, index=index, budget=budget)
+        second = llm_client.propose_links(ORDERS, ships, index=index, budget=budget)
+        self.assertEqual((len(first), second), (1, []))
+        self.assertEqual(self.calls, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Unit tests for the on-disk LLM response cache.
+"""
+import unittest
+import tempfile
+from pathlib import Path
+import sys
+
+# Add src to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root / 'src'))
+
+from llm_response_cache import LLMResponseCache
+
+
+def _body(content, temperature=0.3, model='analysis-model'):
+    return {'model': model, 'temperature': temperature, 'max_tokens': 3000,
+            'messages': [{'role': 'user', 'content': content}]}
+
+
+class TestLLMResponseCache(unittest.TestCase):
+    """Test keying, prompt normalisation, size-based eviction and usage counters"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = LLMResponseCache(path=str(Path(self.tmp.name) / 'llm.sqlite'), max_bytes=1000)
+        self.addCleanup(self.cache.close)
+
+    def test_hit_after_put(self):
+        """Whitespace differences share an entry; model and temperature do not"""
+        self.assertIsNone(self.cache.get(_body("Analyze PO 1")))
+        self.cache.put(_body("Analyze PO 1"), "analysis", completion_tokens=40, generation_seconds=2.0)
+
+        self.assertEqual(self.cache.get(_body("Analyze   PO 1\n")), "analysis")
+        self.assertIsNone(self.cache.get(_body("Analyze PO 1", temperature=0.7)))
+        self.assertIsNone(self.cache.get(_body("Analyze PO 1", model='other-model')))
+
+    def test_persists_across_instances(self):
+        self.cache.put(_body("Analyze PO 2"), "stored", completion_tokens=1, generation_seconds=0.1)
+        reopened = LLMResponseCache(path=str(self.cache.path))
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.get(_body("Analyze PO 2")), "stored")
+
+    def test_least_recently_used_evicted_past_size(self):
+        self.cache.put(_body("PO 1"), "a" * 400, 1, 0.1)
+        self.cache.put(_body("PO 2"), "b" * 400, 1, 0.1)
+        self.cache.get(_body("PO 1"))
+        self.cache.put(_body("PO 3"), "c" * 400, 1, 0.1)
+
+        self.assertIsNone(self.cache.get(_body("PO 2")))
+        self.assertIsNotNone(self.cache.get(_body("PO 1")))
+        self.assertIsNotNone(self.cache.get(_body("PO 3")))
+        self.assertEqual(self.cache.stats['evictions'], 1)
+
+    def test_usage_since_snapshot(self):
+        self.cache.put(_body("PO 0"), "x", 10, 1.0)
+        before = self.cache.snapshot()
+        self.cache.get(_body("PO 1"))
+        self.cache.put(_body("PO 1"), "y", 100, 4.0)
+        self.cache.get(_body("PO 1"))
+
+        usage = self.cache.usage_since(before)
+        self.assertEqual((usage['calls'], usage['hits'], usage['misses']), (2, 1, 1))
+        self.assertEqual(usage['completion_tokens'], 100)
+        self.assertAlmostEqual(usage['tokens_per_second'], 25.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+"""
+Unit tests for fuzzy matching with a shared order-side context.
+"""
+import unittest
+import pandas as pd
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.core import match_fuzzy, normalise
+
+
+CFG = {
+    'map': {'PO NUMBER': 'Customer_PO', 'CUSTOMER STYLE': 'Style', 'CUSTOMER COLOUR DESCRIPTION': 'Color'},
+    'fuzzy_threshold': 0.85
+}
+
+
+def _orders():
+    return pd.DataFrame({
+        'CUSTOMER NAME': ['GREYSON'] * 3,
+        'PO NUMBER': ['1', '1', '2'],
+        'CUSTOMER STYLE': ['A', 'B', 'C'],
+        'CUSTOMER COLOUR DESCRIPTION': ['NAVY BLUE', 'RED', 'GREEN'],
+        'PLANNED DELIVERY METHOD': ['SEA', 'AIR', 'SEA']
+    })
+
+
+def _ships(colors):
+    return pd.DataFrame({
+        'shipment_id': range(len(colors)),
+        'Customer': ['GREYSON'] * len(colors),
+        'Customer_PO': ['1'] * len(colors),
+        'Style': ['A'] * len(colors),
+        'Color': colors
+    })
+
+
+class TestFuzzyContext(unittest.TestCase):
+    """Test that a prepared context gives the same matches and memoises lookups"""
+
+    def test_context_matches_standalone_call(self):
+        """Slices matched with one shared context equal independent calls"""
+        orders_norm = normalise.order_book(_orders(), 'GREYSON')
+        context = match_fuzzy.prepare(orders_norm)
+        for colors in (['BLUE NAVY', 'PURPLE'], ['BLUE NAVY', 'NAVY  BLUE']):
+            orders, ships = normalise.intern_keys(orders_norm, normalise.shipments(_ships(colors), 'GREYSON'))
+            expected, expected_left = match_fuzzy.match(orders, ships, CFG)
+            shared, shared_left = match_fuzzy.match(orders, ships, CFG, context=context)
+            pd.testing.assert_frame_equal(shared, expected)
+            pd.testing.assert_frame_equal(shared_left, expected_left)
+
+        self.assertEqual(set(context['color_mapping']), {'BLUE NAVY', 'PURPLE', 'NAVY BLUE'})
+        self.assertEqual(context['color_mapping']['BLUE NAVY'][0], 'NAVY BLUE')
+
+
+if __name__ == '__main__':
+    unittest.main()
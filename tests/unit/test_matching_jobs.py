@@ -0,0 +1,101 @@
+"""
+Unit tests for the API's matching job queue.
+"""
+import unittest
+import threading
+from pathlib import Path
+import sys
+
+# Add backend to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root / 'backend'))
+
+from matching_jobs import MatchingJobQueue, SUCCEEDED, FAILED
+
+
+class TestMatchingJobQueue(unittest.TestCase):
+    """Test submission, de-duplication, progress and retention"""
+
+    def setUp(self):
+        self.release = threading.Event()
+
+        def runner(job):
+            job.report('LAYER_0', {'total_matches': 3, 'remaining': 2})
+            self.release.wait(5)
+            if job.options.get('fail'):
+                raise RuntimeError("database unavailable")
+            return {'status': 'SUCCESS', 'total_matches': 3, 'matches': [{'shipment_id': 1}]}
+
+        self.queue = MatchingJobQueue(runner, max_workers=2, max_jobs=2)
+
+    def tearDown(self):
+        self.release.set()
+        self.queue.shutdown()
+
+    def _wait(self, job):
+        self.release.set()
+        for _ in range(500):
+            if not job.active:
+                return
+            threading.Event().wait(0.01)
+        self.fail("job did not finish")
+
+    def test_same_customer_and_po_is_deduplicated(self):
+        first, created = self.queue.submit('GREYSON', '4755')
+        second, created_again = self.queue.submit('greyson ', ' 4755')
+        other, _ = self.queue.submit('JOHNNIE_O', '4755')
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertIs(second, first)
+        self.assertIsNot(other, first)
+
+        self._wait(first)
+        third, created = self.queue.submit('GREYSON', '4755')
+        self.assertTrue(created)
+        self.assertIsNot(third, first)
+
+    def test_other_po_is_not_deduplicated(self):
+        """A different PO, or the whole customer, is its own run"""
+        first, _ = self.queue.submit('GREYSON', '4755')
+        other_po, created_po = self.queue.submit('GREYSON', '4756')
+        whole, created_whole = self.queue.submit('GREYSON')
+        again, created_again = self.queue.submit('GREYSON', '')
+
+        self.assertTrue(created_po)
+        self.assertTrue(created_whole)
+        self.assertIsNot(other_po, first)
+        self.assertIsNot(whole, first)
+        self.assertFalse(created_again)
+        self.assertIs(again, whole)
+        self.assertEqual(other_po.po_number, '4756')
+
+    def test_progress_and_result(self):
+        job, _ = self.queue.submit('GREYSON')
+        self._wait(job)
+
+        status = job.to_dict()
+        self.assertEqual(status['status'], SUCCEEDED)
+        self.assertEqual(status['progress'], 100)
+        self.assertEqual([stage['stage'] for stage in status['stages']], ['STARTED', 'LAYER_0'])
+        self.assertEqual(status['summary'], {'status': 'SUCCESS', 'total_matches': 3})
+        self.assertNotIn('result', status)
+        self.assertEqual(job.to_dict(include_result=True)['result']['matches'], [{'shipment_id': 1}])
+
+    def test_failure_is_recorded(self):
+        job, _ = self.queue.submit('GREYSON', options={'fail': True})
+        self._wait(job)
+        self.assertEqual(job.status, FAILED)
+        self.assertEqual(job.error, "database unavailable")
+
+    def test_oldest_finished_jobs_are_evicted(self):
+        first, _ = self.queue.submit('A')
+        self._wait(first)
+        self.queue.submit('B')
+        self.queue.submit('C')
+        self.assertIsNone(self.queue.get(first.id))
+        self.assertEqual(len(self.queue.list()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
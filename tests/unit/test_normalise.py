@@ -0,0 +1,89 @@
+"""
+Unit tests for the vectorised normalisation stage.
+"""
+import unittest
+import pandas as pd
+import numpy as np
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.core import normalise, match_exact
+
+
+def _orders():
+    return pd.DataFrame({
+        'CUSTOMER NAME': ['greyson ', 'GREYSON'],
+        'CUSTOMER STYLE': ['  lj 123', 'LJ124'],
+        'CUSTOMER COLOUR DESCRIPTION': ['navy\t blue', None],
+        'PO NUMBER': ['4755', '4755'],
+        'SIZE': ['M', 'L']
+    })
+
+
+def _ships():
+    return pd.DataFrame({
+        'Customer': ['Greyson', 'Greyson', 'Greyson'],
+        'Style': ['LJ 123', 'lj124', 'NEW1'],
+        'Color': ['NAVY BLUE', np.nan, 'RED'],
+        'Customer_PO': ['4755', '4755', '4755'],
+        'Size': ['M', 'SMS', 'S']
+    })
+
+
+class TestNormalise(unittest.TestCase):
+    """Test vectorised normalisation, interning and the order book cache"""
+
+    def setUp(self):
+        normalise._ORDER_BOOK_CACHE.clear()
+
+    def test_matches_row_by_row_upper_trim(self):
+        """Vectorised output equals _upper_trim applied cell by cell"""
+        values = pd.Series(['  a  b ', None, np.nan, 12, 'Ünïcode\nx', ''])
+        expected = values.map(normalise._upper_trim).tolist()
+        self.assertEqual(normalise._upper_trim_series(values).astype(object).tolist(), expected)
+
+    def test_does_not_mutate_input(self):
+        """The caller's frame is left untouched"""
+        orders = _orders()
+        before = orders.copy()
+        normalise.orders(orders, 'GREYSON')
+        pd.testing.assert_frame_equal(orders, before)
+
+    def test_prepare_shares_key_vocabulary(self):
+        """Paired key columns are categorical with identical categories"""
+        orders, ships = normalise.prepare(_orders(), _ships(), 'GREYSON')
+        for order_col, ship_col in zip(normalise.ORDER_KEYS, normalise.SHIPMENT_KEYS):
+            self.assertEqual(orders[order_col].dtype, 'category')
+            self.assertTrue(orders[order_col].cat.categories.equals(ships[ship_col].cat.categories))
+        self.assertEqual(list(ships.index), [0, 2])  # excluded size dropped, index kept
+
+        cfg = {'map': {'PO NUMBER': 'Customer_PO', 'CUSTOMER STYLE': 'Style', 'CUSTOMER COLOUR DESCRIPTION': 'Color'}}
+        exact, left = match_exact.match(orders, ships, cfg)
+        self.assertEqual(exact['CUSTOMER STYLE'].tolist(), ['LJ 123'])
+        self.assertEqual(left['Style'].tolist(), ['NEW1'])
+
+    def test_order_book_cache_invalidation(self):
+        """The order book is reused until the row count or content changes"""
+        orders = _orders()
+        first = normalise.order_book(orders, 'GREYSON')
+        cached_entry = normalise._ORDER_BOOK_CACHE['GREYSON']
+        normalise.order_book(orders.copy(), 'GREYSON')
+        self.assertIs(normalise._ORDER_BOOK_CACHE['GREYSON'], cached_entry)
+
+        changed = orders.copy()
+        changed.loc[1, 'CUSTOMER STYLE'] = 'LJ125'
+        rebuilt = normalise.order_book(changed, 'GREYSON')
+        self.assertIsNot(normalise._ORDER_BOOK_CACHE['GREYSON'], cached_entry)
+        self.assertEqual(rebuilt['CUSTOMER STYLE'].tolist(), ['LJ 123', 'LJ125'])
+        self.assertEqual(first['CUSTOMER STYLE'].tolist(), ['LJ 123', 'LJ124'])
+
+        normalise.order_book(pd.concat([changed, changed.iloc[:1]]), 'GREYSON')
+        self.assertEqual(normalise._ORDER_BOOK_CACHE['GREYSON'][0][0], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Unit tests for the shared dashboard query-result cache.
+"""
+import unittest
+import sqlite3
+from unittest import mock
+import pandas as pd
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from utils import query_cache
+
+
+class TestQueryResultCache(unittest.TestCase):
+    """Test TTL expiry, LRU eviction and version-based invalidation"""
+
+    def setUp(self):
+        self.cache = query_cache.QueryResultCache(ttl=60, max_entries=2, version_check_interval=5)
+        self.load = mock.Mock(side_effect=lambda: pd.DataFrame({"n": [1, 2]}))
+
+    def test_hit_returns_copy(self):
+        key = query_cache.make_key("SELECT 1", ["GREYSON"])
+        first = self.cache.get_or_load(key, self.load)
+        first["extra"] = 0
+        second = self.cache.get_or_load(key, self.load)
+
+        self.assertEqual(self.load.call_count, 1)
+        self.assertNotIn("extra", second.columns)
+        self.assertEqual(self.cache.stats["hits"], 1)
+
+    def test_params_are_part_of_key(self):
+        self.cache.get_or_load(query_cache.make_key("SELECT ?", ["A"]), self.load)
+        self.cache.get_or_load(query_cache.make_key("SELECT ?", ["B"]), self.load)
+        self.assertEqual(self.load.call_count, 2)
+        self.assertEqual(query_cache.make_key("SELECT 1", None), query_cache.make_key("SELECT 1", []))
+
+    def test_ttl_expiry(self):
+        self.cache.get_or_load("q", self.load)
+        with mock.patch("utils.query_cache.time.monotonic", return_value=query_cache.time.monotonic() + 120):
+            self.cache.get_or_load("q", self.load)
+        self.assertEqual(self.load.call_count, 2)
+        self.assertEqual(self.cache.stats["expired"], 1)
+
+    def test_lru_eviction(self):
+        for key in ("a", "b"):
+            self.cache.get_or_load(key, self.load)
+        self.cache.get_or_load("a", self.load)
+        self.cache.get_or_load("c", self.load)
+
+        self.assertEqual(self.cache.stats["evicted"], 1)
+        self.cache.get_or_load("a", self.load)
+        self.assertEqual(self.load.call_count, 3)
+        self.cache.get_or_load("b", self.load)
+        self.assertEqual(self.load.call_count, 4)
+
+    def test_new_session_invalidates(self):
+        """A finished matching session clears results; checks are throttled"""
+        versions = mock.Mock(side_effect=[("2025-01-01", "ENHANCED_1"), ("2025-01-02", "ENHANCED_2")])
+        self.cache.check_version(versions)
+        self.cache.get_or_load("q", self.load)
+
+        self.cache.check_version(versions)
+        self.assertEqual(versions.call_count, 1)
+
+        with mock.patch("utils.query_cache.time.monotonic", return_value=query_cache.time.monotonic() + 10):
+            self.cache.check_version(versions)
+        self.cache.get_or_load("q", self.load)
+        self.assertEqual(self.load.call_count, 2)
+        self.assertEqual(self.cache.stats["invalidations"], 1)
+
+    def test_session_sorting_lower_invalidates(self):
+        """Results stored by a session whose id sorts below the previous one still change the version"""
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE reconciliation_batch (end_time TEXT)")
+        conn.execute("CREATE TABLE enhanced_matching_results (id INTEGER PRIMARY KEY AUTOINCREMENT, matching_session_id TEXT)")
+        versions = lambda: tuple(conn.execute(query_cache.DATA_VERSION_QUERY).fetchone())
+
+        conn.execute("INSERT INTO enhanced_matching_results (matching_session_id) VALUES ('ZURIEL_4755_20250102')")
+        self.cache.check_version(versions)
+        self.cache.get_or_load("q", self.load)
+
+        conn.execute("INSERT INTO enhanced_matching_results (matching_session_id) VALUES ('ACME_1001_20250103')")
+        with mock.patch("utils.query_cache.time.monotonic", return_value=query_cache.time.monotonic() + 10):
+            self.cache.check_version(versions)
+        self.cache.get_or_load("q", self.load)
+        self.assertEqual(self.load.call_count, 2)
+        self.assertEqual(self.cache.stats["invalidations"], 1)
+
+    def test_load_across_invalidation_is_not_stored(self):
+        def load():
+            self.cache.invalidate()
+            return 1
+
+        self.cache.get_or_load("q", load)
+        self.assertEqual(self.cache.summary()["entries"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Unit tests for the indexed partial-match analysis in the reporter.
+"""
+import unittest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.core import reporter
+
+JOIN_COLS = ['PO NUMBER', 'CUSTOMER STYLE', 'CUSTOMER COLOUR DESCRIPTION', 'PLANNED DELIVERY METHOD']
+
+
+def scan_partial_matches(unmatched_ships, orders, join_cols):
+    """Reference: compare every shipment with every order"""
+    partial_matches = []
+    for _, ship in unmatched_ships.iterrows():
+        best_match = {"ship_id": ship.iloc[0], "matching_cols": [], "ship_data": {}}
+        for col in join_cols:
+            if col in ship.index:
+                best_match["ship_data"][col] = ship[col]
+        for _, order in orders.iterrows():
+            matching_cols = []
+            for col in join_cols:
+                if col in ship.index and col in order.index:
+                    if pd.notna(ship[col]) and pd.notna(order[col]):
+                        if str(ship[col]).strip() == str(order[col]).strip():
+                            matching_cols.append(col)
+            if len(matching_cols) > len(best_match["matching_cols"]):
+                best_match["matching_cols"] = matching_cols
+        partial_matches.append(best_match)
+    return partial_matches
+
+
+def _frame(rng, rows, id_col):
+    values = {
+        'PO NUMBER': rng.choice(['100', '200 ', '300', None], rows),
+        'CUSTOMER STYLE': rng.choice(['A', 'B', ' C', 'D'], rows),
+        'CUSTOMER COLOUR DESCRIPTION': rng.choice(['NAVY', 'RED', np.nan], rows),
+        'PLANNED DELIVERY METHOD': rng.choice(['SEA', 'AIR'], rows),
+    }
+    return pd.DataFrame({id_col: range(rows), **values})
+
+
+class TestAnalyzePartialMatches(unittest.TestCase):
+    """Test that the indexed analysis reproduces the full scan"""
+
+    def test_same_as_scan(self):
+        rng = np.random.default_rng(3)
+        for _ in range(5):
+            ships = _frame(rng, 40, 'shipment_id')
+            orders = _frame(rng, 60, 'order_id').drop(columns=['PLANNED DELIVERY METHOD'])
+            self.assertEqual(reporter.analyze_partial_matches(ships, orders, JOIN_COLS),
+                             scan_partial_matches(ships, orders, JOIN_COLS))
+
+    def test_first_order_wins_ties(self):
+        ships = pd.DataFrame({'id': [1], 'PO NUMBER': ['1'], 'CUSTOMER STYLE': ['A']})
+        orders = pd.DataFrame({'PO NUMBER': ['2', '1'], 'CUSTOMER STYLE': ['A', 'B']})
+        result = reporter.analyze_partial_matches(ships, orders, ['PO NUMBER', 'CUSTOMER STYLE'])
+        self.assertEqual(result[0]['matching_cols'], ['CUSTOMER STYLE'])
+
+    def test_no_orders(self):
+        ships = pd.DataFrame({'id': [1], 'PO NUMBER': ['1']})
+        result = reporter.analyze_partial_matches(ships, pd.DataFrame(), ['PO NUMBER'])
+        self.assertEqual(result, [{'ship_id': 1, 'matching_cols': [], 'ship_data': {'PO NUMBER': '1'}}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+Unit tests for the partitioned Parquet/Arrow results writer.
+"""
+import unittest
+import tempfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.core import results_writer
+from src.core.results_writer import ResultsWriter
+
+
+def shipments(ids, pos, dates, **columns):
+    return pd.DataFrame({
+        'shipment_id': ids,
+        'Customer_PO': pos,
+        'Style': ['ST-1'] * len(ids),
+        'Shipped_Date': pd.to_datetime(dates),
+        **columns
+    })
+
+
+class TestResultsWriter(unittest.TestCase):
+    """Test partition layout, appends across writes and the aggregated summary"""
+
+    def setUp(self):
+        if results_writer.pa is None:
+            self.skipTest("pyarrow not installed")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name) / 'results'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_partitions_round_trip(self):
+        """Rows land in customer/po/ship_date partitions that read back as columns"""
+        exact = shipments([1, 2, 3], ['PO1', 'PO1', 'PO2'], ['2025-01-01', '2025-01-02', '2025-01-01'])
+        exact = exact.rename(columns={'Customer_PO': 'PO NUMBER'})
+        with ResultsWriter(self.root) as writer:
+            writer.write('exact', exact, 'GREYSON')
+
+        files = sorted(str(path.relative_to(self.root)) for path in self.root.rglob('*.parquet'))
+        self.assertEqual(files, [
+            'exact/customer=GREYSON/po=PO1/ship_date=2025-01-01/part-0000.parquet',
+            'exact/customer=GREYSON/po=PO1/ship_date=2025-01-02/part-0000.parquet',
+            'exact/customer=GREYSON/po=PO2/ship_date=2025-01-01/part-0000.parquet',
+        ])
+        result = pd.read_parquet(self.root / 'exact').sort_values('shipment_id')
+        self.assertEqual(result['shipment_id'].tolist(), [1, 2, 3])
+        self.assertEqual(result['po'].astype(str).tolist(), ['PO1', 'PO1', 'PO2'])
+        self.assertEqual(result['Style'].tolist(), ['ST-1'] * 3)
+
+    def test_appends_follow_first_schema(self):
+        """Later writes to an open partition append with the first frame's columns"""
+        with ResultsWriter(self.root) as writer:
+            writer.write('unmatched', shipments([1], ['PO1'], ['2025-01-01'], Qty=[5]), 'GREYSON')
+            writer.write('unmatched', shipments([2], ['PO1'], ['2025-01-01'], Extra=['x']), 'GREYSON')
+
+        self.assertEqual(len(list(self.root.rglob('*.parquet'))), 1)
+        result = pd.read_parquet(self.root / 'unmatched').sort_values('shipment_id')
+        self.assertEqual(result['shipment_id'].tolist(), [1, 2])
+        self.assertNotIn('Extra', result.columns)
+        self.assertTrue(pd.isna(result['Qty'].iloc[1]))
+
+    def test_all_null_column_accepts_later_strings(self):
+        """A column that is all null in the first frame is a string column, in every partition"""
+        with ResultsWriter(self.root) as writer:
+            writer.write('unmatched', shipments([1], ['PO1'], ['2025-01-01'], Note=[np.nan]), 'GREYSON')
+            writer.write('unmatched', shipments([2, 3], ['PO1', 'PO2'], ['2025-01-01'] * 2, Note=['x', 'y']), 'GREYSON')
+
+        result = pd.read_parquet(self.root / 'unmatched').sort_values('shipment_id')
+        self.assertTrue(pd.isna(result['Note'].iloc[0]))
+        self.assertEqual(result['Note'].iloc[1:].tolist(), ['x', 'y'])
+
+    def test_files_are_readable_after_an_error(self):
+        """Leaving the with block on an exception still closes the files"""
+        with self.assertRaises(RuntimeError):
+            with ResultsWriter(self.root) as writer:
+                writer.write('unmatched', shipments([1], ['PO1'], ['2025-01-01']), 'GREYSON')
+                raise RuntimeError("matching failed")
+
+        self.assertEqual(pd.read_parquet(self.root / 'unmatched')['shipment_id'].tolist(), [1])
+
+    def test_closed_partition_gets_new_part(self):
+        """A partition evicted from the open writers continues in a new part file"""
+        with ResultsWriter(self.root, max_open=1) as writer:
+            writer.write('unmatched', shipments([1], ['PO1'], ['2025-01-01']), 'GREYSON')
+            writer.write('unmatched', shipments([2], ['PO2'], ['2025-01-01']), 'GREYSON')
+            writer.write('unmatched', shipments([3], ['PO1'], ['2025-01-01']), 'GREYSON')
+
+        parts = sorted(path.name for path in (self.root / 'unmatched/customer=GREYSON/po=PO1/ship_date=2025-01-01').iterdir())
+        self.assertEqual(parts, ['part-0000.parquet', 'part-0001.parquet'])
+        self.assertEqual(len(pd.read_parquet(self.root / 'unmatched')), 3)
+
+    def test_arrow_format(self):
+        """Arrow IPC files hold the partition's rows; missing keys use the placeholder partition"""
+        import pyarrow as pa
+        frame = shipments([1, 2], [None, 'PO1'], [None, '2025-01-01'])
+        with ResultsWriter(self.root, fmt='arrow') as writer:
+            writer.write('unmatched', frame, 'GREYSON')
+
+        path = self.root / 'unmatched/customer=GREYSON/po=__none__/ship_date=__none__/part-0000.arrow'
+        with pa.ipc.open_file(str(path)) as reader:
+            self.assertEqual(reader.read_all().column('shipment_id').to_pylist(), [1])
+
+    def test_summary_from_counts(self):
+        """Summary totals, per-date rows and unmatched POs come from the aggregated counts"""
+        exact = shipments([1, 2], ['PO1', 'PO1'], ['2025-01-01', '2025-01-02'])
+        fuzzy = shipments([3], ['PO2'], ['2025-01-01'], confidence=[0.8])
+        unmatched = shipments([4, 5], ['PO2', 'PO3'], ['2025-01-02', '2025-01-02'])
+        with ResultsWriter(self.root) as writer:
+            writer.write('exact', exact, 'GREYSON')
+            writer.write('fuzzy', fuzzy, 'GREYSON')
+            writer.write('unmatched', unmatched, 'GREYSON')
+            counts = writer.partition_counts()
+            summary = writer.summary_markdown('GREYSON', 'Q1')
+
+        self.assertEqual(counts[['exact', 'fuzzy', 'unmatched']].sum().tolist(), [2, 1, 2])
+        self.assertIn('| **Total Shipment Lines** | 5 | 100.0% |', summary)
+        self.assertIn('| **Total Matched** | 3 | 60.0% |', summary)
+        self.assertIn('| 2025-01-01 | 2 | 1 | 1 | 0 | 100.0% |', summary)
+        self.assertIn('| 2025-01-02 | 3 | 1 | 0 | 2 | 33.3% |', summary)
+        self.assertIn('- **Mean:** 80.0%', summary)
+        self.assertIn('| PO2 | 1 | 1 |', summary)
+
+    def test_rejects_unknown_kind(self):
+        with ResultsWriter(self.root) as writer:
+            with self.assertRaises(ValueError):
+                writer.write('partial', shipments([1], ['PO1'], ['2025-01-01']), 'GREYSON')
+
+
+if __name__ == '__main__':
+    unittest.main()
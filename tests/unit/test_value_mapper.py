@@ -0,0 +1,118 @@
+"""
+Unit tests for compiled ValueMapper lookups and Series mapping.
+"""
+import unittest
+import tempfile
+import numpy as np
+import pandas as pd
+import yaml
+from pathlib import Path
+import sys
+
+# Add project root to path for imports
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.value_mapper import FuzzyRuleEngine, ValueMapper, apply_value_mappings
+
+
+MAPPINGS = {
+    'global_mappings': {
+        'PLANNED DELIVERY METHOD': {
+            'mappings': [
+                {'order_value': 'FAST BOAT', 'shipment_values': ['SEA-FB', 'FB'], 'confidence': 0.95},
+                {'order_value': 'SEA', 'shipment_values': ['SEA', 'FB'], 'confidence': 0.6},
+                {'order_value': 'AIR', 'shipment_values': [], 'confidence': 1.0},
+            ]
+        },
+        'CUSTOMER STYLE': {
+            'mappings': [{'order_value': 'AB-100', 'shipment_values': ['AB100'], 'confidence': 1.0}],
+            'fuzzy_rules': {'enabled': True, 'rules': [{'pattern': 'remove_spaces_dashes', 'confidence': 0.9}]}
+        }
+    },
+    'customer_specific_mappings': {
+        'GREYSON': {
+            'PLANNED DELIVERY METHOD': {
+                'mappings': [{'order_value': 'FAST BOAT', 'shipment_values': ['GREYSON-FB'], 'confidence': 0.99}]
+            }
+        }
+    }
+}
+
+
+class TestValueMapper(unittest.TestCase):
+    """Test the compiled index against the configured lookup order"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        path = Path(self.tmp.name) / 'value_mappings.yaml'
+        path.write_text(yaml.safe_dump(MAPPINGS))
+        self.mapper = ValueMapper(path)
+
+    def test_exact_lookups(self):
+        """Case-insensitive, first mapping wins, customer before global"""
+        get = self.mapper.get_mapped_value
+        self.assertEqual(get('PLANNED DELIVERY METHOD', 'fast boat'), ('SEA-FB', 0.95))
+        self.assertEqual(get('PLANNED DELIVERY METHOD', 'FB', 'shipment_to_order'), ('FAST BOAT', 0.95))
+        self.assertEqual(get('PLANNED DELIVERY METHOD', 'FAST BOAT', customer='GREYSON'), ('GREYSON-FB', 0.99))
+        self.assertEqual(get('PLANNED DELIVERY METHOD', 'SEA', customer='GREYSON'), ('SEA', 0.6))
+        self.assertEqual(get('PLANNED DELIVERY METHOD', 'AIR'), (None, 0.0))
+        self.assertEqual(get('UNKNOWN', 'AIR'), (None, 0.0))
+
+    def test_fuzzy_rules_after_index_miss(self):
+        self.assertEqual(self.mapper.get_mapped_value('CUSTOMER STYLE', 'AB 100'), ('AB100', 0.9))
+
+    def test_add_mapping_recompiles(self):
+        self.mapper.add_mapping('PLANNED DELIVERY METHOD', 'COURIER', ['EXPRESS'], 0.9, 'test')
+        self.assertEqual(self.mapper.get_mapped_value('PLANNED DELIVERY METHOD', 'COURIER'), ('EXPRESS', 0.9))
+
+    def test_map_series(self):
+        """Series results equal per-value lookups"""
+        series = pd.Series(['FAST BOAT', None, 'SEA', 'UNKNOWN', 'FAST BOAT'], index=[5, 6, 7, 8, 9])
+        mapped, confidence = self.mapper.map_series(series, 'PLANNED DELIVERY METHOD')
+
+        self.assertEqual(mapped[[5, 7, 9]].tolist(), ['SEA-FB', 'SEA', 'SEA-FB'])
+        self.assertTrue(pd.isna(mapped[6]) and pd.isna(mapped[8]))
+        self.assertEqual(list(mapped.index), [5, 6, 7, 8, 9])
+        np.testing.assert_allclose(confidence, [0.95, 0.0, 0.6, 0.0, 0.95])
+
+    def test_apply_value_mappings(self):
+        """Only confident mappings are written back; categorical columns are supported"""
+        df = pd.DataFrame({'PLANNED DELIVERY METHOD': pd.Categorical(['FAST BOAT', 'SEA', 'AIR'])})
+        count = apply_value_mappings(df, {'PLANNED DELIVERY METHOD': 'Shipping_Method'}, mapper=self.mapper)
+
+        self.assertEqual(count, 1)
+        self.assertEqual(df['PLANNED DELIVERY METHOD'].tolist(), ['SEA-FB', 'SEA', 'AIR'])
+
+
+class TestFuzzyRuleEngine(unittest.TestCase):
+    """Test rule precedence, confidences and memoisation of the compiled fuzzy rules"""
+
+    RULES = {'threshold': 0.8, 'rules': [
+        {'pattern': 'extract_color_name', 'confidence': 0.9},
+        {'pattern': 'similar_spelling', 'confidence': 0.7},
+    ]}
+    MAPPINGS = [
+        {'order_value': '417 - MALTESE BLUE', 'shipment_values': ['MALTESE BLUE']},
+        {'order_value': 'ARCTIC', 'shipment_values': []},
+        {'order_value': 'NAVY BLUE', 'shipment_values': ['NAVY']},
+    ]
+
+    def test_earliest_mapping_then_rule_wins(self):
+        engine = FuzzyRuleEngine(self.RULES, self.MAPPINGS, 'order_to_shipment')
+        resolved = engine.resolve(['maltese blue', 'NAVY BLUX', 'ARCTIC', 'PURPLE'])
+
+        self.assertEqual(resolved['maltese blue'], ('MALTESE BLUE', 0.9))
+        self.assertEqual(resolved['NAVY BLUX'], ('NAVY', 0.7))
+        self.assertEqual(resolved['ARCTIC'], (None, 0.0))
+        self.assertEqual(resolved['PURPLE'], (None, 0.0))
+
+    def test_shipment_to_order_and_memo(self):
+        engine = FuzzyRuleEngine(self.RULES, self.MAPPINGS, 'shipment_to_order')
+        self.assertEqual(engine.resolve(['MALTESE BLUE'])['MALTESE BLUE'], ('417 - MALTESE BLUE', 0.9))
+        self.assertIn('MALTESE BLUE', engine._memo)
+
+
+if __name__ == '__main__':
+    unittest.main()
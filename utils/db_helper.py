@@ -1,17 +1,25 @@
 """
 Lightweight SQL helper for Kestra/data pipelines.
 - Loads DB credentials from config.yaml in the working directory
-- Uses ODBC Driver 17 for SQL Server
+- Uses ODBC Driver 17 for SQL Server (resolved once per process)
+- Pooled connections per db_key (utils/db_pool.py)
 - Provides canonical customer name transformation
 """
 
 import os
+import sys
 import pyodbc
 import pandas as pd
 import yaml
+from functools import lru_cache
 from pathlib import Path
 from typing import Union, Optional
 
+# db_helper is also imported as a top-level module (src/core/extractor.py),
+# so make sure the shared pool registry resolves as utils.db_pool
+sys.path.append(str(Path(__file__).parent.parent))
+from utils.db_pool import PooledConnection, pooled_connection, resolve_driver
+
 import warnings
 warnings.filterwarnings("ignore", message="pandas only supports SQLAlchemy connectable")
 
@@ -49,68 +57,54 @@ DB_CONFIG = get_database_config()
 # --------------------------
 # CONNECTION FACTORY
 # --------------------------
-def get_connection(db_key: str) -> pyodbc.Connection:
-    """
-    Create a pyodbc connection using config.yaml block for the given db_key.
-    Supports both conn_str format and individual key format.
-    Tries ODBC Driver 17 first, falls back to SQL Server if not available.
-    """
-    cfg = DB_CONFIG[db_key.lower()]
-    
+def _build_connection_string(cfg: dict) -> str:
+    """Connection string for a config.yaml database block"""
     # Check if using conn_str format (legacy compatibility)
     if 'conn_str' in cfg:
-        conn_str = cfg['conn_str'].strip()
-        return pyodbc.connect(conn_str)
-    
+        return cfg['conn_str'].strip()
+
     # Use individual key format
     driver = cfg.get("driver", DEFAULT_DRIVER)
-    
-    # If using default driver, try ODBC Driver 17 first, then fall back to SQL Server
+
+    # If using default driver, prefer ODBC Driver 17 and fall back to SQL Server
     if driver == DEFAULT_DRIVER:
-        drivers_to_try = ["{ODBC Driver 17 for SQL Server}", "{SQL Server}"]
-    else:
-        drivers_to_try = [driver]
-    
-    conn_parts_base = [
+        driver = resolve_driver(("{ODBC Driver 17 for SQL Server}", "{SQL Server}"))
+
+    conn_parts = [
+        f"DRIVER={driver}",
         f"SERVER={cfg['host']},{cfg['port']}",
         f"DATABASE={cfg['database']}"
     ]
 
     if cfg.get('trusted_connection', '').lower() in ('yes', 'true', '1'):
-        conn_parts_base.append("Trusted_Connection=yes")
+        conn_parts.append("Trusted_Connection=yes")
     else:
-        conn_parts_base.append(f"UID={cfg['username']}")
-        conn_parts_base.append(f"PWD={cfg['password']}")
+        conn_parts.append(f"UID={cfg['username']}")
+        conn_parts.append(f"PWD={cfg['password']}")
 
     encrypt = cfg.get('encrypt', 'yes').lower()
-    conn_parts_base.append(f"Encrypt={'yes' if encrypt in ('yes', 'true', '1') else 'no'}")
+    conn_parts.append(f"Encrypt={'yes' if encrypt in ('yes', 'true', '1') else 'no'}")
 
     trust_cert = cfg.get('trustServerCertificate', 'no').lower()
-    conn_parts_base.append(f"TrustServerCertificate={'yes' if trust_cert in ('yes', 'true', '1') else 'no'}")
+    conn_parts.append(f"TrustServerCertificate={'yes' if trust_cert in ('yes', 'true', '1') else 'no'}")
 
-    conn_parts_base.append("Connection Timeout=30")
-    
-    # Try each driver in order
-    last_error = None
-    for driver_attempt in drivers_to_try:
-        try:
-            conn_parts = [f"DRIVER={driver_attempt}"] + conn_parts_base
-            conn_str = ";".join(conn_parts) + ";"
-            return pyodbc.connect(conn_str)
-        except pyodbc.InterfaceError as e:
-            last_error = e
-            # If this is a driver not found error, try the next driver
-            if "Data source name not found" in str(e) or "IM002" in str(e):
-                continue
-            else:
-                # Different error, re-raise immediately
-                raise
-        except Exception as e:
-            # Non-driver related error, re-raise immediately
-            raise
-    
-    # If we get here, all drivers failed
-    raise last_error if last_error else Exception("No suitable ODBC driver found")
+    conn_parts.append("Connection Timeout=30")
+    return ";".join(conn_parts) + ";"
+
+@lru_cache(maxsize=None)
+def get_connection_string(db_key: str) -> str:
+    """Connection string for db_key, built once per process"""
+    return _build_connection_string(DB_CONFIG[db_key.lower()])
+
+def get_connection(db_key: str) -> PooledConnection:
+    """
+    Check out a pooled pyodbc connection for the config.yaml block of the given db_key.
+    Supports both conn_str format and individual key format.
+    The ODBC driver is resolved once (ODBC Driver 17, else SQL Server); closing
+    the connection or leaving its `with` block returns it to the pool.
+    """
+    conn_str = get_connection_string(db_key)
+    return pooled_connection(db_key.lower(), lambda: pyodbc.connect(conn_str), label=db_key.lower())
 
 # --------------------------
 # QUERY HELPERS
@@ -133,6 +127,28 @@ def run_query(
     with get_connection(db_key) as conn:
         return pd.read_sql(query, conn, params=params, index_col=index_col)
 
+def iter_query(
+    sql_or_path: Union[str, 'Path'],
+    db_key: str,
+    params: Optional[tuple] = None,
+    chunksize: int = 50_000
+):
+    """
+    Run a SELECT SQL and yield DataFrames of at most `chunksize` rows.
+    The connection stays open until the generator is exhausted or closed.
+    """
+    if isinstance(sql_or_path, str) and sql_or_path.strip().lower().endswith(".sql"):
+        with open(sql_or_path, "r") as f:
+            query = f.read()
+    else:
+        query = sql_or_path
+
+    conn = get_connection(db_key)
+    try:
+        yield from pd.read_sql(query, conn, params=params, chunksize=chunksize)
+    finally:
+        conn.close()
+
 def execute(
     sql_or_path: Union[str, 'Path'],
     db_key: str,
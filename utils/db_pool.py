@@ -0,0 +1,294 @@
+"""
+Project-wide pyodbc connection pool.
+- One bounded pool per key (a config.yaml db_key or a connection string)
+- Health check before reusing a connection that sat idle, recycling after a maximum lifetime
+- Thread-safe (Flask / Streamlit servers); pools are dropped in forked child processes
+- ODBC driver resolved once per process
+
+Settings (environment):
+    DB_POOL_SIZE            connections per pool (default 8; 0 disables pooling)
+    DB_POOL_MAX_LIFETIME    seconds before a connection is recycled (default 1800)
+    DB_POOL_HEALTH_CHECK    idle seconds after which a connection is pinged before reuse (default 30)
+    DB_POOL_TIMEOUT         seconds to wait for a free connection (default 30)
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Sequence
+
+import pyodbc
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DEFAULT_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+DEFAULT_HEALTH_CHECK_AFTER = float(os.getenv("DB_POOL_HEALTH_CHECK", "30"))
+DEFAULT_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+_pools: Dict[str, "ConnectionPool"] = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+@lru_cache(maxsize=None)
+def resolve_driver(candidates: Sequence[str]) -> str:
+    """
+    First of the candidate ODBC drivers (e.g. '{ODBC Driver 17 for SQL Server}')
+    installed on this machine, looked up once per process. Falls back to the
+    first candidate so the connect error names the driver that was expected.
+    """
+    installed = set(pyodbc.drivers())
+    for driver in candidates:
+        if driver.strip("{}") in installed:
+            return driver
+    logger.warning(f"None of the ODBC drivers {list(candidates)} are installed (found {sorted(installed)})")
+    return candidates[0]
+
+
+def describe(conn_str: str) -> str:
+    """Credential-free label for a connection string: server/database, or a short hash"""
+    parts = dict(
+        (key.strip().lower(), value.strip())
+        for key, _, value in (item.partition("=") for item in conn_str.split(";")) if value
+    )
+    server = parts.get("server")
+    if server:
+        return f"{re.sub(r'^tcp:', '', server)}/{parts.get('database', '')}"
+    return hashlib.sha1(conn_str.encode()).hexdigest()[:12]
+
+
+class PooledConnection:
+    """
+    pyodbc.Connection proxy handed out by a pool. close() (or leaving a
+    `with` block, which commits or rolls back like pyodbc does) returns the
+    connection to its pool instead of closing it.
+    """
+
+    def __init__(self, pool: Optional["ConnectionPool"], entry: "_Entry"):
+        self._pool = pool
+        self._entry = entry
+
+    @property
+    def raw(self) -> pyodbc.Connection:
+        if self._entry is None:
+            raise pyodbc.ProgrammingError("Attempt to use a closed connection.")
+        return self._entry.conn
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._entry is not None:
+            try:
+                if exc_type is None:
+                    self._entry.conn.commit()
+                else:
+                    self._entry.conn.rollback()
+            finally:
+                self.close()
+        return False
+
+    def close(self):
+        entry, self._entry = self._entry, None
+        if entry is None:
+            return
+        if self._pool is None:
+            entry.conn.close()
+        else:
+            self._pool.release(entry)
+
+    def discard(self):
+        """Close the underlying connection instead of returning it (e.g. after a fatal error)"""
+        entry, self._entry = self._entry, None
+        if entry is not None and self._pool is not None:
+            self._pool.release(entry, discard=True)
+        elif entry is not None:
+            entry.conn.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class _Entry:
+    __slots__ = ("conn", "created", "last_used", "generation")
+
+    def __init__(self, conn, generation: int = 0):
+        self.conn = conn
+        self.created = self.last_used = time.monotonic()
+        self.generation = generation
+
+
+class ConnectionPool:
+    """Bounded LIFO pool of connections created by `connect`"""
+
+    def __init__(self, connect: Callable[[], pyodbc.Connection], label: str = "",
+                 max_size: int = DEFAULT_POOL_SIZE, max_lifetime: float = DEFAULT_MAX_LIFETIME,
+                 health_check_after: float = DEFAULT_HEALTH_CHECK_AFTER, timeout: float = DEFAULT_ACQUIRE_TIMEOUT):
+        self.connect = connect
+        self.label = label
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self.timeout = timeout
+
+        self._idle = []
+        self._in_use = 0
+        self._generation = 0
+        self._cond = threading.Condition()
+        self.stats = {"created": 0, "reused": 0, "recycled": 0, "health_check_failures": 0,
+                      "discarded": 0, "waits": 0, "wait_seconds": 0.0, "connect_seconds": 0.0}
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return now - entry.created > self.max_lifetime or entry.generation != self._generation
+
+    def _count(self, name: str, value: float = 1):
+        with self._cond:
+            self.stats[name] += value
+
+    def _close_quietly(self, entry: _Entry):
+        try:
+            entry.conn.close()
+        except pyodbc.Error:
+            pass
+
+    def _healthy(self, entry: _Entry) -> bool:
+        try:
+            cursor = entry.conn.cursor()
+            cursor.execute("SELECT 1").fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def acquire(self) -> PooledConnection:
+        """Check out a connection, creating one if the pool is not full"""
+        if self.max_size <= 0:
+            return PooledConnection(None, _Entry(self.connect()))
+
+        deadline = None
+        with self._cond:
+            while not self._idle and self._in_use >= self.max_size:
+                if deadline is None:
+                    deadline = time.monotonic() + self.timeout
+                    self._count("waits")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No free database connection in pool '{self.label}' "
+                                       f"after {self.timeout:.0f}s ({self.max_size} in use)")
+                wait_start = time.monotonic()
+                self._cond.wait(remaining)
+                self._count("wait_seconds", time.monotonic() - wait_start)
+            entry = self._idle.pop() if self._idle else None
+            self._in_use += 1
+
+        # Connect and health-check outside the lock
+        try:
+            now = time.monotonic()
+            if entry is not None and self._expired(entry, now):
+                self._close_quietly(entry)
+                self._count("recycled")
+                entry = None
+            elif entry is not None and now - entry.last_used > self.health_check_after and not self._healthy(entry):
+                self._close_quietly(entry)
+                self._count("health_check_failures")
+                entry = None
+
+            if entry is None:
+                connect_start = time.monotonic()
+                entry = _Entry(self.connect(), self._generation)
+                self._count("created")
+                self._count("connect_seconds", time.monotonic() - connect_start)
+            else:
+                self._count("reused")
+        except BaseException:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, entry)
+
+    def release(self, entry: _Entry, discard: bool = False):
+        """Return a checked-out connection; uncommitted work is rolled back"""
+        now = time.monotonic()
+        if not discard and self._expired(entry, now):
+            self._count("recycled")
+            discard = True
+        if not discard:
+            try:
+                entry.conn.rollback()
+            except pyodbc.Error:
+                discard = True
+        if discard:
+            self._close_quietly(entry)
+            self._count("discarded")
+
+        with self._cond:
+            self._in_use -= 1
+            if not discard:
+                entry.last_used = now
+                self._idle.append(entry)
+            self._cond.notify()
+
+    def close_all(self):
+        """Close idle connections; checked-out ones are closed when returned"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._generation += 1
+        for entry in idle:
+            self._close_quietly(entry)
+
+    def summary(self) -> Dict:
+        with self._cond:
+            return {"label": self.label, "max_size": self.max_size,
+                    "in_use": self._in_use, "idle": len(self._idle), **self.stats}
+
+
+def get_pool(key: str, connect: Callable[[], pyodbc.Connection], label: Optional[str] = None) -> ConnectionPool:
+    """The pool registered under key, created with `connect` on first use"""
+    global _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # Sockets inherited through fork must not be shared with the parent
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(connect, label=label or key)
+            _pools[key] = pool
+        return pool
+
+
+def pooled_connection(key: str, connect: Callable[[], pyodbc.Connection], label: Optional[str] = None) -> PooledConnection:
+    """Check out a connection from the pool registered under key"""
+    return get_pool(key, connect, label).acquire()
+
+
+def connect(conn_str: str) -> PooledConnection:
+    """Pooled drop-in for pyodbc.connect(conn_str)"""
+    return pooled_connection(conn_str, lambda: pyodbc.connect(conn_str), label=describe(conn_str))
+
+
+def pool_stats() -> Dict[str, Dict]:
+    """Statistics of every pool in this process, by label"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.label: pool.summary() for pool in pools}
+
+
+def close_all():
+    """Close the idle connections of every pool"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
@@ -0,0 +1,149 @@
+"""
+Shared query-result cache for the Streamlit dashboards.
+- Results keyed on (query, params), expired after a TTL
+- Size-bounded, least-recently-used entries evicted first
+- Invalidated when the matching data changes: a cheap version query
+  (last reconciliation_batch end time / newest enhanced_matching_results id) is
+  re-read at most every few seconds and a new value clears the cache
+- Thread-safe and process-wide, so it survives Streamlit reruns
+
+Settings (environment):
+    QUERY_CACHE_TTL             seconds a result stays valid (default 300; 0 disables caching)
+    QUERY_CACHE_MAX_ENTRIES     results kept per cache (default 128)
+    QUERY_CACHE_VERSION_CHECK   seconds between data version checks (default 5)
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+import pandas as pd
+
+DEFAULT_TTL = float(os.getenv("QUERY_CACHE_TTL", "300"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "128"))
+DEFAULT_VERSION_CHECK = float(os.getenv("QUERY_CACHE_VERSION_CHECK", "5"))
+
+# Changes whenever a matching session finishes or stores results. Results are
+# only ever inserted (re-runs delete and re-insert), so the IDENTITY id grows
+# with every store; session ids are customer-prefixed and do not sort by time.
+DATA_VERSION_QUERY = """
+SELECT
+    (SELECT MAX(end_time) FROM reconciliation_batch) as last_batch_end,
+    (SELECT MAX(id) FROM enhanced_matching_results) as last_result_id
+"""
+
+_caches: Dict[str, "QueryResultCache"] = {}
+_caches_lock = threading.Lock()
+
+
+def make_key(query: str, params=None) -> tuple:
+    """Cache key for a query and its parameters"""
+    if params is None:
+        return (query, ())
+    if isinstance(params, dict):
+        return (query, tuple(sorted(params.items())))
+    return (query, tuple(params))
+
+
+class QueryResultCache:
+    """TTL + LRU cache of query results, cleared when the data version changes"""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 version_check_interval: float = DEFAULT_VERSION_CHECK):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version_check_interval = version_check_interval
+
+        self._entries = OrderedDict()
+        self._version = None
+        self._version_checked = None
+        self._generation = 0
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidations": 0}
+
+    def check_version(self, load_version: Callable[[], Any]):
+        """Re-read the data version if the last check is stale; clear the cache when it changed"""
+        now = time.monotonic()
+        with self._lock:
+            if self._version_checked is not None and now - self._version_checked < self.version_check_interval:
+                return
+            self._version_checked = now
+        version = load_version()
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self._clear("invalidations")
+                self._version = version
+
+    def get_or_load(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        """Cached result for key, calling load() on a miss"""
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return load()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return _copy(entry[1])
+            if entry is not None:
+                del self._entries[key]
+                self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            generation = self._generation
+
+        # Load outside the lock; concurrent misses for one key both query
+        value = load()
+        with self._lock:
+            # Results loaded across an invalidation may predate it
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats["evicted"] += 1
+        return _copy(value)
+
+    def invalidate(self):
+        """Drop every cached result (e.g. after the dashboard itself wrote data)"""
+        with self._lock:
+            self._clear("invalidations")
+            self._version_checked = None
+
+    def _clear(self, reason: str):
+        self._entries.clear()
+        self._generation += 1
+        self.stats[reason] += 1
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "ttl": self.ttl, **self.stats}
+
+
+def _copy(value):
+    # Callers add columns and reorder frames; keep the cached copy intact
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    return value
+
+
+def get_cache(key: str) -> QueryResultCache:
+    """The cache registered under key (e.g. a connection string), created on first use"""
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = QueryResultCache()
+            _caches[key] = cache
+        return cache
+
+
+def invalidate_all():
+    """Drop the results of every cache in this process"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.invalidate()